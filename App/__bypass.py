@@ -0,0 +1,541 @@
+import bisect
+import fnmatch
+import ipaddress
+import random
+import re
+import string
+import threading
+from functools import lru_cache
+from typing import NamedTuple
+
+from . import __log as _l
+
+LOCAL_ENTRY = "<local>"
+MATCH_CACHE_SIZE = 4096
+OPTIMIZED_CACHE_SIZE = 32
+VERIFY_SEED = 0  # the same list always gets the same corpus
+
+_WILDCARD = "*"
+_END = ""
+_IP_WILDCARDS = ("*", "x")
+_IP_ANY = "x"
+_LABEL_CHARS = string.ascii_lowercase + string.digits
+
+
+def normalizeHost(host: str) -> str:
+    host = host.strip().lower()
+    if host.startswith("["):
+        return host[1 : host.find("]")] if "]" in host else host[1:]
+    if host.count(":") == 1:
+        host = host.split(":", 1)[0]
+    return host.rstrip(".")
+
+
+def _parseIp(host: str) -> ipaddress.IPv4Address | ipaddress.IPv6Address | None:
+    if not host or not (host[0].isdigit() or ":" in host):
+        return None
+    try:
+        return ipaddress.ip_address(host)
+    except ValueError:
+        return None
+
+
+def ipNetwork(entry: str) -> ipaddress.IPv4Network | ipaddress.IPv6Network | None:
+    """`10.0.0.0/8`, `10.1.2.3`, `192.168.*`, `192.168.x.x` as a network, else None"""
+    if not entry or not (entry[0].isdigit() or ":" in entry):
+        return None  # a host name, skip the costly failed parse
+    try:
+        return ipaddress.ip_network(entry, strict=False)
+    except ValueError:
+        pass
+    octets = entry.split(".")
+    if len(octets) > 4 or octets[0] in _IP_WILDCARDS:
+        return None
+    fixed = []
+    for octet in octets:
+        if octet in _IP_WILDCARDS:
+            break
+        if not octet.isdigit() or int(octet) > 255:
+            return None
+        fixed.append(octet)
+    # wildcards have to be trailing: 10.*.0.1 is not a prefix
+    if any(o not in _IP_WILDCARDS for o in octets[len(fixed) :]):
+        return None
+    if len(fixed) == len(octets) and len(octets) < 4:
+        return None
+    return ipaddress.ip_network(
+        ".".join(fixed + ["0"] * (4 - len(fixed))) + f"/{8 * len(fixed)}"
+    )
+
+
+class _RadixTree:
+    """Binary trie on address bits, one per address family"""
+
+    def __init__(self: "_RadixTree"):
+        self._roots: dict[int, dict] = {4: {}, 6: {}}
+        self.size = 0
+
+    def insert(
+        self: "_RadixTree", network: ipaddress.IPv4Network | ipaddress.IPv6Network
+    ) -> None:
+        node = self._roots[network.version]
+        bits = network.max_prefixlen
+        value = int(network.network_address)
+        for i in range(network.prefixlen):
+            if _END in node:
+                return  # covered by a shorter prefix
+            node = node.setdefault((value >> (bits - 1 - i)) & 1, {})
+        node.clear()
+        node[_END] = True
+        self.size += 1
+
+    def contains(
+        self: "_RadixTree", address: ipaddress.IPv4Address | ipaddress.IPv6Address
+    ) -> bool:
+        node = self._roots[address.version]
+        bits = address.max_prefixlen
+        value = int(address)
+        for i in range(bits):
+            if _END in node:
+                return True
+            if (node := node.get((value >> (bits - 1 - i)) & 1)) is None:  # type: ignore
+                return False
+        return _END in node
+
+    def covers(
+        self: "_RadixTree", network: ipaddress.IPv4Network | ipaddress.IPv6Network
+    ) -> bool:
+        """Whether a single inserted prefix holds all of `network`"""
+        node = self._roots[network.version]
+        bits = network.max_prefixlen
+        value = int(network.network_address)
+        for i in range(network.prefixlen):
+            if _END in node:
+                return True
+            if (node := node.get((value >> (bits - 1 - i)) & 1)) is None:  # type: ignore
+                return False
+        return _END in node
+
+
+class _SuffixTrie:
+    """Domain labels from the right, `*` marks any subdomain below a node"""
+
+    def __init__(self: "_SuffixTrie"):
+        self._root: dict = {}
+        self.size = 0
+
+    def insert(self: "_SuffixTrie", labels: list[str], subdomains: bool) -> None:
+        node = self._root
+        for label in reversed(labels):
+            node = node.setdefault(label, {})
+        node[_WILDCARD if subdomains else _END] = True
+        self.size += 1
+
+    def contains(self: "_SuffixTrie", host: str) -> bool:
+        node = self._root
+        labels = host.split(".")
+        for i in range(len(labels) - 1, -1, -1):
+            if (node := node.get(labels[i])) is None:  # type: ignore
+                return False
+            if i > 0 and _WILDCARD in node:
+                return True
+        return _END in node
+
+
+class BypassMatcher:
+    """A compiled ProxyOverride list with WinINet matching rules.
+
+    Entries are case-insensitive. `<local>` matches host names without a
+    dot. `*.example.com` matches subdomains only, `.example.com` also
+    matches the domain itself. IP entries may be plain, CIDR, or end in `*`
+    or `x` octets (`192.168.*`, `192.168.x.x`). Any other wildcard pattern
+    falls back to a glob.
+    """
+
+    def __init__(self: "BypassMatcher", entries: list[str] | tuple[str, ...]):
+        self.entries = tuple(entries)
+        self.local = False
+        self._domains = _SuffixTrie()
+        self._networks = _RadixTree()
+        prefixes: list[str] = []
+        suffixes: list[str] = []
+        contains: set[str] = set()
+        globs: list[str] = []
+        for raw in entries:
+            entry = raw.strip().lower()
+            if "://" in entry:
+                entry = entry.split("://", 1)[1]
+            if not entry:
+                continue
+            if entry == LOCAL_ENTRY:
+                self.local = True
+            elif (network := ipNetwork(entry)) is not None:
+                self._networks.insert(network)
+            elif entry.startswith("*.") and _WILDCARD not in entry[2:]:
+                self._domains.insert(entry[2:].split("."), True)
+            elif entry.startswith(".") and _WILDCARD not in entry:
+                self._domains.insert(entry[1:].split("."), True)
+                self._domains.insert(entry[1:].split("."), False)
+            elif "?" in entry or "[" in entry:
+                globs.append(fnmatch.translate(entry))
+            elif _WILDCARD in (inner := entry.strip(_WILDCARD)) or not inner:
+                globs.append(fnmatch.translate(entry))
+            elif entry.startswith(_WILDCARD) and entry.endswith(_WILDCARD):
+                contains.add(inner)
+            elif entry.endswith(_WILDCARD):
+                prefixes.append(inner)
+            elif entry.startswith(_WILDCARD):
+                suffixes.append(inner)
+            else:
+                self._domains.insert(normalizeHost(entry).split("."), False)
+        # `a*`, `*a` and `*a*` cover nearly all wildcards seen in the wild and
+        # are plain string tests; only the rest goes through one regex
+        self._prefixes = tuple(prefixes)
+        self._suffixes = tuple(suffixes)
+        self._contains = contains
+        self._containsLengths = sorted({len(c) for c in contains})
+        self._glob = re.compile("|".join(globs)) if globs else None
+        self._cached = lru_cache(maxsize=MATCH_CACHE_SIZE)(self._match)
+
+    def _match(self: "BypassMatcher", host: str) -> bool:
+        host = normalizeHost(host)
+        if (address := _parseIp(host)) is not None:
+            if self._networks.contains(address):
+                return True
+        elif self.local and "." not in host:
+            return True
+        elif self._domains.contains(host):
+            return True
+        if host.startswith(self._prefixes) or host.endswith(self._suffixes):
+            return True
+        for n in self._containsLengths:
+            if any(host[i : i + n] in self._contains for i in range(len(host) - n + 1)):
+                return True
+        return self._glob is not None and self._glob.match(host) is not None
+
+    def shouldBypass(self: "BypassMatcher", host: str) -> bool:
+        """Whether requests to `host` skip the proxy. LRU cached per matcher."""
+        return self._cached(host)
+
+
+@lru_cache(maxsize=32)
+def matcher(entries: tuple[str, ...]) -> BypassMatcher:
+    return BypassMatcher(entries)
+
+
+def shouldBypass(entries: list[str] | tuple[str, ...] | str, host: str) -> bool:
+    if isinstance(entries, str):
+        entries = entries.split(";")
+    return matcher(tuple(entries)).shouldBypass(host)
+
+
+class OptimizeResult(NamedTuple):
+    entries: list[str]
+    before: int
+    duplicates: int
+    covered: int  # entries another wildcard already matches
+    merged: int  # IP entries folded into fewer patterns
+    equivalent: bool  # False when verification fell back to the original
+
+    @property
+    def after(self) -> int:
+        return len(self.entries)
+
+    def describe(self) -> str:
+        return (
+            f"{self.before} -> {self.after} entries ({self.duplicates} duplicate,"
+            f" {self.covered} covered, {self.merged} merged)"
+        )
+
+
+def _domainSuffixes(domain: str) -> list[str]:
+    labels = domain.split(".")
+    return [".".join(labels[i:]) for i in range(1, len(labels))]
+
+
+def _ipPatterns(
+    network: ipaddress.IPv4Network | ipaddress.IPv6Network, cidrs: list[int]
+) -> list[str]:
+    """Fewest registry entries for `network`, preferring octet wildcards"""
+    if network.prefixlen == network.max_prefixlen:
+        return [str(network.network_address)]
+    if network.version == 6 or network.prefixlen == 0:
+        return [str(network)]
+    if network.prefixlen % 8 == 0:
+        octets = str(network.network_address).split(".")[: network.prefixlen // 8]
+        return [".".join(octets + [_WILDCARD])]
+    # `cidrs` are the sorted starts of the CIDR entries, each inside one
+    # collapsed network
+    i = bisect.bisect_left(cidrs, int(network.network_address))
+    if i < len(cidrs) and cidrs[i] <= int(network.broadcast_address):
+        return [str(network)]  # written as CIDR to begin with, keep it that way
+    # built from aligned entries only, so this never grows the list
+    return [
+        p
+        for subnet in network.subnets(new_prefix=(network.prefixlen // 8 + 1) * 8)
+        for p in _ipPatterns(subnet, cidrs)
+    ]
+
+
+def _coveredByGlob(
+    domain: str, contains: re.Pattern | None, suffixes: tuple[str, ...]
+) -> bool:
+    """Every host ending in `domain` matches one of `*lit*` / `*lit`"""
+    return (
+        contains is not None and contains.search(domain) is not None
+    ) or domain.endswith(suffixes)
+
+
+def optimize(entries: list[str] | tuple[str, ...]) -> OptimizeResult:
+    """Shrink a bypass list without changing what it matches.
+
+    Drops duplicates and entries a wildcard already covers, and collapses
+    IP entries into the fewest octet wildcards (`10.1.*`). Like
+    `BypassMatcher`, this takes `10.1.*` to mean the addresses it names;
+    WinINet also globs it against host names, so a merged pattern can match
+    a name like `10.1.example.com` that the separate entries did not.
+    Entries with `x` octets are kept as written unless such a pattern covers
+    them. The result is not verified, see `verify` for that.
+    """
+    unique: list[str] = []
+    seen: set[str] = set()
+    for raw in entries:
+        entry = raw.strip().lower()
+        if entry and entry not in seen:
+            seen.add(entry)
+            unique.append(entry)
+    duplicates = len(entries) - len(unique)
+    if _WILDCARD in seen:
+        return OptimizeResult(
+            [_WILDCARD], len(entries), duplicates, len(unique) - 1, 0, True
+        )
+
+    ips: dict[str, ipaddress.IPv4Network | ipaddress.IPv6Network] = {}
+    networks: list[ipaddress.IPv4Network | ipaddress.IPv6Network] = []
+    cidrs: dict[int, list[int]] = {4: [], 6: []}
+    subdomains: set[str] = set()  # `*.d`
+    dotted: set[str] = set()  # `.d`
+    contains: list[str] = []  # `*lit*`
+    suffixes: list[str] = []  # `*lit`
+    wildcards: list[str] = []
+    for entry in unique:
+        if "://" in entry or entry == LOCAL_ENTRY:
+            continue
+        if (network := ipNetwork(entry)) is not None:
+            ips[entry] = network
+            if _IP_ANY in entry.split("."):
+                continue  # kept as written, see below
+            networks.append(network)
+            if "/" in entry:
+                cidrs[network.version].append(int(network.network_address))
+        elif entry.startswith("*.") and _WILDCARD not in entry[2:]:
+            subdomains.add(entry[2:])
+        elif entry.startswith(".") and _WILDCARD not in entry:
+            dotted.add(entry[1:])
+        elif _WILDCARD in entry or "?" in entry:
+            wildcards.append(entry)
+            inner = entry.strip(_WILDCARD)
+            if _WILDCARD not in inner and "?" not in inner and "[" not in inner:
+                if entry.startswith(_WILDCARD) and entry.endswith(_WILDCARD):
+                    contains.append(inner)
+                elif entry.startswith(_WILDCARD):
+                    suffixes.append(inner)
+    domainWildcards = subdomains | dotted
+    exactMatcher = BypassMatcher(
+        [f"*.{d}" for d in subdomains]
+        + [f".{d}" for d in dotted]
+        + wildcards
+        + ([LOCAL_ENTRY] if LOCAL_ENTRY in seen else [])
+    )
+
+    containsPattern = (
+        re.compile("|".join(map(re.escape, contains))) if contains else None
+    )
+    suffixesTuple = tuple(suffixes)
+
+    for starts in cidrs.values():
+        starts.sort()
+    # collapse_addresses sorts once and merges neighbours in a single pass
+    ipPatterns = [
+        p
+        for version in (4, 6)
+        for network in ipaddress.collapse_addresses(
+            n for n in networks if n.version == version  # type: ignore
+        )
+        for p in _ipPatterns(network, cidrs[version])
+    ]
+    # a `*` pattern also matches `10.1.x.x` as a string, whatever `x` means
+    stars = _RadixTree()
+    for p in ipPatterns:
+        if p.endswith(_WILDCARD):
+            stars.insert(ipNetwork(p))  # type: ignore
+
+    kept: list[str] = []
+    covered = 0
+    ipsPlaced = False
+    for entry in unique:
+        if entry == LOCAL_ENTRY:
+            continue
+        if "://" in entry:
+            kept.append(entry)
+        elif (network := ips.get(entry)) is not None:
+            if _IP_ANY in entry.split("."):
+                if stars.covers(network):
+                    covered += 1
+                else:
+                    kept.append(entry)
+            elif not ipsPlaced:
+                kept.extend(ipPatterns)
+                ipsPlaced = True
+        elif entry.startswith("*.") and (domain := entry[2:]) in subdomains:
+            if (
+                domain in dotted
+                or any(s in domainWildcards for s in _domainSuffixes(domain))
+                or _coveredByGlob("." + domain, containsPattern, suffixesTuple)
+            ):
+                covered += 1
+            else:
+                kept.append(entry)
+        elif entry.startswith(".") and (domain := entry[1:]) in dotted:
+            if any(
+                s in domainWildcards for s in _domainSuffixes(domain)
+            ) or _coveredByGlob(domain, containsPattern, suffixesTuple):
+                covered += 1
+            else:
+                kept.append(entry)
+        elif _WILDCARD in entry or "?" in entry:
+            kept.append(entry)
+        elif exactMatcher.shouldBypass(entry):
+            covered += 1
+        else:
+            kept.append(entry)
+    if LOCAL_ENTRY in seen:
+        kept.append(LOCAL_ENTRY)  # where Windows puts it
+    merged = len(networks) - len(ipPatterns)
+    return OptimizeResult(kept, len(entries), duplicates, covered, merged, True)
+
+
+def _fill(pattern: str, rng: random.Random) -> str:
+    return "".join(
+        (
+            "".join(rng.choices(_LABEL_CHARS, k=rng.randrange(0, 4)))
+            if c == _WILDCARD
+            else rng.choice(_LABEL_CHARS) if c == "?" else c
+        )
+        for c in pattern
+    )
+
+
+def _probeHosts(entries: list[str] | tuple[str, ...], rng: random.Random) -> set[str]:
+    """Hosts on both sides of every entry's edge, plus random ones"""
+    hosts: set[str] = set()
+    for raw in entries:
+        entry = raw.strip().lower()
+        if "://" in entry:
+            entry = entry.split("://", 1)[1]
+        if not entry or entry == LOCAL_ENTRY:
+            continue
+        if (network := ipNetwork(entry)) is not None:
+            first = int(network.network_address)
+            last = int(network.broadcast_address)
+            for value in (first - 1, first, rng.randint(first, last), last, last + 1):
+                if 0 <= value < 2**network.max_prefixlen:
+                    hosts.add(str(ipaddress.ip_address(value)))
+            continue
+        domain = _fill(entry.lstrip("*."), rng)
+        label = "".join(rng.choices(_LABEL_CHARS, k=3))
+        hosts.update(
+            (
+                domain,
+                f"{label}.{domain}",
+                f"{label}.{label}.{domain}",
+                f"{label}{domain}",
+                _fill(entry, rng),
+            )
+        )
+        if "." in domain:
+            hosts.add(domain.split(".", 1)[1])
+    for _ in range(64):
+        hosts.add(".".join(str(rng.randrange(256)) for _ in range(4)))
+        hosts.add("".join(rng.choices(_LABEL_CHARS, k=8)))
+        hosts.add("".join(rng.choices(_LABEL_CHARS, k=8)) + ".com")
+    return hosts
+
+
+def verify(
+    original: list[str] | tuple[str, ...],
+    optimized: list[str] | tuple[str, ...],
+    seed: int | None = None,
+) -> list[str]:
+    """Hosts the two lists disagree on, from a randomized corpus.
+
+    The corpus probes every entry of either list just inside and just
+    outside of what it matches.
+    """
+    rng = random.Random(seed)
+    before = BypassMatcher(original)
+    after = BypassMatcher(optimized)
+    hosts = _probeHosts(original, rng) | _probeHosts(optimized, rng)
+    return sorted(h for h in hosts if before._match(h) != after._match(h))
+
+
+def optimized(entries: tuple[str, ...]) -> OptimizeResult:
+    """`optimize`, or the original list if `verify` finds a host they disagree on.
+
+    Cached per list. Verifying a long list takes seconds, callers on the
+    apply path use `prepared` instead.
+    """
+    with _lock:
+        if (result := _optimized.get(entries)) is not None:
+            return result
+    result = optimize(entries)
+    if verify(entries, result.entries, VERIFY_SEED):
+        result = OptimizeResult(list(entries), len(entries), 0, 0, 0, False)
+    with _lock:
+        _optimized[entries] = result
+        while len(_optimized) > OPTIMIZED_CACHE_SIZE:
+            del _optimized[next(iter(_optimized))]
+    return result
+
+
+def prepared(entries: tuple[str, ...]) -> OptimizeResult | None:
+    """`optimized(entries)` if it is done, else None after queueing it"""
+    with _lock:
+        if (result := _optimized.get(entries)) is not None:
+            return result
+    prepare(entries)
+    return None
+
+
+def prepare(entries: tuple[str, ...]) -> None:
+    """Run `optimized` for `entries` on the background worker"""
+    global _worker
+    with _lock:
+        if entries in _optimized or entries in _pending:
+            return
+        _pending[entries] = None
+        if _worker is None:
+            _worker = threading.Thread(target=_prepareLoop, daemon=True)
+            _worker.start()
+
+
+def _prepareLoop() -> None:
+    global _worker
+    while True:
+        with _lock:
+            if not _pending:
+                _worker = None
+                return
+            entries = next(iter(_pending))
+        try:
+            optimized(entries)
+        except Exception as e:
+            _l.error(f"failed to optimize bypass list: {e}")
+        with _lock:
+            _pending.pop(entries, None)
+
+
+_lock = threading.Lock()
+_optimized: dict[tuple[str, ...], OptimizeResult] = {}
+_pending: dict[tuple[str, ...], None] = {}  # insertion ordered
+_worker: threading.Thread | None = None
@@ -1,14 +1,20 @@
 import json as _json
 import re
 from pathlib import Path
-from typing import Any, Callable, TypeVar
+from typing import Any, Callable, Mapping, NamedTuple, TypeVar
 
+from . import __bypass as _bp
+from . import __events as _ev
 from . import __log as _l
+from . import __state as _state
+from . import __store as _store
 from . import __utils as _u
 from .__proxy import (
     Network,
+    Proxy,
     ProxyConfig,
     getCurrentProxy,
+    parseOverride,
 )
 
 SAVE_FILE = _u.getExeRelPath("config.json")
@@ -26,7 +32,23 @@ def checkConfigName(name: str) -> bool:
     )
 
 
+def configs() -> Mapping[str, ProxyConfig]:
+    """The configs of the current snapshot, read-only"""
+    return _state.current().configs
+
+
+def active() -> str | None:
+    return _state.current().active
+
+
 def save() -> None:
+    proxyConfig = configs()
+    if _store.active():
+        _store.replaceAll(
+            {k: v.model_dump() for k, v in proxyConfig.items()}, generalConfig
+        )
+        _l.info(f"saved {len(proxyConfig)} proxy configs to {_store.STORE_FILE}")
+        return
     with SAVE_FILE.open("w", encoding="utf-8") as f:
         _json.dump(
             {
@@ -40,8 +62,41 @@ def save() -> None:
         _l.info(f"saved {len(proxyConfig)} proxy configs to {SAVE_FILE}")
 
 
+def _persist(
+    changes: dict[str, ProxyConfig | None],
+    general: dict[str, Any] | None = None,
+    remap: dict[str, str] | None = None,
+) -> None:
+    """Write changed configs and settings; one row each with the store"""
+    if not _store.active():
+        save()
+        return
+    _store.putConfigs(
+        {k: None if v is None else v.model_dump() for k, v in changes.items()},
+        general,
+        remap,
+    )
+    _l.info(f"saved {len(changes)} proxy configs to {_store.STORE_FILE}")
+
+
 def load() -> None:
-    global proxyConfig, generalConfig
+    global generalConfig
+    if _store.exists():
+        try:
+            _store.connect()
+            proxyConfig = {
+                k: ProxyConfig.model_validate(v)
+                for k, v in _store.loadConfigs().items()
+            }
+            _state.update(configs=proxyConfig)
+            _prepareOverrides(proxyConfig)
+            generalConfig = _store.loadGeneral()  # type: ignore
+            _l.info(f"loaded config store {_store.STORE_FILE}")
+            return
+        except Exception as e:
+            # keep the database for inspection, it is not overwritten
+            _store.close()
+            _l.error(f"failed to load config store, using {SAVE_FILE}: {e}")
     if SAVE_FILE.exists():
         try:
             with SAVE_FILE.open("r", encoding="utf-8") as f:
@@ -51,6 +106,8 @@ def load() -> None:
                     k: ProxyConfig.model_validate(v)
                     for k, v in config.get("proxy", {}).items()
                 }
+                _state.update(configs=proxyConfig)
+                _prepareOverrides(proxyConfig)
                 generalConfig = config.get("general", {})  # type: ignore
             return
         except:
@@ -70,69 +127,152 @@ def load() -> None:
         _l.info(f"created new config file {SAVE_FILE}")
 
 
+def _prepareOverrides(proxyConfig: Mapping[str, ProxyConfig]) -> None:
+    # optimized ahead of time, applying a config writes what is ready
+    for config in proxyConfig.values():
+        if isinstance(config.proxy, Proxy):
+            _bp.prepare(tuple(config.proxy.noProxyies))
+
+
+def isCurrent(config: ProxyConfig, current: ProxyConfig) -> bool:
+    if config == current:
+        return True
+    if not isinstance(config.proxy, Proxy):
+        return False
+    # the registry holds the optimized bypass list, not the saved one
+    written = config.proxy.model_copy(
+        update={"noProxyies": list(parseOverride(config.proxy.overrideString))}
+    )
+    return written == current.proxy
+
+
 def identifyActive() -> None:
-    global activeProxyKey
+    proxyConfig = configs()
+    key = None
     if len(proxyConfig) > 0:
         try:
             currentProxy = getCurrentProxy()
-            activeProxyKey = next(
-                k for k, v in proxyConfig.items() if v == currentProxy
-            )
+            key = next(k for k, v in proxyConfig.items() if isCurrent(v, currentProxy))
         except (ValueError, StopIteration):
             pass
-    _l.info(f"active proxy config identified as {activeProxyKey}")
+    if key is not None:
+        _state.update(active=key)
+    key = active()
+    _l.info(f"active proxy config identified as {key}")
+    _ev.publish("config", key)
 
 
 def setCurrentProxy(key: str) -> None:
-    global activeProxyKey
-    if key not in proxyConfig:
+    if (config := configs().get(key)) is None:
         _l.error(f"proxy config {key} not found")
         return
-    proxyConfig[key].proxy.apply()
-    activeProxyKey = key
+    config.proxy.apply()
+    _state.update(active=key)
+    _ev.publish("config", key)
     configSetCallback(key)
 
 
+def _merged(
+    snap: _state.Snapshot, changes: dict[str, ProxyConfig | None]
+) -> dict[str, ProxyConfig]:
+    merged = snap.configs.copy()
+    for key, proxy in changes.items():
+        if proxy is None:
+            merged.pop(key, None)
+        else:
+            merged[key] = proxy
+    return merged
+
+
+def _commit(
+    changes: dict[str, ProxyConfig | None],
+    renames: dict[str, str | None],
+    active: Callable[[str | None], str | None],
+    general: dict[str, Any] | None = None,
+) -> _state.Snapshot:
+    """Publish `changes` with the active key `active` picks and whatever the
+    `renames` (old name -> new name, None when removed) cascade to, then save
+    all of it in one write"""
+    cascade = Cascade({}, {}, {})
+
+    def change(snap: _state.Snapshot) -> dict[str, Any]:
+        nonlocal cascade
+        if renames:
+            cascade = cascadeCallback(snap, renames)
+        return {
+            "configs": _merged(snap, changes),
+            "active": active(snap.active),
+            **cascade.fields,
+        }
+
+    snap = _state.modify(change)
+    _prepareOverrides({k: v for k, v in changes.items() if v is not None})
+    general = {**(general or {}), **cascade.general}
+    generalConfig.update(general)
+    _persist(changes, general, cascade.remap)
+    _ev.publish("configs", {"changed": list(changes), "renamed": renames})
+    return snap
+
+
 def removeProxy(key: str) -> None:
-    global activeProxyKey
-    if key not in proxyConfig:
+    if key not in configs():
         _l.error(f"proxy config {key} not found")
         return
-    del proxyConfig[key]
-    save()
-    if key == activeProxyKey:
-        activeProxyKey = None
+    _commit({key: None}, {key: None}, lambda a: None if a == key else a)
 
 
 def addProxy(key: str, proxy: ProxyConfig) -> None:
-    global activeProxyKey
-    if key in proxyConfig:
+    if key in configs():
         _l.error(f"proxy config {key} already exists")
         return
-    proxyConfig[key] = proxy
-    save()
-    if activeProxyKey is None:
-        activeProxyKey = key
+    _commit({key: proxy}, {}, lambda a: key if a is None else a)
 
 
 def updateProxy(oldKey: str, key: str, proxy: ProxyConfig) -> None:
-    global activeProxyKey
-    if oldKey not in proxyConfig:
+    if oldKey not in configs():
         _l.error(f"proxy config {key} not found")
         return
+    changes: dict[str, ProxyConfig | None] = {}
+    renames: dict[str, str | None] = {}
     if oldKey != key:
-        del proxyConfig[oldKey]
-    proxyConfig[key] = proxy
-    save()
-    if activeProxyKey == oldKey:
-        activeProxyKey = key
+        changes[oldKey] = None
+        renames[oldKey] = key
+    changes[key] = proxy
+    snap = _commit(changes, renames, lambda a: key if a == oldKey else a)
+    if snap.active == key:
         proxy.proxy.apply()
 
 
+def updateProxies(
+    changes: dict[str, ProxyConfig | None], general: dict[str, Any] | None = None
+) -> None:
+    """Add or replace several configs, or remove them with None, in one save.
+
+    `general` settings are written with them.
+    """
+    if not changes:
+        if general:
+            generalConfig.update(general)
+            _persist({}, general)
+        return
+    snap = _commit(
+        changes,
+        {k: None for k, v in changes.items() if v is None},
+        lambda a: None if changes.get(a, True) is None else a,  # type: ignore
+        general,
+    )
+    if (proxy := changes.get(snap.active)) is not None:  # type: ignore
+        proxy.proxy.apply()
+    _l.info(f"updated {len(changes)} proxy configs")
+
+
 def setGeneral(key: str, value: Any) -> None:
     global generalConfig
     generalConfig[key] = value
-    save()
+    if _store.active():
+        _store.putGeneral(key, value)
+    else:
+        save()
 
 
 def getGeneral(key: str, default: _T) -> _T:
@@ -142,7 +282,7 @@ def getGeneral(key: str, default: _T) -> _T:
 
 def nwInfoToText(nwInfo: Network) -> str:
     return (
-        f"{nwInfo.ssid}{NWINFO_TEXT_SPLITTER}{nwInfo.mac}"
+        f"{nwInfo.ssid}{NWINFO_TEXT_SPLITTER}{nwInfo.mac or ''}"
         if nwInfo.ssid is not None
         else nwInfo.mac or ""
     )
@@ -159,12 +299,17 @@ def textToNwInfo(text: str) -> Network:
     )
 
 
+class Cascade(NamedTuple):
+    """What renaming or removing configs changes elsewhere, saved with them"""
+
+    fields: dict[str, Any]  # snapshot fields
+    general: dict[str, Any]  # settings
+    remap: dict[str, str]  # old -> new config of mappings in the store
+
+
 ConfigSerCallbackType = Callable[[str], None]
+CascadeCallbackType = Callable[[_state.Snapshot, dict[str, str | None]], Cascade]
 
-proxyConfig: dict[str, ProxyConfig] = {}
 generalConfig: dict[str | None, Any] = {}
-activeProxyKey: str | None = None
 configSetCallback: ConfigSerCallbackType = lambda _: None
-
-load()
-identifyActive()
+cascadeCallback: CascadeCallbackType = lambda *_: Cascade({}, {}, {})
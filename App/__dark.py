@@ -33,14 +33,16 @@ def _monitor_registry_changes() -> None:
     lastWindow: bool = _key.queryValue(WINDOW_THEME_ENTRY)[1] == 1
     lastTaskbar: bool = _key.queryValue(TASKBAR_THEME_ENTRY)[1] == 1
     while True:
-        if _key is None:
+        if (key := _key) is None:
             return
-        _key.notifyChange()
+        key.notifyChange()
         if _key is None:
             return
         _l.debug(f"theme registry changed")
-        window: bool = _key.queryValue(WINDOW_THEME_ENTRY)[1] == 1
-        taskbar: bool = _key.queryValue(TASKBAR_THEME_ENTRY)[1] == 1
+        window: bool = key.queryValue(WINDOW_THEME_ENTRY)[1] == 1
+        taskbar: bool = key.queryValue(TASKBAR_THEME_ENTRY)[1] == 1
+        if _key is not key:  # stopped meanwhile, the reads may have failed
+            return
         if window != lastWindow:
             lastWindow = window
             _l.debug(f"window theme changed to {window}")
@@ -0,0 +1,349 @@
+import signal
+import sqlite3
+import sys
+import threading
+import urllib.parse
+from typing import Any
+
+from . import __config as _c
+from . import __events as _ev
+from . import __forward as _fw
+from . import __group as _g
+from . import __health as _h
+from . import __ipc as _ipc
+from . import __log as _l
+from . import __mapping as _m
+from . import __netcache as _nc
+from . import __pac as _pac
+from . import __pacjs as _js
+from . import __proxy as _p
+from . import __reg as reg
+from . import __state as _state
+from . import __status as _st
+from . import __store as _store
+from . import __subscription as _sub
+from . import __wpad as _wpad
+
+
+class AlreadyRunningError(RuntimeError):
+    """Another instance owns the control endpoint"""
+
+
+class EmulatedRegistryError(RuntimeError):
+    """Only the in-memory registry is available, see `__reg`"""
+
+
+def _cmdList(_: Any) -> dict[str, Any]:
+    snap = _state.current()
+    return {"configs": list(snap.configs.keys()), "active": snap.active}
+
+
+def _cmdSwitch(key: Any) -> str:
+    if key not in _c.configs():
+        raise _ipc.IpcError(f"proxy config {key} not found")
+    _c.setCurrentProxy(key)
+    return key
+
+
+def _cmdToggle(enabled: Any) -> bool:
+    enabled = not _p.getEnabled() if enabled is None else bool(enabled)
+    _p.setEnabled(enabled)
+    return enabled
+
+
+def _cmdReapply(_: Any) -> None:
+    threading.Thread(
+        target=_m.applyMapping, kwargs={"force": True}, daemon=True
+    ).start()
+
+
+def _cmdStatus(_: Any) -> dict[str, Any]:
+    try:
+        server = _p.getCurrentProxy().proxy.url
+    except ValueError:
+        server = None
+    snap = _state.current()
+    return {
+        "enabled": _p.getEnabled(),
+        "active": snap.active,
+        "server": server,
+        "autoMap": _m.active(),
+        "network": str(snap.network) if snap.network is not None else None,
+        "version": snap.version,
+    }
+
+
+def _cmdHealth(force: Any) -> dict[str, dict[str, Any]]:
+    return {k: v.toDict() for k, v in _h.check(force=bool(force)).items()}
+
+
+def _cmdForward(_: Any) -> dict[str, Any]:
+    return _fw.stats()
+
+
+def _staticProxy() -> _p.Proxy:
+    """The proxy behind ProxyServer, by config so the forwarder is looked through"""
+    snap = _state.current()
+    if snap.active is not None and snap.active in snap.configs:
+        proxy = snap.configs[snap.active].proxy
+        member = _g.current(snap.active) if isinstance(proxy, _p.GroupProxy) else None
+        if member is not None and member in snap.configs:
+            proxy = snap.configs[member].proxy
+        if isinstance(proxy, _p.Proxy):
+            return proxy
+    return _p.getCurrentProxy().proxy
+
+
+def resolve(url: str) -> list[str]:
+    """Where the system sends a request for `url`, as PAC result entries.
+
+    Follows WinINet: AutoConfigURL first, whether or not the static proxy
+    is enabled, then ProxyServer with its bypass list.
+
+    Raises:
+        PacFetchError: The PAC file cannot be fetched.
+        PacError: The PAC file fails to run.
+    """
+    if (autoConfig := _p.getAutoConfigURL()) is not None:
+        if _pac.active() and autoConfig == _pac.url():
+            return _js.parseResult(_pac.script().findProxy(url))
+        return _wpad.resolve(url, _p.PacProxy(pacUrl=autoConfig))
+    if not _p.getEnabled():
+        return [_pac.DIRECT]
+    proxy = _staticProxy()
+    if proxy.shouldBypass(urllib.parse.urlsplit(url).hostname or ""):
+        return [_pac.DIRECT]
+    return [_pac.proxyString(proxy)]
+
+
+def _cmdResolve(url: Any) -> list[str]:
+    if not isinstance(url, str) or "://" not in url:
+        raise _ipc.IpcError("resolve needs an absolute url")
+    try:
+        return resolve(url)
+    except (_wpad.PacFetchError, _js.PacError, ValueError) as e:
+        raise _ipc.IpcError(str(e))
+
+
+def _cmdBypass(host: Any) -> bool:
+    if not isinstance(host, str) or not host:
+        raise _ipc.IpcError("bypass needs a host name")
+    host = f"[{host}]" if ":" in host else host
+    return _cmdResolve(f"http://{host}/") == [_pac.DIRECT]
+
+
+def _cmdSubscriptions(force: Any) -> dict[str, dict[str, Any]]:
+    return {k: v.toDict() for k, v in _sub.refresh(force=bool(force)).items()}
+
+
+def migrateStore() -> str:
+    """Move config.json into the SQLite store, read from then on"""
+    if _store.active():
+        raise FileExistsError(f"already using {_store.STORE_FILE}")
+    mappings = [(nw.ssid, nw.mac, conf) for nw, conf in _m.config().items()]
+    general = {
+        k: v for k, v in _c.generalConfig.items() if k != _m.AUTO_MAP_CONFIG_ENTRY
+    }
+    configs = {k: v.model_dump() for k, v in _c.configs().items()}
+    _store.migrate(configs, general, mappings)  # type: ignore
+    _c.generalConfig.pop(_m.AUTO_MAP_CONFIG_ENTRY, None)
+    # kept as a backup, a config.db next to it always wins
+    _c.SAVE_FILE.replace(_c.SAVE_FILE.with_name(f"{_c.SAVE_FILE.name}.migrated"))
+    return str(_store.STORE_FILE)
+
+
+def _cmdMigrate(_: Any) -> str:
+    try:
+        return migrateStore()
+    except (OSError, sqlite3.Error) as e:
+        raise _ipc.IpcError(str(e))
+
+
+def _cmdNetcache(_: Any) -> dict[str, Any]:
+    return _nc.stats().toDict()
+
+
+def _cmdFlaps(_: Any) -> dict[str, Any]:
+    return _m.flaps()
+
+
+def _cmdPac(_: Any) -> dict[str, Any]:
+    return dict(_pac.info(), consumer=_wpad.stats())
+
+
+def _reapplyActive() -> None:
+    snap = _state.current()
+    if snap.active is not None:
+        snap.configs[snap.active].proxy.apply()
+
+
+def startForwarder() -> None:
+    # both take over applying configs, only one at a time
+    if _pac.active():
+        _c.setGeneral(_pac.PAC_ENABLED_ENTRY, False)
+        _pac.stop()
+    _fw.start(_c.getGeneral(_fw.FORWARD_PORT_ENTRY, _fw.FORWARD_DEFAULT_PORT))
+    # routes the registry through the forwarder and selects the upstream
+    _reapplyActive()
+
+
+def startPac() -> None:
+    if _fw.active():
+        _c.setGeneral(_fw.FORWARD_ENABLED_ENTRY, False)
+        _fw.stop()
+    _pac.start(_c.getGeneral(_pac.PAC_PORT_ENTRY, _pac.PAC_DEFAULT_PORT))
+    # serves the active config as the PAC default and writes AutoConfigURL,
+    # or writes it as a static proxy if the port was taken
+    _reapplyActive()
+
+
+def _publishStatus(sub: _ev.Subscription, page: _st.StatusPage) -> None:
+    while (event := sub.get()) is not None:
+        if event.kind == "enabled":
+            page.update(enabled=event.value)
+        elif event.kind == "config":
+            page.update(key=event.value, lastSwitch=event.ts)
+        elif event.kind == "server":
+            try:
+                _, host, port = _p.splitURL(event.value or "")
+                page.update(host=host, port=port)
+            except ValueError:
+                page.update(host=event.value, port=None)
+        elif event.kind == "network":
+            page.update(network=str(_p.Network.model_validate(event.value)))
+
+
+class Engine:
+    """Qt-free core: config store, network mapping and proxy watcher.
+
+    Nothing is loaded, no thread is started and the registry is not touched
+    until `start()` is called, so the GUI and the headless daemon share it.
+
+    Args:
+        autoMap (bool | None): Force auto mapping on or off for this run
+            without persisting it. `None` follows the saved option.
+    """
+
+    def __init__(self: "Engine", autoMap: bool | None = None):
+        self.autoMap = autoMap
+        self._running = False
+        self._stopEvent = threading.Event()
+        self._statusSub: _ev.Subscription | None = None
+        self._statusPage: _st.StatusPage | None = None
+
+    @property
+    def running(self: "Engine") -> bool:
+        return self._running
+
+    def start(self: "Engine") -> None:
+        if self._running:
+            return
+        _l.info("starting engine...")
+        if not reg.emulationAllowed():
+            raise EmulatedRegistryError(
+                f"no system registry on {sys.platform}, set"
+                f" {reg.EMULATION_ENV}=1 to run on the in-memory one"
+            )
+        if not _ipc.start():
+            raise AlreadyRunningError(f"{_ipc.IPC_ADDRESS} is in use")
+        _ipc.register("list", _cmdList)
+        _ipc.register("switch", _cmdSwitch)
+        _ipc.register("toggle", _cmdToggle)
+        _ipc.register("reapply", _cmdReapply)
+        _ipc.register("status", _cmdStatus)
+        _ipc.register("health", _cmdHealth)
+        _ipc.register("forward", _cmdForward)
+        _ipc.register("bypass", _cmdBypass)
+        _ipc.register("pac", _cmdPac)
+        _ipc.register("resolve", _cmdResolve)
+        _ipc.register("subscriptions", _cmdSubscriptions)
+        _ipc.register("migrate", _cmdMigrate)
+        _ipc.register("netcache", _cmdNetcache)
+        _ipc.register("flaps", _cmdFlaps)
+        _ipc.registerStream("subscribe", _ev.serve)
+        try:
+            self._stopEvent.clear()
+            try:
+                self._statusPage = _st.StatusPage()
+                self._statusSub, _ = _ev.subscribe()
+                threading.Thread(
+                    target=_publishStatus,
+                    args=(self._statusSub, self._statusPage),
+                    daemon=True,
+                ).start()
+            except OSError as e:
+                _l.warning(f"status page unavailable: {e}")
+            _c.load()
+            _c.identifyActive()
+            _m.load()
+            _p.start()
+            _g.start()
+            _wpad.start()
+            _sub.start()
+            if _c.getGeneral(_pac.PAC_ENABLED_ENTRY, False):
+                startPac()
+            elif _c.getGeneral(_fw.FORWARD_ENABLED_ENTRY, False):
+                startForwarder()
+            if (nw := _m.network()) is not None:
+                _ev.publish("network", nw.model_dump())
+            if self.autoMap if self.autoMap is not None else _m.active():
+                threading.Thread(target=_m.applyMapping, daemon=True).start()
+                _m.start(skipConf=True)
+        except BaseException:
+            # leave nothing listening behind a failed start
+            self._teardown()
+            raise
+        self._running = True
+        _l.info("engine started")
+
+    def stop(self: "Engine") -> None:
+        if not self._running:
+            return
+        _l.info("stopping engine...")
+        self._teardown()
+        self._running = False
+        self._stopEvent.set()
+        _l.info("engine stopped")
+
+    def _teardown(self: "Engine") -> None:
+        _m.stop(skipConf=True)
+        _sub.stop()
+        _g.stop()
+        _fw.stop()
+        _pac.stop()
+        _p.stop()
+        _store.close()
+        _ipc.stop()
+        if self._statusSub is not None:
+            self._statusSub.close()
+        if self._statusPage is not None:
+            self._statusPage.close()
+        self._statusSub = self._statusPage = None
+
+    def requestStop(self: "Engine") -> None:
+        self._stopEvent.set()
+
+    def wait(self: "Engine") -> None:
+        # a timed wait keeps Ctrl+C deliverable on Windows
+        while not self._stopEvent.wait(1):
+            pass
+
+
+def runHeadless() -> int:
+    engine = Engine(autoMap=True)
+    signal.signal(signal.SIGTERM, lambda *_: engine.requestStop())
+    try:
+        engine.start()
+    except AlreadyRunningError as e:
+        _l.error(f"not starting, another instance is running: {e}")
+        return 1
+    except EmulatedRegistryError as e:
+        _l.error(f"not starting: {e}")
+        return 1
+    try:
+        engine.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        engine.stop()
+    return 0
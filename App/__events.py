@@ -0,0 +1,242 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Hashable, Iterable, NamedTuple
+
+from . import __log as _l
+
+EVENT_KINDS = (
+    "enabled",
+    "config",
+    "server",
+    "override",
+    "network",
+    "group",
+    "configs",
+    "mappings",
+)
+HISTORY_SIZE = 1024
+MAX_PENDING = 64
+STALL_TIMEOUT = 30.0
+HEARTBEAT_INTERVAL = 15.0
+
+
+class Event(NamedTuple):
+    seq: int
+    kind: str
+    value: Any
+    ts: float
+
+    def toDict(self) -> dict[str, Any]:
+        return self._asdict()
+
+    def key(self) -> Hashable:
+        """What a later event of the same key supersedes: a mapping or a group
+        of one event each, the kind for the others"""
+        if self.kind == "mappings":
+            return self.kind, self.value["ssid"], self.value["mac"]
+        if self.kind == "group":
+            return self.kind, self.value["group"]
+        return self.kind
+
+
+def _merged(older: Event, newer: Event) -> Event:
+    """`newer` standing in for both; "configs" events list their keys, so
+    those add up"""
+    if newer.kind != "configs":
+        return newer
+    changed = dict.fromkeys(older.value["changed"] + newer.value["changed"])
+    renamed = {**older.value["renamed"], **newer.value["renamed"]}
+    return newer._replace(value={"changed": list(changed), "renamed": renamed})
+
+
+class Subscription:
+    """Bounded per-consumer queue.
+
+    `offer` never blocks the publisher. When the queue overflows, pending
+    events are coalesced to the latest one per `Event.key`, so the deltas of
+    other mappings and configs survive; a consumer that stays saturated for
+    `STALL_TIMEOUT` seconds is dropped and has to resume by sequence number.
+    """
+
+    def __init__(
+        self: "Subscription",
+        kinds: Iterable[str] | None = None,
+        maxPending: int = MAX_PENDING,
+    ):
+        self.kinds = None if kinds is None else frozenset(kinds)
+        self.maxPending = max(maxPending, len(EVENT_KINDS))
+        self.coalesced = 0
+        self.dropped = False
+        self.closed = False
+        self._queue: deque[Event] = deque()
+        self._limit = self.maxPending
+        self._saturatedSince: float | None = None
+        self._cond = threading.Condition()
+
+    def offer(self: "Subscription", event: Event) -> None:
+        with self._cond:
+            if self.dropped or self.closed:
+                return
+            if self.kinds is not None and event.kind not in self.kinds:
+                return
+            self._queue.append(event)
+            if len(self._queue) > self._limit:
+                now = time.monotonic()
+                if self._saturatedSince is None:
+                    self._saturatedSince = now
+                elif now - self._saturatedSince > STALL_TIMEOUT:
+                    self.dropped = True
+                    self._queue.clear()
+                self._coalesce()
+            self._cond.notify()
+
+    def _coalesce(self: "Subscription") -> None:
+        latest: dict[Hashable, Event] = {}
+        for e in self._queue:
+            key = e.key()
+            latest[key] = _merged(latest[key], e) if key in latest else e
+        size = len(self._queue)
+        self._queue = deque(sorted(latest.values(), key=lambda e: e.seq))
+        self.coalesced += size - len(self._queue)
+        # many distinct keys may not coalesce, wait for as many again
+        self._limit = max(self.maxPending, 2 * len(self._queue))
+
+    def get(self: "Subscription", timeout: float | None = None) -> Event | None:
+        """Wait for the next event.
+
+        Returns:
+            Event | None: None on timeout, or once dropped or closed.
+        """
+        with self._cond:
+            if not self._queue and not self.dropped and not self.closed:
+                self._cond.wait(timeout)
+            if not self._queue:
+                return None
+            event = self._queue.popleft()
+            if not self._queue:
+                self._saturatedSince = None
+                self._limit = self.maxPending
+            return event
+
+    def close(self: "Subscription") -> None:
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        unsubscribe(self)
+
+
+def publish(kind: str, value: Any) -> Event:
+    global _seq
+    with _lock:
+        _seq += 1
+        event = Event(_seq, kind, value, time.time())
+        _history.append(event)
+        _state[kind] = value
+        # offered under the lock so every subscriber gets them in seq order
+        for sub in _subscriptions:
+            sub.offer(event)
+    return event
+
+
+def lastSeq() -> int:
+    return _seq
+
+
+def state() -> dict[str, Any]:
+    with _lock:
+        return dict(_state)
+
+
+def subscribe(
+    since: int | None = None,
+    kinds: Iterable[str] | None = None,
+    maxPending: int = MAX_PENDING,
+) -> tuple[Subscription, bool]:
+    """Subscribe to state changes, optionally resuming after `since`.
+
+    Returns:
+        tuple[Subscription, bool]: The subscription, with missed events
+            already queued, and whether the resume point was still in the
+            history. If not, the consumer should resync from `state()`.
+
+    Raises:
+        ValueError: `since` is negative.
+    """
+    if since is not None and since < 0:
+        raise ValueError(f"since must not be negative, got {since}")
+    sub = Subscription(kinds, maxPending)
+    with _lock:
+        if since is not None and since > _seq:
+            # from before a restart, its events are not these
+            _l.info(f"resume point {since} is ahead of {_seq}, resyncing")
+            since = None
+            resumed = False
+        else:
+            resumed = (
+                since is None
+                or since == _seq
+                or (len(_history) > 0 and _history[0].seq - 1 <= since < _seq)
+            )
+        if since is not None and resumed:
+            for event in _history:
+                if event.seq > since:
+                    sub.offer(event)
+        _subscriptions.append(sub)
+    return sub, resumed
+
+
+def unsubscribe(sub: Subscription) -> None:
+    with _lock:
+        if sub in _subscriptions:
+            _subscriptions.remove(sub)
+
+
+def serve(arg: Any, send: Callable[[Any], None]) -> None:
+    """Stream events to an IPC client until it disconnects.
+
+    `arg` may carry `since` (int) and `kinds` (list of str). Frames are
+    event dicts; `resync` carries the full state when the resume point is
+    gone, `dropped` is sent before disconnecting a stalled consumer and
+    `error` instead of any event when `since` is not a valid resume point or
+    `kinds` is not a list of str.
+    """
+    arg = arg if isinstance(arg, dict) else {}
+    since = arg.get("since")
+    if since is not None and (
+        not isinstance(since, int) or isinstance(since, bool) or since < 0
+    ):
+        send({"seq": lastSeq(), "kind": "error", "value": f"invalid since {since!r}"})
+        return
+    kinds = arg.get("kinds")
+    if kinds is not None and (
+        not isinstance(kinds, list) or not all(isinstance(k, str) for k in kinds)
+    ):
+        # a bare "config" would subscribe to its characters and match nothing
+        send({"seq": lastSeq(), "kind": "error", "value": f"invalid kinds {kinds!r}"})
+        return
+    sub, resumed = subscribe(since, kinds)
+    try:
+        if not resumed:
+            send({"seq": lastSeq(), "kind": "resync", "value": state()})
+        while not sub.dropped:
+            event = sub.get(HEARTBEAT_INTERVAL)
+            if event is None:
+                if sub.dropped:
+                    break
+                send({"seq": lastSeq(), "kind": "ping", "value": None})
+                continue
+            send(event.toDict())
+        _l.warning(f"dropped stalled event subscriber, {sub.coalesced} coalesced")
+        send({"seq": lastSeq(), "kind": "dropped", "value": None})
+    except (OSError, EOFError):
+        pass
+    finally:
+        sub.close()
+
+
+_lock = threading.Lock()
+_seq = 0
+_history: deque[Event] = deque(maxlen=HISTORY_SIZE)
+_state: dict[str, Any] = {}
+_subscriptions: list[Subscription] = []
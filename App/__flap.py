@@ -0,0 +1,141 @@
+"""Flap damping for network-triggered switches.
+
+Every reconnect adds `penalty` to the score of the network it lands on,
+and scores halve every `halfLife` seconds. Above `suppress` the network
+counts as flapping and reconnects to it are not acted on; it is released
+once the score decays below `reuse`, or after `maxSuppress` seconds.
+"""
+
+import math
+import threading
+import time
+from typing import Any, Callable, Literal
+
+from pydantic import BaseModel, Field
+
+FLAP_DAMPING_ENTRY = "flap_damping"
+
+FlapVerdict = Literal["act", "suppress", "held"]
+
+
+class FlapSettings(BaseModel):
+    penalty: float = Field(1000, gt=0, description="Score added per reconnect")
+    suppress: float = Field(2500, gt=0, description="Score that starts suppression")
+    reuse: float = Field(750, gt=0, description="Score that ends suppression")
+    halfLife: float = Field(60, gt=0, description="Seconds for a score to halve")
+    maxSuppress: float = Field(
+        600, gt=0, description="Longest suppression in seconds, however bad"
+    )
+
+    class Config:
+        extra = "forbid"
+
+
+class _Entry:
+    __slots__ = ("score", "updated", "suppressedSince")
+
+    def __init__(self: "_Entry", now: float) -> None:
+        self.score = 0.0
+        self.updated = now
+        self.suppressedSince: float | None = None
+
+
+class FlapDamper:
+    """Per-network flap scores, all times from `clock`"""
+
+    def __init__(
+        self: "FlapDamper",
+        settings: FlapSettings | None = None,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.settings = settings or FlapSettings()
+        if self.settings.reuse >= self.settings.suppress:
+            raise ValueError("reuse must be below suppress")
+        self.clock = clock
+        # a score never needs longer than maxSuppress to decay to reuse
+        self.ceiling = self.settings.reuse * 2 ** (
+            self.settings.maxSuppress / self.settings.halfLife
+        )
+        self.acted = 0
+        self.suppressed = 0
+        self.suppressions = 0
+        self._entries: dict[str, _Entry] = {}
+        self._lock = threading.Lock()
+
+    def _decay(self: "FlapDamper", entry: _Entry, now: float) -> None:
+        elapsed = max(now - entry.updated, 0)
+        entry.score *= 0.5 ** (elapsed / self.settings.halfLife)
+        entry.updated = now
+        if entry.suppressedSince is not None and (
+            entry.score < self.settings.reuse
+            or now - entry.suppressedSince >= self.settings.maxSuppress
+        ):
+            entry.suppressedSince = None
+
+    def transition(self: "FlapDamper", key: str) -> FlapVerdict:
+        """Score a reconnect to network `key`.
+
+        Returns:
+            FlapVerdict: "act" if it may be acted on, "suppress" if the
+                network has just started flapping, "held" if it already was.
+        """
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry(now)
+            self._decay(entry, now)
+            entry.score = min(entry.score + self.settings.penalty, self.ceiling)
+            if entry.suppressedSince is not None:
+                self.suppressed += 1
+                return "held"
+            if entry.score > self.settings.suppress:
+                entry.suppressedSince = now
+                self.suppressed += 1
+                self.suppressions += 1
+                return "suppress"
+            self.acted += 1
+            return "act"
+
+    def isSuppressed(self: "FlapDamper", key: str) -> bool:
+        now = self.clock()
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                return False
+            self._decay(entry, now)
+            return entry.suppressedSince is not None
+
+    def releaseIn(self: "FlapDamper", key: str) -> float:
+        """Seconds until `key` is released if nothing else happens"""
+        now = self.clock()
+        with self._lock:
+            if (entry := self._entries.get(key)) is None:
+                return 0
+            self._decay(entry, now)
+            if entry.suppressedSince is None:
+                return 0
+            decay = self.settings.halfLife * math.log2(
+                entry.score / self.settings.reuse
+            )
+            limit = entry.suppressedSince + self.settings.maxSuppress - now
+            return max(min(decay, limit), 0)
+
+    def stats(self: "FlapDamper") -> dict[str, Any]:
+        now = self.clock()
+        with self._lock:
+            networks = {}
+            for key, entry in list(self._entries.items()):
+                self._decay(entry, now)
+                if entry.score < 1 and entry.suppressedSince is None:
+                    del self._entries[key]
+                    continue
+                networks[key] = {
+                    "score": round(entry.score),
+                    "suppressed": entry.suppressedSince is not None,
+                }
+            return {
+                "acted": self.acted,
+                "suppressed": self.suppressed,
+                "suppressions": self.suppressions,
+                "networks": networks,
+            }
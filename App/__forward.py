@@ -0,0 +1,549 @@
+import asyncio
+import concurrent.futures
+import struct
+import threading
+import time
+from typing import Any
+
+from . import __log as _l
+from . import __proxy as _p
+
+FORWARD_ENABLED_ENTRY = "forward_mode"
+FORWARD_PORT_ENTRY = "forward_port"
+FORWARD_HOST = "127.0.0.1"
+FORWARD_DEFAULT_PORT = 18080
+FORWARD_CONNECT_TIMEOUT = 10.0
+POOL_SIZE = 8
+POOL_IDLE_TIMEOUT = 30.0
+RELAY_CHUNK = 64 * 1024
+
+Upstream = tuple[str, str, int]
+
+
+class ForwardError(Exception):
+    pass
+
+
+class UpstreamStats:
+    def __init__(self: "UpstreamStats"):
+        self.connections = 0  # upstream connections opened
+        self.reused = 0  # requests served on a pooled connection
+        self.active = 0  # client requests or tunnels in flight
+        self.requests = 0
+        self.tunnels = 0
+        self.errors = 0
+        self.bytesUp = 0
+        self.bytesDown = 0
+
+    def toDict(self: "UpstreamStats") -> dict[str, int]:
+        return dict(self.__dict__)
+
+
+def _upstreamUrl(upstream: Upstream) -> str:
+    return f"{upstream[0]}://{upstream[1]}:{upstream[2]}"
+
+
+def _stats(upstream: Upstream) -> UpstreamStats:
+    if (s := _statsByUpstream.get(url := _upstreamUrl(upstream))) is None:
+        s = _statsByUpstream[url] = UpstreamStats()
+    return s
+
+
+async def _readHead(reader: asyncio.StreamReader) -> bytes | None:
+    try:
+        return await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError as e:
+        if e.partial.strip():
+            raise ForwardError("truncated header")
+        return None
+    except asyncio.LimitOverrunError:
+        raise ForwardError("header too large")
+
+
+def _parseHead(head: bytes) -> tuple[list[str], list[tuple[str, str]]]:
+    lines = head.decode("latin-1").split("\r\n")
+    start = lines[0].split(" ", 2)
+    if len(start) < 3:
+        raise ForwardError(f"malformed start line {lines[0]!r}")
+    headers = []
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers.append((name.strip(), value.strip()))
+    return start, headers
+
+
+def _header(headers: list[tuple[str, str]], name: str) -> str | None:
+    name = name.lower()
+    return next((v for k, v in headers if k.lower() == name), None)
+
+
+def _buildHead(start: list[str], headers: list[tuple[str, str]]) -> bytes:
+    return (
+        "\r\n".join([" ".join(start)] + [f"{k}: {v}" for k, v in headers]) + "\r\n\r\n"
+    ).encode("latin-1")
+
+
+def _keepAlive(version: str, headers: list[tuple[str, str]]) -> bool:
+    conn = (_header(headers, "connection") or "").lower()
+    proxyConn = (_header(headers, "proxy-connection") or "").lower()
+    if "close" in conn or "close" in proxyConn:
+        return False
+    return version == "HTTP/1.1" or "keep-alive" in conn or "keep-alive" in proxyConn
+
+
+async def _relayBody(
+    src: asyncio.StreamReader,
+    dst: asyncio.StreamWriter,
+    headers: list[tuple[str, str]],
+    untilEof: bool,
+) -> tuple[int, bool]:
+    """Copy one message body.
+
+    Returns:
+        tuple[int, bool]: Bytes copied and whether the body was delimited,
+            i.e. the connection can carry another message.
+    """
+    copied = 0
+    if "chunked" in (_header(headers, "transfer-encoding") or "").lower():
+        while True:
+            line = await src.readuntil(b"\r\n")
+            dst.write(line)
+            size = int(line.split(b";", 1)[0], 16)
+            if size == 0:
+                while (trailer := await src.readuntil(b"\r\n")) != b"\r\n":
+                    dst.write(trailer)
+                dst.write(b"\r\n")
+                copied += len(line) + 2
+                break
+            chunk = await src.readexactly(size + 2)
+            dst.write(chunk)
+            copied += len(line) + len(chunk)
+            await dst.drain()
+        await dst.drain()
+        return copied, True
+    if (length := _header(headers, "content-length")) is not None:
+        remaining = int(length)
+        while remaining > 0:
+            data = await src.read(min(remaining, RELAY_CHUNK))
+            if not data:
+                raise ForwardError("body ended early")
+            dst.write(data)
+            remaining -= len(data)
+            copied += len(data)
+            await dst.drain()
+        return copied, True
+    if not untilEof:
+        return 0, True
+    while data := await src.read(RELAY_CHUNK):
+        dst.write(data)
+        copied += len(data)
+        await dst.drain()
+    return copied, False
+
+
+async def _pipe(
+    src: asyncio.StreamReader, dst: asyncio.StreamWriter, stats: UpstreamStats, up: bool
+) -> None:
+    try:
+        while data := await src.read(RELAY_CHUNK):
+            dst.write(data)
+            if up:
+                stats.bytesUp += len(data)
+            else:
+                stats.bytesDown += len(data)
+            await dst.drain()
+        if dst.can_write_eof():
+            dst.write_eof()
+    except (ConnectionError, OSError):
+        pass
+
+
+async def _readExactly(reader: asyncio.StreamReader, n: int) -> bytes:
+    try:
+        return await reader.readexactly(n)
+    except asyncio.IncompleteReadError:
+        raise ForwardError("upstream closed during handshake")
+
+
+async def _socksConnect(
+    upstream: Upstream, host: str, port: int
+) -> tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    reader, writer = await asyncio.open_connection(upstream[1], upstream[2])
+    if upstream[0] == "socks4":
+        writer.write(
+            struct.pack(">BBH4s", 4, 1, port, b"\0\0\0\1")
+            + b"\0"
+            + host.encode("idna")
+            + b"\0"
+        )
+        if (reply := await _readExactly(reader, 8))[1] != 0x5A:
+            writer.close()
+            raise ForwardError(f"socks4 rejected 0x{reply[1]:02x}")
+        return reader, writer
+    writer.write(b"\x05\x01\x00")
+    if (await _readExactly(reader, 2)) != b"\x05\x00":
+        writer.close()
+        raise ForwardError("socks5 greeting refused")
+    name = host.encode("idna")
+    writer.write(
+        b"\x05\x01\x00\x03" + bytes([len(name)]) + name + struct.pack(">H", port)
+    )
+    reply = await _readExactly(reader, 4)
+    if reply[1] != 0:
+        writer.close()
+        raise ForwardError(f"socks5 rejected 0x{reply[1]:02x}")
+    # skip the bound address
+    if reply[3] == 1:
+        await _readExactly(reader, 4 + 2)
+    elif reply[3] == 4:
+        await _readExactly(reader, 16 + 2)
+    else:
+        await _readExactly(reader, (await _readExactly(reader, 1))[0] + 2)
+    return reader, writer
+
+
+async def _openTunnel(
+    upstream: Upstream, host: str, port: int
+) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, bytes | None]:
+    """Open a byte stream to host:port through the upstream.
+
+    Returns:
+        The stream, plus the upstream's refusal head for HTTP upstreams that
+        did not answer 2xx (the stream is closed then).
+    """
+    async with asyncio.timeout(FORWARD_CONNECT_TIMEOUT):
+        if upstream[0].startswith("socks"):
+            return *(await _socksConnect(upstream, host, port)), None
+        reader, writer = await asyncio.open_connection(upstream[1], upstream[2])
+        target = f"{host}:{port}"
+        writer.write(f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n\r\n".encode())
+        if (head := await _readHead(reader)) is None:
+            raise ForwardError("upstream closed the tunnel")
+        if not head.split(b" ", 2)[1].startswith(b"2"):
+            writer.close()
+            return reader, writer, head
+        return reader, writer, None
+
+
+def _splitHostPort(authority: str, defaultPort: int) -> tuple[str, int]:
+    host, sep, port = authority.rpartition(":")
+    if not sep or not port.isdigit() or host.endswith(":"):
+        return authority.strip("[]"), defaultPort
+    return host.strip("[]"), int(port)
+
+
+async def _acquire(
+    upstream: Upstream,
+) -> tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+    idle = _pool.get(upstream, [])
+    now = time.monotonic()
+    while idle:
+        reader, writer, since = idle.pop()
+        if now - since < POOL_IDLE_TIMEOUT and not reader.at_eof():
+            _stats(upstream).reused += 1
+            return reader, writer, True
+        writer.close()
+    async with asyncio.timeout(FORWARD_CONNECT_TIMEOUT):
+        reader, writer = await asyncio.open_connection(upstream[1], upstream[2])
+    _stats(upstream).connections += 1
+    return reader, writer, False
+
+
+def _release(
+    upstream: Upstream, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    # pooled connections of a previous upstream are not reused after a switch
+    idle = _pool.setdefault(upstream, [])
+    if upstream != _upstream or len(idle) >= POOL_SIZE:
+        writer.close()
+        return
+    idle.append((reader, writer, time.monotonic()))
+
+
+async def _tunnel(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    upstream: Upstream,
+    target: str,
+) -> None:
+    stats = _stats(upstream)
+    stats.tunnels += 1
+    host, port = _splitHostPort(target, 443)
+    upReader, upWriter, refused = await _openTunnel(upstream, host, port)
+    stats.connections += 1
+    if refused is not None:
+        writer.write(refused)
+        await writer.drain()
+        return
+    writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+    try:
+        await asyncio.gather(
+            _pipe(reader, upWriter, stats, True), _pipe(upReader, writer, stats, False)
+        )
+    finally:
+        upWriter.close()
+
+
+async def _exchange(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    upReader: asyncio.StreamReader,
+    upWriter: asyncio.StreamWriter,
+    start: list[str],
+    headers: list[tuple[str, str]],
+    stats: UpstreamStats,
+) -> tuple[bool, bool]:
+    """Send one request upstream and relay the response.
+
+    Returns:
+        tuple[bool, bool]: Whether the upstream and the client connection
+            can each be kept alive.
+    """
+    head = _buildHead(start, headers)
+    upWriter.write(head)
+    stats.bytesUp += len(head)
+    stats.bytesUp += (await _relayBody(reader, upWriter, headers, False))[0]
+    await upWriter.drain()
+    if (respHead := await _readHead(upReader)) is None:
+        raise ForwardError("upstream closed before responding")
+    respStart, respHeaders = _parseHead(respHead)
+    writer.write(respHead)
+    stats.bytesDown += len(respHead)
+    status = respStart[1]
+    hasBody = (
+        start[0] != "HEAD"
+        and not status.startswith("1")
+        and status not in ("204", "304")
+    )
+    copied, delimited = (
+        await _relayBody(upReader, writer, respHeaders, True) if hasBody else (0, True)
+    )
+    stats.bytesDown += copied
+    await writer.drain()
+    upKeep = delimited and _keepAlive(respStart[0], respHeaders)
+    return upKeep, upKeep and _keepAlive(start[2], headers)
+
+
+async def _forwardRequest(
+    reader: asyncio.StreamReader,
+    writer: asyncio.StreamWriter,
+    upstream: Upstream,
+    start: list[str],
+    headers: list[tuple[str, str]],
+) -> bool:
+    stats = _stats(upstream)
+    stats.requests += 1
+    headers = [(k, v) for k, v in headers if k.lower() != "proxy-connection"]
+    if upstream[0].startswith("socks"):
+        # SOCKS only carries bytes: talk origin-form HTTP to the origin itself
+        url = start[1]
+        if not url.lower().startswith("http://"):
+            raise ForwardError(f"unsupported request target {url}")
+        authority, _, path = url[7:].partition("/")
+        host, port = _splitHostPort(authority, 80)
+        upReader, upWriter, _ = await _openTunnel(upstream, host, port)
+        stats.connections += 1
+        try:
+            _, clientKeep = await _exchange(
+                reader,
+                writer,
+                upReader,
+                upWriter,
+                [start[0], "/" + path, start[2]],
+                headers,
+                stats,
+            )
+        finally:
+            upWriter.close()
+        return clientKeep
+    bodyless = (
+        _header(headers, "content-length") in (None, "0")
+        and _header(headers, "transfer-encoding") is None
+    )
+    for attempt in range(2):
+        upReader, upWriter, reused = await _acquire(upstream)
+        try:
+            upKeep, clientKeep = await _exchange(
+                reader, writer, upReader, upWriter, start, headers, stats
+            )
+        except (ForwardError, ConnectionError, asyncio.IncompleteReadError):
+            upWriter.close()
+            # a pooled connection may have been closed by the upstream meanwhile
+            if reused and bodyless and attempt == 0:
+                continue
+            raise
+        if upKeep:
+            _release(upstream, upReader, upWriter)
+        else:
+            upWriter.close()
+        return clientKeep
+    return False
+
+
+async def _handleClient(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    upstream: Upstream | None = None
+    try:
+        while (head := await _readHead(reader)) is not None:
+            start, headers = _parseHead(head)
+            if (upstream := _upstream) is None:
+                writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+                break
+            stats = _stats(upstream)
+            stats.active += 1
+            try:
+                if start[0] == "CONNECT":
+                    await _tunnel(reader, writer, upstream, start[1])
+                    break
+                if not await _forwardRequest(reader, writer, upstream, start, headers):
+                    break
+            finally:
+                stats.active -= 1
+    except (
+        ForwardError,
+        ConnectionError,
+        OSError,
+        TimeoutError,
+        ValueError,
+        asyncio.IncompleteReadError,
+    ) as e:
+        if upstream is not None:
+            _stats(upstream).errors += 1
+        _l.debug(f"forwarding failed: {e!r}")
+        if not writer.is_closing():
+            writer.write(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+    except asyncio.CancelledError:
+        # shutting down; finishing normally keeps asyncio from logging it
+        pass
+    finally:
+        writer.close()
+
+
+def setUpstream(proxy: _p.Proxy) -> None:
+    """Point the forwarder at `proxy`; takes effect for the next request."""
+    global _upstream, _upstreamProxy
+    proto, host, port = _p.splitURL(proxy.url)
+    _upstream = (proto, host, port)
+    _upstreamProxy = proxy
+    _l.info(f"forwarding to {_upstreamUrl(_upstream)}")
+    _p.notifyServer(_upstreamUrl(_upstream))
+
+
+def intercept(proxy: _p.Proxy) -> bool:
+    global _writtenOverride
+    if _server is None or _p.forwardAddress is None:
+        return False
+    setUpstream(proxy)
+    if _p.getAutoConfigURL() is not None:
+        # left over from a pac config, it would take precedence
+        _p.setAutoConfigURL(None)
+    # the registry keeps pointing here, only a changed bypass list is written
+    if proxy.noProxyiesString != _writtenOverride:
+        _local(proxy).writeRegistry()
+        _writtenOverride = proxy.noProxyiesString
+    return True
+
+
+def _local(proxy: _p.Proxy) -> _p.SpecificProxy:
+    return _p.SpecificProxy(
+        proto="http", host=FORWARD_HOST, port=_port, noProxyies=proxy.noProxyies
+    )
+
+
+def _snapshot() -> dict[str, Any]:
+    return {
+        "listening": _p.forwardAddress,
+        "upstream": _upstreamUrl(_upstream) if _upstream else None,
+        "upstreams": {k: v.toDict() for k, v in _statsByUpstream.items()},
+    }
+
+
+def stats() -> dict[str, Any]:
+    # the counters are updated on the loop thread, read them there
+    if (loop := _loop) is not None:
+        future: concurrent.futures.Future = concurrent.futures.Future()
+        try:
+            loop.call_soon_threadsafe(lambda: future.set_result(_snapshot()))
+            return future.result(1)
+        except (TimeoutError, RuntimeError):
+            pass  # stopped meanwhile, nothing updates them any more
+    return _snapshot()
+
+
+def active() -> bool:
+    return _server is not None
+
+
+def start(port: int = FORWARD_DEFAULT_PORT) -> None:
+    global _loop, _thread, _server, _port
+    if _server is not None:
+        return
+    _l.info(f"starting local forwarder on {FORWARD_HOST}:{port}...")
+    _loop = asyncio.new_event_loop()
+    _thread = threading.Thread(target=_loop.run_forever, daemon=True)
+    _thread.start()
+    try:
+        _server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(_handleClient, FORWARD_HOST, port), _loop
+        ).result()
+    except BaseException:
+        # the port is taken, do not leave the loop thread behind
+        _loop.call_soon_threadsafe(_loop.stop)
+        _thread.join()
+        _loop.close()
+        _loop = _thread = None
+        raise
+    _port = _server.sockets[0].getsockname()[1]
+    _p.forwardAddress = f"http://{FORWARD_HOST}:{_port}"
+    _p.applyInterceptor = intercept
+
+
+async def _shutdown(server: asyncio.Server) -> None:
+    server.close()
+    for idle in _pool.values():
+        for _, writer, _ in idle:
+            writer.close()
+    _pool.clear()
+    tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def stop() -> None:
+    global _server, _loop, _thread, _writtenOverride
+    if _server is None or _loop is None:
+        return
+    _l.info("stopping local forwarder...")
+    _p.applyInterceptor = lambda _: False
+    _p.forwardAddress = None
+    # do not leave the system pointing at a closed port
+    if _upstreamProxy is not None:
+        _upstreamProxy.writeRegistry()
+    try:
+        asyncio.run_coroutine_threadsafe(_shutdown(_server), _loop).result(5)
+    except TimeoutError:
+        _l.warning("local forwarder did not shut down in time")
+    _loop.call_soon_threadsafe(_loop.stop)
+    if _thread is not None:
+        _thread.join()
+    _loop.close()
+    _server = None
+    _loop = None
+    _thread = None
+    _writtenOverride = None
+
+
+_loop: asyncio.AbstractEventLoop | None = None
+_thread: threading.Thread | None = None
+_server: asyncio.Server | None = None
+_port: int = FORWARD_DEFAULT_PORT
+_upstream: Upstream | None = None
+_upstreamProxy: _p.Proxy | None = None
+_writtenOverride: str | None = None
+_pool: dict[
+    Upstream, list[tuple[asyncio.StreamReader, asyncio.StreamWriter, float]]
+] = {}
+_statsByUpstream: dict[str, UpstreamStats] = {}
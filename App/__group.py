@@ -0,0 +1,159 @@
+import threading
+import time
+
+from . import __config as _c
+from . import __events as _ev
+from . import __health as _h
+from . import __log as _l
+from . import __proxy as _p
+from . import __toast as _t
+
+GROUP_PROBE_INTERVAL = 30.0
+
+
+class _GroupState:
+    def __init__(self: "_GroupState"):
+        self.current: str | None = None
+        self.lastSwitch: float = 0.0
+
+
+def _latency(result: _h.HealthResult) -> float:
+    return result.p50 if result.p50 is not None else result.latency or 0.0
+
+
+def _members(group: _p.GroupProxy) -> list[str]:
+    return [
+        m
+        for m in group.members
+        if (config := _c.configs().get(m)) is not None
+        and isinstance(config.proxy, _p.Proxy)
+    ]
+
+
+def _pick(
+    group: _p.GroupProxy,
+    members: list[str],
+    current: str | None,
+    results: dict[str, _h.HealthResult],
+) -> str | None:
+    alive = [m for m in members if (r := results.get(m)) is not None and r.ok]
+    if not alive:
+        # nothing known to work, stay put rather than guess
+        return current if current in members else next(iter(members), None)
+    if group.policy == "failover":
+        return alive[0]
+    if group.policy == "round-robin":
+        if current not in members:
+            return alive[0]
+        after = members[members.index(current) + 1 :] + members
+        return next(m for m in after if m in alive)
+    best = min(alive, key=lambda m: _latency(results[m]))
+    if current in alive and _latency(results[current]) <= _latency(results[best]) * (
+        1 + group.hysteresis
+    ):
+        return current
+    return best
+
+
+def select(name: str, group: _p.GroupProxy, now: float | None = None) -> str | None:
+    """Choose the member to use for group `name`.
+
+    A different member only wins once `minSwitchInterval` has passed since
+    the group last switched; until then the current member is kept. Only
+    cached health results are used, probing is left to `_proberLoop`.
+    """
+    now = time.monotonic() if now is None else now
+    members = _members(group)
+    with _lock:
+        state = _states.setdefault(name, _GroupState())
+    results = {m: r for m in members if (r := _h.cached(m)) is not None}
+    winner = _pick(group, members, state.current, results)
+    with _lock:
+        if winner == state.current:
+            return winner
+        if (
+            state.current in members
+            and now - state.lastSwitch < group.minSwitchInterval
+        ):
+            _l.debug(f"group {name} holds {state.current} over {winner}")
+            return state.current
+        _l.info(f"group {name} switched from {state.current} to {winner}")
+        state.current = winner
+        state.lastSwitch = now
+    return winner
+
+
+def current(name: str) -> str | None:
+    with _lock:
+        return state.current if (state := _states.get(name)) is not None else None
+
+
+def apply(group: _p.GroupProxy) -> None:
+    global _activeGroup
+    configs = _c.configs()
+    name = next((k for k, v in configs.items() if v.proxy is group), None)
+    if name is None:
+        _l.error("applied proxy group is not a saved config")
+        return
+    if (member := select(name, group)) is None:
+        _l.error(f"proxy group {name} has no usable member")
+        return
+    configs[member].proxy.apply()
+    _activeGroup = name
+    if any(_h.cached(m) is None for m in group.members):
+        # the prober switches to a better member once these are in
+        _h.checkInBackground()
+    _ev.publish("group", {"group": name, "member": member})
+
+
+def _stillActive(member: str | None) -> bool:
+    if member is None or (config := _c.configs().get(member)) is None:
+        return False
+    try:
+        # someone switched away from the group since it was applied
+        return config.proxy.url == _ev.state().get("server")
+    except ValueError:
+        return False
+
+
+def _proberLoop() -> None:
+    global _activeGroup
+    while not _stopEvent.wait(GROUP_PROBE_INTERVAL):
+        if (name := _activeGroup) is None:
+            continue
+        configs = _c.configs()
+        config = configs.get(name)
+        if config is None or not isinstance(config.proxy, _p.GroupProxy):
+            _activeGroup = None
+            continue
+        previous = current(name)
+        if not _stillActive(previous):
+            _activeGroup = None
+            continue
+        _h.check(_members(config.proxy), force=True)
+        if (member := select(name, config.proxy)) not in (None, previous):
+            configs[member].proxy.apply()  # type: ignore
+            _ev.publish("group", {"group": name, "member": member})
+            _t.toast(f"分组 [{name}] 已切换到配置 [{member}]")
+
+
+def start() -> None:
+    global _thread
+    _p.groupApplyCallback = apply
+    _stopEvent.clear()
+    if _thread is None or not _thread.is_alive():
+        _thread = threading.Thread(target=_proberLoop, daemon=True)
+        _thread.start()
+
+
+def stop() -> None:
+    _stopEvent.set()
+    if _thread is not None:
+        _thread.join()
+
+
+_lock = threading.Lock()
+_states: dict[str, _GroupState] = {}
+_activeGroup: str | None = None
+_stopEvent = threading.Event()
+_thread: threading.Thread | None = None
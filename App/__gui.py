@@ -0,0 +1,918 @@
+import os
+import sys
+import threading
+from typing import Callable
+
+import qdarktheme  # type: ignore
+from PyQt5.QtCore import QObject, QSize, Qt, pyqtSignal
+from PyQt5.QtGui import QIcon, QIntValidator, QKeyEvent
+from PyQt5.QtWidgets import (
+    QAbstractItemView,
+    QAction,
+    QApplication,
+    QCheckBox,
+    QComboBox,
+    QDialog,
+    QFormLayout,
+    QHBoxLayout,
+    QHeaderView,
+    QLabel,
+    QLineEdit,
+    QMainWindow,
+    QMenu,
+    QMessageBox,
+    QPushButton,
+    QSystemTrayIcon,
+    QTableView,
+    QTabWidget,
+    QVBoxLayout,
+    QWidget,
+    QWidgetAction,
+)
+
+from . import __config as _c
+from . import __dark as _d
+from . import __engine as _e
+from . import __events as _ev
+from . import __forward as _fw
+from . import __health as _h
+from . import __ipc as _ipc
+from . import __log as _l
+from . import __mapping as _m
+from . import __models as _mdl
+from . import __pac as _pac
+from . import __proxy as _p
+from . import __state as _state
+from . import __subscription as _sub
+from . import __traymenu as _tm
+from . import __uistate as _ui
+from . import __utils as _u
+
+MAPPING_UNSET_KW = _mdl.MAPPING_UNSET_KW
+MAPPING_SSID_WIRED_KW = _mdl.MAPPING_SSID_WIRED_KW
+
+
+def stop() -> None:
+    _l.info(f"tray updates: {UI.stats().describe()}")
+    TABLE_EVENTS.close()
+    ENGINE.stop()
+    _d.stop()
+    APP.quit()
+    _l.info("Stopped gracefully")
+
+
+def openMSSettings() -> None:
+    os.system("start ms-settings:network-proxy")
+
+
+### app
+class App(QApplication):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+# main window
+class ConfigWindow(QMainWindow):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.setWindowTitle("设置")
+        self.tabs = QTabWidget(self)
+        self.setCentralWidget(self.tabs)
+
+        self.configTab = ConfigPage()
+        self.mappingTab = MappingPage()
+        self.optionsTab = OptionsPage()
+        self.tabs.addTab(self.configTab, "配置")
+        self.tabs.addTab(self.mappingTab, "映射")
+        self.tabs.addTab(self.optionsTab, "选项")
+
+        self.pageUpdates = {
+            0: lambda: self.configTab.updateList(),
+            1: lambda: self.mappingTab.updateTable(),
+            2: lambda: self.optionsTab.updateOptions(),
+        }
+        self.tabs.currentChanged.connect(self.onCurrentChanged)
+
+        self.setFixedSize(480, 320)
+        self.setWindowFlag(getattr(Qt, "WindowContextHelpButtonHint"), False)
+
+        self.pageUpdates[self.tabs.currentIndex()]()
+
+    def onCurrentChanged(self, index: int) -> None:
+        _l.debug(f"Current tab changed to {index}")
+        return self.pageUpdates[index]()
+
+    def applyEvent(self, event: _ev.Event | None) -> None:
+        self.configTab.applyEvent(event)
+        self.mappingTab.applyEvent(event)
+
+    def show(self) -> None:
+        # hidden pages skip the resyncs, see applyEvent
+        self.pageUpdates[self.tabs.currentIndex()]()
+        super().show()
+        ui = UI.current()
+        self.setWindowIcon(
+            QIcon(_d.getTBIconPath(ui.enabled, ui.windowLight).as_posix())
+        )
+
+
+# config page
+class ConfigPage(QWidget):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rootLayout = QHBoxLayout(self)
+        self.setLayout(self.rootLayout)
+        # left table
+        self.tableLayout = QVBoxLayout()
+        self.rootLayout.addLayout(self.tableLayout)
+        self.model = _mdl.ConfigTableModel(self)
+        self.filter = _mdl.TableFilter(self.model, self)
+        self.filterEdit = tableFilterEdit(self.filter)
+        self.tableLayout.addWidget(self.filterEdit)
+        self.table = tableView(self.filter)
+        self.table.selectionModel().selectionChanged.connect(self.onSelectionChanged)
+        self.table.doubleClicked.connect(self.editConfig)
+        self.tableLayout.addWidget(self.table)
+        # right buttons
+        self.buttons = QVBoxLayout()
+        self.buttons.setAlignment(getattr(Qt, "AlignTop"))
+        self.rootLayout.addLayout(self.buttons)
+        self.appendBtn = QPushButton("添加")
+        self.appendBtn.clicked.connect(self.newConfig)
+        self.buttons.addWidget(self.appendBtn)
+        self.editBtn = QPushButton("编辑")
+        self.editBtn.clicked.connect(self.editConfig)
+        self.editBtn.setEnabled(False)
+        self.buttons.addWidget(self.editBtn)
+        self.removeBtn = QPushButton("删除")
+        self.removeBtn.clicked.connect(self.removeConfig)
+        self.removeBtn.setEnabled(False)
+        self.buttons.addWidget(self.removeBtn)
+
+    def updateList(self) -> None:
+        change = self.model.reset(_c.configs())
+        _l.debug(f"Page updated config list: {change.describe()}")
+
+    def applyEvent(self, event: _ev.Event | None) -> None:
+        """Follow a change of the configs, None when some were missed"""
+        if event is None or event.kind != "configs":
+            if event is None and self.isVisible():
+                self.updateList()
+            return
+        configs = _c.configs()
+        for key in event.value["changed"]:
+            if key in configs:
+                self.model.put(key, configs[key])
+            else:
+                self.model.discard(key)
+
+    def newConfig(self) -> None:
+        editWindow = ConfigEditWindow(title="新配置")
+        editWindow.move(
+            self.mapToGlobal(self.rect().center() - editWindow.rect().center())
+        )
+        editWindow.exec_()
+        self.editWindow = editWindow  # store a reference to prevent garbage collection
+
+    def editConfig(self) -> None:
+        if not (selected := selectedKeys(self.table)):
+            _l.warning("No config selected")
+            return
+        selectedKey = selected[0]
+        config = _c.configs()[selectedKey]
+        if not isinstance(config.proxy, _p.Proxy):
+            QMessageBox.information(self, "提示", "分组和 PAC 配置请在配置文件中编辑")
+            return
+        editWindow = ConfigEditWindow(title="编辑配置", name=selectedKey, config=config)
+        editWindow.move(
+            self.mapToGlobal(self.rect().center() - editWindow.rect().center())
+        )
+        editWindow.exec_()
+        self.editWindow = editWindow  # store a reference to prevent garbage collection
+
+    def removeConfig(self) -> None:
+        if not (selected := selectedKeys(self.table)):
+            _l.warning("No config selected")
+            return
+        confirm = QMessageBox.question(
+            self, "确认", "确定要删除所选配置吗？", QMessageBox.Yes | QMessageBox.No
+        )
+        if confirm == QMessageBox.Yes:
+            for item in selected:
+                _c.removeProxy(item)
+                _l.info(f"Removed config {item}")
+
+    def onSelectionChanged(self) -> None:
+        selected = self.table.selectionModel().hasSelection()
+        self.removeBtn.setEnabled(selected)
+        self.editBtn.setEnabled(selected)
+
+
+# mapping page
+class MappingPage(QWidget):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rootLayout = QVBoxLayout(self)
+        self.setLayout(self.rootLayout)
+
+        self.model = _mdl.MappingTableModel(self)
+        self.filter = _mdl.TableFilter(self.model, self)
+        self.filterEdit = tableFilterEdit(self.filter)
+        self.rootLayout.addWidget(self.filterEdit)
+        self.table = tableView(self.filter)
+        self.table.selectionModel().selectionChanged.connect(self.onSelectionChanged)
+        self.table.doubleClicked.connect(self.editMapping)
+        self.rootLayout.addWidget(self.table)
+
+        self.buttonsLayout = QHBoxLayout()
+        self.buttonsLayout.setAlignment(getattr(Qt, "AlignCenter"))
+        self.rootLayout.addLayout(self.buttonsLayout)
+        self.appendBtn = QPushButton("添加")
+        self.appendBtn.clicked.connect(self.newMapping)
+        self.buttonsLayout.addWidget(self.appendBtn)
+        self.editBtn = QPushButton("编辑")
+        self.editBtn.clicked.connect(self.editMapping)
+        self.editBtn.setEnabled(False)
+        self.buttonsLayout.addWidget(self.editBtn)
+        self.removeBtn = QPushButton("删除")
+        self.removeBtn.clicked.connect(self.removeMapping)
+        self.removeBtn.setEnabled(False)
+        self.buttonsLayout.addWidget(self.removeBtn)
+
+    def updateTable(self) -> None:
+        change = self.model.reset(_m.config())
+        _l.debug(f"Page updated mapping table: {change.describe()}")
+
+    def applyEvent(self, event: _ev.Event | None) -> None:
+        """Follow a change of the mappings, None when some were missed"""
+        if event is None or event.kind != "mappings":
+            # renamed and removed configs move their mappings
+            if (event is None or event.value["renamed"]) and self.isVisible():
+                self.updateTable()
+            return
+        nwInfo = _p.Network(ssid=event.value["ssid"], mac=event.value["mac"])
+        if event.value.get("removed"):
+            self.model.discard(nwInfo)
+        else:
+            self.model.put(nwInfo, event.value["config"])
+
+    def onSelectionChanged(self) -> None:
+        selected = self.table.selectionModel().hasSelection()
+        self.editBtn.setEnabled(selected)
+        self.removeBtn.setEnabled(selected)
+
+    def newMapping(self) -> None:
+        editWindow = MappingEditWindow(new=True)
+        editWindow.move(
+            self.mapToGlobal(self.rect().center() - editWindow.rect().center())
+        )
+        editWindow.exec_()
+        self.editWindow = editWindow
+
+    def editMapping(self) -> None:
+        if not (selected := selectedKeys(self.table)):
+            _l.warning("No mapping selected")
+            return
+        nwInfo: _p.Network = selected[0]
+        editWindow = MappingEditWindow(
+            new=False, oldNWInfo=nwInfo, oldConfig=self.model.value(nwInfo)
+        )
+        editWindow.move(
+            self.mapToGlobal(self.rect().center() - editWindow.rect().center())
+        )
+        editWindow.exec_()
+        self.editWindow = editWindow
+
+    def removeMapping(self) -> None:
+        if not (selected := selectedKeys(self.table)):
+            _l.warning("No mapping selected")
+            return
+        confirm = QMessageBox.question(
+            self, "确认", "确定要删除所选映射吗？", QMessageBox.Yes | QMessageBox.No
+        )
+        if confirm == QMessageBox.Yes:
+            for nwInfo in selected:
+                _m.removeMapping(nwInfo)
+                _l.info(f"Removed mapping {nwInfo}")
+
+
+def tableView(model: _mdl.TableFilter) -> QTableView:
+    """A sortable table of whole rows for the pages"""
+    view = QTableView()
+    view.setModel(model)
+    view.setSortingEnabled(True)
+    view.sortByColumn(-1, Qt.SortOrder.AscendingOrder)  # in insertion order
+    view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+    view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+    view.setWordWrap(False)
+    view.verticalHeader().hide()
+    # fixed heights, sizing rows to their contents would visit all of them
+    view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+    view.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
+    view.horizontalHeader().setStretchLastSection(True)
+    return view
+
+
+def tableFilterEdit(model: _mdl.TableFilter) -> QLineEdit:
+    edit = QLineEdit()
+    edit.setPlaceholderText("输入以筛选")
+    edit.setClearButtonEnabled(True)
+    edit.textChanged.connect(model.setQuery)
+    return edit
+
+
+def selectedKeys(view: QTableView) -> list:
+    """Keys of the selected rows, in the order shown"""
+    rows = sorted(view.selectionModel().selectedRows(), key=lambda i: i.row())
+    return [index.data(_mdl.KEY_ROLE) for index in rows]
+
+
+# options page
+class OptionsPage(QWidget):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.rootLayout = QVBoxLayout(self)
+        self.rootLayout.setAlignment(getattr(Qt, "AlignTop"))
+        self.setLayout(self.rootLayout)
+        self.startupBtn = QCheckBox("开机启动")
+        self.startupBtn.clicked.connect(self.switchStartup)
+        self.rootLayout.addWidget(self.startupBtn)
+        self.autoSelectBtn = QCheckBox("根据当前网络自动选择配置")
+        self.autoSelectBtn.clicked.connect(self.switchAutoSelect)
+        self.rootLayout.addWidget(self.autoSelectBtn)
+        self.autoSelectHint = QLabel(
+            "此功能现可能占用系统资源。若禁用此项，可在托盘菜单中手动映射"
+        )
+        self.autoSelectHint.setWordWrap(True)
+        self.rootLayout.addWidget(self.autoSelectHint)
+        self.forwardBtn = QCheckBox("本地转发代理（切换配置时不改写系统代理）")
+        self.forwardBtn.clicked.connect(self.switchForward)
+        self.rootLayout.addWidget(self.forwardBtn)
+        self.pacBtn = QCheckBox("PAC 模式（按域名规则分流，规则在配置文件中编辑）")
+        self.pacBtn.clicked.connect(self.switchPac)
+        self.rootLayout.addWidget(self.pacBtn)
+
+    def switchStartup(self) -> None:
+        if self.startupEnabled:
+            _u.disable_startup()
+        else:
+            _u.enable_startup()
+        self.updateOptions()
+
+    def updateOptions(self) -> None:
+        self.startupEnabled = _u.check_startup()
+        self.startupBtn.setChecked(self.startupEnabled)
+        self.autoSelectBtn.setChecked(_m.active())
+        self.forwardBtn.setChecked(_fw.active())
+        self.pacBtn.setChecked(_pac.active())
+
+    def switchForward(self) -> None:
+        enabled = self.forwardBtn.isChecked()
+        _c.setGeneral(_fw.FORWARD_ENABLED_ENTRY, enabled)
+        if enabled:
+            _e.startForwarder()
+        else:
+            _fw.stop()
+        self.updateOptions()
+
+    def switchPac(self) -> None:
+        enabled = self.pacBtn.isChecked()
+        _c.setGeneral(_pac.PAC_ENABLED_ENTRY, enabled)
+        if enabled:
+            _e.startPac()
+        else:
+            _pac.stop()
+        self.updateOptions()
+
+    def switchAutoSelect(self) -> None:
+        if self.autoSelectBtn.isChecked():
+            _m.start()
+        else:
+            _m.stop()
+
+
+# config edit window
+class ConfigEditWindow(QDialog):
+    def __init__(
+        self,
+        title: str,
+        name: str = "新配置",
+        config: _p.ProxyConfig | None = None,
+        *args,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.setWindowTitle(title)
+        self.new = config is None
+        self.oldName = name
+        self.config = (
+            config
+            or _p.getCurrentProxy()
+            or _p.ProxyConfig(
+                proxy=_p.SpecificProxy(
+                    proto=_p.PROXY_ALLOWED_PROTOS[0], port=80, noProxyies=[], host=""
+                )
+            )
+        )
+        self.rootLayout = QVBoxLayout(self)
+        self.setLayout(self.rootLayout)
+        self.form = QFormLayout()
+        self.rootLayout.addLayout(self.form)
+        self.name = QLineEdit()
+        self.form.addRow("名称", self.name)
+        self.proto = QComboBox()
+        self.proto.addItems(_p.PROXY_ALLOWED_PROTOS)
+        self.form.addRow("协议", self.proto)
+        self.followGateway = QCheckBox("跟随网关")
+        self.form.addRow(self.followGateway)
+        self.host = QLineEdit()
+        self.form.addRow("主机", self.host)
+        self.port = QLineEdit()
+        self.form.addRow("端口", self.port)
+        self.port.setValidator(QIntValidator())
+        # self.username = QLineEdit()
+        # self.form.addRow("用户名", self.username)
+        # self.password = QLineEdit()
+        # self.form.addRow("密码", self.password)
+        # self.auth = QCheckBox()
+        # self.form.addRow("认证", self.auth)
+        self.btnLayout = QHBoxLayout()
+        self.btnLayout.setAlignment(getattr(Qt, "AlignRight"))
+        self.rootLayout.addLayout(self.btnLayout)
+        self.saveBtn = QPushButton("保存")
+        self.saveBtn.clicked.connect(self.apply)
+        self.btnLayout.addWidget(self.saveBtn)
+        self.cancelBtn = QPushButton("取消")
+        self.cancelBtn.clicked.connect(self.reject)
+        self.btnLayout.addWidget(self.cancelBtn)
+
+        self.name.setText(name)
+        self.proto.setCurrentText(self.config.proxy.proto)
+        self.host.setText(
+            ""
+            if (followGatewayB := self.config.proxy.proxyType == "GatewayProxy")
+            else self.config.proxy.host
+        )
+        self.host.setDisabled(followGatewayB)
+        self.followGateway.setChecked(followGatewayB)
+        self.port.setText(str(self.config.proxy.port))
+        # self.username.setText(self.config.username)
+        # self.password.setText(self.config.password)
+        # self.auth.setChecked(self.config.auth)
+
+        def onFGWSwitch(s: bool):
+            self.host.setDisabled(s)
+            if not s:
+                self.host.setFocus()
+
+        self.followGateway.stateChanged.connect(onFGWSwitch)
+
+        self.setWindowFlag(getattr(Qt, "WindowContextHelpButtonHint"), False)
+        self.setFixedSize(QSize(250, 200))
+
+    def apply(self) -> None:
+        if not _c.checkConfigName(self.name.text()):
+            QMessageBox.warning(self, "错误", "名称不可用")
+            return
+        elif self.name.text() in _c.configs() and (
+            self.name.text() != self.oldName or self.new
+        ):
+            QMessageBox.warning(self, "错误", "名称已存在")
+            return
+        if (pt := self.proto.currentText()) in _p.PROXY_ALLOWED_PROTOS:
+            protoText: _p.ProxyProto = pt  # type: ignore
+        else:
+            protoText = _p.PROXY_ALLOWED_PROTOS[0]
+        if self.followGateway.isChecked():
+            self.config.proxy = _p.GatewayProxy(
+                proto=protoText,
+                port=int(self.port.text()),
+                noProxyies=_p.DEFUALT_NO_PROXY,
+            )
+        # self.config.username = self.username.text()
+        # self.config.password = self.password.text()
+        # self.config.auth = self.auth.isChecked()
+        if self.new:
+            _c.addProxy(self.name.text(), self.config)
+        else:
+            _c.updateProxy(self.oldName, self.name.text(), self.config)
+        self.accept()
+
+
+# mapping edit window
+class MappingEditWindow(QDialog):
+    def __init__(
+        self,
+        new: bool = False,
+        oldNWInfo: _p.Network | None = None,
+        oldConfig: str | None = None,
+        *args,
+        **kwargs,
+    ):
+        super().__init__(*args, **kwargs)
+        self.new = new
+        self.setWindowTitle("新映射" if new else "编辑映射")
+        if new:
+            curNWInfo = _p.Network(
+                mac=_u.getGwMac(),
+                ssid=_u.getSSID(),
+            )
+            self.oldNWInfo = None if curNWInfo in _m.config() else curNWInfo
+        else:
+            self.oldNWInfo = oldNWInfo
+        _l.debug(f"oldNWInfo: {self.oldNWInfo}")
+        self.oldConfig = oldConfig
+        self.rootLayout = QVBoxLayout(self)
+        self.setLayout(self.rootLayout)
+        self.form = QFormLayout()
+        self.rootLayout.addLayout(self.form)
+        self.ssid = QLineEdit()
+        self.ssid.setText("" if self.oldNWInfo is None else self.oldNWInfo.ssid or "")
+        self.ssid.setPlaceholderText("留空则为有线网络")
+        self.form.addRow("SSID", self.ssid)
+        self.macaddr = QLineEdit()
+        self.macaddr.setText("" if self.oldNWInfo is None else self.oldNWInfo.mac or "")
+        self.macaddr.setPlaceholderText("留空则不区分网关MAC")
+        self.form.addRow("网关MAC", self.macaddr)
+        self.config = QComboBox()
+        self.config.addItems(list(_c.configs().keys()) + [MAPPING_UNSET_KW])
+        self.config.setCurrentText(self.oldConfig or MAPPING_UNSET_KW)
+        self.form.addRow("配置", self.config)
+        self.setRow = QHBoxLayout()
+        self.useCurrSsid = QPushButton("使用当前SSID")
+        self.setRow.addWidget(self.useCurrSsid)
+        self.useCurrMac = QPushButton("使用当前MAC")
+        self.setRow.addWidget(self.useCurrMac)
+        self.form.addRow(self.setRow)
+        self.btnLayout = QHBoxLayout()
+        self.btnLayout.setAlignment(getattr(Qt, "AlignRight"))
+        self.rootLayout.addLayout(self.btnLayout)
+        self.saveBtn = QPushButton("保存")
+        self.saveBtn.clicked.connect(self.apply)
+        self.btnLayout.addWidget(self.saveBtn)
+        self.cancelBtn = QPushButton("取消")
+        self.cancelBtn.clicked.connect(self.reject)
+        self.btnLayout.addWidget(self.cancelBtn)
+        self.config.setCurrentText(oldConfig or "")
+
+        self.useCurrSsid.clicked.connect(lambda: self.ssid.setText(_u.getSSID() or ""))
+        self.useCurrMac.clicked.connect(
+            lambda: self.macaddr.setText(_u.getGwMac() or "")
+        )
+
+        self.setWindowFlag(getattr(Qt, "WindowContextHelpButtonHint"), False)
+        self.setFixedSize(QSize(250, 160))
+        self.saveBtn.setFocus()
+
+    def apply(self) -> None:
+        nwInfo = _p.Network(
+            mac=_u.macAddrValidate(self.macaddr.text() or None),
+            ssid=self.ssid.text() or None,
+        )
+        if self.new and nwInfo in _m.config():
+            QMessageBox.warning(self, "错误", "SSID已存在")
+            return
+        config: str | None = self.config.currentText()
+        if config == MAPPING_UNSET_KW:
+            config = None
+        if self.oldNWInfo and not self.new:
+            _m.removeMapping(self.oldNWInfo)
+        _m.addMapping(nwInfo, config)
+        self.accept()
+
+
+### tray
+class TrayIcon(QSystemTrayIcon):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+def setTrayIcon(icon: tuple[bool, bool]) -> None:
+    TRAY_ICON.setIcon(QIcon(_d.getTBIconPath(*icon).as_posix()))
+
+
+def handleTrayClick(reason: QSystemTrayIcon.ActivationReason) -> None:
+    # if reason == QSystemTrayIcon.ActivationReason.Trigger:
+    #     TRAY_MENU.show()
+    if reason == QSystemTrayIcon.ActivationReason.DoubleClick:
+        _p.setEnabled(not UI.current().enabled)
+
+
+### action
+class Action(QAction):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+
+# base actions, built on the first open
+def updateTrayActions() -> None:
+    if not TRAY_MENU.actions():
+        for text, callback in TOP_ACTIONS:
+            TRAY_MENU.addAction(Action(text, TRAY_MENU, triggered=callback))
+        TRAY_MENU.addSeparator()
+        TRAY_MENU.addAction(Action("设置", CONFIG_MENU, triggered=showConfigWindow))
+        TRAY_MENU.addMenu(CONFIG_MENU)
+        TRAY_MENU.addAction(MAPPING_ACTION)
+        TRAY_MENU.addSeparator()
+        for text, callback in BOTTOM_ACTIONS:
+            TRAY_MENU.addAction(Action(text, TRAY_MENU, triggered=callback))
+    MAPPING_ACTION.setVisible(not _m.active())
+
+
+def showConfigWindow() -> None:
+    # Move config window to near the tray icon
+    config_window_size = CONFIG_WINDOW.size()
+    tray_geometry = TRAY_ICON.geometry()
+    config_window_x = (
+        tray_geometry.x() + tray_geometry.width() / 2 - config_window_size.width() / 2
+    )
+    config_window_y = (
+        tray_geometry.y() + tray_geometry.height() / 2 - config_window_size.height() / 2
+    )
+    desktop = QApplication.desktop()
+    screen_geometry = desktop.availableGeometry(CONFIG_WINDOW) if desktop else None
+    if not screen_geometry:
+        _l.warning("Cannot get screen geometry")
+        return
+    config_window_x = min(
+        max(config_window_x, screen_geometry.left() + 50),
+        screen_geometry.right() - config_window_size.width() - 50,
+    )
+    config_window_y = min(
+        max(config_window_y, screen_geometry.top() + 50),
+        screen_geometry.bottom() - config_window_size.height() - 50,
+    )
+    CONFIG_WINDOW.move(int(config_window_x), int(config_window_y))
+    CONFIG_WINDOW.show()
+
+
+### ipc
+class IpcBridge(QObject):
+    """Carries IPC requests over to the GUI thread"""
+
+    showRequested = pyqtSignal()
+
+
+class TableBridge(QObject):
+    """Carries config and mapping changes over to the GUI thread, None when
+    some were missed"""
+
+    changed = pyqtSignal(object)
+
+
+def forwardTableEvents() -> None:
+    global TABLE_EVENTS
+    while True:
+        while (event := TABLE_EVENTS.get()) is not None:
+            TABLE_BRIDGE.changed.emit(event)
+        if not TABLE_EVENTS.dropped:
+            return
+        # stalled and dropped, follow again from the current tables
+        TABLE_EVENTS, _ = _ev.subscribe(kinds=TABLE_EVENT_KINDS)
+        TABLE_BRIDGE.changed.emit(None)
+
+
+class UiBridge(QObject):
+    """Carries tray state updates over to the GUI thread"""
+
+    flushRequested = pyqtSignal()
+
+
+### tray menu
+class TrayMenu(QMenu):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.aboutToShow.connect(updateTrayActions)
+
+
+### config menu
+class ConfigMenu(QMenu):
+    """One action per config, updated when the menu opens, see `_tm`"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.filterEdit = QLineEdit(self)
+        self.filterEdit.setPlaceholderText("输入以筛选")
+        self.filterEdit.setClearButtonEnabled(True)
+        self.filterEdit.textChanged.connect(self.applyFilter)
+        self.filterAction = QWidgetAction(self)
+        self.filterAction.setDefaultWidget(self.filterEdit)
+        self.addAction(self.filterAction)
+        self.emptyAction = Action("无配置", self, enabled=False)
+        self.addAction(self.emptyAction)
+        self.groupSeparator = self.addSeparator()
+        self.groupMenus: dict[str, QMenu] = {}
+        self.model: _tm.MenuModel[QAction] = _tm.MenuModel(
+            self.createAction,
+            self.updateAction,
+            self.dropAction,
+            self.arrange,
+            lambda action, visible: action.setVisible(visible),
+        )
+        self.aboutToShow.connect(self.updateActions)
+        # also for the actions of the submenus
+        self.triggered.connect(self.onTriggered)
+
+    def updateActions(self) -> None:
+        self.filterEdit.clear()
+        snap = _state.current()
+        result = self.model.sync(
+            _tm.entries(
+                snap.configs,
+                snap.active,
+                lambda key: health.describe() if (health := _h.cached(key)) else None,
+                [sub.name for sub in _sub.subscriptions()],
+            )
+        )
+        _l.debug(f"config menu updated: {result.describe()}")
+        self.filterAction.setVisible(len(self.model) >= _tm.FILTER_THRESHOLD)
+        self.emptyAction.setText("无配置")
+        self.emptyAction.setVisible(len(self.model) == 0)
+        # results show up the next time the menu opens
+        _h.checkInBackground()
+
+    def createAction(self, entry: _tm.MenuEntry) -> QAction:
+        action = Action(entry.text, self)
+        action.setData(entry.key)
+        action.setCheckable(entry.checked)
+        action.setChecked(entry.checked)
+        return action
+
+    def updateAction(self, action: QAction, entry: _tm.MenuEntry) -> None:
+        action.setText(entry.text)
+        action.setCheckable(entry.checked)
+        action.setChecked(entry.checked)
+
+    def dropAction(self, action: QAction, entry: _tm.MenuEntry) -> None:
+        menu = self if entry.group is None else self.groupMenus.get(entry.group)
+        if menu is not None:
+            menu.removeAction(action)
+        action.deleteLater()
+
+    def arrange(self, group: str | None, actions: list[QAction]) -> None:
+        if group is None:
+            # inserting an action the menu holds moves it
+            self.insertActions(self.groupSeparator, actions)
+            return
+        if not actions:
+            if (menu := self.groupMenus.pop(group, None)) is not None:
+                self.removeAction(menu.menuAction())
+                menu.deleteLater()
+        else:
+            if (menu := self.groupMenus.get(group)) is None:
+                menu = self.groupMenus[group] = QMenu(group, self)
+                self.addMenu(menu)
+            menu.addActions(actions)
+        self.groupSeparator.setVisible(len(self.groupMenus) > 0)
+
+    def applyFilter(self, text: str) -> None:
+        shown = self.model.setFilter(text)
+        for group, count in self.model.groups().items():
+            if (menu := self.groupMenus.get(group)) is not None:  # type: ignore
+                menu.menuAction().setVisible(count > 0)
+        self.emptyAction.setText("无匹配配置" if len(self.model) else "无配置")
+        self.emptyAction.setVisible(shown == 0)
+
+    def onTriggered(self, action: QAction) -> None:
+        if isinstance(key := action.data(), str):
+            _c.setCurrentProxy(key)
+
+    def keyPressEvent(self, event: QKeyEvent) -> None:
+        # typing filters long lists wherever the focus is
+        text = self.filterEdit.text()
+        if self.filterAction.isVisible() and not self.filterEdit.hasFocus():
+            if event.key() == Qt.Key.Key_Backspace and text:
+                self.filterEdit.setText(text[:-1])
+                return
+            if event.key() == Qt.Key.Key_Escape and text:
+                self.filterEdit.clear()
+                return
+            if (typed := event.text()).isprintable() and typed.strip():
+                self.filterEdit.setText(text + typed)
+                return
+        super().keyPressEvent(event)
+
+
+### callbacks
+def updateUi(**fields) -> None:
+    # the watchers start before the tray, their first reports are read below
+    if "UI" in globals():
+        UI.update(**fields)
+
+
+def enabledCallback(enabled: bool):
+    updateUi(enabled=enabled)
+
+
+def protoCallback(proto: _p.ProxyProto):
+    updateUi(proto=proto)
+
+
+def followGatewayCallback(followGateway: bool):
+    updateUi(followGateway=followGateway)
+
+
+def hostCallback(host: str):
+    updateUi(host=host)
+
+
+def portCallback(port: int):
+    updateUi(port=port)
+
+
+def noProxyCallback(noProxy: list[str]):
+    updateUi(noProxy=tuple(noProxy))
+
+
+def configSetCallback(key: str):
+    updateUi(configKey=key)
+
+
+def windowThemeCallback(light: bool):
+    updateUi(windowLight=light)
+
+
+def tbThemeCallback(light: bool):
+    updateUi(tbLight=light)
+
+
+### init
+_p.enabledCallback = enabledCallback
+_p.protoCallback = protoCallback
+_p.followGatewayCallback = followGatewayCallback
+_p.hostCallback = hostCallback
+_p.portCallback = portCallback
+_p.noProxyiesCallback = noProxyCallback
+_c.configSetCallback = configSetCallback
+_d.windowCallback = windowThemeCallback
+_d.taskbarCallback = tbThemeCallback
+ENGINE = _e.Engine()
+try:
+    ENGINE.start()
+except _e.AlreadyRunningError:
+    _l.info("another instance is running, asking it to show the settings")
+    _ipc.forward("show")
+    sys.exit(0)
+_d.start()
+
+# app
+qdarktheme.enable_hi_dpi()
+APP = App([])
+APP.setQuitOnLastWindowClosed(False)
+qdarktheme.setup_theme("auto")
+
+# status, flushed once per event loop pass however many threads report
+currentConfig = _p.getCurrentProxy()
+UI_BRIDGE = UiBridge()
+UI = _ui.UiStore(
+    _ui.UiState(
+        enabled=_p.getEnabled(),
+        configKey=_c.active(),
+        proto=currentConfig.proxy.proto,
+        followGateway=isinstance(currentConfig.proxy, _p.GatewayProxy),
+        host=getattr(currentConfig.proxy, "host", ""),
+        port=currentConfig.proxy.port,
+        noProxy=tuple(currentConfig.proxy.noProxyies),
+        windowLight=_d.isWindowLight(),
+        tbLight=_d.isTBLight(),
+    ),
+    UI_BRIDGE.flushRequested.emit,
+)
+UI_BRIDGE.flushRequested.connect(UI.flush, Qt.ConnectionType.QueuedConnection)
+
+# static actions
+TOP_ACTIONS: list[tuple[str, Callable]] = [
+    ("切换 (双击图标)", lambda: _p.setEnabled(not UI.current().enabled)),
+    ("打开系统设置", openMSSettings),
+]
+BOTTOM_ACTIONS: list[tuple[str, Callable]] = [
+    ("关闭", stop),
+]
+MAPPING_ACTION = Action("映射配置", triggered=lambda: _m.applyMapping(force=True))
+
+# config window, its tables follow the changes of configs and mappings
+CONFIG_WINDOW = ConfigWindow()
+TABLE_BRIDGE = TableBridge()
+TABLE_BRIDGE.changed.connect(CONFIG_WINDOW.applyEvent)
+TABLE_EVENT_KINDS = ("configs", "mappings")
+TABLE_EVENTS, _ = _ev.subscribe(kinds=TABLE_EVENT_KINDS)
+threading.Thread(target=forwardTableEvents, daemon=True).start()
+
+# tray menu
+TRAY_MENU = TrayMenu()
+
+# tray icon
+TRAY_ICON = TrayIcon(APP)
+UI.watch("icon", lambda ui: (ui.enabled, ui.tbLight), setTrayIcon)
+UI.watch("tooltip", lambda ui: ui.tooltip, TRAY_ICON.setToolTip)
+TRAY_ICON.setContextMenu(TRAY_MENU)
+TRAY_ICON.activated.connect(handleTrayClick)
+TRAY_ICON.show()
+
+# config menu
+CONFIG_MENU = ConfigMenu("选择配置")
+
+# ipc
+IPC_BRIDGE = IpcBridge()
+IPC_BRIDGE.showRequested.connect(showConfigWindow)
+_ipc.register("show", lambda _: IPC_BRIDGE.showRequested.emit())
@@ -0,0 +1,255 @@
+import asyncio
+import socket
+import struct
+import threading
+import time
+from collections import deque
+from typing import NamedTuple
+
+from . import __config as _c
+from . import __log as _l
+from . import __pacjs as _js
+from . import __proxy as _p
+from . import __wpad as _wpad
+
+HEALTH_TARGET_HOST = "www.gstatic.com"
+HEALTH_TARGET_PORT = 443
+HEALTH_TIMEOUT = 3.0
+HEALTH_CONCURRENCY = 16
+HEALTH_TTL = 60.0
+HEALTH_HISTORY = 20
+
+
+class ProbeError(Exception):
+    pass
+
+
+class HealthResult(NamedTuple):
+    key: str
+    ok: bool
+    latency: float | None  # ms, last probe
+    p50: float | None
+    p90: float | None
+    p99: float | None
+    samples: int
+    failures: int
+    reason: str | None  # last failure reason
+    checkedAt: float
+
+    def toDict(self) -> dict:
+        return self._asdict()
+
+    def describe(self) -> str:
+        if self.ok:
+            return f"{self.latency:.0f} ms"
+        return f"✗ {self.reason}"
+
+
+def _percentile(sortedValues: list[float], pct: float) -> float | None:
+    if not sortedValues:
+        return None
+    return sortedValues[min(len(sortedValues) - 1, int(len(sortedValues) * pct))]
+
+
+async def _readExactly(reader: asyncio.StreamReader, n: int) -> bytes:
+    try:
+        return await reader.readexactly(n)
+    except asyncio.IncompleteReadError:
+        raise ProbeError("connection closed")
+
+
+async def _handshakeHttp(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    target = f"{HEALTH_TARGET_HOST}:{HEALTH_TARGET_PORT}"
+    writer.write(f"CONNECT {target} HTTP/1.1\r\nHost: {target}\r\n\r\n".encode("ascii"))
+    await writer.drain()
+    line = await reader.readline()
+    parts = line.split(None, 2)
+    if len(parts) < 2 or not parts[0].startswith(b"HTTP/") or not parts[1].isdigit():
+        raise ProbeError("not an http proxy")
+    if not 200 <= (code := int(parts[1])) < 300:
+        raise ProbeError(f"http {code}")
+
+
+async def _handshakeSocks4(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    # SOCKS4a: IP 0.0.0.1 and the host name after the empty user id
+    writer.write(
+        struct.pack(">BBH4s", 4, 1, HEALTH_TARGET_PORT, b"\0\0\0\1")
+        + b"\0"
+        + HEALTH_TARGET_HOST.encode("ascii")
+        + b"\0"
+    )
+    await writer.drain()
+    reply = await _readExactly(reader, 8)
+    if reply[0] != 0:
+        raise ProbeError("not a socks4 proxy")
+    if reply[1] != 0x5A:
+        raise ProbeError(f"socks4 rejected 0x{reply[1]:02x}")
+
+
+async def _handshakeSocks5(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+) -> None:
+    writer.write(b"\x05\x01\x00")
+    await writer.drain()
+    reply = await _readExactly(reader, 2)
+    if reply[0] != 5:
+        raise ProbeError("not a socks5 proxy")
+    if reply[1] != 0:
+        raise ProbeError("socks5 requires authentication")
+
+
+_HANDSHAKES = {
+    "http": _handshakeHttp,
+    "https": _handshakeHttp,
+    "socks4": _handshakeSocks4,
+    "socks5": _handshakeSocks5,
+    "socks5h": _handshakeSocks5,
+}
+
+
+async def probe(
+    proto: str, host: str, port: int, timeout: float | None = None
+) -> float:
+    """TCP connect, then the protocol greeting for `proto`.
+
+    Returns:
+        float: Milliseconds until the handshake answered.
+
+    Raises:
+        ProbeError: With a short failure reason.
+    """
+    start = time.perf_counter()
+    writer = None
+    try:
+        async with asyncio.timeout(timeout or HEALTH_TIMEOUT):
+            reader, writer = await asyncio.open_connection(host, port)
+            await _HANDSHAKES[proto](reader, writer)
+    except TimeoutError:
+        raise ProbeError("timeout")
+    except ConnectionRefusedError:
+        raise ProbeError("refused")
+    except ConnectionResetError:
+        raise ProbeError("reset")
+    except socket.gaierror:
+        raise ProbeError("dns")
+    except OSError as e:
+        raise ProbeError(e.strerror or type(e).__name__)
+    finally:
+        if writer is not None:
+            writer.close()
+    return (time.perf_counter() - start) * 1000
+
+
+def _record(key: str, latency: float | None, reason: str | None) -> HealthResult:
+    history = _history.setdefault(key, deque(maxlen=HEALTH_HISTORY))
+    history.append(latency)
+    ok = sorted(v for v in history if v is not None)
+    return HealthResult(
+        key=key,
+        ok=latency is not None,
+        latency=latency,
+        p50=_percentile(ok, 0.5),
+        p90=_percentile(ok, 0.9),
+        p99=_percentile(ok, 0.99),
+        samples=len(history),
+        failures=len(history) - len(ok),
+        reason=reason,
+        checkedAt=time.time(),
+    )
+
+
+async def _probeAll(
+    targets: dict[str, tuple[str, str, int]],
+) -> dict[str, HealthResult]:
+    sem = asyncio.Semaphore(HEALTH_CONCURRENCY)
+
+    async def one(key: str, proto: str, host: str, port: int) -> HealthResult:
+        async with sem:
+            try:
+                latency, reason = await probe(proto, host, port), None
+            except ProbeError as e:
+                latency, reason = None, str(e)
+        with _lock:
+            return _record(key, latency, reason)
+
+    results = await asyncio.gather(*(one(k, *t) for k, t in targets.items()))
+    return {r.key: r for r in results}
+
+
+def _pacTarget(pac: _p.PacProxy) -> tuple[str, str, int] | None:
+    """First proxy the PAC file picks for the probe target, None for DIRECT"""
+    entries = _wpad.resolve(f"https://{HEALTH_TARGET_HOST}/", pac)
+    return next((t for e in entries if (t := _js.splitEntry(e)) is not None), None)
+
+
+def _targets(keys: list[str]) -> dict[str, tuple[str, str, int]]:
+    targets = {}
+    for key in keys:
+        config = _c.configs().get(key)
+        if config is None or isinstance(config.proxy, _p.GroupProxy):
+            continue
+        try:
+            if isinstance(config.proxy, _p.PacProxy):
+                if (target := _pacTarget(config.proxy)) is not None:
+                    targets[key] = target
+            else:
+                targets[key] = _p.splitURL(config.proxy.url)
+        except (ValueError, _wpad.PacFetchError, _js.PacError):
+            _l.warning(f"cannot probe proxy config {key}")
+    return targets
+
+
+def check(
+    keys: list[str] | None = None, force: bool = False
+) -> dict[str, HealthResult]:
+    """Probe the given configs (default: all) concurrently.
+
+    Results younger than `HEALTH_TTL` are served from cache unless `force`.
+    """
+    keys = list(_c.configs().keys()) if keys is None else keys
+    now = time.time()
+    with _lock:
+        stale = [
+            k
+            for k in keys
+            if force or (r := _results.get(k)) is None or now - r.checkedAt > HEALTH_TTL
+        ]
+    if stale and (targets := _targets(stale)):
+        fresh = asyncio.run(_probeAll(targets))
+        _l.debug(f"probed {len(fresh)} proxy configs")
+        with _lock:
+            _results.update(fresh)
+    with _lock:
+        return {k: _results[k] for k in keys if k in _results}
+
+
+def checkInBackground(force: bool = False) -> None:
+    global _checking
+    with _lock:
+        if _checking:
+            return
+        _checking = True
+
+    def run() -> None:
+        global _checking
+        try:
+            check(force=force)
+        finally:
+            _checking = False
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def cached(key: str) -> HealthResult | None:
+    with _lock:
+        return _results.get(key)
+
+
+_lock = threading.Lock()
+_checking = False
+_results: dict[str, HealthResult] = {}
+_history: dict[str, deque[float | None]] = {}
@@ -0,0 +1,240 @@
+import contextlib
+import getpass
+import json as _json
+import os
+import stat
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Callable, Iterator
+
+from . import __log as _l
+
+if sys.platform == "win32":
+    IPC_FAMILY = "AF_PIPE"
+    IPC_ADDRESS = rf"\\.\pipe\ProxyControl-{getpass.getuser()}"
+else:
+    IPC_FAMILY = "AF_UNIX"
+    # XDG_RUNTIME_DIR is private to the user, the temp dir is shared and
+    # gets a directory of our own
+    IPC_DIR = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(
+        tempfile.gettempdir(), f"proxy-control-{getpass.getuser()}"
+    )
+    IPC_ADDRESS = os.path.join(IPC_DIR, f"proxy-control-{getpass.getuser()}.sock")
+IPC_TIMEOUT = 5.0
+IPC_ACCEPT_BACKOFF = (0.05, 5.0)  # seconds, doubled per failed accept()
+
+IpcHandlerType = Callable[[Any], Any]
+IpcStreamHandlerType = Callable[[Any, Callable[[Any], None]], None]
+
+
+class IpcError(Exception):
+    """Raised by handlers to answer with an error, and by `request` on failure"""
+
+
+def _encode(obj: Any) -> bytes:
+    return _json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _decode(data: bytes) -> Any:
+    return _json.loads(data.decode("utf-8"))
+
+
+def register(cmd: str, handler: IpcHandlerType) -> None:
+    handlers[cmd] = handler
+
+
+def registerStream(cmd: str, handler: IpcStreamHandlerType) -> None:
+    """Register a command that takes over its connection.
+
+    After the `ok` response the handler pushes frames through the given
+    send function until it returns or the client goes away.
+    """
+    streamHandlers[cmd] = handler
+
+
+def connect() -> Connection | None:
+    try:
+        return Client(IPC_ADDRESS, IPC_FAMILY)
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+
+
+def request(cmd: str, arg: Any = None, timeout: float = IPC_TIMEOUT) -> Any:
+    """Send one request to the running instance.
+
+    Request frames are `{"cmd": str, "arg": Any}`, responses are
+    `{"ok": true, "data": Any}` or `{"ok": false, "error": str}`,
+    both compact UTF-8 JSON.
+
+    Raises:
+        IpcError: No instance is running, it timed out or it answered with an error.
+    """
+    conn = connect()
+    if conn is None:
+        raise IpcError("no running instance")
+    with conn:
+        conn.send_bytes(_encode({"cmd": cmd, "arg": arg}))
+        if not conn.poll(timeout):
+            raise IpcError(f"request {cmd} timed out")
+        resp = _decode(conn.recv_bytes())
+    if not resp.get("ok"):
+        raise IpcError(resp.get("error", "unknown error"))
+    return resp.get("data")
+
+
+def stream(cmd: str, arg: Any = None) -> Iterator[Any]:
+    """Open a streaming request and yield frames until the server closes it.
+
+    Raises:
+        IpcError: No instance is running or it refused the request.
+    """
+    conn = connect()
+    if conn is None:
+        raise IpcError("no running instance")
+    with conn:
+        conn.send_bytes(_encode({"cmd": cmd, "arg": arg}))
+        resp = _decode(conn.recv_bytes())
+        if not resp.get("ok"):
+            raise IpcError(resp.get("error", "unknown error"))
+        try:
+            while True:
+                yield _decode(conn.recv_bytes())
+        except EOFError:
+            return
+
+
+def forward(cmd: str, arg: Any = None) -> bool:
+    try:
+        request(cmd, arg)
+        return True
+    except IpcError:
+        return False
+
+
+def _dispatch(req: Any) -> dict[str, Any]:
+    if not isinstance(req, dict) or (cmd := req.get("cmd")) not in handlers:
+        return {"ok": False, "error": f"unknown command {req}"}
+    try:
+        return {"ok": True, "data": handlers[cmd](req.get("arg"))}
+    except IpcError as e:
+        return {"ok": False, "error": str(e)}
+    except Exception as e:
+        _l.error(f"ipc command {cmd} failed: {e}")
+        return {"ok": False, "error": f"internal error: {e}"}
+
+
+def _serve(conn: Connection) -> None:
+    with conn:
+        try:
+            while True:
+                req = _decode(conn.recv_bytes())
+                if isinstance(req, dict) and (cmd := req.get("cmd")) in streamHandlers:
+                    conn.send_bytes(_encode({"ok": True, "data": None}))
+                    streamHandlers[cmd](
+                        req.get("arg"), lambda frame: conn.send_bytes(_encode(frame))
+                    )
+                    return
+                conn.send_bytes(_encode(_dispatch(req)))
+        except (EOFError, OSError):
+            pass
+        except ValueError as e:
+            _l.warning(f"dropped malformed ipc request: {e}")
+
+
+def _acceptLoop() -> None:
+    _l.info(f"ipc listening on {IPC_ADDRESS}")
+    backoff = IPC_ACCEPT_BACKOFF[0]
+    while (listener := _listener) is not None:
+        try:
+            conn = listener.accept()
+        except OSError as e:
+            if _listener is None:
+                return  # closed by stop()
+            # e.g. out of file descriptors, do not spin on it
+            _l.warning(f"ipc accept failed, retrying in {backoff:g} s: {e}")
+            time.sleep(backoff)
+            backoff = min(backoff * 2, IPC_ACCEPT_BACKOFF[1])
+            continue
+        backoff = IPC_ACCEPT_BACKOFF[0]
+        if _listener is None:
+            conn.close()
+            return
+        threading.Thread(target=_serve, args=(conn,), daemon=True).start()
+
+
+def _privateDir(path: str) -> None:
+    """Create `path` for this user only, or check that it is"""
+    with contextlib.suppress(FileExistsError):
+        os.mkdir(path, 0o700)
+    info = os.lstat(path)
+    if (
+        not stat.S_ISDIR(info.st_mode)
+        or info.st_uid != os.getuid()
+        or info.st_mode & 0o077
+    ):
+        raise PermissionError(f"{path} is not a private directory of this user")
+
+
+def _bind() -> Listener | None:
+    if IPC_FAMILY == "AF_UNIX":
+        _privateDir(IPC_DIR)
+    try:
+        return Listener(IPC_ADDRESS, IPC_FAMILY)
+    except (PermissionError, FileExistsError):
+        # the pipe is created with FILE_FLAG_FIRST_PIPE_INSTANCE
+        return None
+    except OSError:
+        if IPC_FAMILY != "AF_UNIX":
+            return None
+        if (probe := connect()) is not None:
+            probe.close()
+            return None
+        # stale socket file left by a crashed instance, unless another
+        # instance starting at the same time cleaned it up first
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(IPC_ADDRESS)
+        try:
+            return Listener(IPC_ADDRESS, IPC_FAMILY)
+        except OSError:
+            return None  # that instance bound it in between
+
+
+def start() -> bool:
+    """Start serving requests.
+
+    Returns:
+        bool: False if another instance already owns the endpoint.
+    """
+    global _listener, _thread
+    if _listener is not None:
+        return True
+    if (listener := _bind()) is None:
+        _l.warning(f"ipc endpoint {IPC_ADDRESS} is owned by another instance")
+        return False
+    _listener = listener
+    _thread = threading.Thread(target=_acceptLoop, daemon=True)
+    _thread.start()
+    return True
+
+
+def stop() -> None:
+    global _listener
+    _l.info("stopping ipc server...")
+    if (listener := _listener) is None:
+        return
+    _listener = None
+    # wake the blocking accept()
+    if (conn := connect()) is not None:
+        conn.close()
+    listener.close()
+    if _thread:
+        _thread.join(1)
+
+
+handlers: dict[str, IpcHandlerType] = {}
+streamHandlers: dict[str, IpcStreamHandlerType] = {}
+_listener: Listener | None = None
+_thread: threading.Thread | None = None
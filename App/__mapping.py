@@ -1,9 +1,16 @@
 import threading
 import time
+from typing import Any, Iterable, Mapping
 
 from . import __config as _c
 from . import __debounce as _d
+from . import __events as _ev
+from . import __flap as _flap
+from . import __log as _l
+from . import __netcache as _nc
 from . import __proxy as _p
+from . import __state as _state
+from . import __store as _store
 from . import __toast as _t
 from . import __utils as _u
 
@@ -13,10 +20,25 @@ DEPRECATED_STR = "配置失效"
 NULL_KEY_REPLACEMENT = "TlVMX0FTX0Y=\u0000"
 
 
-def _saveConfig() -> None:
-    _c.setGeneral(
-        AUTO_MAP_CONFIG_ENTRY, {_c.nwInfoToText(k): v for k, v in _config.items()}
-    )
+def _serialize(mappings: Mapping[_p.Network, str | None]) -> dict[str, str | None]:
+    return {_c.nwInfoToText(k): v for k, v in mappings.items()}
+
+
+def _saved(
+    changed: Mapping[_p.Network, str | None], removed: Iterable[_p.Network] = ()
+) -> dict[str, str | None]:
+    """The saved mapping setting with only these entries rewritten"""
+    saved = dict(_c.getGeneral(AUTO_MAP_CONFIG_ENTRY, {}))
+    for nwInfo in removed:
+        saved.pop(_c.nwInfoToText(nwInfo), None)
+    saved.update((_c.nwInfoToText(k), v) for k, v in changed.items())
+    return saved
+
+
+def _saveConfig(
+    changed: Mapping[_p.Network, str | None], removed: Iterable[_p.Network] = ()
+) -> None:
+    _c.setGeneral(AUTO_MAP_CONFIG_ENTRY, _saved(changed, removed))
 
 
 def _loadConfig() -> dict[_p.Network, str | None]:
@@ -36,7 +58,6 @@ def _getNetworkInfo() -> _p.Network:
 
 
 def _networkChangeDetection() -> None:
-    global _lastNetworkInfo
     while _active:
         if not _u.isConnected():
             while _active:
@@ -45,51 +66,217 @@ def _networkChangeDetection() -> None:
                 time.sleep(1)
             else:
                 return
-            if (nwInfo := _getNetworkInfo()) != _lastNetworkInfo:
-                applyMapping()
-                _lastNetworkInfo = nwInfo
+            _reconnected()
+        _releaseHeld()
         time.sleep(1)
 
 
+def _reconnected() -> None:
+    """Apply the decision cached for this network at once, then let the
+    probes and applyMapping confirm or correct it"""
+    global _held, _joined
+    started = time.monotonic()
+    ssid = _u.getSSID()
+    fp = _nc.fingerprint(ssid, None if ssid else _u.getGateway())
+    left, _joined = _joined, fp or ""
+    verdict = _damper.transition(_joined)
+    if (
+        verdict == "act"
+        and left is not None
+        and _damper.isSuppressed(left)
+        and _nc.cached(fp) is _nc.MISSING
+    ):
+        # bouncing off a flapping network; a known one that is not flapping
+        # itself is more likely a real move and is applied at once
+        verdict = "held"
+    if verdict != "act":
+        if verdict == "suppress":
+            _l.warning(f"network {fp} is flapping, holding automatic switches")
+            if _held is None:  # one toast per episode, not per network
+                _t.toast(f"网络 [{ssid or fp or '未知'}] 连接不稳定，暂停自动切换")
+        _held = (left, _joined) if left is not None else (_joined,)
+        # keep track of the network, known or not, and leave the registry to
+        # _releaseHeld: it looks the settled network up and applies that, so
+        # a cached guess that was wrong never gets written in the first place
+        if (nwInfo := _getNetworkInfo()) != network():
+            _state.update(network=nwInfo)
+            _ev.publish("network", nwInfo.model_dump())
+        return
+    _held = None
+    decision = _nc.begin(fp, started)
+    guessed = decision is not _nc.MISSING and _speculate(decision, ssid or fp)
+    if (nwInfo := _getNetworkInfo()) != network():
+        _state.update(network=nwInfo)
+        _ev.publish("network", nwInfo.model_dump())
+    elif not guessed:
+        _nc.cancel()
+        return
+    applyMapping()
+
+
+def _releaseHeld() -> None:
+    """Catch up on the switches held back once the network has settled"""
+    global _held
+    if _held is None or any(_damper.isSuppressed(key) for key in _held):
+        return
+    _held = None
+    snap = _state.current()
+    if (nwInfo := _getNetworkInfo()) != snap.network:
+        snap = _state.update(network=nwInfo)
+        _ev.publish("network", nwInfo.model_dump())
+    found = _lookup(nwInfo, snap)
+    decision = found[1] if found is not None and found[1] in snap.configs else None
+    if found is not None and _inEffect(decision):
+        _l.info(f"network [{nwInfo}] is stable again, {decision} still in effect")
+        return
+    _l.info(f"network [{nwInfo}] is stable again")
+    applyMapping()
+
+
+def flaps() -> dict[str, Any]:
+    return _damper.stats()
+
+
+def _inEffect(confName: str | None) -> bool:
+    if not _p.getEnabled():
+        return confName is None
+    if confName is None or (config := _c.configs().get(confName)) is None:
+        return False
+    try:
+        return _c.isCurrent(config, _p.getCurrentProxy())
+    except ValueError:
+        return False
+
+
+def _speculate(confName: str | None, where: str | None) -> bool:
+    """Apply a cached decision unless it is in effect already.
+
+    Returns:
+        bool: Whether anything was changed.
+    """
+    if confName is not None and confName not in _c.configs():
+        return False  # renamed or removed since, wait for the lookup
+    if _inEffect(confName):
+        _nc.speculated()
+        return False
+    if confName is None:
+        _p.setEnabled(False)
+        _nc.speculated()
+        _t.toast(f"按网络 [{where}] 的上次记录，已禁用代理")
+        return True
+    _c.configs()[confName].proxy.apply()
+    _p.setEnabled(True)
+    _nc.speculated()
+    _t.toast(f"按网络 [{where}] 的上次记录，使用配置 [{confName}]")
+    return True
+
+
 @_d.debounce(2000)
 def applyMapping(force: bool = False) -> None:
-    global _lastNetworkInfo
     if force:
-        _lastNetworkInfo = _getNetworkInfo()
-    if _lastNetworkInfo is None:
+        snap = _state.update(network=_getNetworkInfo())
+        _ev.publish("network", snap.network.model_dump())  # type: ignore
+    else:
+        snap = _state.current()
+    if (nwInfo := snap.network) is None:
         _p.setEnabled(False)
         _t.toast("无法获取网络信息，已禁用代理")
         return
-    if _lastNetworkInfo in _config:  # assuming is connected
-        confName = _config[_lastNetworkInfo]
-        if confName in _c.proxyConfig:
-            _c.proxyConfig[confName].proxy.apply()
-            _p.setEnabled(True)
-            _t.toast(
-                f"根据网络 [{_lastNetworkInfo or '有线连接'}]，使用配置 [{confName}]"
-            )
-            return
+    found = _lookup(nwInfo, snap)
+    decision = found[1] if found is not None and found[1] in snap.configs else None
+    if _nc.settle(_nc.fingerprint(nwInfo.ssid, None), decision):
+        _l.info(f"cached decision {decision} for [{nwInfo}] confirmed")
+        return
+    if found is None:  # assuming is connected
         _p.setEnabled(False)
-        _t.toast(f"根据网络 [{_lastNetworkInfo or '有线连接'}]，已禁用代理")
+        _t.toast(f"未找到适用于网络 [{nwInfo}] 的配置，已禁用代理")
+        return
+    info, confName = found
+    if confName is not None and (config := snap.configs.get(confName)) is not None:
+        config.proxy.apply()
+        _p.setEnabled(True)
+        _t.toast(f"根据网络 [{info}]，使用配置 [{confName}]")
         return
-    for info, confName in _config.items():
-        if info.mac is None and info.ssid == _lastNetworkInfo.ssid:
-            if confName in _c.proxyConfig:
-                _c.proxyConfig[confName].proxy.apply()
-                _p.setEnabled(True)
-                _t.toast(f"根据网络 [{info}]，使用配置 [{confName}]")
-                return
-            _p.setEnabled(False)
-            _t.toast(f"根据网络 [{info}]，已禁用代理")
-            return
     _p.setEnabled(False)
-    _t.toast(f"未找到适用于网络 [{_lastNetworkInfo}] 的配置，已禁用代理")
+    _t.toast(f"根据网络 [{info}]，已禁用代理")
+
+
+def _lookup(
+    nwInfo: _p.Network, snap: _state.Snapshot | None = None
+) -> tuple[_p.Network, str | None] | None:
+    """The mapping for exactly `nwInfo`, else one for its SSID with any MAC"""
+    if _store.active():
+        if (row := _store.lookupMapping(nwInfo.ssid, nwInfo.mac)) is None:
+            return None
+        return _p.Network(ssid=row[0], mac=row[1]), row[2]
+    mappings = (snap or _state.current()).mappings
+    if nwInfo in mappings:
+        return nwInfo, mappings[nwInfo]
+    for info, confName in mappings.items():
+        if info.mac is None and info.ssid == nwInfo.ssid:
+            return info, confName
+    return None
+
 
+def priority(nwInfo: _p.Network) -> int:
+    """When `_lookup` uses the mapping for `nwInfo`: 1 for an exact match, 2
+    for one with any MAC, when there is no exact one"""
+    return 2 if nwInfo.mac is None else 1
 
-def _checkMapping() -> None:
-    for nwInfo, confName in _config.items():
-        if confName is not None and confName not in _c.proxyConfig:
-            _config[nwInfo] = DEPRECATED_STR
+
+def _index(
+    mappings: Mapping[_p.Network, str | None],
+) -> dict[str, frozenset[_p.Network]]:
+    references: dict[str, set[_p.Network]] = {}
+    for nwInfo, confName in mappings.items():
+        if confName is not None:
+            references.setdefault(confName, set()).add(nwInfo)
+    return {k: frozenset(v) for k, v in references.items()}
+
+
+def _mapped(
+    snap: _state.Snapshot, nwInfo: _p.Network, confName: str | None, remove: bool
+) -> dict[str, Any]:
+    """Snapshot fields with the mapping for `nwInfo` set or removed"""
+    mappings = snap.mappings.copy()
+    references = snap.references.copy()
+    if nwInfo in mappings and (old := mappings.pop(nwInfo)) in references:
+        if rest := references[old] - {nwInfo}:
+            references[old] = rest
+        else:
+            del references[old]
+    if not remove:
+        mappings[nwInfo] = confName
+        if confName is not None:
+            references[confName] = references.get(confName, frozenset()) | {nwInfo}
+    return {"mappings": mappings, "references": references}
+
+
+def _cascade(snap: _state.Snapshot, renames: dict[str, str | None]) -> _c.Cascade:
+    """Point the mappings of renamed configs at the new name and those of
+    removed ones at DEPRECATED_STR, touching only the affected mappings"""
+    targets = {k: DEPRECATED_STR if v is None else v for k, v in renames.items()}
+    if _store.active():
+        return _c.Cascade({}, {}, targets)
+    affected = {k: snap.references[k] for k in targets if k in snap.references}
+    if not affected:
+        return _c.Cascade({}, {}, {})
+    mappings = snap.mappings.copy()
+    references = snap.references.copy()
+    changed: dict[_p.Network, str | None] = {}
+    for old, nwInfos in affected.items():
+        new = targets[old]
+        del references[old]
+        references[new] = references.get(new, frozenset()) | nwInfos
+        changed.update(dict.fromkeys(nwInfos, new))
+    mappings.update(changed)
+    count = sum(map(len, affected.values()))
+    _l.info(f"moved {count} mappings of {len(affected)} renamed or removed configs")
+    return _c.Cascade(
+        {"mappings": mappings, "references": references},
+        {AUTO_MAP_CONFIG_ENTRY: _saved(changed)},
+        {},
+    )
 
 
 def start(skipConf: bool = False) -> None:
@@ -102,9 +289,10 @@ def start(skipConf: bool = False) -> None:
         _thread.start()
 
 
-def stop() -> None:
+def stop(skipConf: bool = False) -> None:
     global _active
-    _c.setGeneral(AUTO_MAP_ENABLED_ENTRY, False)
+    if not skipConf:
+        _c.setGeneral(AUTO_MAP_ENABLED_ENTRY, False)
     _active = False
     if _thread.is_alive():
         _thread.join()
@@ -114,29 +302,80 @@ def active() -> bool:
     return _active
 
 
-def config() -> dict[_p.Network, str | None]:
-    _checkMapping()
-    return _config
+def network() -> _p.Network | None:
+    return _state.current().network
+
+
+def config() -> Mapping[_p.Network, str | None]:
+    if _store.active():
+        return {
+            _p.Network(ssid=ssid, mac=mac): confName
+            for ssid, mac, confName in _store.mappings()
+        }
+    return _state.current().mappings
+
+
+def references(confName: str) -> frozenset[_p.Network]:
+    """The networks mapped to config `confName`"""
+    if _store.active():
+        return frozenset(
+            _p.Network(ssid=ssid, mac=mac)
+            for ssid, mac, _ in _store.mappingsTo(confName)
+        )
+    return _state.current().references.get(confName, frozenset())
 
 
 def addMapping(nwInfo: _p.Network, confName: str | None) -> None:
-    _config[nwInfo] = confName
-    _saveConfig()
+    if _store.active():
+        _store.putMapping(nwInfo.ssid, nwInfo.mac, confName)
+    else:
+        _state.modify(lambda s: _mapped(s, nwInfo, confName, False))
+        _saveConfig({nwInfo: confName})
+    _ev.publish("mappings", {**nwInfo.model_dump(), "config": confName})
 
 
 def removeMapping(nwInfo: _p.Network) -> None:
-    _config.pop(nwInfo, None)
-    _saveConfig()
+    if _store.active():
+        _store.deleteMapping(nwInfo.ssid, nwInfo.mac)
+    else:
+        _state.modify(lambda s: _mapped(s, nwInfo, None, True))
+        _saveConfig({}, (nwInfo,))
+    _ev.publish("mappings", {**nwInfo.model_dump(), "removed": True})
+
+
+def load() -> None:
+    global _active, _damper
+    _active = _c.getGeneral(AUTO_MAP_ENABLED_ENTRY, False)
+    try:
+        _damper = _flap.FlapDamper(
+            _flap.FlapSettings.model_validate(
+                _c.getGeneral(_flap.FLAP_DAMPING_ENTRY, {})
+            )
+        )
+    except ValueError as e:
+        _l.error(f"invalid {_flap.FLAP_DAMPING_ENTRY} setting, using defaults: {e}")
+        _damper = _flap.FlapDamper()
+    # with the store, mappings are looked up through its index when needed
+    mappings = {} if _store.active() else _loadConfig()
+    # the only full check; renames and removals keep mappings in step later
+    configs = _c.configs()
+    for nwInfo, confName in mappings.items():
+        if confName is not None and confName not in configs:
+            mappings[nwInfo] = DEPRECATED_STR
+    if not _store.active():
+        # later saves rewrite single entries, so the keys have to be canonical
+        _c.generalConfig[AUTO_MAP_CONFIG_ENTRY] = _serialize(mappings)
+    _state.update(
+        network=_getNetworkInfo(), mappings=mappings, references=_index(mappings)
+    )
 
 
-_active: bool = _c.getGeneral(AUTO_MAP_ENABLED_ENTRY, False)
-_lastNetworkInfo: _p.Network | None = _getNetworkInfo()
+_c.cascadeCallback = _cascade
+
+_active: bool = False
+_damper = _flap.FlapDamper()
+_joined: str | None = None  # fingerprint of the last reconnect, "" if unknown
+_held: tuple[str, ...] | None = None  # flapping networks a switch waits for
 _thread: threading.Thread = threading.Thread(
     target=_networkChangeDetection, daemon=True
 )
-_config: dict[_p.Network, str | None] = _loadConfig()
-
-_checkMapping()
-if _active:
-    applyMapping()
-    start(skipConf=True)
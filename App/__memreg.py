@@ -0,0 +1,355 @@
+"""In-memory registry with the RegKey surface of __winreg.
+
+It is the registry backend off Windows, so the proxy and theme watchers and
+the apply path run anywhere. Keys live in one process-wide tree and are
+created on first open. notifyChange blocks like a synchronous
+RegNotifyChangeKeyValue: until a value of the key or of a subkey is set or
+deleted, or until the handle is closed. Failures are silent like in
+__winreg, which ignores the status codes: a failed query returns
+(REG_NONE, None), a failed write does nothing and a failed notifyChange
+returns at once. Faults and latency can be injected per operation, and
+every operation is counted.
+"""
+
+import statistics
+import threading
+import time
+from collections import deque
+from typing import Any, Literal, Mapping, NamedTuple
+
+from .__regtypes import RegKeyAccess, RegKeyRoot, RegValueType, _RegKeyAccessGenerated
+
+RegOp = Literal["open", "query", "set", "delete", "notify"]
+REG_OPS: list[RegOp] = ["open", "query", "set", "delete", "notify"]
+SAMPLES = 1024
+
+# access bits each operation needs on the handle
+_NEEDS: dict[RegOp, int] = {
+    "query": RegKeyAccess.KEY_QUERY_VALUE.value,
+    "set": RegKeyAccess.KEY_SET_VALUE.value,
+    "delete": RegKeyAccess.KEY_SET_VALUE.value,
+    "notify": RegKeyAccess.KEY_NOTIFY.value,
+}
+
+
+class RegStats(NamedTuple):
+    calls: dict[str, int]
+    failures: dict[str, int]  # injected, denied, or on a closed handle
+    opTime: dict[str, float]  # mean seconds per call
+    notifications: int  # notifyChange calls woken by a change
+    wakeLatency: float | None  # median seconds from a change to the wake
+
+    def toDict(self: "RegStats") -> dict[str, Any]:
+        return self._asdict()
+
+    def describe(self: "RegStats") -> str:
+        ops = ", ".join(
+            f"{op} {n} ({self.failures[op]} failed, {self.opTime[op] * 1e6:.1f} µs)"
+            for op, n in self.calls.items()
+        )
+        wake = "-" if self.wakeLatency is None else f"{self.wakeLatency * 1e6:.0f} µs"
+        return f"{ops}; {self.notifications} notifications, woken after {wake}"
+
+
+class _Node:
+    __slots__ = ("values", "generation", "changedAt", "waiters")
+
+    def __init__(self: "_Node") -> None:
+        self.values: dict[str, tuple[RegValueType, int | str | bytes]] = {}
+        self.generation = 0  # changes to this key and its subkeys
+        self.changedAt = 0.0
+        self.waiters = 0  # blocked in notifyChange
+
+
+class _Fault:
+    __slots__ = ("op", "error", "remaining", "value")
+
+    def __init__(
+        self: "_Fault",
+        op: RegOp,
+        error: BaseException | None,
+        remaining: int | None,
+        value: str | None,
+    ) -> None:
+        self.op = op
+        self.error = error
+        self.remaining = remaining
+        self.value = value
+
+
+def _path(path: str | bytes) -> str:
+    if isinstance(path, bytes):
+        path = path.decode("ascii")
+    return "\\".join(p for p in path.lower().split("\\") if p)
+
+
+def _node(root: RegKeyRoot, path: str) -> _Node:
+    if (node := _tree.get((root, path))) is None:
+        node = _tree[(root, path)] = _Node()
+    return node
+
+
+def _changed(root: RegKeyRoot, path: str) -> None:
+    """Wake the watchers of the key and of all its parents"""
+    now = time.perf_counter()
+    parts = path.split("\\")
+    for i in range(len(parts), -1, -1):
+        if (node := _tree.get((root, "\\".join(parts[:i])))) is not None:
+            node.generation += 1
+            node.changedAt = now
+    _cond.notify_all()
+
+
+def _fault(op: RegOp, value: str | None = None) -> bool:
+    """Whether an injected fault fails this call; raises if it says so"""
+    for fault in _faults:
+        if fault.op != op or fault.value not in (None, value):
+            continue
+        if fault.remaining is not None:
+            fault.remaining -= 1
+            if fault.remaining <= 0:
+                _faults.remove(fault)
+        if fault.error is not None:
+            _calls[op] += 1
+            _failures[op] += 1
+            raise fault.error
+        return True
+    return False
+
+
+def _begin(op: RegOp) -> float:
+    if (delay := _latency.get(op)) is not None:
+        time.sleep(delay)
+    return time.perf_counter()
+
+
+def _end(op: RegOp, started: float, failed: bool) -> None:
+    _calls[op] += 1
+    _opTime[op] += time.perf_counter() - started
+    if failed:
+        _failures[op] += 1
+
+
+def _typed(data: int | str | bytes) -> RegValueType:
+    if isinstance(data, bool) or not isinstance(data, (int, str, bytes)):
+        raise ValueError(f"Unsupported value: {type(data).__name__}")
+    if isinstance(data, int):
+        return RegValueType.REG_DWORD
+    return RegValueType.REG_SZ if isinstance(data, str) else RegValueType.REG_BINARY
+
+
+class RegKey:
+    def __init__(
+        self: "RegKey",
+        key: RegKeyRoot,
+        path: str,
+        access: RegKeyAccess | _RegKeyAccessGenerated,
+    ):
+        self.key = key
+        self.path: bytes = path.encode("ascii")
+        self.access: int = access.value
+        self._handle: _Node | None = None
+        self._name = _path(path)
+
+    def _usable(self: "RegKey", op: RegOp, value: str | None = None) -> bool:
+        return (
+            self._handle is not None
+            and self.access & _NEEDS[op] == _NEEDS[op]
+            and not _fault(op, value)
+        )
+
+    def open(self: "RegKey") -> None:
+        started = _begin("open")
+        with _cond:
+            failed = _fault("open")
+            self._handle = None if failed else _node(self.key, self._name)
+            _end("open", started, failed)
+
+    def queryValue(
+        self: "RegKey", value: str
+    ) -> tuple[RegValueType, str | int | bytes | None]:
+        started = _begin("query")
+        with _cond:
+            ok = self._usable("query", value)
+            found = self._handle.values.get(value) if ok else None  # type: ignore
+            _end("query", started, not ok)
+        return found or (RegValueType.REG_NONE, None)
+
+    def notifyChange(self: "RegKey", event: Any = None) -> None:
+        if event is not None:
+            raise NotImplementedError("asynchronous notification is not emulated")
+        global _notifications
+        started = _begin("notify")
+        with _cond:
+            if not self._usable("notify"):
+                _end("notify", started, True)
+                return
+            node = self._handle
+            generation = node.generation  # type: ignore
+            _end("notify", started, False)
+            node.waiters += 1  # type: ignore
+            _cond.wait_for(
+                lambda: self._handle is not node or node.generation != generation  # type: ignore
+            )
+            node.waiters -= 1  # type: ignore
+            if self._handle is node:
+                _notifications += 1
+                _wakeSamples.append(time.perf_counter() - node.changedAt)  # type: ignore
+
+    def setValue(
+        self: "RegKey", value: str, data: int | str | bytes, valueType: RegValueType
+    ) -> None:
+        if valueType == RegValueType.REG_DWORD:
+            if not isinstance(data, int):
+                raise ValueError(f"Given data is not an integer: {type(data).__name__}")
+            data.to_bytes(4, byteorder="little")  # same overflow as a DWORD
+        elif valueType == RegValueType.REG_SZ:
+            if not isinstance(data, str):
+                raise ValueError(f"Given data is not a string: {type(data).__name__}")
+            data.encode("ascii")
+        elif valueType == RegValueType.REG_BINARY:
+            if not isinstance(data, bytes):
+                raise ValueError(f"Given data is not bytes: {type(data).__name__}")
+        else:
+            raise ValueError(f"Unsupported value type: {valueType.name}")
+        started = _begin("set")
+        with _cond:
+            ok = self._usable("set", value)
+            if ok:
+                self._handle.values[value] = (valueType, data)  # type: ignore
+                _changed(self.key, self._name)
+            _end("set", started, not ok)
+
+    def deleteValue(self: "RegKey", value: str) -> None:
+        started = _begin("delete")
+        with _cond:
+            ok = self._usable("delete", value)
+            if ok and self._handle.values.pop(value, None) is not None:  # type: ignore
+                _changed(self.key, self._name)
+            _end("delete", started, not ok)
+
+    def close(self: "RegKey") -> None:
+        with _cond:
+            if self._handle is not None:
+                self._handle = None
+                _cond.notify_all()  # a closed handle ends its notifyChange
+
+    def __del__(self: "RegKey") -> None:
+        self.close()
+
+    def __enter__(self: "RegKey") -> "RegKey":
+        self.open()
+        return self
+
+    def __exit__(self: "RegKey", exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def getHKey(root: RegKeyRoot) -> RegKeyRoot:
+    return root
+
+
+def seed(
+    path: str,
+    values: Mapping[str, int | str | bytes],
+    root: RegKeyRoot = RegKeyRoot.HKEY_CURRENT_USER,
+) -> None:
+    """Set values without counting them or waking anyone, e.g. before a test;
+    ints are stored as REG_DWORD, str as REG_SZ and bytes as REG_BINARY"""
+    with _cond:
+        node = _node(root, _path(path))
+        node.values.update((k, (_typed(v), v)) for k, v in values.items())
+
+
+def values(
+    path: str, root: RegKeyRoot = RegKeyRoot.HKEY_CURRENT_USER
+) -> dict[str, int | str | bytes]:
+    with _cond:
+        node = _tree.get((root, _path(path)))
+        return {} if node is None else {k: v for k, (_, v) in node.values.items()}
+
+
+def generation(path: str, root: RegKeyRoot = RegKeyRoot.HKEY_CURRENT_USER) -> int:
+    """How often the key or one of its subkeys has changed"""
+    with _cond:
+        node = _tree.get((root, _path(path)))
+        return 0 if node is None else node.generation
+
+
+def waiters(path: str, root: RegKeyRoot = RegKeyRoot.HKEY_CURRENT_USER) -> int:
+    """How many notifyChange calls wait on exactly this key; a change made
+    while a watcher is between two calls is missed, as on Windows"""
+    with _cond:
+        node = _tree.get((root, _path(path)))
+        return 0 if node is None else node.waiters
+
+
+def injectFault(
+    op: RegOp,
+    error: BaseException | None = None,
+    count: int | None = 1,
+    value: str | None = None,
+) -> None:
+    """Fail the next `count` calls of `op` (every call with None), only
+    those on `value` if given. They raise `error`, or fail silently like a
+    Win32 call whose status is ignored."""
+    with _cond:
+        _faults.append(_Fault(op, error, count, value))
+
+
+def setLatency(op: RegOp, seconds: float | None) -> None:
+    """Delay every call of `op`, as a slow or contended registry would"""
+    with _cond:
+        if seconds is None:
+            _latency.pop(op, None)
+        else:
+            _latency[op] = seconds
+
+
+def clearFaults() -> None:
+    with _cond:
+        _faults.clear()
+        _latency.clear()
+
+
+def stats() -> RegStats:
+    with _cond:
+        return RegStats(
+            dict(_calls),
+            dict(_failures),
+            {op: _opTime[op] / n if (n := _calls[op]) else 0.0 for op in REG_OPS},
+            _notifications,
+            statistics.median(_wakeSamples) if _wakeSamples else None,
+        )
+
+
+def resetStats() -> None:
+    global _notifications
+    with _cond:
+        for op in REG_OPS:
+            _calls[op] = _failures[op] = 0
+            _opTime[op] = 0.0
+        _notifications = 0
+        _wakeSamples.clear()
+
+
+def reset() -> None:
+    """Empty the registry and forget faults and counts; open handles keep
+    their old keys"""
+    with _cond:
+        _tree.clear()
+        _faults.clear()
+        _latency.clear()
+        resetStats()
+        _cond.notify_all()
+
+
+_cond = threading.Condition()
+_tree: dict[tuple[RegKeyRoot, str], _Node] = {}
+_faults: list[_Fault] = []
+_latency: dict[RegOp, float] = {}
+_calls: dict[RegOp, int] = {op: 0 for op in REG_OPS}
+_failures: dict[RegOp, int] = {op: 0 for op in REG_OPS}
+_opTime: dict[RegOp, float] = {op: 0.0 for op in REG_OPS}
+_notifications = 0
+_wakeSamples: deque[float] = deque(maxlen=SAMPLES)
@@ -0,0 +1,315 @@
+"""Table models of the config and mapping pages.
+
+A `KeyedTableModel` holds one row per key. `put` and `discard` change a
+single row and signal only that row, and `reset` compares the model with new
+contents and signals only the rows that were removed, changed or added, so
+views keep their selection and scroll position however many rows there
+are. Once sorted, the model keeps its rows in order: new rows are inserted
+where they belong and changed ones move there. The pages show them through
+a `TableFilter`, which leaves the sorting to the model and keeps the rows in
+which every typed word appears.
+"""
+
+from typing import Any, Hashable, Iterable, Iterator, Mapping, NamedTuple
+
+from PyQt5.QtCore import QAbstractTableModel, QModelIndex, QSortFilterProxyModel, Qt
+
+from . import __mapping as _m
+from . import __proxy as _p
+from . import __traymenu as _tm
+
+MAPPING_UNSET_KW = "断开"
+MAPPING_SSID_WIRED_KW = "有线网络"
+MAPPING_MAC_ANY_KW = "任意"
+
+KEY_ROLE = Qt.ItemDataRole.UserRole  # the key of the row, e.g. its Network
+
+_Row = tuple[Hashable, Any, tuple[str, ...]]  # key, value, cells
+
+
+class TableChange(NamedTuple):
+    inserted: int
+    removed: int
+    changed: int
+    unchanged: int
+
+    def toDict(self: "TableChange") -> dict[str, Any]:
+        return self._asdict()
+
+    def describe(self: "TableChange") -> str:
+        return (
+            f"{self.inserted} inserted, {self.removed} removed,"
+            f" {self.changed} changed, {self.unchanged} unchanged"
+        )
+
+
+def _ranges(rows: Iterable[int]) -> Iterator[tuple[int, int]]:
+    """Runs of consecutive rows as (first, last), in the order of `rows`"""
+    first = last = None
+    for row in rows:
+        if last is not None and abs(row - last) == 1:
+            last = row
+            continue
+        if first is not None:
+            yield min(first, last), max(first, last)  # type: ignore
+        first = last = row
+    if first is not None:
+        yield min(first, last), max(first, last)  # type: ignore
+
+
+class KeyedTableModel(QAbstractTableModel):
+    """Rows of (key, value), shown as the `cells` of each"""
+
+    HEADERS: tuple[str, ...] = ()
+    HEADER_TIPS: tuple[str | None, ...] = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._rows: list[_Row] = []
+        self._index: dict[Hashable, int] = {}
+        self._sortColumn = -1
+        self._descending = False
+
+    def cells(self, key: Any, value: Any) -> tuple[str, ...]:
+        raise NotImplementedError
+
+    def rowCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def columnCount(self, parent: QModelIndex = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index: QModelIndex, role: int = Qt.ItemDataRole.DisplayRole) -> Any:
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self._rows[index.row()][2][index.column()]
+        if role == KEY_ROLE:
+            return self._rows[index.row()][0]
+        return None
+
+    def headerData(
+        self,
+        section: int,
+        orientation: Qt.Orientation,
+        role: int = Qt.ItemDataRole.DisplayRole,
+    ) -> Any:
+        if orientation != Qt.Orientation.Horizontal:
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        if role == Qt.ItemDataRole.ToolTipRole and section < len(self.HEADER_TIPS):
+            return self.HEADER_TIPS[section]
+        return None
+
+    def keys(self) -> list[Hashable]:
+        return [key for key, _, _ in self._rows]
+
+    def value(self, key: Hashable) -> Any:
+        return self._rows[self._index[key]][1]
+
+    def text(self, row: int) -> str:
+        """All cells of `row`, what the filter matches"""
+        return " ".join(self._rows[row][2])
+
+    def sort(
+        self, column: int, order: Qt.SortOrder = Qt.SortOrder.AscendingOrder
+    ) -> None:
+        """Sort by the text of `column` and keep the rows in that order, -1
+        to leave them as they are"""
+        self._sortColumn = column
+        self._descending = order == Qt.SortOrder.DescendingOrder
+        if column < 0 or not self._rows:
+            return
+        self.layoutAboutToBeChanged.emit()
+        persistent = self.persistentIndexList()
+        where = [(self._rows[i.row()][0], i.column()) for i in persistent]
+        self._rows.sort(key=self._sortKey, reverse=self._descending)
+        self._reindex()
+        self.changePersistentIndexList(
+            persistent, [self.index(self._index[k], c) for k, c in where]
+        )
+        self.layoutChanged.emit()
+
+    def put(self, key: Hashable, value: Any) -> None:
+        """Set the row of `key`, adding it if new"""
+        if (row := self._index.get(key)) is None:
+            new = (key, value, self.cells(key, value))
+            row = self._position(new, len(self._rows))
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._rows.insert(row, new)
+            self._reindex(row)
+            self.endInsertRows()
+        elif self._rows[row][1] != value:
+            self._rows[row] = (key, value, self.cells(key, value))
+            self._changed(row, row)
+            self._place(row)
+
+    def discard(self, key: Hashable) -> None:
+        if (row := self._index.get(key)) is not None:
+            self._remove(row, row)
+
+    def reset(self, items: Mapping[Hashable, Any]) -> TableChange:
+        """Make the rows those of `items`, signalling only the differences;
+        kept rows stay where they are and new ones are appended"""
+        gone = sorted(
+            (row for key, row in self._index.items() if key not in items), reverse=True
+        )
+        for first, last in _ranges(gone):
+            self._remove(first, last, reindex=False)
+        if gone:
+            self._reindex()
+        changed = []
+        for row, (key, value, _) in enumerate(self._rows):
+            if (new := items[key]) != value:
+                self._rows[row] = (key, new, self.cells(key, new))
+                changed.append(row)
+        for first, last in _ranges(changed):
+            self._changed(first, last)
+        added = [key for key in items if key not in self._index]
+        if added:
+            start = len(self._rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(added) - 1)
+            for row, key in enumerate(added, start):
+                self._rows.append((key, items[key], self.cells(key, items[key])))
+                self._index[key] = row
+            self.endInsertRows()
+        if added or changed:
+            self.sort(self._sortColumn, self.sortOrder())
+        return TableChange(
+            len(added),
+            len(gone),
+            len(changed),
+            len(self._rows) - len(added) - len(changed),
+        )
+
+    def sortOrder(self) -> Qt.SortOrder:
+        if self._descending:
+            return Qt.SortOrder.DescendingOrder
+        return Qt.SortOrder.AscendingOrder
+
+    def _sortKey(self, row: _Row) -> str:
+        return row[2][self._sortColumn].casefold()
+
+    def _position(self, row: _Row, end: int) -> int:
+        """Where `row` goes among the first `end` rows, after equal ones"""
+        if self._sortColumn < 0:
+            return end
+        key = self._sortKey(row)
+        lo, hi = 0, end
+        while lo < hi:
+            mid = (lo + hi) // 2
+            other = self._sortKey(self._rows[mid])
+            if (key > other) if self._descending else (key < other):
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+
+    def _place(self, row: int) -> None:
+        """Move the changed `row` to where it belongs"""
+        if self._sortColumn < 0:
+            return
+        moved = self._rows.pop(row)
+        to = self._position(moved, len(self._rows))
+        self._rows.insert(row, moved)
+        if to == row:
+            return
+        # the destination counts the rows before the move
+        self.beginMoveRows(
+            QModelIndex(), row, row, QModelIndex(), to if to < row else to + 1
+        )
+        self._rows.insert(to, self._rows.pop(row))
+        self._reindex(min(row, to))
+        self.endMoveRows()
+
+    def _changed(self, first: int, last: int) -> None:
+        self.dataChanged.emit(
+            self.index(first, 0),
+            self.index(last, len(self.HEADERS) - 1),
+            [Qt.ItemDataRole.DisplayRole],
+        )
+
+    def _remove(self, first: int, last: int, reindex: bool = True) -> None:
+        self.beginRemoveRows(QModelIndex(), first, last)
+        for key, _, _ in self._rows[first : last + 1]:
+            del self._index[key]
+        del self._rows[first : last + 1]
+        if reindex:
+            self._reindex(first)
+        self.endRemoveRows()
+
+    def _reindex(self, start: int = 0) -> None:
+        for row in range(start, len(self._rows)):
+            self._index[self._rows[row][0]] = row
+
+
+class MappingTableModel(KeyedTableModel):
+    """Network -> config name, as `_m.config()`"""
+
+    HEADERS = ("SSID", "MAC", "配置", "优先级")
+    HEADER_TIPS = (
+        None,
+        "网关MAC",
+        None,
+        "1: SSID 和网关MAC都相同时使用\n2: 没有 1 时, SSID 相同即使用",
+    )
+
+    def cells(self, key: _p.Network, value: str | None) -> tuple[str, ...]:
+        return (
+            key.ssid or MAPPING_SSID_WIRED_KW,
+            MAPPING_MAC_ANY_KW if key.mac is None else key.mac,
+            value or MAPPING_UNSET_KW,
+            str(_m.priority(key)),
+        )
+
+
+CONFIG_TYPE_NAMES = {
+    "SpecificProxy": "代理",
+    "GatewayProxy": "网关代理",
+    "GroupProxy": "分组",
+    "PacProxy": "PAC",
+}
+
+
+class ConfigTableModel(KeyedTableModel):
+    """Config name -> ProxyConfig, as `_c.configs()`"""
+
+    HEADERS = ("名称", "类型", "地址")
+
+    def cells(self, key: str, value: _p.ProxyConfig) -> tuple[str, ...]:
+        proxy = value.proxy
+        if isinstance(proxy, _p.SpecificProxy):
+            address = proxy.url
+        elif isinstance(proxy, _p.GatewayProxy):
+            # its url asks for the gateway
+            address = f"{proxy.proto}://网关:{proxy.port}"
+        elif isinstance(proxy, _p.GroupProxy):
+            address = ", ".join(proxy.members)
+        else:
+            address = proxy.pacUrl or "WPAD"
+        return key, CONFIG_TYPE_NAMES[proxy.proxyType], address
+
+
+class TableFilter(QSortFilterProxyModel):
+    """Shows the rows of `model` in which every word of the query appears,
+    ignoring case, sorted by the clicked column"""
+
+    def __init__(self, model: KeyedTableModel, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.query = ""
+        self.setSourceModel(model)
+
+    def sort(
+        self, column: int, order: Qt.SortOrder = Qt.SortOrder.AscendingOrder
+    ) -> None:
+        # sorting here compares rows through data(), a Python call per
+        # comparison; the model sorts its rows in one pass and keeps them so
+        self.sourceModel().sort(column, order)
+
+    def setQuery(self, query: str) -> None:
+        self.query = query
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, row: int, parent: QModelIndex) -> bool:
+        if not self.query:
+            return True
+        return _tm.matches(self.sourceModel().text(row), self.query)
@@ -0,0 +1,176 @@
+"""Last-known network decisions, for applying a config before the probes end.
+
+A fingerprint is what can be read right after reconnecting: the SSID, or
+the gateway address on a wired network. It maps to the config (or None
+for no proxy) the full network lookup chose last time there. The cache
+is kept in `network-cache.json` next to the executable.
+"""
+
+import json
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, NamedTuple
+
+from . import __log as _l
+from . import __utils as _u
+
+CACHE_FILE = _u.getExeRelPath("network-cache.json")
+CACHE_SIZE = 64
+SAMPLES = 64
+
+MISSING = object()  # nothing cached for a fingerprint
+
+
+class CacheStats(NamedTuple):
+    hits: int  # guessed right
+    wrong: int  # guessed, then corrected
+    misses: int  # nothing cached, waited for the probes
+    timeToCorrect: float | None  # median seconds from reconnect to right proxy
+    timeToConfirm: float | None  # median seconds from reconnect to lookup
+
+    def toDict(self: "CacheStats") -> dict[str, Any]:
+        return self._asdict()
+
+    def describe(self: "CacheStats") -> str:
+        def ms(value: float | None) -> str:
+            return "-" if value is None else f"{value * 1000:.0f} ms"
+
+        return (
+            f"{self.hits} hits, {self.wrong} wrong, {self.misses} misses,"
+            f" right proxy after {ms(self.timeToCorrect)}"
+            f" (lookup after {ms(self.timeToConfirm)})"
+        )
+
+
+def fingerprint(ssid: str | None, gateway: str | None) -> str | None:
+    if ssid:
+        return f"ssid:{ssid}"
+    if gateway:
+        return f"gateway:{gateway}"
+    return None
+
+
+def _load() -> None:
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        with CACHE_FILE.open("r", encoding="utf-8") as f:
+            entries = json.load(f)
+        _entries.update((k, v) for k, v in entries.items() if isinstance(k, str))
+    except FileNotFoundError:
+        pass
+    except (OSError, ValueError, AttributeError) as e:
+        _l.warning(f"ignoring network cache {CACHE_FILE}: {e}")
+
+
+def _save() -> None:
+    tmp = CACHE_FILE.with_name(f"{CACHE_FILE.name}.tmp")
+    try:
+        with tmp.open("w", encoding="utf-8") as f:
+            json.dump(dict(_entries), f, ensure_ascii=False, indent=4)
+        tmp.replace(CACHE_FILE)
+    except OSError as e:
+        _l.warning(f"failed to save network cache: {e}")
+
+
+def begin(fp: str | None, started: float) -> Any:
+    """Note a reconnect first seen at `started` (monotonic).
+
+    Returns:
+        Any: The cached decision for `fp`, a config name or None, or MISSING.
+    """
+    global _pending
+    with _lock:
+        _load()
+        decision = _entries.get(fp, MISSING) if fp is not None else MISSING
+        _pending = (fp, started, decision, None)
+    return decision
+
+
+def cached(fp: str | None) -> Any:
+    """The cached decision for `fp`, or MISSING, without noting a reconnect"""
+    with _lock:
+        _load()
+        return _entries.get(fp, MISSING) if fp is not None else MISSING
+
+
+def cancel() -> None:
+    """The reconnect needs no decision, e.g. it is the same network"""
+    global _pending
+    with _lock:
+        _pending = None
+
+
+def speculated() -> None:
+    """The cached decision has just been applied"""
+    global _pending
+    with _lock:
+        if _pending is not None:
+            _pending = _pending[:3] + (time.monotonic(),)
+
+
+def settle(fp: str | None, decision: str | None) -> bool:
+    """Record what the full lookup decided.
+
+    Returns:
+        bool: Whether the speculatively applied decision was already right,
+            so nothing has to be applied again.
+    """
+    global _pending, _hits, _wrong, _misses
+    now = time.monotonic()
+    with _lock:
+        _load()
+        pending, _pending = _pending, None
+        if pending is not None and fp is None:
+            fp = pending[0]
+        right = False
+        if pending is not None:
+            _, started, guess, appliedAt = pending
+            _confirmSamples.append(now - started)
+            if guess is MISSING:
+                _misses += 1
+            elif guess == decision:
+                _hits += 1
+                right = appliedAt is not None
+            else:
+                _wrong += 1
+            # the right proxy is in place now, unless the guess already was
+            correctAt: float = appliedAt if right else now  # type: ignore
+            _correctSamples.append(correctAt - started)
+        if fp is None:
+            return right
+        changed = _entries.get(fp, MISSING) != decision
+        _entries[fp] = decision
+        _entries.move_to_end(fp)
+        while len(_entries) > CACHE_SIZE:
+            _entries.popitem(last=False)
+        if changed:
+            _save()
+    return right
+
+
+def stats() -> CacheStats:
+    with _lock:
+        return CacheStats(
+            _hits,
+            _wrong,
+            _misses,
+            statistics.median(_correctSamples) if _correctSamples else None,
+            statistics.median(_confirmSamples) if _confirmSamples else None,
+        )
+
+
+_lock = threading.Lock()
+_loaded = False
+_entries: OrderedDict[str, str | None] = OrderedDict()
+# fingerprint, start, cached decision, when it was applied
+_pending: tuple[str | None, float, Any, float | None] | None = None
+_hits = 0
+_wrong = 0
+_misses = 0
+_correctSamples: deque[float] = deque(maxlen=SAMPLES)
+_confirmSamples: deque[float] = deque(maxlen=SAMPLES)
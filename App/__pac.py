@@ -0,0 +1,361 @@
+import hashlib
+import http.server
+import ipaddress
+import json
+import threading
+from typing import Any
+
+from pydantic import BaseModel, Field, ValidationError
+
+from . import __bypass as _bp
+from . import __config as _c
+from . import __group as _g
+from . import __log as _l
+from . import __pacjs as _js
+from . import __proxy as _p
+
+PAC_ENABLED_ENTRY = "pac_mode"
+PAC_PORT_ENTRY = "pac_port"
+PAC_RULES_ENTRY = "pac_rules"
+PAC_HOST = "127.0.0.1"
+PAC_DEFAULT_PORT = 18081
+PAC_PATH = "/proxy.pac"
+PAC_CONTENT_TYPE = "application/x-ns-proxy-autoconfig"
+DIRECT = "DIRECT"
+
+_PAC_KEYWORDS = {
+    "http": "PROXY",
+    "https": "HTTPS",
+    "socks4": "SOCKS",
+    "socks5": "SOCKS5",
+    "socks5h": "SOCKS5",
+}
+
+# ES3 only, PAC engines are old. Lookup order, most specific first: exact
+# host, IPv4 networks from the longest prefix (octet prefixes and CIDR rules
+# interleaved), plain name (<local>), domain suffix from the longest, glob,
+# default.
+_PAC_LOOKUP = """
+function has(table, key) {
+  return Object.prototype.hasOwnProperty.call(table, key);
+}
+
+function ipv4(host) {
+  var parts = host.split(".");
+  if (parts.length != 4) return -1;
+  var value = 0;
+  for (var i = 0; i < 4; i++) {
+    var octet = parseInt(parts[i], 10);
+    if (String(octet) != parts[i] || octet > 255) return -1;
+    value = value * 256 + octet;
+  }
+  return value;
+}
+
+function inNet(ip, cidr) {
+  return Math.floor(ip / cidr[2]) * cidr[2] == cidr[1];
+}
+
+function lookup(host) {
+  if (has(EXACT, host)) return EXACT[host];
+  var ip = ipv4(host);
+  if (ip >= 0) {
+    var parts = host.split(".");
+    var c = 0;
+    for (var n = 3; n > 0; n--) {
+      for (; c < CIDR.length && CIDR[c][0] > n * 8; c++) {
+        if (inNet(ip, CIDR[c])) return CIDR[c][3];
+      }
+      var prefix = parts.slice(0, n).join(".") + ".";
+      if (has(NET, prefix)) return NET[prefix];
+    }
+    for (; c < CIDR.length; c++) {
+      if (inNet(ip, CIDR[c])) return CIDR[c][3];
+    }
+  } else if (host.indexOf(".") < 0 && host.indexOf(":") < 0) {
+    if (LOCAL >= 0) return LOCAL;
+  } else {
+    var dot = host.indexOf(".");
+    while (dot >= 0) {
+      var suffix = host.substring(dot + 1);
+      if (has(SUFFIX, suffix)) return SUFFIX[suffix];
+      dot = host.indexOf(".", dot + 1);
+    }
+  }
+  for (var j = 0; j < GLOB.length; j++) {
+    if (shExpMatch(host, GLOB[j][0])) return GLOB[j][1];
+  }
+  return DEFAULT;
+}
+
+function FindProxyForURL(url, host) {
+  host = host.toLowerCase();
+  if (host.charAt(0) == "[") host = host.substring(1, host.length - 1);
+  if (host.charAt(host.length - 1) == ".") host = host.substring(0, host.length - 1);
+  return PROXIES[lookup(host)];
+}
+"""
+
+
+class PacRule(BaseModel):
+    """Route hosts matching `pattern` (bypass-list syntax) to `target`"""
+
+    pattern: str = Field(..., description="Host pattern")
+    target: str = Field(..., description="Proxy config key or DIRECT")
+
+    class Config:
+        extra = "forbid"
+
+
+def rules() -> list[PacRule]:
+    ret = []
+    for raw in _c.getGeneral(PAC_RULES_ENTRY, []):
+        try:
+            ret.append(PacRule.model_validate(raw))
+        except ValidationError:
+            _l.error(f"invalid pac rule {raw}")
+    return ret
+
+
+def proxyString(proxy: _p.Proxy) -> str:
+    """`proxy` as a PAC result entry, e.g. `PROXY host:port`"""
+    proto, host, port = _p.splitURL(proxy.url)
+    return f"{_PAC_KEYWORDS[proto]} {host}:{port}"
+
+
+def _target(key: str) -> str:
+    """PAC result for config `key`; groups list every member, current first"""
+    if key.upper() == DIRECT:
+        return DIRECT
+    configs = _c.configs()
+    if (config := configs.get(key)) is None:
+        raise ValueError(f"proxy config {key} not found")
+    if isinstance(config.proxy, _p.Proxy):
+        return proxyString(config.proxy)
+    if not isinstance(config.proxy, _p.GroupProxy):
+        raise ValueError(f"proxy config {key} cannot be a pac rule target")
+    members = [
+        m
+        for m in config.proxy.members
+        if m in configs and isinstance(configs[m].proxy, _p.Proxy)
+    ]
+    if (current := _g.current(key)) in members:
+        members.remove(current)
+        members.insert(0, current)
+    if not members:
+        raise ValueError(f"proxy group {key} has no usable member")
+    # the browser fails over along the list by itself
+    return "; ".join(proxyString(configs[m].proxy) for m in members)
+
+
+class _Tables:
+    def __init__(self: "_Tables"):
+        self.proxies: list[str] = []
+        self.exact: dict[str, int] = {}
+        self.suffix: dict[str, int] = {}
+        self.net: dict[str, int] = {}
+        self.cidr: list[tuple[int, int, int, int]] = []  # prefixlen, base, size, i
+        self.glob: list[tuple[str, int]] = []
+        self.local = -1
+
+    def index(self: "_Tables", target: str) -> int:
+        if target not in self.proxies:
+            self.proxies.append(target)
+        return self.proxies.index(target)
+
+    def add(self: "_Tables", pattern: str, target: str) -> None:
+        """First rule for a key wins, like the order of the rule table"""
+        i = self.index(target)
+        entry = pattern.strip().lower()
+        if "://" in entry:
+            entry = entry.split("://", 1)[1]
+        if not entry:
+            return
+        if entry == _bp.LOCAL_ENTRY:
+            self.local = i if self.local < 0 else self.local
+        elif (network := _bp.ipNetwork(entry)) is not None:
+            self._addNetwork(network, i)
+        elif entry.startswith("*.") and "*" not in entry[2:]:
+            self.suffix.setdefault(entry[2:], i)
+        elif entry.startswith(".") and "*" not in entry:
+            self.exact.setdefault(entry[1:], i)
+            self.suffix.setdefault(entry[1:], i)
+        elif "*" in entry or "?" in entry:
+            self.glob.append((entry, i))
+        else:
+            self.exact.setdefault(_bp.normalizeHost(entry), i)
+
+    def _addNetwork(
+        self: "_Tables",
+        network: ipaddress.IPv4Network | ipaddress.IPv6Network,
+        i: int,
+    ) -> None:
+        if network.prefixlen == network.max_prefixlen:
+            self.exact.setdefault(str(network.network_address), i)
+        elif network.version == 6:
+            _l.warning(f"pac files cannot match IPv6 network {network}, skipped")
+        elif network.prefixlen in (8, 16, 24):
+            octets = str(network.network_address).split(".")[: network.prefixlen // 8]
+            self.net.setdefault(".".join(octets) + ".", i)
+        else:
+            size = 2 ** (32 - network.prefixlen)
+            self.cidr.append((network.prefixlen, int(network.network_address), size, i))
+
+    def render(self: "_Tables", default: int) -> str:
+        # longest prefix first, lookup() interleaves them with NET by length;
+        # the stable sort keeps rule order among equally long prefixes
+        cidr = sorted(self.cidr, key=lambda c: -c[0])
+        tables = {
+            "PROXIES": self.proxies,
+            "EXACT": self.exact,
+            "SUFFIX": self.suffix,
+            "NET": self.net,
+            "CIDR": [list(c) for c in cidr],
+            "GLOB": [list(g) for g in self.glob],
+            "LOCAL": self.local,
+            "DEFAULT": default,
+        }
+        return (
+            "".join(
+                f"var {name} = {json.dumps(value, ensure_ascii=False)};\n"
+                for name, value in tables.items()
+            )
+            + _PAC_LOOKUP
+        )
+
+
+def generate(default: _p.Proxy | None, ruleTable: list[PacRule]) -> str:
+    """Compile the rule table, then `default`'s bypass list, into a PAC file.
+
+    Hosts no rule matches go to `default`, or DIRECT without one.
+    """
+    tables = _Tables()
+    for rule in ruleTable:
+        try:
+            tables.add(rule.pattern, _target(rule.target))
+        except ValueError as e:
+            _l.error(f"pac rule {rule.pattern} skipped: {e}")
+    if default is None:
+        return tables.render(tables.index(DIRECT))
+    for entry in default.noProxyies:
+        tables.add(entry, DIRECT)
+    return tables.render(tables.index(proxyString(default)))
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?", 1)[0] != PAC_PATH:
+            self.send_error(404)
+            return
+        body, etag = _body, _etag
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", PAC_CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        _l.debug(f"pac server: {format % args}")
+
+
+def url() -> str | None:
+    if _server is None:
+        return None
+    # a new URL per version, WinINet caches PAC files by URL
+    return f"http://{PAC_HOST}:{_server.server_address[1]}{PAC_PATH}?v={_etag[1:-1]}"
+
+
+def _render() -> None:
+    global _body, _etag
+    _body = generate(_default, rules()).encode("utf-8")
+    _etag = f'"{hashlib.sha1(_body).hexdigest()[:16]}"'
+
+
+def rebuild(default: _p.Proxy | None = None) -> None:
+    """Regenerate the served PAC file, by default for the last applied proxy,
+    and point AutoConfigURL at it"""
+    global _default
+    if default is not None:
+        _default = default
+    _render()
+    # read back, a pac config or a static proxy may have replaced it meanwhile
+    if _server is not None and (current := url()) != _p.getAutoConfigURL():
+        _p.setAutoConfigURL(current)
+        _l.info(f"pac file updated, {len(_body)} bytes at {current}")
+
+
+def script() -> _js.PacScript:
+    """The served PAC file, compiled once per version"""
+    global _script
+    body, etag = _body, _etag
+    if _script is None or _script[0] != etag:
+        _script = (etag, _js.PacScript(body.decode("utf-8")))
+    return _script[1]
+
+
+def intercept(proxy: _p.Proxy) -> bool:
+    if _server is None:
+        return False
+    rebuild(proxy)
+    _p.notifyServer(proxy.url)
+    return True
+
+
+def info() -> dict[str, Any]:
+    return {"url": url(), "etag": _etag, "size": len(_body), "rules": len(rules())}
+
+
+def active() -> bool:
+    return _server is not None
+
+
+def start(port: int = PAC_DEFAULT_PORT) -> None:
+    global _server, _thread
+    if _server is not None:
+        return
+    _l.info(f"starting pac server on {PAC_HOST}:{port}...")
+    try:
+        _server = http.server.ThreadingHTTPServer((PAC_HOST, port), _Handler)
+    except OSError as e:
+        # configs keep being applied as static proxies
+        _l.error(f"cannot serve pac file on {PAC_HOST}:{port}: {e}")
+        return
+    _server.daemon_threads = True
+    _thread = threading.Thread(target=_server.serve_forever, daemon=True)
+    _thread.start()
+    # AutoConfigURL is written once a proxy config is applied through it
+    _render()
+    _p.applyInterceptor = intercept
+
+
+def stop() -> None:
+    global _server, _thread
+    if _server is None:
+        return
+    _l.info("stopping pac server...")
+    _p.applyInterceptor = lambda _: False
+    _p.setAutoConfigURL(None)
+    # back to the static proxy the pac file defaulted to
+    if _default is not None:
+        _default.writeRegistry()
+    _server.shutdown()
+    _server.server_close()
+    if _thread is not None:
+        _thread.join()
+    _server = None
+    _thread = None
+
+
+_server: http.server.ThreadingHTTPServer | None = None
+_thread: threading.Thread | None = None
+_default: _p.Proxy | None = None
+_body: bytes = b""
+_etag: str = '""'
+_script: tuple[str, _js.PacScript] | None = None
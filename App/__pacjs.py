@@ -0,0 +1,1725 @@
+"""Restricted JavaScript evaluator for PAC files.
+
+Covers the subset PAC files are written in: `var`, functions, `if`,
+`for`, `while`, `do`, `switch`, `break`, `continue`, `return`, the usual
+operators, string/array/regex methods and the standard PAC helpers.
+Source is parsed once into Python closures; nothing can reach the file
+system or the network except the DNS helpers. Standard library only.
+"""
+
+import datetime
+import fnmatch
+import ipaddress
+import math
+import re
+import re._constants as _sre
+import re._parser as _sreParse
+import socket
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Any, Callable
+
+PAC_STEP_LIMIT = 1_000_000
+PAC_ALLOC_LIMIT = 8_000_000  # characters and array slots one evaluation creates
+PAC_REGEX_BUDGET = 1_000_000_000  # worst case backtracking of a regex call, ~0.2 s
+PAC_MEMO_SIZE = 4096
+PAC_MEMO_TTL = 300.0
+PAC_DNS_TTL = 60.0
+
+
+class PacError(Exception):
+    pass
+
+
+class _Undefined:
+    def __repr__(self) -> str:
+        return "undefined"
+
+
+UNDEFINED = _Undefined()
+
+
+class _Budget(threading.local):
+    """What the evaluation running in this thread may still allocate"""
+
+    left = PAC_ALLOC_LIMIT
+
+
+_budget = _Budget()
+
+
+def _room(n: int) -> None:
+    """Fail before creating `n` characters or array slots that would not fit"""
+    if n > _budget.left:
+        raise PacError("memory limit exceeded")
+
+
+def _alloc(n: int) -> None:
+    _room(n)
+    _budget.left -= n
+
+
+def _charged(fn: Callable) -> Callable:
+    """`fn`, charging the strings and arrays it returns"""
+
+    def charged(*args: Any) -> Any:
+        result = fn(*args)
+        if isinstance(result, (str, list)):
+            _alloc(len(result))
+        return result
+
+    return charged
+
+
+_PUNCTUATORS = sorted(
+    """>>>= === !== >>> <<= >>= && || == != <= >= += -= *= /= %= &= |= ^= ++ --
+    << >> { } ( ) [ ] ; , . < > + - * / % & | ^ ! ~ ? : =""".split(),
+    key=len,
+    reverse=True,
+)
+_TOKEN = re.compile(
+    r"""
+    (?P<space>\s+|//[^\n]*|/\*.*?\*/)
+    |(?P<number>0[xX][0-9a-fA-F]+|(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+    |(?P<string>"(?:[^"\\\n]|\\.)*"|'(?:[^'\\\n]|\\.)*')
+    |(?P<name>[A-Za-z_$][\w$]*)
+    |(?P<punct>""" + "|".join(re.escape(p) for p in _PUNCTUATORS) + ")",
+    re.S | re.X,
+)
+_REGEX = re.compile(r"/((?:[^/\\\[\n]|\\.|\[(?:[^\]\\\n]|\\.)*\])+)/([gimsuy]*)")
+_ESCAPES = {"n": "\n", "t": "\t", "r": "\r", "b": "\b", "f": "\f", "v": "\v", "0": "\0"}
+_KEYWORDS = {
+    "var", "function", "return", "if", "else", "for", "while", "do", "break",
+    "continue", "switch", "case", "default", "true", "false", "null",
+    "undefined", "typeof", "new", "in",
+}  # fmt: skip
+
+
+def _unescape(raw: str) -> str:
+    out = []
+    i = 0
+    while i < len(raw):
+        c = raw[i]
+        if c != "\\":
+            out.append(c)
+            i += 1
+            continue
+        n = raw[i + 1]
+        if n == "x":
+            out.append(chr(int(raw[i + 2 : i + 4], 16)))
+            i += 4
+        elif n == "u":
+            out.append(chr(int(raw[i + 2 : i + 6], 16)))
+            i += 6
+        else:
+            out.append(_ESCAPES.get(n, n))
+            i += 2
+    return "".join(out)
+
+
+def _tokenize(source: str) -> list[tuple[str, Any]]:
+    tokens: list[tuple[str, Any]] = []
+    pos = 0
+    while pos < len(source):
+        # a slash starts a regex unless it can only be a division
+        if source[pos] == "/" and (
+            not tokens
+            or tokens[-1][0] == "punct"
+            and tokens[-1][1] not in (")", "]", "}")
+            or tokens[-1] in (("name", "return"), ("name", "typeof"))
+        ):
+            if (m := _REGEX.match(source, pos)) is not None:
+                tokens.append(("regex", (m.group(1), m.group(2))))
+                pos = m.end()
+                continue
+        if (m := _TOKEN.match(source, pos)) is None:
+            raise PacError(f"unexpected character {source[pos]!r} at {pos}")
+        kind = m.lastgroup
+        text = m.group()
+        pos = m.end()
+        if kind == "space":
+            continue
+        if kind == "number":
+            hex = text[:2] in ("0x", "0X")
+            tokens.append(("number", float(int(text, 16)) if hex else float(text)))
+        elif kind == "string":
+            tokens.append(("string", _unescape(text[1:-1])))
+        else:
+            tokens.append((kind, text))  # type: ignore
+    tokens.append(("eof", None))
+    return tokens
+
+
+class _Break:
+    pass
+
+
+class _Continue:
+    pass
+
+
+_BREAK = _Break()
+_CONTINUE = _Continue()
+
+
+class _Return:
+    __slots__ = ("value",)
+
+    def __init__(self: "_Return", value: Any):
+        self.value = value
+
+
+class _Method:
+    """A builtin taking `this` first, e.g. String.prototype methods"""
+
+    __slots__ = ("fn", "this")
+
+    def __init__(self: "_Method", fn: Callable, this: Any = UNDEFINED):
+        self.fn = fn
+        self.this = this
+
+    def __call__(self: "_Method", *args: Any) -> Any:
+        return self.fn(self.this, *args)
+
+
+class _RegExp:
+    def __init__(self: "_RegExp", source: str, flags: str):
+        self.source = source
+        self.flags = flags
+        self.compiled = re.compile(
+            source, (re.I if "i" in flags else 0) | (re.M if "m" in flags else 0)
+        )
+        self.degree, self.exponential = _regexGrowth(source, "i" in flags)
+
+    def subject(self: "_RegExp", s: str) -> str:
+        """`s`, if matching it stays within `PAC_REGEX_BUDGET`; Python's re
+        cannot be interrupted, so a pattern that may backtrack that much
+        fails the evaluation instead"""
+        n = len(s) + 1
+        if self.exponential:
+            # measured, a doubling round costs about a thousand polynomial steps
+            cost = 1000 * 2.0 ** min(n, 64)
+        else:
+            cost = float(n) ** (self.degree + 1)
+        if cost > PAC_REGEX_BUDGET:
+            raise PacError(f"regex /{self.source}/ too slow for {len(s)} characters")
+        return s
+
+
+_ALL_CHARS = frozenset(range(129))  # ASCII, 128 standing for any other character
+_DIGIT_CHARS = frozenset(range(48, 58))
+_WORD_CHARS = frozenset(c for c in range(128) if chr(c).isalnum() or c == 95) | {128}
+_SPACE_CHARS = frozenset(map(ord, " \t\n\r\f\v"))
+_CATEGORY_CHARS = {
+    _sre.CATEGORY_DIGIT: _DIGIT_CHARS,
+    _sre.CATEGORY_NOT_DIGIT: _ALL_CHARS - _DIGIT_CHARS,
+    _sre.CATEGORY_WORD: _WORD_CHARS,
+    _sre.CATEGORY_NOT_WORD: _ALL_CHARS - _WORD_CHARS,
+    _sre.CATEGORY_SPACE: _SPACE_CHARS,
+    _sre.CATEGORY_NOT_SPACE: _ALL_CHARS - _SPACE_CHARS,
+}
+_REPEATS = (_sre.MAX_REPEAT, _sre.MIN_REPEAT)
+
+_Items = list[tuple[Any, Any]]  # a parsed pattern
+
+
+def _char(c: int, ignoreCase: bool) -> frozenset[int]:
+    if c >= 128:
+        return frozenset({128})
+    if ignoreCase:
+        return frozenset({ord(chr(c).lower()), ord(chr(c).upper())})
+    return frozenset({c})
+
+
+def _charSet(op: Any, av: Any, ignoreCase: bool) -> frozenset[int] | None:
+    """Characters a one-character item matches, None for other items"""
+    if op == _sre.LITERAL:
+        return _char(av, ignoreCase)
+    if op == _sre.NOT_LITERAL:
+        return _ALL_CHARS - _char(av, ignoreCase)
+    if op == _sre.ANY:
+        return _ALL_CHARS - {10}
+    if op != _sre.IN:
+        return None
+    chars: set[int] = set()
+    negate = False
+    for kind, value in av:
+        if kind == _sre.NEGATE:
+            negate = True
+        elif kind == _sre.LITERAL:
+            chars |= _char(value, ignoreCase)
+        elif kind == _sre.RANGE:
+            for c in range(value[0], min(value[1], 128) + 1):
+                chars |= _char(c, ignoreCase)
+        else:
+            chars |= _CATEGORY_CHARS.get(value, _ALL_CHARS)
+    return _ALL_CHARS - chars if negate else frozenset(chars)
+
+
+def _first(items: _Items, ignoreCase: bool) -> tuple[frozenset[int], bool]:
+    """Characters `items` can start with, and whether they can match nothing"""
+    first: frozenset[int] = frozenset()
+    for op, av in items:
+        if (chars := _charSet(op, av, ignoreCase)) is not None:
+            return first | chars, False
+        if op in _REPEATS or op == _sre.POSSESSIVE_REPEAT:
+            chars, nullable = _first(av[2], ignoreCase)
+            nullable = nullable or av[0] == 0
+        elif op == _sre.SUBPATTERN:
+            chars, nullable = _first(av[3], ignoreCase)
+        elif op == _sre.ATOMIC_GROUP:
+            chars, nullable = _first(av, ignoreCase)
+        elif op == _sre.BRANCH:
+            alternatives = [_first(p, ignoreCase) for p in av[1]]
+            chars = frozenset().union(*(c for c, _ in alternatives))
+            nullable = any(n for _, n in alternatives)
+        elif op in (_sre.AT, _sre.ASSERT, _sre.ASSERT_NOT):
+            chars, nullable = frozenset(), True
+        else:  # back references and the like
+            chars, nullable = _ALL_CHARS, True
+        first |= chars
+        if not nullable:
+            return first, False
+    return first, True
+
+
+def _growth(
+    items: _Items, follow: frozenset[int], inRepeat: bool, ignoreCase: bool
+) -> tuple[int, bool]:
+    """How many unbounded repeats of `items` can hand characters over to what
+    follows them, each multiplying the backtracking by the input length, and
+    whether one inside another repeat can, which doubles it per character"""
+    degree, exponential = 0, False
+    for i, (op, av) in enumerate(items):
+        rest, nullable = _first(items[i + 1 :], ignoreCase)
+        after = rest | follow if nullable else rest
+        if op in _REPEATS:
+            chars, _ = _first(av[2], ignoreCase)
+            unbounded = av[1] == _sre.MAXREPEAT
+            if unbounded and chars & after:
+                degree += 1
+                exponential |= inRepeat
+            # another round may follow the body
+            follow2 = after | chars if av[1] > 1 else after
+            d, e = _growth(av[2], follow2, inRepeat or av[1] > 1, ignoreCase)
+        elif op == _sre.SUBPATTERN:
+            d, e = _growth(av[3], after, inRepeat, ignoreCase)
+        elif op == _sre.BRANCH:
+            alternatives = [_first(p, ignoreCase)[0] for p in av[1]]
+            seen: frozenset[int] = frozenset()
+            for chars in alternatives:
+                # two ways into the same round
+                exponential |= inRepeat and bool(seen & chars)
+                seen |= chars
+            grown = [_growth(p, after, inRepeat, ignoreCase) for p in av[1]]
+            d, e = max(d for d, _ in grown), any(e for _, e in grown)
+        else:
+            continue
+        degree += d
+        exponential |= e
+    return degree, exponential
+
+
+@lru_cache(maxsize=256)
+def _regexGrowth(source: str, ignoreCase: bool) -> tuple[int, bool]:
+    items = list(_sreParse.parse(source, re.I if ignoreCase else 0))
+    return _growth(items, frozenset(), False, ignoreCase)
+
+
+class _Scope:
+    __slots__ = ("vars", "parent")
+
+    def __init__(self: "_Scope", vars: dict[str, Any], parent: "_Scope | None"):
+        self.vars = vars
+        self.parent = parent
+
+    def find(self: "_Scope", name: str) -> "_Scope | None":
+        scope: _Scope | None = self
+        while scope is not None:
+            if name in scope.vars:
+                return scope
+            scope = scope.parent
+        return None
+
+
+class _Function:
+    def __init__(
+        self: "_Function",
+        name: str,
+        params: list[str],
+        declared: list[str],
+        functions: list[tuple[str, Callable]],
+        body: Callable,
+        scope: _Scope,
+        steps: list[int],
+    ):
+        self.name = name
+        self.params = params
+        self.declared = declared
+        self.functions = functions
+        self.body = body
+        self.scope = scope
+        self.steps = steps
+
+    def __call__(self: "_Function", *args: Any) -> Any:
+        vars: dict[str, Any] = {n: UNDEFINED for n in self.declared}
+        for i, p in enumerate(self.params):
+            vars[p] = args[i] if i < len(args) else UNDEFINED
+        vars["arguments"] = list(args)
+        scope = _Scope(vars, self.scope)
+        for name, make in self.functions:
+            vars[name] = make(scope)
+        result = self.body(scope)
+        return result.value if isinstance(result, _Return) else UNDEFINED
+
+
+def _typeof(v: Any) -> str:
+    if v is UNDEFINED:
+        return "undefined"
+    if v is None:
+        return "object"
+    if isinstance(v, bool):
+        return "boolean"
+    if isinstance(v, float):
+        return "number"
+    if isinstance(v, str):
+        return "string"
+    if callable(v):
+        return "function"
+    return "object"
+
+
+def _truthy(v: Any) -> bool:
+    if v is UNDEFINED or v is None:
+        return False
+    if isinstance(v, float):
+        return v != 0 and not math.isnan(v)
+    if isinstance(v, (bool, str)):
+        return bool(v)
+    return True
+
+
+def _toNumber(v: Any) -> float:
+    if isinstance(v, bool):
+        return 1.0 if v else 0.0
+    if isinstance(v, (int, float)):
+        return float(v)
+    if v is None:
+        return 0.0
+    if isinstance(v, str):
+        text = v.strip()
+        if not text:
+            return 0.0
+        try:
+            return float(int(text, 16)) if text[:2] in ("0x", "0X") else float(text)
+        except ValueError:
+            return math.nan
+    if isinstance(v, list) and len(v) <= 1:
+        return _toNumber(_toString(v))
+    return math.nan
+
+
+def _toString(v: Any) -> str:
+    if isinstance(v, str):
+        return v
+    if isinstance(v, bool):
+        return "true" if v else "false"
+    if isinstance(v, float):
+        if math.isnan(v):
+            return "NaN"
+        if math.isinf(v):
+            return "Infinity" if v > 0 else "-Infinity"
+        return str(int(v)) if v.is_integer() and abs(v) < 1e21 else repr(v)
+    if v is None:
+        return "null"
+    if v is UNDEFINED:
+        return "undefined"
+    if isinstance(v, list):
+        return _join(v)
+    if isinstance(v, _RegExp):
+        return f"/{v.source}/{v.flags}"
+    if callable(v):
+        return "function"
+    return "[object Object]"
+
+
+def _int32(v: Any) -> int:
+    n = _toNumber(v)
+    if math.isnan(n) or math.isinf(n):
+        return 0
+    n = int(n) & 0xFFFFFFFF
+    return n - 0x100000000 if n & 0x80000000 else n
+
+
+def _primitive(v: Any) -> Any:
+    if isinstance(v, (str, float, bool)) or v is None or v is UNDEFINED:
+        return v
+    return _toString(v)
+
+
+def _looseEquals(a: Any, b: Any) -> bool:
+    if (a is None or a is UNDEFINED) and (b is None or b is UNDEFINED):
+        return True
+    if a is None or a is UNDEFINED or b is None or b is UNDEFINED:
+        return False
+    if type(a) is type(b):
+        return a == b if isinstance(a, (str, float, bool)) else a is b
+    if isinstance(a, (list, dict)) and isinstance(b, (list, dict)):
+        return a is b
+    a, b = _primitive(a), _primitive(b)
+    if isinstance(a, str) and isinstance(b, str):
+        return a == b
+    return _toNumber(a) == _toNumber(b)
+
+
+def _strictEquals(a: Any, b: Any) -> bool:
+    if type(a) is not type(b):
+        return False
+    return a == b if isinstance(a, (str, float, bool)) else a is b
+
+
+def _add(a: Any, b: Any) -> Any:
+    a, b = _primitive(a), _primitive(b)
+    if isinstance(a, str) or isinstance(b, str):
+        a, b = _toString(a), _toString(b)
+        _alloc(len(a) + len(b))
+        return a + b
+    return _toNumber(a) + _toNumber(b)
+
+
+def _compare(a: Any, b: Any) -> tuple[Any, Any] | None:
+    a, b = _primitive(a), _primitive(b)
+    if isinstance(a, str) and isinstance(b, str):
+        return a, b
+    x, y = _toNumber(a), _toNumber(b)
+    return None if math.isnan(x) or math.isnan(y) else (x, y)
+
+
+def _div(a: Any, b: Any) -> float:
+    x, y = _toNumber(a), _toNumber(b)
+    if y != 0:
+        return x / y
+    if x == 0 or math.isnan(x):
+        return math.nan
+    return math.copysign(math.inf, x) * math.copysign(1, y)
+
+
+def _mod(a: Any, b: Any) -> float:
+    x, y = _toNumber(a), _toNumber(b)
+    return math.nan if y == 0 or math.isinf(x) else math.fmod(x, y)
+
+
+def _lt(a: Any, b: Any) -> bool:
+    return (p := _compare(a, b)) is not None and p[0] < p[1]
+
+
+def _gt(a: Any, b: Any) -> bool:
+    return (p := _compare(a, b)) is not None and p[0] > p[1]
+
+
+def _le(a: Any, b: Any) -> bool:
+    return (p := _compare(a, b)) is not None and p[0] <= p[1]
+
+
+def _ge(a: Any, b: Any) -> bool:
+    return (p := _compare(a, b)) is not None and p[0] >= p[1]
+
+
+_BINARY: dict[str, Callable[[Any, Any], Any]] = {
+    "+": _add,
+    "-": lambda a, b: _toNumber(a) - _toNumber(b),
+    "*": lambda a, b: _toNumber(a) * _toNumber(b),
+    "/": _div,
+    "%": _mod,
+    "==": _looseEquals,
+    "!=": lambda a, b: not _looseEquals(a, b),
+    "===": _strictEquals,
+    "!==": lambda a, b: not _strictEquals(a, b),
+    "<": _lt,
+    ">": _gt,
+    "<=": _le,
+    ">=": _ge,
+    "&": lambda a, b: float(_int32(a) & _int32(b)),
+    "|": lambda a, b: float(_int32(a) | _int32(b)),
+    "^": lambda a, b: float(_int32(a) ^ _int32(b)),
+    "<<": lambda a, b: float(_int32(_int32(a) << (_int32(b) & 31))),
+    ">>": lambda a, b: float(_int32(a) >> (_int32(b) & 31)),
+    ">>>": lambda a, b: float((_int32(a) & 0xFFFFFFFF) >> (_int32(b) & 31)),
+    "in": lambda a, b: _hasProperty(b, a),
+}
+
+
+def _index(v: Any) -> int | None:
+    n = _toNumber(v)
+    return int(n) if not math.isnan(n) and n.is_integer() and n >= 0 else None
+
+
+def _slice(length: int, start: Any, end: Any) -> tuple[int, int]:
+    def clamp(v: Any, default: int) -> int:
+        if v is UNDEFINED:
+            return default
+        n = _toNumber(v)
+        n = 0 if math.isnan(n) else int(n)
+        return max(0, length + n) if n < 0 else min(n, length)
+
+    return clamp(start, 0), clamp(end, length)
+
+
+def _substring(s: str, start: Any = UNDEFINED, end: Any = UNDEFINED) -> str:
+    def clamp(v: Any) -> int:
+        n = _toNumber(v)
+        return 0 if math.isnan(n) else max(0, min(int(n), len(s)))
+
+    a = clamp(start) if start is not UNDEFINED else 0
+    b = clamp(end) if end is not UNDEFINED else len(s)
+    return s[min(a, b) : max(a, b)]
+
+
+def _substr(s: str, start: Any = UNDEFINED, length: Any = UNDEFINED) -> str:
+    a, _ = _slice(len(s), start, UNDEFINED)
+    n = len(s) - a if length is UNDEFINED else max(0, int(_toNumber(length)))
+    return s[a : a + n]
+
+
+def _indexOf(s: str, sub: Any = UNDEFINED, start: Any = 0.0) -> float:
+    return float(s.find(_toString(sub), max(0, int(_toNumber(start)))))
+
+
+def _lastIndexOf(s: str, sub: Any = UNDEFINED, *_: Any) -> float:
+    return float(s.rfind(_toString(sub)))
+
+
+def _split(s: str, sep: Any = UNDEFINED, limit: Any = UNDEFINED) -> list:
+    if sep is UNDEFINED:
+        parts: list = [s]
+    elif isinstance(sep, _RegExp):
+        parts = sep.compiled.split(sep.subject(s))
+    elif (sep := _toString(sep)) == "":
+        parts = list(s)
+    else:
+        parts = s.split(sep)
+    return parts if limit is UNDEFINED else parts[: int(_toNumber(limit))]
+
+
+def _replacement(template: str) -> Callable[[re.Match], str]:
+    """JS $1 / $& / $$ in a replacement string, split once; Match.expand
+    would parse a Python template again for every match"""
+    parts = re.split(r"\$(\d|&|\$)", template)
+
+    def expand(m: re.Match) -> str:
+        out = []
+        for i, part in enumerate(parts):
+            if i % 2 == 0 or part == "$":
+                out.append(part)
+            elif part == "&":
+                out.append(m.group(0))
+            elif int(part) <= m.re.groups:
+                out.append(m.group(int(part)) or "")
+            else:  # no such group, JS keeps it as written
+                out.append(f"${part}")
+        return "".join(out)
+
+    return expand
+
+
+def _replace(s: str, pattern: Any = UNDEFINED, replacement: Any = "") -> str:
+    if isinstance(pattern, _RegExp):
+        count = 0 if "g" in pattern.flags else 1
+        if callable(replacement):
+            expand = lambda m: _toString(replacement(m.group(0), *m.groups()))
+        else:
+            expand = _replacement(_toString(replacement))
+
+        def substitute(m: re.Match) -> str:
+            # charged one by one, a global replace can multiply the length
+            _alloc(len(new := expand(m)))
+            return new
+
+        return pattern.compiled.sub(substitute, pattern.subject(s), count)
+    needle = _toString(pattern)
+    if callable(replacement):
+        if (i := s.find(needle)) < 0:
+            return s
+        return s[:i] + _toString(replacement(needle)) + s[i + len(needle) :]
+    return s.replace(needle, _toString(replacement), 1)
+
+
+def _regExp(pattern: Any) -> _RegExp:
+    return pattern if isinstance(pattern, _RegExp) else _RegExp(_toString(pattern), "")
+
+
+def _match(s: str, pattern: Any = UNDEFINED) -> list | None:
+    regex = _regExp(pattern)
+    if "g" in regex.flags:
+        return [m.group(0) for m in regex.compiled.finditer(regex.subject(s))] or None
+    return _exec(regex, s)
+
+
+def _exec(regex: _RegExp, s: Any = UNDEFINED) -> list | None:
+    if (m := regex.compiled.search(regex.subject(_toString(s)))) is None:
+        return None
+    return [m.group(0)] + [UNDEFINED if g is None else g for g in m.groups()]
+
+
+def _charAt(s: str, i: Any = 0.0) -> str:
+    n = _index(i)
+    return s[n] if n is not None and n < len(s) else ""
+
+
+def _charCodeAt(s: str, i: Any = 0.0) -> float:
+    n = _index(i)
+    return float(ord(s[n])) if n is not None and n < len(s) else math.nan
+
+
+_STRING_METHODS: dict[str, Callable] = {
+    "toLowerCase": lambda s: s.lower(),
+    "toUpperCase": lambda s: s.upper(),
+    "trim": lambda s: s.strip(),
+    "indexOf": _indexOf,
+    "lastIndexOf": _lastIndexOf,
+    "substring": _substring,
+    "substr": _substr,
+    "slice": lambda s, a=UNDEFINED, b=UNDEFINED: s[slice(*_slice(len(s), a, b))],
+    "split": _split,
+    "charAt": _charAt,
+    "charCodeAt": _charCodeAt,
+    "replace": _replace,
+    "match": _match,
+    "search": lambda s, p=UNDEFINED: float(
+        m.start() if (m := (r := _regExp(p)).compiled.search(r.subject(s))) else -1
+    ),
+    "concat": lambda s, *a: _concat([s] + [_toString(x) for x in a]),
+    "toString": lambda s: s,
+}
+_STRING_METHODS = {name: _charged(fn) for name, fn in _STRING_METHODS.items()}
+
+
+def _concat(parts: list[str]) -> str:
+    _room(sum(map(len, parts)))
+    return "".join(parts)
+
+
+def _push(a: list, *items: Any) -> float:
+    _alloc(len(items))
+    a.extend(items)
+    return float(len(a))
+
+
+def _join(a: list, sep: Any = UNDEFINED) -> str:
+    sep = "," if sep is UNDEFINED else _toString(sep)
+    parts = ["" if x is None or x is UNDEFINED else _toString(x) for x in a]
+    _alloc(len(sep) * len(parts) + sum(map(len, parts)))
+    return sep.join(parts)
+
+
+def _arrayIndexOf(a: list, v: Any = UNDEFINED, *_: Any) -> float:
+    return float(next((i for i, x in enumerate(a) if _strictEquals(x, v)), -1))
+
+
+_ARRAY_METHODS: dict[str, Callable] = {
+    "push": _push,
+    "pop": lambda a: a.pop() if a else UNDEFINED,
+    "shift": lambda a: a.pop(0) if a else UNDEFINED,
+    "join": _join,
+    "slice": lambda a, s=UNDEFINED, e=UNDEFINED: a[slice(*_slice(len(a), s, e))],
+    "indexOf": _arrayIndexOf,
+    "concat": lambda a, *o: a + [y for x in o for y in (x if isinstance(x, list) else [x])],  # fmt: skip
+    "reverse": lambda a: a.reverse() or a,
+    "toString": _join,
+}
+for _name in ("slice", "concat"):  # the others charge for themselves
+    _ARRAY_METHODS[_name] = _charged(_ARRAY_METHODS[_name])
+
+_REGEXP_METHODS: dict[str, Callable] = {
+    "test": lambda r, s=UNDEFINED: r.compiled.search(r.subject(_toString(s)))
+    is not None,
+    "exec": _exec,
+}
+
+
+def _hasOwnProperty(this: Any, key: Any = UNDEFINED) -> bool:
+    if isinstance(this, dict):
+        return _toString(key) in this
+    if isinstance(this, (list, str)):
+        return (n := _index(key)) is not None and n < len(this) or key == "length"
+    return False
+
+
+def _hasProperty(obj: Any, key: Any) -> bool:
+    if isinstance(obj, dict):
+        return _toString(key) in obj
+    if isinstance(obj, list):
+        return (n := _index(key)) is not None and n < len(obj)
+    raise PacError("'in' needs an object")
+
+
+def _callMethod(fn: Any) -> _Method:
+    # f.call(thisArg, ...)
+    if isinstance(fn, _Method):
+        return _Method(lambda _, this=UNDEFINED, *a: fn.fn(this, *a))
+    return _Method(lambda _, this=UNDEFINED, *a: fn(*a))
+
+
+def _getMember(obj: Any, key: Any) -> Any:
+    if isinstance(obj, dict):
+        name = _toString(key)
+        if name in obj:
+            return obj[name]
+        return _Method(_hasOwnProperty, obj) if name == "hasOwnProperty" else UNDEFINED
+    if isinstance(obj, str):
+        if key == "length":
+            return float(len(obj))
+        if isinstance(key, float):
+            return _charAt(obj, key) or UNDEFINED
+        if (fn := _STRING_METHODS.get(key)) is not None:
+            return _Method(fn, obj)
+        return UNDEFINED
+    if isinstance(obj, list):
+        if key == "length":
+            return float(len(obj))
+        if (n := _index(key)) is not None:
+            return obj[n] if n < len(obj) else UNDEFINED
+        if (fn := _ARRAY_METHODS.get(key)) is not None:
+            return _Method(fn, obj)
+        return UNDEFINED
+    if isinstance(obj, _RegExp):
+        if (fn := _REGEXP_METHODS.get(key)) is not None:
+            return _Method(fn, obj)
+        return {"source": obj.source, "global": "g" in obj.flags}.get(key, UNDEFINED)
+    if callable(obj):
+        if key == "call":
+            return _callMethod(obj)
+        if key == "apply":
+            call = _callMethod(obj)
+            return _Method(lambda _, this=UNDEFINED, a=None: call(this, *(a or [])))
+        return UNDEFINED
+    if isinstance(obj, float) and key == "toString":
+        return _Method(lambda n, *_: _toString(n), obj)
+    if obj is None or obj is UNDEFINED:
+        raise PacError(f"cannot read property {_toString(key)!r} of {_toString(obj)}")
+    return UNDEFINED
+
+
+def _setMember(obj: Any, key: Any, value: Any) -> None:
+    if isinstance(obj, dict):
+        obj[_toString(key)] = value
+    elif isinstance(obj, list) and (n := _index(key)) is not None:
+        _alloc(max(0, n + 1 - len(obj)))
+        obj.extend([UNDEFINED] * (n + 1 - len(obj)))
+        obj[n] = value
+    elif isinstance(obj, list) and key == "length":
+        del obj[int(_toNumber(value)) :]
+    else:
+        raise PacError(f"cannot set property {_toString(key)!r}")
+
+
+def _parseInt(s: Any = UNDEFINED, radix: Any = UNDEFINED) -> float:
+    text = _toString(s).strip()
+    base = 10 if radix is UNDEFINED else int(_toNumber(radix)) or 10
+    sign = -1 if text.startswith("-") else 1
+    text = text.lstrip("+-")
+    if base == 16 or radix is UNDEFINED:
+        if text[:2] in ("0x", "0X"):
+            text, base = text[2:], 16
+    digits = "0123456789abcdefghijklmnopqrstuvwxyz"[:base]
+    n = 0
+    for i, c in enumerate(text.lower()):
+        if c not in digits:
+            text = text[:i]
+            break
+        n = n * base + digits.index(c)
+    return sign * float(n) if text else math.nan
+
+
+def _parseFloat(s: Any = UNDEFINED) -> float:
+    m = re.match(r"\s*[+-]?(?:\d+\.?\d*(?:[eE][+-]?\d+)?|\.\d+|Infinity)", _toString(s))
+    return float(m.group().replace("Infinity", "inf")) if m else math.nan
+
+
+def _rounding(fn: Callable[[float], int]) -> Callable[..., float]:
+    def rounded(x: Any = math.nan) -> float:
+        n = _toNumber(x)
+        return float(fn(n)) if math.isfinite(n) else n
+
+    return rounded
+
+
+def _math() -> dict[str, Any]:
+    return {
+        "floor": _rounding(math.floor),
+        "ceil": _rounding(math.ceil),
+        "round": _rounding(lambda n: math.floor(n + 0.5)),
+        "abs": lambda x=math.nan: abs(_toNumber(x)),
+        "min": lambda *a: min((_toNumber(x) for x in a), default=math.inf),
+        "max": lambda *a: max((_toNumber(x) for x in a), default=-math.inf),
+        "pow": lambda x, y: _toNumber(x) ** _toNumber(y),
+    }
+
+
+class Resolver:
+    """DNS for the PAC helpers; cached, replaceable for tests"""
+
+    def __init__(self: "Resolver"):
+        self._cache: dict[str, tuple[float, str | None]] = {}
+
+    def lookup(self: "Resolver", host: str) -> str | None:
+        return socket.gethostbyname(host)
+
+    def resolve(self: "Resolver", host: str) -> str | None:
+        now = time.monotonic()
+        if (hit := self._cache.get(host)) is not None and now - hit[0] < PAC_DNS_TTL:
+            return hit[1]
+        try:
+            address = self.lookup(host)
+        except OSError:
+            address = None
+        self._cache[host] = (now, address)
+        return address
+
+    def myIpAddress(self: "Resolver") -> str:
+        try:
+            # no packet is sent, this only picks the outgoing interface
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+                s.connect(("192.0.2.1", 9))
+                return s.getsockname()[0]
+        except OSError:
+            return "127.0.0.1"
+
+
+@lru_cache(maxsize=1024)
+def _shExp(pattern: str) -> re.Pattern:
+    return re.compile(fnmatch.translate(pattern), re.S)
+
+
+def _ip(host: str, resolver: Resolver) -> ipaddress.IPv4Address | None:
+    try:
+        return ipaddress.IPv4Address(host)
+    except ValueError:
+        pass
+    if (address := resolver.resolve(host)) is None:
+        return None
+    try:
+        return ipaddress.IPv4Address(address)
+    except ValueError:
+        return None
+
+
+_WEEKDAYS = ["MON", "TUE", "WED", "THU", "FRI", "SAT", "SUN"]
+_MONTHS = [
+    "JAN", "FEB", "MAR", "APR", "MAY", "JUN",
+    "JUL", "AUG", "SEP", "OCT", "NOV", "DEC",
+]  # fmt: skip
+
+
+def _now(args: tuple) -> tuple[datetime.datetime, tuple]:
+    if args and args[-1] == "GMT":
+        return datetime.datetime.now(datetime.timezone.utc), args[:-1]
+    return datetime.datetime.now(), args
+
+
+def _inRange(value: int, low: int, high: int) -> bool:
+    return low <= value <= high if low <= high else value >= low or value <= high
+
+
+def _weekdayRange(*args: Any) -> bool:
+    now, args = _now(args)
+    days = [_WEEKDAYS.index(_toString(a).upper()) for a in args]
+    return _inRange(now.weekday(), days[0], days[-1])
+
+
+def _timeRange(*args: Any) -> bool:
+    now, args = _now(args)
+    n = [int(_toNumber(a)) for a in args]
+    if len(n) == 1:
+        return now.hour == n[0]
+    if len(n) == 2:
+        return _inRange(now.hour, n[0], n[1] - 1 if n[1] > n[0] else n[1])
+    if len(n) == 4:
+        return _inRange(now.hour * 60 + now.minute, n[0] * 60 + n[1], n[2] * 60 + n[3])
+    if len(n) == 6:
+        sec = now.hour * 3600 + now.minute * 60 + now.second
+        return _inRange(
+            sec, n[0] * 3600 + n[1] * 60 + n[2], n[3] * 3600 + n[4] * 60 + n[5]
+        )
+    raise PacError("timeRange needs 1, 2, 4 or 6 numbers")
+
+
+def _dateRange(*args: Any) -> bool:
+    now, args = _now(args)
+    days, months, years = [], [], []
+    for a in args:
+        if isinstance(a, str):
+            months.append(_MONTHS.index(a.upper()) + 1)
+        elif (n := int(_toNumber(a))) > 31:
+            years.append(n)
+        else:
+            days.append(n)
+    if years and not (years[0] <= now.year <= years[-1]):
+        return False
+    if months and not _inRange(now.month, months[0], months[-1]):
+        return False
+    return not days or _inRange(now.day, days[0], days[-1])
+
+
+def _helpers(resolver: Resolver) -> dict[str, Any]:
+    def isInNet(host: Any, pattern: Any, mask: Any) -> bool:
+        if (address := _ip(_toString(host), resolver)) is None:
+            return False
+        m = int(ipaddress.IPv4Address(_toString(mask)))
+        return int(address) & m == int(ipaddress.IPv4Address(_toString(pattern))) & m
+
+    def isInNetEx(host: Any, prefix: Any) -> bool:
+        try:
+            return ipaddress.ip_address(_toString(host)) in ipaddress.ip_network(
+                _toString(prefix), strict=False
+            )
+        except (TypeError, ValueError):
+            return False
+
+    def dnsResolve(host: Any) -> str | None:
+        return resolver.resolve(_toString(host))
+
+    return {
+        "isPlainHostName": lambda h: "." not in _toString(h),
+        "dnsDomainIs": lambda h, d: _toString(h).lower().endswith(_toString(d).lower()),
+        "localHostOrDomainIs": lambda h, d: (h := _toString(h)) == (d := _toString(d))
+        or ("." not in h and d.startswith(h + ".")),
+        "isResolvable": lambda h: dnsResolve(h) is not None,
+        "isResolvableEx": lambda h: dnsResolve(h) is not None,
+        "isInNet": isInNet,
+        "isInNetEx": isInNetEx,
+        "dnsResolve": dnsResolve,
+        "dnsResolveEx": lambda h: dnsResolve(h) or "",
+        "myIpAddress": resolver.myIpAddress,
+        "myIpAddressEx": resolver.myIpAddress,
+        "dnsDomainLevels": lambda h: float(_toString(h).count(".")),
+        "shExpMatch": lambda s, p: _shExp(_toString(p)).match(_toString(s)) is not None,
+        "convert_addr": lambda a: float(int(ipaddress.IPv4Address(_toString(a)))),
+        "weekdayRange": _weekdayRange,
+        "dateRange": _dateRange,
+        "timeRange": _timeRange,
+        "alert": lambda *_: UNDEFINED,
+    }
+
+
+def _globals(resolver: Resolver) -> dict[str, Any]:
+    return {
+        "Math": _math(),
+        "Object": {"prototype": {"hasOwnProperty": _Method(_hasOwnProperty)}},
+        "String": lambda v="": _toString(v),
+        "Number": lambda v=0.0: _toNumber(v),
+        "Boolean": lambda v=False: _truthy(v),
+        "parseInt": _parseInt,
+        "parseFloat": _parseFloat,
+        "isNaN": lambda v=UNDEFINED: math.isnan(_toNumber(v)),
+        "RegExp": lambda p="", f="": _RegExp(_toString(p), _toString(f)),
+        "Array": lambda *a: list(a),
+        "NaN": math.nan,
+        "Infinity": math.inf,
+        **_helpers(resolver),
+    }
+
+
+Expr = Callable[[_Scope], Any]
+Stmt = Callable[[_Scope], Any]
+
+_ASSIGN_OPS = {"=", "+=", "-=", "*=", "/=", "%=", "&=", "|=", "^=", "<<=", ">>=", ">>>="}  # fmt: skip
+_PRECEDENCE = {
+    "||": 1, "&&": 2, "|": 3, "^": 4, "&": 5,
+    "==": 6, "!=": 6, "===": 6, "!==": 6,
+    "<": 7, ">": 7, "<=": 7, ">=": 7, "in": 7,
+    "<<": 8, ">>": 8, ">>>": 8,
+    "+": 9, "-": 9, "*": 10, "/": 10, "%": 10,
+}  # fmt: skip
+
+
+class _Compiler:
+    """Recursive descent parser that emits closures instead of an AST"""
+
+    def __init__(self: "_Compiler", source: str, steps: list[int]):
+        self.tokens = _tokenize(source)
+        self.pos = 0
+        self.steps = steps
+        # per function being compiled: hoisted vars and function declarations
+        self.declared: list[list[str]] = [[]]
+        self.functions: list[list[tuple[str, Callable]]] = [[]]
+
+    # tokens
+
+    def peek(self: "_Compiler", offset: int = 0) -> tuple[str, Any]:
+        return self.tokens[self.pos + offset]
+
+    def next(self: "_Compiler") -> tuple[str, Any]:
+        token = self.tokens[self.pos]
+        self.pos += 1
+        return token
+
+    def isPunct(self: "_Compiler", *values: str) -> bool:
+        kind, value = self.tokens[self.pos]
+        return kind == "punct" and value in values
+
+    def isName(self: "_Compiler", *values: str) -> bool:
+        kind, value = self.tokens[self.pos]
+        return kind == "name" and value in values
+
+    def expect(self: "_Compiler", value: str) -> None:
+        kind, got = self.next()
+        if got != value or kind not in ("punct", "name"):
+            raise PacError(f"expected {value!r}, got {got!r}")
+
+    def identifier(self: "_Compiler") -> str:
+        kind, value = self.next()
+        if kind != "name" or value in _KEYWORDS:
+            raise PacError(f"expected a name, got {value!r}")
+        return value
+
+    def semicolon(self: "_Compiler") -> None:
+        # automatic semicolon insertion, the lenient version
+        if self.isPunct(";"):
+            self.pos += 1
+
+    # statements
+
+    def program(self: "_Compiler") -> tuple[Stmt, list[str], list]:
+        body = self.statements(lambda: self.peek()[0] == "eof")
+        return body, self.declared[0], self.functions[0]
+
+    def statements(self: "_Compiler", done: Callable[[], bool]) -> Stmt:
+        stmts = []
+        while not done():
+            if (stmt := self.statement()) is not None:
+                stmts.append(stmt)
+        return _sequence(stmts)
+
+    def statement(self: "_Compiler") -> Stmt | None:
+        kind, value = self.peek()
+        if kind == "punct":
+            if value == "{":
+                self.pos += 1
+                body = self.statements(lambda: self.isPunct("}"))
+                self.pos += 1
+                return body
+            if value == ";":
+                self.pos += 1
+                return None
+        elif kind == "name":
+            if value == "var":
+                self.pos += 1
+                stmt = self.varDeclarations()
+                self.semicolon()
+                return stmt
+            if value == "function" and self.peek(1)[0] == "name":
+                self.pos += 1
+                name = self.identifier()
+                make = self.functionBody(name)
+                self.functions[-1].append((name, make))
+                return None
+            if value == "if":
+                return self.ifStatement()
+            if value == "for":
+                return self.forStatement()
+            if value == "while":
+                self.pos += 1
+                self.expect("(")
+                cond = self.expression()
+                self.expect(")")
+                return _loop(None, cond, None, self.loopBody(), self.steps)
+            if value == "do":
+                self.pos += 1
+                body = self.loopBody()
+                self.expect("while")
+                self.expect("(")
+                cond = self.expression()
+                self.expect(")")
+                self.semicolon()
+                return _doWhile(body, cond, self.steps)
+            if value == "return":
+                self.pos += 1
+                if self.isPunct(";", "}") or self.peek()[0] == "eof":
+                    expr: Expr = lambda _: UNDEFINED
+                else:
+                    expr = self.expression()
+                self.semicolon()
+                return lambda s: _Return(expr(s))
+            if value in ("break", "continue"):
+                self.pos += 1
+                self.semicolon()
+                signal = _BREAK if value == "break" else _CONTINUE
+                return lambda _: signal
+            if value == "switch":
+                return self.switchStatement()
+        expr = self.expression()
+        self.semicolon()
+
+        def expression(s: _Scope) -> None:
+            expr(s)
+
+        return expression
+
+    def loopBody(self: "_Compiler") -> Stmt:
+        return self.statement() or (lambda _: None)
+
+    def varDeclarations(self: "_Compiler") -> Stmt:
+        assigns = []
+        while True:
+            name = self.identifier()
+            self.declared[-1].append(name)
+            if self.isPunct("="):
+                self.pos += 1
+                assigns.append(_assignName(name, self.assignment()))
+            if not self.isPunct(","):
+                break
+            self.pos += 1
+        return _sequence(assigns)
+
+    def ifStatement(self: "_Compiler") -> Stmt:
+        self.pos += 1
+        self.expect("(")
+        cond = self.expression()
+        self.expect(")")
+        then = self.loopBody()
+        other: Stmt | None = None
+        if self.isName("else"):
+            self.pos += 1
+            other = self.loopBody()
+
+        def ifStmt(s: _Scope) -> Any:
+            if _truthy(cond(s)):
+                return then(s)
+            if other is not None:
+                return other(s)
+
+        return ifStmt
+
+    def forStatement(self: "_Compiler") -> Stmt:
+        self.pos += 1
+        self.expect("(")
+        init: Stmt | None = None
+        if self.isName("var"):
+            self.pos += 1
+            if self.peek(1) == ("name", "in"):
+                name = self.identifier()
+                self.declared[-1].append(name)
+                return self.forIn(name)
+            init = self.varDeclarations()
+        elif not self.isPunct(";"):
+            if self.peek()[0] == "name" and self.peek(1) == ("name", "in"):
+                return self.forIn(self.identifier())
+            expr = self.expression()
+            init = lambda s: expr(s) and None
+        self.expect(";")
+        cond = None if self.isPunct(";") else self.expression()
+        self.expect(";")
+        update = None if self.isPunct(")") else self.expression()
+        self.expect(")")
+        return _loop(init, cond, update, self.loopBody(), self.steps)
+
+    def forIn(self: "_Compiler", name: str) -> Stmt:
+        self.expect("in")
+        obj = self.expression()
+        self.expect(")")
+        body = self.loopBody()
+
+        def forIn(s: _Scope) -> Any:
+            target = obj(s)
+            keys = (
+                list(target)
+                if isinstance(target, dict)
+                else (
+                    [_toString(float(i)) for i in range(len(target))]
+                    if isinstance(target, (list, str))
+                    else []
+                )
+            )
+            for key in keys:
+                _setName(s, name, key)
+                result = body(s)
+                if result is _BREAK:
+                    break
+                if isinstance(result, _Return):
+                    return result
+
+        return forIn
+
+    def switchStatement(self: "_Compiler") -> Stmt:
+        self.pos += 1
+        self.expect("(")
+        subject = self.expression()
+        self.expect(")")
+        self.expect("{")
+        cases: list[tuple[Expr | None, Stmt]] = []
+        while not self.isPunct("}"):
+            if self.isName("default"):
+                self.pos += 1
+                test: Expr | None = None
+            else:
+                self.expect("case")
+                test = self.expression()
+            self.expect(":")
+            body = self.statements(
+                lambda: self.isName("case", "default") or self.isPunct("}")
+            )
+            cases.append((test, body))
+        self.pos += 1
+
+        default = next((i for i, (t, _) in enumerate(cases) if t is None), len(cases))
+
+        def switch(s: _Scope) -> Any:
+            value = subject(s)
+            start = default
+            for i, (test, _) in enumerate(cases):
+                if test is not None and _strictEquals(test(s), value):
+                    start = i
+                    break
+            for _, body in cases[start:]:
+                result = body(s)
+                if result is _BREAK:
+                    return None
+                if result is not None:
+                    return result
+
+        return switch
+
+    def functionBody(self: "_Compiler", name: str) -> Callable[[_Scope], _Function]:
+        self.expect("(")
+        params: list[str] = []
+        while not self.isPunct(")"):
+            params.append(self.identifier())
+            if self.isPunct(","):
+                self.pos += 1
+        self.pos += 1
+        self.expect("{")
+        self.declared.append([])
+        self.functions.append([])
+        body = self.statements(lambda: self.isPunct("}"))
+        self.pos += 1
+        declared = self.declared.pop()
+        functions = self.functions.pop()
+        steps = self.steps
+        return lambda scope: _Function(
+            name, params, declared, functions, body, scope, steps
+        )
+
+    # expressions
+
+    def expression(self: "_Compiler") -> Expr:
+        expr = self.assignment()
+        if not self.isPunct(","):
+            return expr
+        exprs = [expr]
+        while self.isPunct(","):
+            self.pos += 1
+            exprs.append(self.assignment())
+
+        def comma(s: _Scope) -> Any:
+            value = UNDEFINED
+            for e in exprs:
+                value = e(s)
+            return value
+
+        return comma
+
+    def assignment(self: "_Compiler") -> Expr:
+        start = self.pos
+        target = self.conditional()
+        if not (self.peek()[0] == "punct" and self.peek()[1] in _ASSIGN_OPS):
+            return target
+        op = self.next()[1]
+        value = self.assignment()
+        return self.assignTo(start, op, value)
+
+    def assignTo(self: "_Compiler", start: int, op: str, value: Expr) -> Expr:
+        """Re-read the target tokens from `start` as a reference"""
+        end = self.pos
+        self.pos = start
+        ref = self.reference()
+        self.pos = end
+        combine = _BINARY[op[:-1]] if op != "=" else None
+        get, set = ref
+
+        def assign(s: _Scope) -> Any:
+            v = value(s) if combine is None else combine(get(s), value(s))
+            set(s, v)
+            return v
+
+        return assign
+
+    def reference(self: "_Compiler") -> tuple[Expr, Callable[[_Scope, Any], None]]:
+        """Parse a name or member expression as a getter/setter pair"""
+        _, ref = self.postfixRef()
+        if ref is None:
+            raise PacError("invalid assignment target")
+        if isinstance(ref, str):
+            return (lambda s: _lookup(s, ref)), (lambda s, v: _setName(s, ref, v))
+        obj, key = ref
+        return (lambda s: _getMember(obj(s), key(s))), (
+            lambda s, v: _setMember(obj(s), key(s), v)
+        )
+
+    def identifierName(self: "_Compiler") -> str:
+        kind, value = self.next()
+        if kind != "name":
+            raise PacError(f"expected a property name, got {value!r}")
+        return value
+
+    def conditional(self: "_Compiler") -> Expr:
+        cond = self.binary(1)
+        if not self.isPunct("?"):
+            return cond
+        self.pos += 1
+        then = self.assignment()
+        self.expect(":")
+        other = self.assignment()
+        return lambda s: then(s) if _truthy(cond(s)) else other(s)
+
+    def binary(self: "_Compiler", minPrecedence: int) -> Expr:
+        left = self.unary()
+        while True:
+            kind, op = self.peek()
+            if kind not in ("punct", "name") or (prec := _PRECEDENCE.get(op)) is None:
+                return left
+            if prec < minPrecedence:
+                return left
+            self.pos += 1
+            right = self.binary(prec + 1)
+            if op == "&&":
+                left = lambda s, l=left, r=right: r(s) if _truthy(v := l(s)) else v
+            elif op == "||":
+                left = lambda s, l=left, r=right: v if _truthy(v := l(s)) else r(s)
+            else:
+                fn = _BINARY[op]
+                left = lambda s, l=left, r=right, fn=fn: fn(l(s), r(s))
+
+    def unary(self: "_Compiler") -> Expr:
+        kind, op = self.peek()
+        if kind == "punct" and op in ("!", "-", "+", "~"):
+            self.pos += 1
+            operand = self.unary()
+            if op == "!":
+                return lambda s: not _truthy(operand(s))
+            if op == "-":
+                return lambda s: -_toNumber(operand(s))
+            if op == "+":
+                return lambda s: _toNumber(operand(s))
+            return lambda s: float(~_int32(operand(s)))
+        if kind == "punct" and op in ("++", "--"):
+            self.pos += 1
+            get, set = self.reference()
+            delta = 1.0 if op == "++" else -1.0
+
+            def prefix(s: _Scope) -> float:
+                v = _toNumber(get(s)) + delta
+                set(s, v)
+                return v
+
+            return prefix
+        if kind == "name" and op == "typeof":
+            self.pos += 1
+            name = self.peek()[1]
+            if self.peek()[0] == "name" and self.peek(1)[1] not in (".", "[", "("):
+                # typeof of an undeclared name is "undefined", not an error
+                self.pos += 1
+                return lambda s: _typeof(
+                    scope.vars[name] if (scope := s.find(name)) else UNDEFINED
+                )
+            operand = self.unary()
+            return lambda s: _typeof(operand(s))
+        start = self.pos
+        expr = self.postfix()
+        if self.isPunct("++", "--"):
+            op = self.next()[1]
+            end = self.pos
+            self.pos = start
+            get, set = self.reference()
+            self.pos = end
+            delta = 1.0 if op == "++" else -1.0
+
+            def postfix(s: _Scope) -> float:
+                v = _toNumber(get(s))
+                set(s, v + delta)
+                return v
+
+            return postfix
+        return expr
+
+    def postfix(self: "_Compiler") -> Expr:
+        return self.postfixRef()[0]
+
+    def postfixRef(self: "_Compiler") -> tuple[Expr, str | tuple[Expr, Expr] | None]:
+        """An expression and what it refers to: a name, (object, key) or None"""
+        kind, value = self.peek()
+        ref: str | tuple[Expr, Expr] | None = None
+        if kind == "name" and value not in _KEYWORDS:
+            ref = value
+        expr = self.primary()
+        while self.isPunct(".", "[", "("):
+            if self.isPunct("("):
+                expr = self.call(expr)
+                ref = None
+                continue
+            if self.next()[1] == ".":
+                prop = self.identifierName()
+                key: Expr = lambda _, p=prop: p
+            else:
+                key = self.expression()
+                self.expect("]")
+            ref = (expr, key)
+            expr = lambda s, o=expr, k=key: _getMember(o(s), k(s))
+        return expr, ref
+
+    def arguments(self: "_Compiler") -> list[Expr]:
+        self.expect("(")
+        args: list[Expr] = []
+        while not self.isPunct(")"):
+            args.append(self.assignment())
+            if self.isPunct(","):
+                self.pos += 1
+        self.pos += 1
+        return args
+
+    def call(self: "_Compiler", fn: Expr) -> Expr:
+        args = self.arguments()
+
+        def call(s: _Scope) -> Any:
+            f = fn(s)
+            if not callable(f):
+                raise PacError(f"{_toString(f)} is not a function")
+            return f(*(a(s) for a in args))
+
+        return call
+
+    def primary(self: "_Compiler") -> Expr:
+        kind, value = self.next()
+        if kind in ("number", "string"):
+            return lambda _: value
+        if kind == "regex":
+            source, flags = value
+            return lambda _: _RegExp(source, flags)
+        if kind == "punct":
+            if value == "(":
+                expr = self.expression()
+                self.expect(")")
+                return expr
+            if value == "[":
+                items: list[Expr] = []
+                while not self.isPunct("]"):
+                    items.append(self.assignment())
+                    if self.isPunct(","):
+                        self.pos += 1
+                self.pos += 1
+                return lambda s: [i(s) for i in items]
+            if value == "{":
+                props: list[tuple[str, Expr]] = []
+                while not self.isPunct("}"):
+                    k, key = self.next()
+                    if k not in ("name", "string", "number"):
+                        raise PacError(f"invalid property name {key!r}")
+                    self.expect(":")
+                    props.append((_toString(key), self.assignment()))
+                    if self.isPunct(","):
+                        self.pos += 1
+                self.pos += 1
+                return lambda s: {k: v(s) for k, v in props}
+        if kind == "name":
+            if value == "true":
+                return lambda _: True
+            if value == "false":
+                return lambda _: False
+            if value == "null":
+                return lambda _: None
+            if value == "undefined":
+                return lambda _: UNDEFINED
+            if value == "function":
+                name = self.identifier() if self.peek()[0] == "name" else ""
+                make = self.functionBody(name)
+                if not name:
+                    return make
+
+                def named(s: _Scope) -> _Function:
+                    # the name of a function expression is visible inside it only
+                    scope = _Scope({}, s)
+                    scope.vars[name] = make(scope)
+                    return scope.vars[name]
+
+                return named
+            if value == "new":
+                name = self.identifier()
+                if name not in ("RegExp", "Array", "Object"):
+                    raise PacError(f"new {name} is not supported")
+                args = self.arguments() if self.isPunct("(") else []
+                if name == "Object":
+                    return lambda _: {}
+                return lambda s: _lookup(s, name)(*(a(s) for a in args))
+            if value not in _KEYWORDS:
+                return lambda s: _lookup(s, value)
+        raise PacError(f"unexpected {value!r}")
+
+
+def _lookup(s: _Scope, name: str) -> Any:
+    if (scope := s.find(name)) is None:
+        raise PacError(f"{name} is not defined")
+    return scope.vars[name]
+
+
+def _setName(s: _Scope, name: str, value: Any) -> None:
+    scope = s.find(name)
+    if scope is None:
+        # undeclared: a global, as in sloppy mode
+        scope = s
+        while scope.parent is not None and scope.parent.parent is not None:
+            scope = scope.parent
+    scope.vars[name] = value
+
+
+def _assignName(name: str, value: Expr) -> Stmt:
+    def assign(s: _Scope) -> None:
+        _setName(s, name, value(s))
+
+    return assign
+
+
+def _sequence(stmts: list[Stmt]) -> Stmt:
+    if len(stmts) == 1:
+        return stmts[0]
+
+    def sequence(s: _Scope) -> Any:
+        for stmt in stmts:
+            if (result := stmt(s)) is not None:
+                return result
+
+    return sequence
+
+
+def _loop(
+    init: Stmt | None,
+    cond: Expr | None,
+    update: Expr | None,
+    body: Stmt,
+    steps: list[int],
+) -> Stmt:
+    def loop(s: _Scope) -> Any:
+        if init is not None:
+            init(s)
+        while cond is None or _truthy(cond(s)):
+            steps[0] += 1
+            if steps[0] > PAC_STEP_LIMIT:
+                raise PacError("step limit exceeded")
+            result = body(s)
+            if result is _BREAK:
+                break
+            if isinstance(result, _Return):
+                return result
+            if update is not None:
+                update(s)
+
+    return loop
+
+
+def _doWhile(body: Stmt, cond: Expr, steps: list[int]) -> Stmt:
+    def doWhile(s: _Scope) -> Any:
+        while True:
+            steps[0] += 1
+            if steps[0] > PAC_STEP_LIMIT:
+                raise PacError("step limit exceeded")
+            result = body(s)
+            if result is _BREAK:
+                break
+            if isinstance(result, _Return):
+                return result
+            if not _truthy(cond(s)):
+                break
+
+    return doWhile
+
+
+class PacScript:
+    """A compiled PAC file.
+
+    `findProxy` memoizes results per (scheme, host) for `PAC_MEMO_TTL`
+    seconds, since time and DNS helpers can change the answer. Calls are
+    serialized, one script is safe to share between threads.
+    """
+
+    def __init__(self: "PacScript", source: str, resolver: Resolver | None = None):
+        self.resolver = resolver or Resolver()
+        self._steps = [0]
+        body, declared, functions = _Compiler(source, self._steps).program()
+        builtins = _Scope(_globals(self.resolver), None)
+        self._scope = _Scope({n: UNDEFINED for n in declared}, builtins)
+        for name, make in functions:
+            self._scope.vars[name] = make(self._scope)
+        self._guard(lambda: body(self._scope))
+        fn = self._scope.vars.get("FindProxyForURLEx") or self._scope.vars.get(
+            "FindProxyForURL"
+        )
+        if not callable(fn):
+            raise PacError("FindProxyForURL is not defined")
+        self._fn = fn
+        self._memo: OrderedDict[tuple[str, str], tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _guard(self: "PacScript", run: Callable[[], Any]) -> Any:
+        self._steps[0] = 0
+        _budget.left = PAC_ALLOC_LIMIT
+        try:
+            return run()
+        except RecursionError:
+            raise PacError("recursion too deep")
+        except (MemoryError, OverflowError):
+            raise PacError("memory limit exceeded")
+        except (TypeError, ValueError, IndexError, ZeroDivisionError) as e:
+            raise PacError(f"script error: {e}")
+
+    def findProxy(self: "PacScript", url: str, host: str | None = None) -> str:
+        """Raw FindProxyForURL result for `url`"""
+        scheme, _, rest = url.partition("://")
+        if host is None:
+            authority = rest.split("/", 1)[0].rsplit("@", 1)[-1]
+            if authority.startswith("["):
+                host = authority[1 : authority.find("]")]
+            else:
+                host = authority.split(":", 1)[0]
+        key = (scheme.lower(), host.lower())
+        with self._lock:
+            now = time.monotonic()
+            hit = self._memo.get(key)
+            if hit is not None and now - hit[0] < PAC_MEMO_TTL:
+                self._memo.move_to_end(key)
+                self.hits += 1
+                return hit[1]
+            self.misses += 1
+            result = _toString(self._guard(lambda: self._fn(url, host)))
+            self._memo[key] = (now, result)
+            if len(self._memo) > PAC_MEMO_SIZE:
+                self._memo.popitem(last=False)
+            return result
+
+
+def parseResult(result: str) -> list[str]:
+    """`"PROXY a:1; DIRECT"` as `["PROXY a:1", "DIRECT"]`"""
+    return [" ".join(e.split()) for e in result.split(";") if e.strip()] or ["DIRECT"]
+
+
+_RESULT_PROTOS = {
+    "PROXY": "http",
+    "HTTP": "http",
+    "HTTPS": "https",
+    "SOCKS": "socks4",
+    "SOCKS4": "socks4",
+    "SOCKS5": "socks5",
+}
+
+
+def splitEntry(entry: str) -> tuple[str, str, int] | None:
+    """`"SOCKS5 h:1080"` as `("socks5", "h", 1080)`, None for DIRECT"""
+    parts = entry.split()
+    if len(parts) != 2 or (proto := _RESULT_PROTOS.get(parts[0].upper())) is None:
+        return None
+    host, _, port = parts[1].rpartition(":")
+    if not host or not port.isdigit():
+        return None
+    return proto, host.strip("[]"), int(port)
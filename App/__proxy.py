@@ -1,14 +1,14 @@
-import sys
-
-if sys.platform != "win32":
-    raise NotImplementedError("Wrong platform for this module")
 import abc
 import re
+import sys
 import threading
-from typing import Callable, Literal
+from functools import lru_cache
+from typing import Any, Callable, Literal, NamedTuple
 
 from pydantic import BaseModel, Field
 
+from . import __bypass as _bp
+from . import __events as _ev
 from . import __log as _l
 from . import __reg as reg
 from . import __utils as _u
@@ -17,10 +17,14 @@ PROXY_ENTRY = rf"Software\Microsoft\Windows\CurrentVersion\Internet Settings"
 PROXY_ENABLED_ENTRY = "ProxyEnable"
 PROXY_SERVER_ENTRY = "ProxyServer"
 PROXY_OVERRIDE_ENTRY = "ProxyOverride"
+PROXY_AUTOCONFIG_ENTRY = "AutoConfigURL"
 
 PROXY_URL_REGEX = re.compile(
-    "^(?:(?P<protocol>http|https|socks4|socks5)://)?(?P<host>[^:/]+)(?::(?P<port>\d+))?$"
+    r"^(?:(?P<protocol>[a-z0-9]+)://)?(?P<host>\[[^\]]+\]|[^:/\[\]=]+)(?::(?P<port>\d+))?/?$",
+    re.IGNORECASE,
 )
+PROXY_SCHEME_REGEX = re.compile(r"^(?P<scheme>[a-z]+)=(?P<url>.*)$", re.IGNORECASE)
+PROXY_SERVER_SEPARATORS = re.compile(r"[;\s]+")
 
 if sys.platform == "win32":
     ProxyProto = Literal["http", "https", "socks4", "socks5"]
@@ -32,6 +36,15 @@ elif sys.platform == "linux":
     DEFUALT_NO_PROXY = ["localhost", "127.0.0.1", "::1", ".local"]
 else:
     raise NotImplementedError(f"unsupported platform {sys.platform}")
+DEFAULT_PORTS: dict[str, int] = {
+    "http": 80,
+    "https": 443,
+    "socks4": 1080,
+    "socks5": 1080,
+    "socks5h": 1080,
+}
+# how WinINet talks to the proxy of a `scheme=` entry without a protocol
+SCHEME_PROTOS: dict[str, ProxyProto] = {"socks": "socks4"}
 
 ProxyEnabledWatcherCallbackType = Callable[[bool], None]
 ProxyProtocolWatcherCallbackType = Callable[[ProxyProto], None]
@@ -39,15 +52,131 @@ ProxyFollowGatewayWatcherCallbackType = Callable[[bool], None]
 ProxyHostWatcherCallbackType = Callable[[str], None]
 ProxyPortWatcherCallbackType = Callable[[int], None]
 ProxyNoProxyiesWatcherCallbackType = Callable[[list[str]], None]
+GroupApplyCallbackType = Callable[["GroupProxy"], None]
+ApplyInterceptorType = Callable[["Proxy"], bool]
+PacApplyCallbackType = Callable[["PacProxy"], None]
+
+GroupPolicy = Literal["lowest-latency", "failover", "round-robin"]
+GROUP_POLICIES: list[GroupPolicy] = ["lowest-latency", "failover", "round-robin"]
+
+
+class ProxyEndpoint(NamedTuple):
+    proto: ProxyProto
+    host: str
+    port: int
+
+    @property
+    def address(self: "ProxyEndpoint") -> str:
+        host = f"[{self.host}]" if ":" in self.host else self.host
+        return f"{host}:{self.port}"
+
+    @property
+    def url(self: "ProxyEndpoint") -> str:
+        return f"{self.proto}://{self.address}"
+
 
+class ProxyServer(NamedTuple):
+    """A ProxyServer value: one proxy for every scheme and/or one per scheme"""
 
-def splitURL(url: str) -> tuple[ProxyProto, str, int]:
+    default: ProxyEndpoint | None
+    schemes: tuple[tuple[str, ProxyEndpoint], ...] = ()
+
+    def forScheme(self: "ProxyServer", scheme: str) -> ProxyEndpoint | None:
+        return next((e for s, e in self.schemes if s == scheme), self.default)
+
+    @property
+    def primary(self: "ProxyServer") -> ProxyEndpoint | None:
+        """The proxy shown and compared with the configs, http's if per scheme"""
+        for scheme in ("http", "https", "socks"):
+            if (endpoint := self.forScheme(scheme)) is not None:
+                return endpoint
+        return self.schemes[0][1] if self.schemes else None
+
+    def toDict(self: "ProxyServer") -> dict[str, Any]:
+        return {
+            "default": None if self.default is None else self.default.url,
+            "schemes": {s: e.url for s, e in self.schemes},
+        }
+
+
+def parseEndpoint(url: str, proto: ProxyProto = "http") -> ProxyEndpoint:
+    """`[proto://]host[:port]`, `proto` if none is given; the port defaults
+    per protocol"""
     match = PROXY_URL_REGEX.match(url)
     if match is None:
         raise ValueError(f"invalid proxy url {url}")
-    proto: ProxyProto = "http" if (mpr := f"{match.group('protocol')}".lower()) is None or mpr not in PROXY_ALLOWED_PROTOS else mpr  # type: ignore
-    port: int = 80 if (mpo := match.group("port")) is None else int(mpo)
-    return proto, f"{match.group('host')}", port
+    if (mpr := match.group("protocol")) is not None:
+        if (mpr := mpr.lower()) not in PROXY_ALLOWED_PROTOS:
+            raise ValueError(f"unsupported proxy protocol {mpr} in {url}")
+        proto = mpr
+    host = match.group("host")
+    if host.startswith("["):
+        host = host[1:-1]
+    port = DEFAULT_PORTS[proto] if (mpo := match.group("port")) is None else int(mpo)
+    if not 0 < port < 65536:
+        raise ValueError(f"invalid proxy port {port} in {url}")
+    return ProxyEndpoint(proto, host, port)
+
+
+@lru_cache(maxsize=64)
+def parseServer(value: str) -> ProxyServer:
+    """ProxyServer as WinINet reads it: `[proto://]host[:port]` for every
+    scheme, and/or `scheme=[proto://]host[:port]` entries, separated by `;`
+    or blanks. Cached on the raw value; raises ValueError."""
+    default: ProxyEndpoint | None = None
+    schemes: list[tuple[str, ProxyEndpoint]] = []
+    for entry in PROXY_SERVER_SEPARATORS.split(value):
+        if not entry:
+            continue
+        if (match := PROXY_SCHEME_REGEX.match(entry)) is not None:
+            scheme = match.group("scheme").lower()
+            endpoint = parseEndpoint(
+                match.group("url"), SCHEME_PROTOS.get(scheme, "http")
+            )
+            schemes.append((scheme, endpoint))
+        elif default is None:
+            default = parseEndpoint(entry)
+        else:
+            raise ValueError(f"more than one proxy for every scheme in {value}")
+    return ProxyServer(default, tuple(schemes))
+
+
+def serializeServer(server: ProxyServer) -> str:
+    """The ProxyServer value `parseServer` reads back as `server`"""
+    entries = [] if server.default is None else [server.default.url]
+    for scheme, endpoint in server.schemes:
+        bare = endpoint.proto == SCHEME_PROTOS.get(scheme, "http")
+        entries.append(f"{scheme}={endpoint.address if bare else endpoint.url}")
+    return ";".join(entries)
+
+
+@lru_cache(maxsize=64)
+def parseOverride(value: str) -> tuple[str, ...]:
+    """ProxyOverride entries, without blanks and empty entries"""
+    return tuple(e for e in (e.strip() for e in value.split(";")) if e)
+
+
+def serializeOverride(entries: list[str] | tuple[str, ...]) -> str:
+    return ";".join(entries)
+
+
+def splitURL(url: str) -> ProxyEndpoint:
+    """The proxy of a proxy url or ProxyServer value, see `parseServer`"""
+    if (endpoint := parseServer(url).primary) is None:
+        raise ValueError(f"invalid proxy url {url}")
+    return endpoint
+
+
+def notifyServer(server: str) -> None:
+    _ev.publish("server", server)
+    try:
+        proto, host, port = splitURL(server)
+    except ValueError:
+        _l.warning(f"cannot parse proxy server {server}")
+        return
+    threading.Thread(target=protoCallback, args=(proto,), daemon=True).start()
+    threading.Thread(target=hostCallback, args=(host,), daemon=True).start()
+    threading.Thread(target=portCallback, args=(port,), daemon=True).start()
 
 
 def _monitor_registry_changes() -> None:
@@ -57,34 +186,45 @@ def _monitor_registry_changes() -> None:
     _lastEnabled = _key.queryValue(PROXY_ENABLED_ENTRY)[1] != 0
     _lastServer = _key.queryValue(PROXY_SERVER_ENTRY)[1]
     _lastOverride = _key.queryValue(PROXY_OVERRIDE_ENTRY)[1]
+    _ev.publish("enabled", _lastEnabled)
+    if _lastServer != forwardAddress:
+        _ev.publish("server", _lastServer)
+    _ev.publish("override", _lastOverride)
     while True:
-        if _key is None:
+        if (key := _key) is None:
             return
-        _key.notifyChange()
+        key.notifyChange()
         if _key is None:
             return
         _l.debug("proxy registry changed")
-        enabled = _key.queryValue(PROXY_ENABLED_ENTRY)[1] != 0
+        enabled = key.queryValue(PROXY_ENABLED_ENTRY)[1] != 0
+        server = str(key.queryValue(PROXY_SERVER_ENTRY)[1])
+        override = str(key.queryValue(PROXY_OVERRIDE_ENTRY)[1])
+        if _key is not key:  # stopped meanwhile, the reads may have failed
+            return
         if enabled != _lastEnabled:
             _l.debug(f"proxy switched to {enabled}")
             _lastEnabled = enabled
+            if enabled:  # switched on elsewhere, e.g. in the settings app
+                _resumeAutoConfig()
+            _ev.publish("enabled", enabled)
             threading.Thread(
                 target=enabledCallback, args=(enabled == 1,), daemon=True
             ).start()
-        server = str(_key.queryValue(PROXY_SERVER_ENTRY)[1])
         if server != _lastServer:
             _l.debug(f"proxy server changed to {server}")
             _lastServer = server
-            proto, host, port = splitURL(server)
-            threading.Thread(target=protoCallback, args=(proto,), daemon=True).start()
-            threading.Thread(target=hostCallback, args=(host,), daemon=True).start()
-            threading.Thread(target=portCallback, args=(port,), daemon=True).start()
-        override = str(_key.queryValue(PROXY_OVERRIDE_ENTRY)[1])
+            # the local forwarder reports its upstream itself
+            if server != forwardAddress:
+                notifyServer(server)
         if override != _lastOverride:
             _l.debug(f"proxy override changed to {override}")
             _lastOverride = override
+            _ev.publish("override", override)
             threading.Thread(
-                target=noProxyiesCallback, args=(override.split(";"),), daemon=True
+                target=noProxyiesCallback,
+                args=(list(parseOverride(override)),),
+                daemon=True,
             ).start()
 
 
@@ -129,7 +269,28 @@ class Proxy(BaseModel):
     def noProxyiesString(self) -> str:
         return ";".join(self.noProxyies)
 
+    @property
+    def overrideString(self) -> str:
+        """`noProxyiesString` as written to the registry: optimized once
+        `_bp.prepared` has it, as saved until then"""
+        optimized = _bp.prepared(tuple(self.noProxyies))
+        return (
+            self.noProxyiesString if optimized is None else ";".join(optimized.entries)
+        )
+
+    def shouldBypass(self, host: str) -> bool:
+        return _bp.matcher(tuple(self.noProxyies)).shouldBypass(host)
+
     def apply(self) -> None:
+        if applyInterceptor(self):
+            _l.info(f"applied proxy config {self} without writing ProxyServer")
+            return
+        self.writeRegistry()
+
+    def writeRegistry(self) -> None:
+        global _pausedAutoConfig
+        # optimizing a long list takes seconds, never on the applying thread
+        optimized = _bp.prepared(tuple(self.noProxyies))
         with reg.RegKey(
             reg.getHKey(reg.RegKeyRoot.HKEY_CURRENT_USER),
             PROXY_ENTRY,
@@ -137,8 +298,23 @@ class Proxy(BaseModel):
         ) as key:
             key.setValue(PROXY_SERVER_ENTRY, self.url, reg.RegValueType.REG_SZ)
             key.setValue(
-                PROXY_OVERRIDE_ENTRY, self.noProxyiesString, reg.RegValueType.REG_SZ
+                PROXY_OVERRIDE_ENTRY,
+                (
+                    self.noProxyiesString
+                    if optimized is None
+                    else ";".join(optimized.entries)
+                ),
+                reg.RegValueType.REG_SZ,
             )
+            # a pac url takes precedence over ProxyServer
+            key.deleteValue(PROXY_AUTOCONFIG_ENTRY)
+        _pausedAutoConfig = None  # the static proxy replaced the pac url
+        if optimized is None:
+            _l.info("bypass list written as saved, optimizing it in the background")
+        elif not optimized.equivalent:
+            _l.warning("optimized bypass list differs from the original, kept as is")
+        elif optimized.after < optimized.before:
+            _l.info(f"bypass list optimized: {optimized.describe()}")
         _l.info(f"applied proxy config {self} to registry")
 
 
@@ -159,10 +335,46 @@ class GatewayProxy(Proxy):
         return f"{self.proto}://{_u.getGateway()}:{self.port}"
 
 
+class GroupProxy(BaseModel):
+    """Picks one of several other proxy configs and applies that one"""
+
+    proxyType: Literal["GroupProxy"] = "GroupProxy"
+    members: list[str] = Field(..., description="Member proxy config names")
+    policy: GroupPolicy = Field(GROUP_POLICIES[0], description="Selection policy")
+    minSwitchInterval: float = Field(
+        60, description="Minimum seconds between two switches of this group"
+    )
+    hysteresis: float = Field(
+        0.25,
+        description="Relative latency gain a member needs to replace the current one",
+    )
+
+    class Config:
+        extra = "forbid"
+
+    def apply(self) -> None:
+        groupApplyCallback(self)
+
+
+class PacProxy(BaseModel):
+    """Leaves the choice of proxy per url to a proxy auto-config file"""
+
+    proxyType: Literal["PacProxy"] = "PacProxy"
+    pacUrl: str | None = Field(
+        None, description="PAC file URL, None to discover it through WPAD"
+    )
+
+    class Config:
+        extra = "forbid"
+
+    def apply(self) -> None:
+        pacApplyCallback(self)
+
+
 class ProxyConfig(BaseModel):
     """Proxy configuration"""
 
-    proxy: SpecificProxy | GatewayProxy = Field(
+    proxy: SpecificProxy | GatewayProxy | GroupProxy | PacProxy = Field(
         ..., description="Proxy configuration", discriminator="proxyType"
     )
 
@@ -173,10 +385,14 @@ def getCurrentProxy() -> ProxyConfig:
         PROXY_ENTRY,
         reg.RegKeyAccess.KEY_READ,
     ) as key:
-        proxyServer = str(key.queryValue(PROXY_SERVER_ENTRY)[1])
-        proxyOverride = str(key.queryValue(PROXY_OVERRIDE_ENTRY)[1])
-    proto, host, port = splitURL(proxyServer)
-    noProxyies = proxyOverride.split(";")
+        proxyServer = key.queryValue(PROXY_SERVER_ENTRY)[1]
+        proxyOverride = key.queryValue(PROXY_OVERRIDE_ENTRY)[1]
+    server = parseServer("" if proxyServer is None else str(proxyServer))
+    # nothing set yet reads as the blank config of the settings dialog
+    proto, host, port = server.primary or ProxyEndpoint("http", "", 80)
+    noProxyies = list(
+        parseOverride("" if proxyOverride is None else str(proxyOverride))
+    )
     ret = ProxyConfig(
         proxy=SpecificProxy(proto=proto, host=host, port=port, noProxyies=noProxyies)
     )
@@ -184,29 +400,87 @@ def getCurrentProxy() -> ProxyConfig:
     return ret
 
 
-def getEnabled() -> bool:
+def getAutoConfigURL() -> str | None:
     with reg.RegKey(
         reg.getHKey(reg.RegKeyRoot.HKEY_CURRENT_USER),
         PROXY_ENTRY,
         reg.RegKeyAccess.KEY_READ,
     ) as key:
-        ret = key.queryValue(PROXY_ENABLED_ENTRY)[1] != 0
-    _l.debug(f"loaded status {ret} from registry")
-    return ret
+        ret = key.queryValue(PROXY_AUTOCONFIG_ENTRY)[1]
+    return None if ret is None else str(ret)
+
+
+def setAutoConfigURL(url: str | None) -> None:
+    """Point WinINet at a pac file, or remove the setting with None; while
+    the proxy is disabled, only what enabling it restores"""
+    global _pausedAutoConfig
+    with _autoConfigLock:
+        if _autoConfigPaused:
+            _pausedAutoConfig = url
+            _l.info(f"proxy disabled, will restore auto-config url {url}")
+            return
+        _writeAutoConfigURL(url)
 
 
-def setEnabled(enabled: bool) -> None:
+def _writeAutoConfigURL(url: str | None) -> None:
     with reg.RegKey(
         reg.getHKey(reg.RegKeyRoot.HKEY_CURRENT_USER),
         PROXY_ENTRY,
         reg.RegKeyAccess.KEY_WRITE,
     ) as key:
-        key.setValue(
-            PROXY_ENABLED_ENTRY, 1 if enabled else 0, reg.RegValueType.REG_DWORD
-        )
+        if url is None:
+            key.deleteValue(PROXY_AUTOCONFIG_ENTRY)
+        else:
+            key.setValue(PROXY_AUTOCONFIG_ENTRY, url, reg.RegValueType.REG_SZ)
+    _l.info(f"set proxy auto-config url to {url}")
+
+
+def getEnabled() -> bool:
+    with reg.RegKey(
+        reg.getHKey(reg.RegKeyRoot.HKEY_CURRENT_USER),
+        PROXY_ENTRY,
+        reg.RegKeyAccess.KEY_READ,
+    ) as key:
+        ret = key.queryValue(PROXY_ENABLED_ENTRY)[1] != 0
+    _l.debug(f"loaded status {ret} from registry")
+    return ret
+
+
+def setEnabled(enabled: bool) -> None:
+    """Switch the proxy on or off, a pac url included: WinINet follows
+    AutoConfigURL whatever ProxyEnable says, so it is removed while off and
+    written back when switched on"""
+    global _autoConfigPaused, _pausedAutoConfig
+    with _autoConfigLock:
+        if not enabled and not _autoConfigPaused:
+            _autoConfigPaused = True
+            _pausedAutoConfig = getAutoConfigURL()
+            if _pausedAutoConfig is not None:
+                _writeAutoConfigURL(None)
+        with reg.RegKey(
+            reg.getHKey(reg.RegKeyRoot.HKEY_CURRENT_USER),
+            PROXY_ENTRY,
+            reg.RegKeyAccess.KEY_WRITE,
+        ) as key:
+            key.setValue(
+                PROXY_ENABLED_ENTRY, 1 if enabled else 0, reg.RegValueType.REG_DWORD
+            )
+        if enabled:
+            _resumeAutoConfig()
     _l.info(f"set proxy status to {enabled}")
 
 
+def _resumeAutoConfig() -> None:
+    """Write back the pac url `setEnabled(False)` removed, if any"""
+    global _autoConfigPaused
+    with _autoConfigLock:
+        if not _autoConfigPaused:
+            return
+        _autoConfigPaused = False
+        if _pausedAutoConfig is not None and getAutoConfigURL() is None:
+            _writeAutoConfigURL(_pausedAutoConfig)
+
+
 def start() -> None:
     global _thread, _key
     _l.info("starting proxy watcher...")
@@ -239,3 +513,11 @@ followGatewayCallback: ProxyFollowGatewayWatcherCallbackType = lambda _: None
 hostCallback: ProxyHostWatcherCallbackType = lambda _: None
 portCallback: ProxyPortWatcherCallbackType = lambda _: None
 noProxyiesCallback: ProxyNoProxyiesWatcherCallbackType = lambda _: None
+groupApplyCallback: GroupApplyCallbackType = lambda _: None
+applyInterceptor: ApplyInterceptorType = lambda _: False
+# the pac url setEnabled(False) removed, written back once enabled
+_autoConfigPaused = False
+_pausedAutoConfig: str | None = None
+_autoConfigLock = threading.RLock()
+pacApplyCallback: PacApplyCallbackType = lambda _: None
+forwardAddress: str | None = None
@@ -0,0 +1,70 @@
+"""Registry roots, access rights and value types, shared by the backends"""
+
+from enum import Enum
+from typing import Union
+
+
+class RegKeyRoot(Enum):
+    HKEY_CLASSES_ROOT = 0x80000000
+    HKEY_CURRENT_USER = 0x80000001
+    HKEY_LOCAL_MACHINE = 0x80000002
+    HKEY_USERS = 0x80000003
+    HKEY_PERFORMANCE_DATA = 0x80000004
+    HKEY_PERFORMANCE_TEXT = 0x80000050
+    HKEY_PERFORMANCE_NLSTEXT = 0x80000060
+    HKEY_CURRENT_CONFIG = 0x80000005
+    HKEY_DYN_DATA = 0x80000006
+    HKEY_CURRENT_USER_LOCAL_SETTINGS = 0x80000007
+
+
+class _RegKeyAccessGenerated:
+    def __init__(self: "_RegKeyAccessGenerated", value: int):
+        self._value = value
+
+    @property
+    def value(self: "_RegKeyAccessGenerated") -> int:
+        return self._value
+
+    def __or__(
+        self, other: Union["RegKeyAccess", "_RegKeyAccessGenerated"]
+    ) -> "_RegKeyAccessGenerated":
+        return _RegKeyAccessGenerated(self.value | other.value)
+
+    def __repr__(self: "_RegKeyAccessGenerated") -> str:
+        return f"{self.__class__.__name__}({self.value})"
+
+
+class RegKeyAccess(Enum):
+    KEY_QUERY_VALUE = 0x0001
+    KEY_SET_VALUE = 0x0002
+    KEY_CREATE_SUB_KEY = 0x0004
+    KEY_ENUMERATE_SUB_KEYS = 0x0008
+    KEY_NOTIFY = 0x0010
+    KEY_CREATE_LINK = 0x0020
+    KEY_WOW64_32KEY = 0x0200
+    KEY_WOW64_64KEY = 0x0100
+    KEY_WOW64_RES = 0x0300
+    KEY_READ = 0x20019
+    KEY_WRITE = 0x20006
+    KEY_EXECUTE = 0x20019
+    KEY_ALL_ACCESS = 0xF003F
+
+    def __or__(
+        self, other: Union["RegKeyAccess", _RegKeyAccessGenerated]
+    ) -> _RegKeyAccessGenerated:
+        return _RegKeyAccessGenerated(self.value | other.value)
+
+
+class RegValueType(Enum):
+    REG_NONE = 0
+    REG_SZ = 1
+    REG_EXPAND_SZ = 2
+    REG_BINARY = 3
+    REG_DWORD = 4
+    REG_DWORD_BIG_ENDIAN = 5
+    REG_LINK = 6
+    REG_MULTI_SZ = 7
+    REG_RESOURCE_LIST = 8
+    REG_FULL_RESOURCE_DESCRIPTOR = 9
+    REG_RESOURCE_REQUIREMENTS_LIST = 10
+    REG_QWORD = 11
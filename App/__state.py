@@ -0,0 +1,85 @@
+"""Versioned, immutable snapshot of the shared runtime state.
+
+Readers take `current()` once and work on that snapshot; it never changes
+under them. Writers build the next snapshot from the latest one under a
+lock and publish it with a single reference assignment, so reads never
+block. Every publication bumps `version`; `wait` blocks until a newer one
+is out.
+"""
+
+import threading
+from types import MappingProxyType
+from typing import Any, Callable, Mapping, NamedTuple
+
+from .__proxy import Network, ProxyConfig
+
+_FIELDS = ("configs", "active", "mappings", "references", "network")
+
+
+class Snapshot(NamedTuple):
+    version: int
+    configs: Mapping[str, ProxyConfig]  # in display order
+    active: str | None
+    mappings: Mapping[Network, str | None]  # empty while the store holds them
+    references: Mapping[str, frozenset[Network]]  # config name -> its mappings
+    network: Network | None
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        # taken over, the writer built it for this snapshot
+        return MappingProxyType(value)
+    if isinstance(value, Mapping) and not isinstance(value, MappingProxyType):
+        return MappingProxyType(dict(value))
+    return value
+
+
+def current() -> Snapshot:
+    return _current
+
+
+def version() -> int:
+    return _current.version
+
+
+def modify(change: Callable[[Snapshot], dict[str, Any] | None]) -> Snapshot:
+    """Publish the fields returned by `change`, called with the latest
+    snapshot while other writers wait. Returning None publishes nothing.
+
+    Dicts in the fields become part of the snapshot and must not be
+    changed afterwards; build new ones from `snap.mappings.copy()` and the
+    like.
+    """
+    global _current
+    with _changed:
+        fields = change(_current)
+        if not fields:
+            return _current
+        unknown = set(fields) - set(_FIELDS)
+        if unknown:
+            raise ValueError(f"unknown state fields {sorted(unknown)}")
+        _current = _current._replace(
+            version=_current.version + 1,
+            **{k: _freeze(v) for k, v in fields.items()},
+        )
+        _changed.notify_all()
+        return _current
+
+
+def update(**fields: Any) -> Snapshot:
+    """Publish `fields` as they are, regardless of the previous values"""
+    return modify(lambda _: fields)
+
+
+def wait(since: int, timeout: float | None = None) -> Snapshot:
+    """The first snapshot newer than version `since`, or the current one
+    after `timeout` seconds"""
+    with _changed:
+        _changed.wait_for(lambda: _current.version > since, timeout)
+        return _current
+
+
+_changed = threading.Condition(threading.RLock())
+_current = Snapshot(
+    0, MappingProxyType({}), None, MappingProxyType({}), MappingProxyType({}), None
+)
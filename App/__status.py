@@ -0,0 +1,178 @@
+"""Shared-memory status page, readable by other processes without IPC.
+
+Standard library only, so other tools can import or copy this file as is.
+"""
+
+import getpass
+import mmap
+import os
+import stat
+import struct
+import tempfile
+import threading
+from pathlib import Path
+from typing import NamedTuple
+
+STATUS_MAGIC = b"PXST"
+STATUS_VERSION = 1
+STATUS_SIZE = 512
+STATUS_FILE = Path(
+    os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir(),
+    f"proxy-control-{getpass.getuser()}.status",
+)
+
+# magic, version, flags, generation, enabled, port, lastSwitch, key, host, network
+_LAYOUT = struct.Struct("<4sHHQ?xHd64s128s128s")
+_GENERATION = struct.Struct("<Q")
+_GENERATION_OFFSET = 8
+_FLAG_RUNNING = 0x1
+_READ_RETRIES = 1000
+
+
+class Status(NamedTuple):
+    running: bool
+    generation: int
+    enabled: bool
+    key: str | None
+    host: str | None
+    port: int | None
+    network: str | None
+    lastSwitch: float | None
+
+
+def _text(raw: bytes) -> str | None:
+    return raw.rstrip(b"\0").decode("utf-8", "replace") or None
+
+
+def _raw(text: str | None, size: int) -> bytes:
+    data = (text or "").encode("utf-8")[:size]
+    # never cut a multi-byte character in half
+    return data.decode("utf-8", "ignore").encode("utf-8")
+
+
+def _openOwn(path: Path) -> int:
+    """Open or create `path` for writing, refusing anything but a regular
+    file of ours: without XDG_RUNTIME_DIR it lives in the shared temp dir,
+    where someone else may have planted a symlink or the file itself"""
+    flags = os.O_RDWR | os.O_CREAT | getattr(os, "O_NOFOLLOW", 0)
+    fd = os.open(path, flags | getattr(os, "O_BINARY", 0), 0o600)
+    info = os.fstat(fd)
+    if not stat.S_ISREG(info.st_mode) or (
+        hasattr(os, "getuid") and info.st_uid != os.getuid()
+    ):
+        os.close(fd)
+        raise PermissionError(f"{path} is not a file of this user")
+    return fd
+
+
+class StatusPage:
+    """Single writer of the status record."""
+
+    def __init__(self: "StatusPage", path: Path = STATUS_FILE):
+        self.path = path
+        fd = _openOwn(path)
+        try:
+            os.ftruncate(fd, STATUS_SIZE)
+            self._map = mmap.mmap(fd, STATUS_SIZE)
+        finally:
+            os.close(fd)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._fields: dict[str, object] = {
+            "enabled": False,
+            "key": None,
+            "host": None,
+            "port": None,
+            "network": None,
+            "lastSwitch": None,
+        }
+        self._write(True)
+
+    def update(self: "StatusPage", **fields: object) -> None:
+        with self._lock:
+            self._fields.update(fields)
+            self._write(True)
+
+    def _write(self: "StatusPage", running: bool) -> None:
+        f = self._fields
+        self._generation += 1  # odd: write in progress
+        _GENERATION.pack_into(self._map, _GENERATION_OFFSET, self._generation)
+        _LAYOUT.pack_into(
+            self._map,
+            0,
+            STATUS_MAGIC,
+            STATUS_VERSION,
+            _FLAG_RUNNING if running else 0,
+            self._generation,
+            bool(f["enabled"]),
+            f["port"] or 0,
+            f["lastSwitch"] or 0.0,
+            _raw(f["key"], 64),  # type: ignore
+            _raw(f["host"], 128),  # type: ignore
+            _raw(f["network"], 128),  # type: ignore
+        )
+        self._generation += 1
+        _GENERATION.pack_into(self._map, _GENERATION_OFFSET, self._generation)
+
+    def close(self: "StatusPage") -> None:
+        with self._lock:
+            if self._map.closed:
+                return
+            self._write(False)
+            self._map.close()
+
+
+class StatusReader:
+    """Lock-free reader of the status record."""
+
+    def __init__(self: "StatusReader", path: Path = STATUS_FILE):
+        with path.open("rb") as f:
+            self._map = mmap.mmap(f.fileno(), STATUS_SIZE, access=mmap.ACCESS_READ)
+
+    def read(self: "StatusReader") -> Status | None:
+        """Read a consistent copy of the record.
+
+        Returns:
+            Status | None: None if the page is not a known layout version or
+                the writer kept it busy for all retries.
+        """
+        m = self._map
+        for _ in range(_READ_RETRIES):
+            # seqlock: odd while being written, changed if the copy is torn
+            (gen,) = _GENERATION.unpack_from(m, _GENERATION_OFFSET)
+            if gen & 1:
+                continue
+            rec = _LAYOUT.unpack_from(m, 0)
+            if _GENERATION.unpack_from(m, _GENERATION_OFFSET)[0] != gen:
+                continue
+            if rec[0] != STATUS_MAGIC or rec[1] != STATUS_VERSION:
+                return None
+            return Status(
+                running=bool(rec[2] & _FLAG_RUNNING),
+                generation=gen,
+                enabled=rec[4],
+                key=_text(rec[7]),
+                host=_text(rec[8]),
+                port=rec[5] or None,
+                network=_text(rec[9]),
+                lastSwitch=rec[6] or None,
+            )
+        return None
+
+    def close(self: "StatusReader") -> None:
+        self._map.close()
+
+    def __enter__(self: "StatusReader") -> "StatusReader":
+        return self
+
+    def __exit__(self: "StatusReader", exc_type, exc_value, traceback) -> None:
+        self.close()
+
+
+def read(path: Path = STATUS_FILE) -> Status | None:
+    """One-shot read. Keep a `StatusReader` around for repeated reads."""
+    try:
+        with StatusReader(path) as reader:
+            return reader.read()
+    except (OSError, ValueError):
+        return None
@@ -0,0 +1,268 @@
+"""SQLite storage for configs, general settings and network mappings.
+
+Optional; used instead of config.json once `migrate` has created the
+database. Every change is its own small transaction. Mappings are looked
+up through the (ssid, mac) index instead of being loaded at start.
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Iterable
+
+from . import __log as _l
+from . import __utils as _u
+
+STORE_FILE = _u.getExeRelPath("config.db")
+STORE_VERSION = 1
+
+# NULL never equals NULL in a unique index, so None is stored as this
+_NONE = "\0"
+
+Mapping = tuple[str | None, str | None, str | None]  # ssid, mac, config name
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS configs (
+    name TEXT PRIMARY KEY,
+    position INTEGER NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS configs_position ON configs (position);
+CREATE TABLE IF NOT EXISTS general (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS mappings (
+    ssid TEXT NOT NULL,
+    mac TEXT NOT NULL,
+    config TEXT,
+    priority INTEGER NOT NULL,
+    PRIMARY KEY (ssid, mac)
+);
+CREATE INDEX IF NOT EXISTS mappings_priority ON mappings (priority);
+CREATE INDEX IF NOT EXISTS mappings_config ON mappings (config);
+"""
+
+
+def _enc(value: str | None) -> str:
+    return _NONE if value is None else value
+
+
+def _dec(value: str) -> str | None:
+    return None if value == _NONE else value
+
+
+def exists(path: Path | None = None) -> bool:
+    return (path or STORE_FILE).exists()
+
+
+def active() -> bool:
+    return _conn is not None
+
+
+def connect(path: Path | None = None) -> None:
+    global _conn
+    if _conn is not None:
+        return
+    path = path or STORE_FILE
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    # WAL keeps the database consistent with NORMAL, a crash loses at most
+    # the last commits
+    conn.execute("PRAGMA synchronous = NORMAL")
+    conn.executescript(_SCHEMA)
+    conn.execute(f"PRAGMA user_version = {STORE_VERSION}")
+    _conn = conn
+    _l.info(f"opened config store {path}")
+
+
+def close() -> None:
+    global _conn
+    if _conn is None:
+        return
+    with _lock:
+        _conn.close()
+        _conn = None
+
+
+def _db() -> sqlite3.Connection:
+    if _conn is None:
+        raise RuntimeError("config store is not open")
+    return _conn
+
+
+class _Transaction:
+    def __enter__(self: "_Transaction") -> sqlite3.Connection:
+        _lock.acquire()
+        db = _db()
+        db.execute("BEGIN IMMEDIATE")
+        return db
+
+    def __exit__(self: "_Transaction", excType: Any, *_: Any) -> None:
+        try:
+            _db().execute("COMMIT" if excType is None else "ROLLBACK")
+        finally:
+            _lock.release()
+
+
+def loadConfigs() -> dict[str, Any]:
+    with _lock:
+        rows = _db().execute("SELECT name, body FROM configs ORDER BY position")
+        return {name: json.loads(body) for name, body in rows}
+
+
+def loadGeneral() -> dict[str, Any]:
+    with _lock:
+        rows = _db().execute("SELECT key, value FROM general")
+        return {key: json.loads(value) for key, value in rows}
+
+
+def putConfigs(
+    changes: dict[str, Any | None],
+    general: dict[str, Any] | None = None,
+    remap: dict[str, str] | None = None,
+) -> None:
+    """Upsert configs (as dumped dicts) or delete them with None.
+
+    New configs go to the end, replaced ones keep their position. Mappings
+    to a key of `remap` are pointed at its value.
+    """
+    with _Transaction() as db:
+        (last,) = db.execute(
+            "SELECT COALESCE(MAX(position), -1) FROM configs"
+        ).fetchone()
+        for name, body in changes.items():
+            if body is None:
+                db.execute("DELETE FROM configs WHERE name = ?", (name,))
+                continue
+            last += 1
+            db.execute(
+                "INSERT INTO configs (name, position, body) VALUES (?, ?, ?)"
+                " ON CONFLICT (name) DO UPDATE SET body = excluded.body",
+                (name, last, json.dumps(body, ensure_ascii=False)),
+            )
+        _putGeneral(db, general or {})
+        db.executemany(
+            "UPDATE mappings SET config = ? WHERE config = ?",
+            ((new, old) for old, new in (remap or {}).items()),
+        )
+
+
+def _putGeneral(db: sqlite3.Connection, values: dict[str, Any]) -> None:
+    db.executemany(
+        "INSERT INTO general (key, value) VALUES (?, ?)"
+        " ON CONFLICT (key) DO UPDATE SET value = excluded.value",
+        ((k, json.dumps(v, ensure_ascii=False)) for k, v in values.items()),
+    )
+
+
+def putGeneral(key: str, value: Any) -> None:
+    with _Transaction() as db:
+        _putGeneral(db, {key: value})
+
+
+def replaceAll(configs: dict[str, Any], general: dict[str, Any]) -> None:
+    """Replace every config and setting, mappings are kept"""
+    with _Transaction() as db:
+        db.execute("DELETE FROM configs")
+        db.executemany(
+            "INSERT INTO configs (name, position, body) VALUES (?, ?, ?)",
+            (
+                (name, i, json.dumps(body, ensure_ascii=False))
+                for i, (name, body) in enumerate(configs.items())
+            ),
+        )
+        db.execute("DELETE FROM general")
+        _putGeneral(db, general)
+
+
+def mappings() -> list[Mapping]:
+    with _lock:
+        rows = _db().execute("SELECT ssid, mac, config FROM mappings ORDER BY priority")
+        return [(_dec(ssid), _dec(mac), config) for ssid, mac, config in rows]
+
+
+def lookupMapping(ssid: str | None, mac: str | None) -> Mapping | None:
+    """The mapping for exactly (ssid, mac), else the one for `ssid` with
+    any gateway MAC"""
+    with _lock:
+        db = _db()
+        for key in ((_enc(ssid), _enc(mac)), (_enc(ssid), _NONE)):
+            row = db.execute(
+                "SELECT config FROM mappings WHERE ssid = ? AND mac = ?", key
+            ).fetchone()
+            if row is not None:
+                return _dec(key[0]), _dec(key[1]), row[0]
+    return None
+
+
+def mappingsTo(config: str) -> list[Mapping]:
+    with _lock:
+        rows = _db().execute(
+            "SELECT ssid, mac, config FROM mappings WHERE config = ? ORDER BY priority",
+            (config,),
+        )
+        return [(_dec(ssid), _dec(mac), config) for ssid, mac, config in rows]
+
+
+def putMapping(ssid: str | None, mac: str | None, config: str | None) -> None:
+    """Add a mapping after all others, or change the config of one"""
+    with _Transaction() as db:
+        db.execute(
+            "INSERT INTO mappings (ssid, mac, config, priority)"
+            " VALUES (?, ?, ?, (SELECT COALESCE(MAX(priority), -1) + 1 FROM mappings))"
+            " ON CONFLICT (ssid, mac) DO UPDATE SET config = excluded.config",
+            (_enc(ssid), _enc(mac), config),
+        )
+
+
+def deleteMapping(ssid: str | None, mac: str | None) -> None:
+    with _Transaction() as db:
+        db.execute(
+            "DELETE FROM mappings WHERE ssid = ? AND mac = ?", (_enc(ssid), _enc(mac))
+        )
+
+
+def migrate(
+    configs: dict[str, Any],
+    general: dict[str, Any],
+    mappingRows: Iterable[Mapping],
+    path: Path | None = None,
+) -> None:
+    """Create the database from a loaded config.json and open it.
+
+    Raises:
+        FileExistsError: The database already exists.
+    """
+    path = path or STORE_FILE
+    if path.exists():
+        raise FileExistsError(f"{path} already exists")
+    connect(path)
+    try:
+        with _Transaction() as db:
+            db.executemany(
+                "INSERT INTO configs (name, position, body) VALUES (?, ?, ?)",
+                (
+                    (name, i, json.dumps(body, ensure_ascii=False))
+                    for i, (name, body) in enumerate(configs.items())
+                ),
+            )
+            _putGeneral(db, general)
+            db.executemany(
+                "INSERT OR REPLACE INTO mappings (ssid, mac, config, priority)"
+                " VALUES (?, ?, ?, ?)",
+                (
+                    (_enc(ssid), _enc(mac), config, i)
+                    for i, (ssid, mac, config) in enumerate(mappingRows)
+                ),
+            )
+    except BaseException:
+        close()
+        path.unlink(missing_ok=True)
+        raise
+    _l.info(f"migrated {len(configs)} proxy configs to {path}")
+
+
+_lock = threading.RLock()
+_conn: sqlite3.Connection | None = None
@@ -0,0 +1,609 @@
+import codecs
+import json
+import re
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Literal, NamedTuple
+
+from pydantic import BaseModel, Field, ValidationError
+
+from . import __config as _c
+from . import __log as _l
+from . import __proxy as _p
+
+SUBSCRIPTIONS_ENTRY = "subscriptions"
+SUBSCRIPTION_STATE_ENTRY = "subscription_state"
+SUBSCRIPTION_TICK = 60.0
+SUBSCRIPTION_TIMEOUT = 30.0
+SUBSCRIPTION_CHUNK = 64 * 1024
+
+SubscriptionFormat = Literal["auto", "json", "yaml"]
+
+# clash proxy types the Windows proxy settings can express
+_CLASH_PROTOS = {
+    "http": "http",
+    "https": "https",
+    "socks4": "socks4",
+    "socks5": "socks5",
+}
+
+
+class SubscriptionError(Exception):
+    pass
+
+
+class Subscription(BaseModel):
+    """A list of proxy configs kept in sync with a URL or a file"""
+
+    name: str = Field(..., description="Prefix of the config names it creates")
+    url: str = Field(..., description="http(s) or file URL, or a file path")
+    format: SubscriptionFormat = Field("auto", description="List format")
+    interval: float = Field(3600, description="Seconds between two fetches")
+    noProxyies: list[str] | None = Field(
+        None, description="Bypass list for its configs, None for the default"
+    )
+
+    class Config:
+        extra = "forbid"
+
+
+class SubscriptionResult(NamedTuple):
+    name: str
+    notModified: bool
+    added: int
+    updated: int
+    removed: int
+    skipped: int  # invalid or unsupported entries, names taken by other configs
+    error: str | None
+    checkedAt: float
+
+    def toDict(self) -> dict:
+        return self._asdict()
+
+    def describe(self) -> str:
+        if self.error is not None:
+            return f"✗ {self.error}"
+        if self.notModified:
+            return "not modified"
+        return f"+{self.added} ~{self.updated} -{self.removed}" + (
+            f", {self.skipped} skipped" if self.skipped else ""
+        )
+
+
+def subscriptions() -> list[Subscription]:
+    ret = []
+    for raw in _c.getGeneral(SUBSCRIPTIONS_ENTRY, []):
+        try:
+            sub = Subscription.model_validate(raw)
+        except ValidationError:
+            _l.error(f"invalid subscription {raw}")
+            continue
+        if not _c.checkConfigName(sub.name):
+            _l.error(f"invalid subscription name {sub.name}")
+            continue
+        ret.append(sub)
+    return ret
+
+
+# -- reading -----------------------------------------------------------------
+
+
+def _chunks(response: Any) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+    while data := response.read(SUBSCRIPTION_CHUNK):
+        yield decoder.decode(data)
+    yield decoder.decode(b"", final=True)
+
+
+def _lines(chunks: Iterable[str]) -> Iterator[str]:
+    rest = ""
+    for chunk in chunks:
+        lines = (rest + chunk).split("\n")
+        rest = lines.pop()
+        yield from lines
+    if rest:
+        yield rest
+
+
+class _JsonStream:
+    """Top-level JSON list or object, one element at a time"""
+
+    _decoder = json.JSONDecoder()
+
+    def __init__(self: "_JsonStream", chunks: Iterator[str]):
+        self.chunks = chunks
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self: "_JsonStream") -> bool:
+        if self.eof:
+            return False
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos :] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self: "_JsonStream") -> str:
+        """Next non-blank character, empty at the end"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self: "_JsonStream", char: str) -> None:
+        if (found := self.peek()) != char:
+            raise SubscriptionError(f"expected {char!r}, found {found!r}")
+        self.pos += 1
+
+    def value(self: "_JsonStream") -> Any:
+        self.peek()
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as e:
+                if self._fill():
+                    continue
+                # positions are relative to the buffer, not the file
+                raise SubscriptionError(f"invalid json: {e.msg}")
+            # a number may go on in the next chunk
+            if end == len(self.buf) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def items(self: "_JsonStream") -> Iterator[tuple[str | None, Any]]:
+        opening = self.peek()
+        if opening not in ("[", "{"):
+            raise SubscriptionError("expected a json list or object")
+        self.pos += 1
+        closing = "]" if opening == "[" else "}"
+        first = True
+        while True:
+            if self.peek() == closing:
+                self.pos += 1
+                return
+            if not first:
+                self.expect(",")
+            first = False
+            key = None
+            if closing == "}":
+                if not isinstance(key := self.value(), str):
+                    raise SubscriptionError("expected a json object key")
+                self.expect(":")
+            yield key, self.value()
+
+
+def _iterJson(chunks: Iterator[str]) -> Iterator[tuple[str | None, Any]]:
+    """Entries of a list, a name -> config object, or a config.json"""
+    for key, value in _JsonStream(chunks).items():
+        # config.json and clash json wrap the list in one more level
+        if key == "proxy" and isinstance(value, dict):
+            yield from value.items()
+        elif key == "proxies" and isinstance(value, list):
+            yield from ((None, v) for v in value)
+        else:
+            yield key, value
+
+
+_NAME_UNSAFE = re.compile(r"\W")
+_YAML_INT = re.compile(r"^[-+]?\d+$")
+_YAML_FLOAT = re.compile(r"^[-+]?(\d+\.\d*|\.\d+|\d+)([eE][-+]?\d+)?$")
+
+
+def _stripComment(line: str) -> str:
+    quote = None
+    for i, c in enumerate(line):
+        if quote is not None:
+            if c == quote:
+                quote = None
+        elif c in "'\"":
+            quote = c
+        elif c == "#" and (i == 0 or line[i - 1] in " \t"):
+            return line[:i]
+    return line
+
+
+def _split(text: str, sep: str) -> list[str]:
+    """Split flow collection content at top-level `sep`"""
+    parts, depth, quote, start = [], 0, None, 0
+    for i, c in enumerate(text):
+        if quote is not None:
+            if c == quote:
+                quote = None
+        elif c in "'\"":
+            quote = c
+        elif c in "[{":
+            depth += 1
+        elif c in "]}":
+            depth -= 1
+        elif c == sep and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _scalar(text: str) -> Any:
+    text = text.strip()
+    if not text:
+        return None
+    if text[0] == '"' and text[-1] == '"' and len(text) > 1:
+        try:
+            return json.loads(text)
+        except ValueError:
+            return text[1:-1]
+    if text[0] == "'" and text[-1] == "'" and len(text) > 1:
+        return text[1:-1].replace("''", "'")
+    if text.startswith("{") and text.endswith("}"):
+        return dict(_pair(p) for p in _split(text[1:-1], ","))
+    if text.startswith("[") and text.endswith("]"):
+        return [_scalar(p) for p in _split(text[1:-1], ",")]
+    if (lower := text.lower()) in ("true", "false"):
+        return lower == "true"
+    if lower in ("null", "~"):
+        return None
+    if _YAML_INT.match(text):
+        return int(text)
+    if _YAML_FLOAT.match(text):
+        return float(text)
+    return text
+
+
+def _pair(text: str) -> tuple[str, Any]:
+    quote = None
+    for i, c in enumerate(text):
+        if quote is not None:
+            if c == quote:
+                quote = None
+        elif c in "'\"":
+            quote = c
+        elif c == ":" and (i + 1 == len(text) or text[i + 1] in " \t"):
+            return str(_scalar(text[:i])), _scalar(text[i + 1 :])
+    raise SubscriptionError(f"expected a key: value pair, found {text!r}")
+
+
+def _iterYaml(lines: Iterable[str]) -> Iterator[tuple[str | None, Any]]:
+    """Items of the top-level `proxies:` list of a clash style file.
+
+    Only block lists of block or flow mappings with scalar values are
+    read; nested blocks inside an item and other top-level keys are skipped.
+    """
+    inProxies = found = False
+    item: dict[str, Any] | None = None
+    listIndent: int | None = None
+    keyIndent: int | None = None  # -1 once the item takes no more keys
+    for raw in lines:
+        line = _stripComment(raw).rstrip()
+        if not line.strip() or line.lstrip().startswith("---"):
+            continue
+        indent = len(line) - len(line.lstrip(" "))
+        text = line.strip()
+        if indent == 0 and not text.startswith("-"):
+            if item is not None:
+                yield None, item
+                item = None
+            inProxies = text.split(":", 1)[0].strip() == "proxies"
+            found = found or inProxies
+            listIndent = None
+            continue
+        if not inProxies:
+            continue
+        if (text == "-" or text.startswith("- ")) and indent == (
+            listIndent if listIndent is not None else indent
+        ):
+            if item is not None:
+                yield None, item
+            listIndent = indent
+            body = text[1:].strip()
+            if body.startswith("{"):
+                item, keyIndent = _scalar(body), -1
+            elif body:
+                item, keyIndent = dict([_pair(body)]), indent + text.index(body)
+            else:
+                item, keyIndent = {}, None
+        elif item is not None and keyIndent != -1:
+            if keyIndent is None:
+                keyIndent = indent
+            if indent != keyIndent:
+                continue  # nested block
+            k, v = _pair(text)
+            item[k] = v
+    if item is not None:
+        yield None, item
+    if not found:
+        # an error page or a truncated file must not empty the subscription
+        raise SubscriptionError("no proxies list found")
+
+
+def _iterEntries(
+    chunks: Iterator[str], format: SubscriptionFormat
+) -> Iterator[tuple[str | None, Any]]:
+    if format == "auto":
+        # peek at the first character without reading the whole list
+        head = ""
+        for chunk in chunks:
+            head += chunk
+            if head.strip():
+                break
+        first = head.lstrip()[:1]
+        format = "json" if first in ("[", "{") else "yaml"
+        chunks = _prepend(head, chunks)
+    if format == "json":
+        return _iterJson(chunks)
+    return _iterYaml(_lines(chunks))
+
+
+def _prepend(head: str, chunks: Iterator[str]) -> Iterator[str]:
+    yield head
+    yield from chunks
+
+
+# -- converting --------------------------------------------------------------
+
+
+def key(sub: Subscription, name: str) -> str:
+    """Config name for entry `name` of `sub`"""
+    return f"{sub.name}_{_NAME_UNSAFE.sub('_', name)}"
+
+
+def _fromClash(sub: Subscription, entry: dict[str, Any]) -> _p.ProxyConfig:
+    kind = str(entry.get("type", "http")).lower()
+    if (proto := _CLASH_PROTOS.get(kind)) is None:
+        raise SubscriptionError(f"unsupported proxy type {kind}")
+    if not entry.get("server"):
+        raise SubscriptionError("entry has no server")
+    if proto == "http" and entry.get("tls") is True:
+        proto = "https"
+    return _p.ProxyConfig(
+        proxy=_p.SpecificProxy(
+            proto=proto,  # type: ignore
+            host=str(entry.get("server", "")),
+            port=entry.get("port"),  # type: ignore
+            noProxyies=(
+                sub.noProxyies
+                if sub.noProxyies is not None
+                else list(_p.DEFUALT_NO_PROXY)
+            ),
+        )
+    )
+
+
+def _convert(
+    sub: Subscription, name: str | None, value: Any
+) -> tuple[str, _p.ProxyConfig]:
+    if not isinstance(value, dict):
+        raise SubscriptionError("entry is not an object")
+    if name is None:
+        if not isinstance(name := value.get("name"), (str, int)):
+            raise SubscriptionError("entry has no name")
+        name = str(name)
+    if "proxy" in value:
+        config = _p.ProxyConfig.model_validate(value)
+    elif "proxyType" in value:
+        proxy = {k: v for k, v in value.items() if k != "name"}
+        config = _p.ProxyConfig.model_validate({"proxy": proxy})
+    else:
+        return key(sub, name), _fromClash(sub, value)
+    if isinstance(config.proxy, _p.GroupProxy):
+        # members are entries of the same list
+        members = [key(sub, m) for m in config.proxy.members]
+        config = _p.ProxyConfig(
+            proxy=config.proxy.model_copy(update={"members": members})
+        )
+    elif sub.noProxyies is not None and isinstance(config.proxy, _p.Proxy):
+        config = _p.ProxyConfig(
+            proxy=config.proxy.model_copy(update={"noProxyies": sub.noProxyies})
+        )
+    return key(sub, name), config
+
+
+def parse(
+    sub: Subscription, chunks: Iterator[str]
+) -> tuple[dict[str, _p.ProxyConfig], int]:
+    """Configs of a subscription list and the number of skipped entries.
+
+    Raises:
+        SubscriptionError: The list itself is malformed.
+    """
+    configs: dict[str, _p.ProxyConfig] = {}
+    skipped = 0
+    for name, value in _iterEntries(chunks, sub.format):
+        try:
+            k, config = _convert(sub, name, value)
+        except (SubscriptionError, ValidationError) as e:
+            skipped += 1
+            _l.debug(f"subscription {sub.name} entry {name or value} skipped: {e}")
+            continue
+        if k in configs:
+            # two names that only differ in characters a config name cannot hold
+            i = 2
+            while f"{k}_{i}" in configs:
+                i += 1
+            k = f"{k}_{i}"
+        configs[k] = config
+    return configs, skipped
+
+
+# -- syncing -----------------------------------------------------------------
+
+
+def _open(sub: Subscription, state: dict[str, Any], force: bool) -> Any | None:
+    """Response for `sub`, None when it has not changed since `state`"""
+    url = sub.url if "://" in sub.url else Path(sub.url).resolve().as_uri()
+    request = urllib.request.Request(url)
+    if not force and state.get("etag"):
+        request.add_header("If-None-Match", state["etag"])
+    if not force and state.get("lastModified"):
+        request.add_header("If-Modified-Since", state["lastModified"])
+    try:
+        response = urllib.request.urlopen(request, timeout=SUBSCRIPTION_TIMEOUT)
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None
+        raise SubscriptionError(f"http {e.code}")
+    except (urllib.error.URLError, OSError) as e:
+        raise SubscriptionError(str(getattr(e, "reason", e)))
+    # file urls ignore the conditional headers, compare by hand
+    if (
+        not force
+        and url.startswith("file:")
+        and response.headers.get("Last-Modified") == state.get("lastModified")
+        and response.headers.get("Content-Length") == state.get("length")
+    ):
+        response.close()
+        return None
+    return response
+
+
+def diff(
+    owned: Iterable[str], configs: dict[str, _p.ProxyConfig]
+) -> tuple[dict[str, _p.ProxyConfig | None], int]:
+    """Changes that turn the configs in `owned` into `configs`.
+
+    Names taken by configs from elsewhere are left alone and counted.
+    """
+    owned = set(owned)
+    existing = _c.configs()
+    changes: dict[str, _p.ProxyConfig | None] = {}
+    conflicts = 0
+    for k, config in configs.items():
+        if k not in owned and k in existing:
+            conflicts += 1
+            _l.warning(f"subscription config {k} clashes with an existing config")
+        elif existing.get(k) != config:
+            changes[k] = config
+    for k in owned - configs.keys():
+        if k in existing:
+            changes[k] = None
+    return changes, conflicts
+
+
+def _sync(sub: Subscription, force: bool) -> SubscriptionResult:
+    states: dict[str, Any] = _c.generalConfig.setdefault(SUBSCRIPTION_STATE_ENTRY, {})
+    state = states.get(sub.name, {})
+    # validators of another url mean nothing
+    response = _open(sub, state, force or state.get("url") != sub.url)
+    if response is None:
+        return SubscriptionResult(sub.name, True, 0, 0, 0, 0, None, time.time())
+    with response:
+        configs, skipped = parse(sub, _chunks(response))
+        headers = response.headers
+    owned = set(state.get("keys", []))
+    existing = _c.configs()
+    changes, conflicts = diff(owned, configs)
+    added = sum(1 for k, v in changes.items() if v is not None and k not in existing)
+    removed = sum(1 for v in changes.values() if v is None)
+    states[sub.name] = {
+        "url": sub.url,
+        "etag": headers.get("ETag"),
+        "lastModified": headers.get("Last-Modified"),
+        "length": headers.get("Content-Length"),
+        "keys": [k for k in configs if k in owned or k not in existing],
+    }
+    if changes or states[sub.name] != state:
+        _c.updateProxies(changes, {SUBSCRIPTION_STATE_ENTRY: states})
+    return SubscriptionResult(
+        sub.name,
+        False,
+        added,
+        len(changes) - added - removed,
+        removed,
+        skipped + conflicts,
+        None,
+        time.time(),
+    )
+
+
+def refresh(
+    name: str | None = None, force: bool = False
+) -> dict[str, SubscriptionResult]:
+    """Fetch subscription `name` (default: all), apply what changed.
+
+    Refreshing all of them also drops the configs of subscriptions that
+    were removed from the settings.
+    """
+    with _lock:
+        subs = [s for s in subscriptions() if name is None or s.name == name]
+        results = {}
+        for sub in subs:
+            try:
+                results[sub.name] = _sync(sub, force)
+            except SubscriptionError as e:
+                _l.error(f"subscription {sub.name} failed: {e}")
+                results[sub.name] = SubscriptionResult(
+                    sub.name, False, 0, 0, 0, 0, str(e), time.time()
+                )
+            else:
+                _l.info(f"subscription {sub.name}: {results[sub.name].describe()}")
+            _lastCheck[sub.name] = time.monotonic()
+        if name is None:
+            _prune({s.name for s in subscriptions()})
+        _results.update(results)
+        return results
+
+
+def _prune(names: set[str]) -> None:
+    states: dict[str, Any] = _c.getGeneral(SUBSCRIPTION_STATE_ENTRY, {})
+    if not (gone := [n for n in states if n not in names]):
+        return
+    existing = _c.configs()
+    changes: dict[str, _p.ProxyConfig | None] = {}
+    for n in gone:
+        changes.update(
+            (k, None) for k in states.pop(n).get("keys", []) if k in existing
+        )
+        _l.info(f"subscription {n} removed, dropping its configs")
+    _c.updateProxies(changes, {SUBSCRIPTION_STATE_ENTRY: states})
+
+
+def results() -> dict[str, SubscriptionResult]:
+    with _lock:
+        return dict(_results)
+
+
+def _schedulerLoop() -> None:
+    while True:
+        now = time.monotonic()
+        for sub in subscriptions():
+            last = _lastCheck.get(sub.name)
+            if last is None or now - last >= sub.interval:
+                refresh(sub.name)
+        if _stopEvent.wait(SUBSCRIPTION_TICK):
+            return
+
+
+def start() -> None:
+    global _thread
+    if _thread is not None:
+        return
+    _l.info("starting subscription scheduler...")
+    _stopEvent.clear()
+    _thread = threading.Thread(target=_schedulerLoop, daemon=True)
+    _thread.start()
+
+
+def stop() -> None:
+    global _thread
+    if _thread is None:
+        return
+    _l.info("stopping subscription scheduler...")
+    _stopEvent.set()
+    _thread.join()
+    _thread = None
+
+
+_lock = threading.RLock()
+_stopEvent = threading.Event()
+_thread: threading.Thread | None = None
+_lastCheck: dict[str, float] = {}
+_results: dict[str, SubscriptionResult] = {}
@@ -1,13 +1,19 @@
-from windows_toasts import Toast, ToastDuration, WindowsToaster
+import sys
 
+from . import __log as _l
 from . import __utils as _u
 
+if sys.platform == "win32":
+    from windows_toasts import Toast, ToastDuration, WindowsToaster
 
-def toast(message: str, long: bool = False):
-    _text.text_fields = [message]
-    _text.duration =(ToastDuration.Long if long else ToastDuration.Short)
-    _toaster.show_toast(_text)
+    def toast(message: str, long: bool = False):
+        _text.text_fields = [message]
+        _text.duration =(ToastDuration.Long if long else ToastDuration.Short)
+        _toaster.show_toast(_text)
 
-
-_toaster = WindowsToaster(_u.APP_NAME)
-_text = Toast()
+    _toaster = WindowsToaster(_u.APP_NAME)
+    _text = Toast()
+else:
+    # off Windows, e.g. in CI and the benches, toasts only go to the log
+    def toast(message: str, long: bool = False):
+        _l.info(f"toast: {message}")
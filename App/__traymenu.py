@@ -0,0 +1,184 @@
+"""Config entries of the tray menu, kept up to date instead of rebuilt.
+
+`MenuModel.sync` compares the entries with those of the last sync and
+creates, updates or removes only the items (QActions in the tray) that
+differ. It arranges a group again only when its order changed. With many
+configs, those of a subscription go into a submenu of their own, and
+`setFilter` shows only the entries matching what was typed. Qt-free, the
+GUI passes the functions that handle the actions.
+"""
+
+from typing import Any, Callable, Generic, Iterable, Mapping, NamedTuple, TypeVar
+
+GROUP_THRESHOLD = 30  # configs from which subscriptions get submenus
+FILTER_THRESHOLD = 15  # configs from which the menu can be filtered
+
+_T = TypeVar("_T")
+
+
+class MenuEntry(NamedTuple):
+    key: str
+    text: str
+    checked: bool
+    group: str | None  # submenu, None for the menu itself
+
+
+class SyncResult(NamedTuple):
+    created: int
+    updated: int
+    removed: int
+    unchanged: int
+    arranged: list[str | None]  # groups laid out again
+
+    def toDict(self: "SyncResult") -> dict[str, Any]:
+        return self._asdict()
+
+    def describe(self: "SyncResult") -> str:
+        return (
+            f"{self.created} created, {self.updated} updated, {self.removed} removed,"
+            f" {self.unchanged} unchanged, {len(self.arranged)} groups arranged"
+        )
+
+
+def groupOf(key: str, prefixes: Iterable[str]) -> str | None:
+    """The subscription that created config `key`, by the longest prefix"""
+    best = None
+    for prefix in prefixes:
+        if key.startswith(f"{prefix}_") and len(prefix) > len(best or ""):
+            best = prefix
+    return best
+
+
+def entries(
+    configs: Iterable[str],
+    active: str | None,
+    describe: Callable[[str], str | None] = lambda _: None,
+    prefixes: Iterable[str] = (),
+) -> list[MenuEntry]:
+    """Menu entries of `configs` in display order; `describe` adds the text
+    after the name, e.g. the health of the config"""
+    keys = list(configs)
+    prefixes = list(prefixes) if len(keys) >= GROUP_THRESHOLD else []
+    ret = []
+    for key in keys:
+        detail = describe(key)
+        ret.append(
+            MenuEntry(
+                key,
+                f"{key}\t{detail}" if detail else key,
+                key == active,
+                groupOf(key, prefixes),
+            )
+        )
+    return ret
+
+
+def matches(key: str, query: str) -> bool:
+    """Whether every word of `query` is in `key`, ignoring case"""
+    key = key.lower()
+    return all(word in key for word in query.lower().split())
+
+
+class MenuModel(Generic[_T]):
+    """One item per config entry.
+
+    Args:
+        create: a new item for an entry
+        update: changes an item to show another entry with the same key
+        remove: drops an item
+        arrange: lays out the items of a group in this order, removing the
+            group if there are none
+        show: shows or hides an item
+    """
+
+    def __init__(
+        self: "MenuModel",
+        create: Callable[[MenuEntry], _T],
+        update: Callable[[_T, MenuEntry], None],
+        remove: Callable[[_T, MenuEntry], None],
+        arrange: Callable[[str | None, list[_T]], None],
+        show: Callable[[_T, bool], None],
+    ):
+        self._create = create
+        self._update = update
+        self._remove = remove
+        self._arrange = arrange
+        self._show = show
+        self._items: dict[str, tuple[MenuEntry, _T]] = {}
+        self._layout: dict[str | None, list[str]] = {}
+        self._hidden: set[str] = set()
+        self.query = ""
+
+    def __len__(self: "MenuModel") -> int:
+        return len(self._items)
+
+    def items(self: "MenuModel") -> Mapping[str, _T]:
+        return {key: item for key, (_, item) in self._items.items()}
+
+    def sync(self: "MenuModel", entries: list[MenuEntry]) -> SyncResult:
+        created = updated = unchanged = 0
+        items: dict[str, tuple[MenuEntry, _T]] = {}
+        layout: dict[str | None, list[str]] = {}
+        for entry in entries:
+            old = self._items.pop(entry.key, None)
+            if old is None or old[0].group != entry.group:
+                if old is not None:  # moved to another submenu
+                    self._remove(old[1], old[0])
+                    self._hidden.discard(entry.key)
+                item = self._create(entry)
+                created += 1
+                if not matches(entry.key, self.query):
+                    self._show(item, False)
+                    self._hidden.add(entry.key)
+            elif old[0] != entry:
+                item = old[1]
+                self._update(item, entry)
+                updated += 1
+            else:
+                item = old[1]
+                unchanged += 1
+            items[entry.key] = (entry, item)
+            layout.setdefault(entry.group, []).append(entry.key)
+        for key, (entry, item) in self._items.items():
+            self._remove(item, entry)
+            self._hidden.discard(key)
+        removed = len(self._items)
+        self._items = items
+        # removing an item keeps the others in order
+        arranged = [
+            group
+            for group in {**self._layout, **layout}
+            if layout.get(group, [])
+            != [
+                k
+                for k in self._layout.get(group, [])
+                if k in items and items[k][0].group == group
+            ]
+            or group not in layout
+        ]
+        for group in arranged:
+            self._arrange(group, [items[k][1] for k in layout.get(group, [])])
+        self._layout = layout
+        return SyncResult(created, updated, removed, unchanged, arranged)
+
+    def setFilter(self: "MenuModel", query: str) -> int:
+        """Show only entries matching `query`; returns how many match"""
+        self.query = query
+        shown = 0
+        for key, (_, item) in self._items.items():
+            if matches(key, query):
+                shown += 1
+                if key in self._hidden:
+                    self._hidden.discard(key)
+                    self._show(item, True)
+            elif key not in self._hidden:
+                self._hidden.add(key)
+                self._show(item, False)
+        return shown
+
+    def groups(self: "MenuModel") -> dict[str | None, int]:
+        """Shown entries per group"""
+        ret: dict[str | None, int] = {}
+        for group, keys in self._layout.items():
+            ret[group] = sum(1 for k in keys if k not in self._hidden)
+        return ret
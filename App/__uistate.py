@@ -0,0 +1,147 @@
+"""Tray state, updated from any thread and rendered on the GUI thread.
+
+Watcher callbacks call `UiStore.update` from their own threads. The fields
+are merged into one pending change, and `schedule` is called once for it;
+the GUI posts a queued signal from there. `flush` then runs on the GUI
+thread, publishes the next immutable `UiState` and renders only the views
+whose part of the state changed, so the icon and the tooltip are set at
+most once per pass of the event loop. Qt-free, so it runs headless.
+"""
+
+import threading
+from typing import Any, Callable, NamedTuple
+
+
+class UiState(NamedTuple):
+    enabled: bool
+    configKey: str | None
+    proto: str
+    followGateway: bool
+    host: str
+    port: int
+    noProxy: tuple[str, ...]
+    windowLight: bool
+    tbLight: bool
+
+    @property
+    def tooltip(self: "UiState") -> str:
+        return "\n".join(
+            [
+                "代理切换器",
+                "状态: " + ("\u2713" if self.enabled else "\u2717"),
+                f"配置: {self.configKey}",
+                f"协议: {self.proto}",
+                "跟随网关" if self.followGateway else f"主机: {self.host}",
+                f"端口: {self.port}",
+            ]
+        )
+
+
+class UiStats(NamedTuple):
+    updates: int
+    coalesced: int  # updates merged into an already scheduled flush
+    flushes: int
+    unchanged: int  # flushes that left the state as it was
+    renders: dict[str, int]  # per view
+    skipped: dict[str, int]  # flushes that did not change the view's part
+
+    def toDict(self: "UiStats") -> dict[str, Any]:
+        return self._asdict()
+
+    def describe(self: "UiStats") -> str:
+        views = ", ".join(
+            f"{name} {n} ({self.skipped[name]} skipped)"
+            for name, n in self.renders.items()
+        )
+        return (
+            f"{self.updates} updates in {self.flushes} flushes"
+            f" ({self.coalesced} coalesced, {self.unchanged} unchanged); {views}"
+        )
+
+
+class _View(NamedTuple):
+    select: Callable[[UiState], Any]
+    render: Callable[[Any], None]
+
+
+class UiStore:
+    def __init__(
+        self: "UiStore",
+        state: UiState,
+        schedule: Callable[[], None] = lambda: None,
+    ):
+        self.schedule = schedule
+        self._state = state
+        self._pending: dict[str, Any] = {}
+        self._scheduled = False
+        self._lock = threading.Lock()
+        self._views: dict[str, _View] = {}
+        self._updates = 0
+        self._coalesced = 0
+        self._flushes = 0
+        self._unchanged = 0
+        self._renders: dict[str, int] = {}
+        self._skipped: dict[str, int] = {}
+
+    def current(self: "UiStore") -> UiState:
+        """The last flushed state, pending updates are not in it"""
+        return self._state
+
+    def watch(
+        self: "UiStore",
+        name: str,
+        select: Callable[[UiState], Any],
+        render: Callable[[Any], None],
+    ) -> None:
+        """Render `select(state)` now and after every flush that changes it;
+        on the GUI thread"""
+        self._views[name] = _View(select, render)
+        self._renders[name] = 1
+        self._skipped[name] = 0
+        render(select(self._state))
+
+    def update(self: "UiStore", **fields: Any) -> None:
+        """Queue `fields` for the next flush; from any thread"""
+        unknown = set(fields) - set(UiState._fields)
+        if unknown:
+            raise ValueError(f"unknown ui state fields {sorted(unknown)}")
+        with self._lock:
+            self._updates += 1
+            self._pending.update(fields)
+            if self._scheduled:
+                self._coalesced += 1
+                return
+            self._scheduled = True
+        self.schedule()
+
+    def flush(self: "UiStore") -> UiState:
+        """Publish the pending fields and render the views they change; on
+        the GUI thread"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+            self._flushes += 1
+        old = self._state
+        new = old._replace(**pending)
+        if new == old:
+            self._unchanged += 1
+            return old
+        self._state = new
+        for name, view in self._views.items():
+            if (value := view.select(new)) == view.select(old):
+                self._skipped[name] += 1
+                continue
+            self._renders[name] += 1
+            view.render(value)
+        return new
+
+    def stats(self: "UiStore") -> UiStats:
+        with self._lock:
+            return UiStats(
+                self._updates,
+                self._coalesced,
+                self._flushes,
+                self._unchanged,
+                dict(self._renders),
+                dict(self._skipped),
+            )
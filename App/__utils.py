@@ -1,7 +1,4 @@
 import sys
-
-if sys.platform != "win32":
-    raise NotImplementedError("Wrong platform for this module")
 import re
 import locale
 import os
@@ -17,8 +14,12 @@ STARTUP_REG_ENTRY = r"Software\Microsoft\Windows\CurrentVersion\Run"
 APP_NAME = "Proxy Control"
 IS_FROZEN = getattr(sys, "frozen", False)
 MAIN_PATH = Path(__main__.__file__).parent
-SUBPROCESS_SILENT_INFO = subprocess.STARTUPINFO(
-    dwFlags=subprocess.STARTF_USESHOWWINDOW, wShowWindow=subprocess.SW_HIDE
+SUBPROCESS_SILENT_INFO = (
+    subprocess.STARTUPINFO(
+        dwFlags=subprocess.STARTF_USESHOWWINDOW, wShowWindow=subprocess.SW_HIDE
+    )
+    if sys.platform == "win32"
+    else None
 )
 MAC_ADDR_PATTERN = re.compile(r"^([0-9A-Fa-f]{2}[:-]){5}([0-9A-Fa-f]{2})$")
 
@@ -46,18 +47,54 @@ def isConnected() -> bool:
     return False
 
 
+def decodeNetsh(bytes: bytes) -> str:
+    """netsh answers in the console code page, which varies"""
+    detected_encoding = chardet.detect(bytes)['encoding']
+    encoding = detected_encoding or locale.getdefaultlocale()[1] or "utf-8"
+    return bytes.decode(encoding)
+
+
+def parseSSID(output: str) -> str | None:
+    """The SSID in `netsh wlan show interfaces` output"""
+    lines = output.split("\n")
+    for line in lines:
+        if line.strip().startswith("SSID"):
+            return line.split(":")[1].strip()
+    return None
+
+
+def parseArp(output: str) -> str | None:
+    """The MAC address in `arp -a <ip>` output"""
+    lines = output.split("\n")
+    if len(lines) > 3:
+        return macAddrValidate(lines[3].split()[1])
+    return None
+
+
+def parseRoute(output: str) -> str | None:
+    """The default gateway in `route print` output"""
+    lines = output.split("\n")
+    for line in lines:
+        if " 0.0.0.0 " in line:
+            return line.split()[2]
+    return None
+
+
+def parseIpRoute(output: str) -> str | None:
+    """The default gateway in `ip route` output"""
+    lines = output.split("\n")
+    for line in lines:
+        if "default" in line:
+            return line.split()[2]
+    return None
+
+
 def getSSID() -> str | None:
     try:
         bytes = subprocess.check_output(
             ["netsh", "wlan", "show", "interfaces"], startupinfo=SUBPROCESS_SILENT_INFO
         )
-        detected_encoding = chardet.detect(bytes)['encoding']
-        encoding = detected_encoding or locale.getdefaultlocale()[1] or "utf-8"
-        output = bytes.decode(encoding)
-        lines = output.split("\n")
-        for line in lines:
-            if line.strip().startswith("SSID"):
-                return line.split(":")[1].strip()
+        return parseSSID(decodeNetsh(bytes))
     except subprocess.CalledProcessError:
         pass
     return None
@@ -68,10 +105,7 @@ def getMacAddr(ip: str) -> str | None:
         bytes = subprocess.check_output(
             ["arp", "-a", ip], startupinfo=SUBPROCESS_SILENT_INFO
         )
-        output = bytes.decode(locale.getdefaultlocale()[1] or "utf-8")
-        lines = output.split("\n")
-        if len(lines) > 3:
-            return macAddrValidate(lines[3].split()[1])
+        return parseArp(bytes.decode(locale.getdefaultlocale()[1] or "utf-8"))
     except subprocess.CalledProcessError:
         pass
     return None
@@ -85,7 +119,7 @@ def enable_startup():
             reg.RegKeyAccess.KEY_WRITE,
         ) as key:
             key.setValue(APP_NAME, START_COMMAND, reg.RegValueType.REG_SZ)
-    elif platform.system() == "Linux":  # UNTESTED
+    elif sys.platform == "linux":  # UNTESTED
         autostart_dir = Path.home() / ".config" / "autostart"
         autostart_dir.mkdir(parents=True, exist_ok=True)
         desktop_file = autostart_dir / "myapp.desktop"
@@ -160,21 +194,12 @@ def getGateway() -> str | None:
         bytes = subprocess.check_output(
             ["route", "print"], startupinfo=SUBPROCESS_SILENT_INFO
         )
-        output = bytes.decode(locale.getdefaultlocale()[1] or "utf-8")
-        lines = output.split("\n")
-        for line in lines:
-            if " 0.0.0.0 " in line:
-                return line.split()[2]
+        return parseRoute(bytes.decode(locale.getdefaultlocale()[1] or "utf-8"))
     elif sys.platform == "linux":  # UNTESTED
         bytes = subprocess.check_output(["ip", "route"])
-        output = bytes.decode(locale.getdefaultlocale()[1] or "utf-8")
-        lines = output.split("\n")
-        for line in lines:
-            if "default" in line:
-                return line.split()[2]
+        return parseIpRoute(bytes.decode(locale.getdefaultlocale()[1] or "utf-8"))
     else:
         raise NotImplementedError("Unsupported platform")
-    return None
 
 
 def getGwMac() -> str | None:
@@ -0,0 +1,254 @@
+import hashlib
+import json
+import socket
+import threading
+import time
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Any
+
+from . import __log as _l
+from . import __pacjs as _js
+from . import __proxy as _p
+from . import __utils as _u
+
+PAC_CACHE_DIR = _u.getExeRelPath("pac-cache")
+PAC_REFRESH_INTERVAL = 1800.0
+PAC_RETRY_INTERVAL = 60.0
+PAC_FETCH_TIMEOUT = 10.0
+PAC_MAX_SIZE = 1024 * 1024
+WPAD_FILE = "wpad.dat"
+
+
+class PacFetchError(Exception):
+    pass
+
+
+class _Entry:
+    """A downloaded PAC file with its validators, mirrored to disk"""
+
+    def __init__(
+        self: "_Entry",
+        url: str,
+        body: str,
+        etag: str | None = None,
+        lastModified: str | None = None,
+    ):
+        self.url = url
+        self.body = body
+        self.etag = etag
+        self.lastModified = lastModified
+        self.checkedAt = 0.0  # monotonic, 0 forces a revalidation
+
+    @staticmethod
+    def _path(url: str) -> Path:
+        return PAC_CACHE_DIR / hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def load(cls: type["_Entry"], url: str) -> "_Entry | None":
+        path = cls._path(url)
+        try:
+            meta = json.loads(path.with_suffix(".json").read_text("utf-8"))
+            body = path.with_suffix(".pac").read_text("utf-8")
+        except (OSError, ValueError):
+            return None
+        return cls(url, body, meta.get("etag"), meta.get("lastModified"))
+
+    def save(self: "_Entry") -> None:
+        path = self._path(self.url)
+        try:
+            PAC_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            path.with_suffix(".pac").write_text(self.body, "utf-8")
+            path.with_suffix(".json").write_text(
+                json.dumps(
+                    {
+                        "url": self.url,
+                        "etag": self.etag,
+                        "lastModified": self.lastModified,
+                    }
+                ),
+                "utf-8",
+            )
+        except OSError as e:
+            _l.warning(f"cannot cache pac file {self.url}: {e}")
+
+
+def _decode(data: bytes) -> str:
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data.decode("latin-1")
+
+
+def _download(url: str, entry: "_Entry | None") -> "_Entry | None":
+    """Conditional GET, None when the cached `entry` is still current"""
+    request = urllib.request.Request(url)
+    if entry is not None and entry.etag:
+        request.add_header("If-None-Match", entry.etag)
+    if entry is not None and entry.lastModified:
+        request.add_header("If-Modified-Since", entry.lastModified)
+    try:
+        with _opener.open(request, timeout=PAC_FETCH_TIMEOUT) as response:
+            data = response.read(PAC_MAX_SIZE + 1)
+            headers = response.headers
+    except urllib.error.HTTPError as e:
+        if e.code == 304 and entry is not None:
+            return None
+        raise PacFetchError(f"http {e.code}")
+    except (urllib.error.URLError, OSError) as e:
+        raise PacFetchError(str(getattr(e, "reason", e)))
+    if len(data) > PAC_MAX_SIZE:
+        raise PacFetchError("pac file too large")
+    return _Entry(url, _decode(data), headers.get("ETag"), headers.get("Last-Modified"))
+
+
+def fetch(url: str, force: bool = False) -> str:
+    """PAC file at `url`, revalidated every `PAC_REFRESH_INTERVAL` seconds.
+
+    Falls back to the last good copy, in memory or on disk, when the server
+    cannot be reached.
+
+    Raises:
+        PacFetchError: Neither the server nor the cache has the file.
+    """
+    with _lock:
+        entry = _entries.get(url)
+        if entry is None and (entry := _Entry.load(url)) is not None:
+            _entries[url] = entry
+        now = time.monotonic()
+        if (
+            entry is not None
+            and not force
+            and now - entry.checkedAt < PAC_REFRESH_INTERVAL
+        ):
+            return entry.body
+        _stats["requests"] += 1
+        try:
+            fresh = _download(url, entry)
+        except PacFetchError as e:
+            if entry is None:
+                raise PacFetchError(f"cannot fetch pac file {url}: {e}")
+            _stats["fallbacks"] += 1
+            _l.warning(f"cannot fetch pac file {url}, using cached copy: {e}")
+            # retry sooner than a full refresh period
+            entry.checkedAt = now - PAC_REFRESH_INTERVAL + PAC_RETRY_INTERVAL
+            return entry.body
+        if fresh is None:
+            _stats["notModified"] += 1
+            entry.checkedAt = now  # type: ignore[union-attr]
+            return entry.body  # type: ignore[union-attr]
+        _stats["downloads"] += 1
+        fresh.checkedAt = now
+        _entries[url] = fresh
+        fresh.save()
+        _l.debug(f"fetched pac file {url}, {len(fresh.body)} chars")
+        return fresh.body
+
+
+def candidates(fqdn: str | None = None) -> list[str]:
+    """WPAD urls to try for this machine, most specific domain first"""
+    labels = (fqdn or socket.getfqdn()).strip(".").lower().split(".")[1:]
+    return [
+        f"http://wpad.{'.'.join(labels[i:])}/{WPAD_FILE}"
+        for i in range(max(len(labels) - 1, 0))
+    ]
+
+
+def discover(force: bool = False) -> str:
+    """Find the PAC url through WPAD DNS names.
+
+    DHCP option 252 is not queried, it needs the Windows DHCP client API.
+
+    Raises:
+        PacFetchError: No candidate answered.
+    """
+    global _discovered
+    if _discovered is not None and not force:
+        return _discovered
+    for url in candidates():
+        try:
+            fetch(url, force=True)
+        except PacFetchError as e:
+            _l.debug(f"wpad candidate {url} failed: {e}")
+            continue
+        _l.info(f"discovered pac file at {url}")
+        _discovered = url
+        return url
+    raise PacFetchError("no pac file found through wpad")
+
+
+def pacUrl(pac: _p.PacProxy) -> str:
+    return pac.pacUrl if pac.pacUrl is not None else discover()
+
+
+def script(pac: _p.PacProxy) -> _js.PacScript:
+    """Compiled PAC file for `pac`, recompiled only when its content changes
+
+    Raises:
+        PacFetchError: Cannot get the file.
+        PacError: The file does not compile.
+    """
+    url = pacUrl(pac)
+    body = fetch(url)
+    digest = hashlib.sha1(body.encode("utf-8")).hexdigest()
+    with _lock:
+        if (cached := _scripts.get(url)) is not None and cached[0] == digest:
+            return cached[1]
+    compiled = _js.PacScript(body)
+    with _lock:
+        _scripts[url] = (digest, compiled)
+    _l.info(f"compiled pac file {url}")
+    return compiled
+
+
+def resolve(url: str, pac: _p.PacProxy) -> list[str]:
+    """PAC result entries for `url`, like `["PROXY a:8080", "DIRECT"]`"""
+    return _js.parseResult(script(pac).findProxy(url))
+
+
+def _setUrl(url: str) -> None:
+    # ProxyServer stays as is, AutoConfigURL takes precedence over it
+    if _p.getAutoConfigURL() != url:
+        _p.setAutoConfigURL(url)
+
+
+def apply(pac: _p.PacProxy) -> None:
+    """Point the registry at the PAC file and compile it in the background.
+
+    A known url is written right away, WPAD has to find it first.
+    """
+    if pac.pacUrl is not None:
+        _setUrl(pac.pacUrl)
+
+    def run() -> None:
+        try:
+            if pac.pacUrl is None:
+                _setUrl(discover())
+            script(pac)
+        except (PacFetchError, _js.PacError) as e:
+            _l.error(f"cannot apply pac config: {e}")
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def stats() -> dict[str, Any]:
+    with _lock:
+        scripts = {
+            url: {"hits": s.hits, "misses": s.misses}
+            for url, (_, s) in _scripts.items()
+        }
+        return dict(_stats, discovered=_discovered, scripts=scripts)
+
+
+def start() -> None:
+    _p.pacApplyCallback = apply
+
+
+# the pac file itself must never be fetched through a proxy
+_opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+_lock = threading.RLock()
+_entries: dict[str, _Entry] = {}
+_scripts: dict[str, tuple[str, _js.PacScript]] = {}
+_stats = {"requests": 0, "downloads": 0, "notModified": 0, "fallbacks": 0}
+_discovered: str | None = None
@@ -0,0 +1,129 @@
+import fnmatch
+import ipaddress
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __bypass as _bp
+
+ENTRIES = 10_000
+LOOKUPS = 50_000
+
+
+def _entries(rng: random.Random, n: int) -> list[str]:
+    entries = ["<local>"]
+    while len(entries) < n:
+        kind = rng.random()
+        name = f"h{rng.randrange(100_000)}.d{rng.randrange(500)}.example"
+        if kind < 0.4:
+            entries.append(name)
+        elif kind < 0.6:
+            entries.append(f"*.{name}")
+        elif kind < 0.7:
+            entries.append(f".{name}")
+        elif kind < 0.8:
+            entries.append(f"10.{rng.randrange(256)}.{rng.randrange(256)}.*")
+        elif kind < 0.9:
+            entries.append(f"172.{rng.randrange(16, 32)}.{rng.randrange(256)}.0/24")
+        elif kind < 0.98:
+            entries.append(f"192.168.{rng.randrange(256)}.{rng.randrange(256)}")
+        else:
+            entries.append(f"*tracker{rng.randrange(1000)}*")
+    return entries
+
+
+def _hosts(rng: random.Random, entries: list[str], n: int) -> list[str]:
+    hosts = []
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.3:
+            entry = rng.choice(entries).lstrip("*.").split("/")[0]
+            hosts.append(entry.replace("*", str(rng.randrange(256))))
+        elif kind < 0.5:
+            hosts.append(f"www.h{rng.randrange(100_000)}.d{rng.randrange(500)}.example")
+        elif kind < 0.7:
+            hosts.append(".".join(str(rng.randrange(256)) for _ in range(4)))
+        elif kind < 0.8:
+            hosts.append(f"intranet{rng.randrange(10)}")
+        else:
+            hosts.append(f"cdn{rng.randrange(1000)}.example.com")
+    return hosts
+
+
+def naive(entries: list[str], host: str) -> bool:
+    """Per-entry linear scan, the obvious reading of the ProxyOverride rules"""
+    host = _bp.normalizeHost(host)
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        address = None
+    for entry in entries:
+        entry = entry.strip().lower()
+        if entry == _bp.LOCAL_ENTRY:
+            if address is None and "." not in host:
+                return True
+            continue
+        if address is not None and (network := _bp.ipNetwork(entry)) is not None:
+            if address.version == network.version and address in network:
+                return True
+            continue
+        if entry.startswith(".") and "*" not in entry:
+            if host == entry[1:] or host.endswith(entry):
+                return True
+            continue
+        if fnmatch.fnmatchcase(host, entry):
+            return True
+    return False
+
+
+def main() -> None:
+    rng = random.Random(33)
+    entries = _entries(rng, ENTRIES)
+    hosts = _hosts(rng, entries, LOOKUPS)
+
+    start = time.perf_counter()
+    m = _bp.BypassMatcher(entries)
+    compiled = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cold = [m._match(h) for h in hosts]
+    coldTime = time.perf_counter() - start
+
+    # a browser asks about the same few thousand hosts over and over
+    hot = hosts[: _bp.MATCH_CACHE_SIZE // 2] * (LOOKUPS // (_bp.MATCH_CACHE_SIZE // 2))
+    for h in hot:
+        m.shouldBypass(h)
+    start = time.perf_counter()
+    for h in hot:
+        m.shouldBypass(h)
+    cachedTime = time.perf_counter() - start
+
+    sample = hosts[:500]
+    start = time.perf_counter()
+    reference = [naive(entries, h) for h in sample]
+    naiveTime = time.perf_counter() - start
+
+    mismatches = sum(a != b for a, b in zip(reference, cold))
+    print(f"entries        {len(entries)}")
+    print(f"compile        {compiled * 1000:.1f} ms")
+    print(f"cold lookup    {LOOKUPS / coldTime:,.0f} /s")
+    print(f"cached lookup  {len(hot) / cachedTime:,.0f} /s")
+    print(f"naive scan     {len(sample) / naiveTime:,.0f} /s")
+    print(f"bypassed       {sum(cold)} of {LOOKUPS}")
+    print(f"mismatches     {mismatches} of {len(sample)}")
+
+    start = time.perf_counter()
+    result = _bp.optimize(entries)
+    optimizeTime = time.perf_counter() - start
+    start = time.perf_counter()
+    differ = _bp.verify(entries, result.entries, seed=33)
+    verifyTime = time.perf_counter() - start
+    print(f"optimize       {result.describe()} in {optimizeTime * 1000:.0f} ms")
+    print(f"verify         {len(differ)} differing hosts in {verifyTime * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __config as _c
+from App import __mapping as _m
+from App import __proxy as _p
+from App import __state as _state
+from App import __store as _store
+
+SIZES = [100, 10_000, 100_000]
+EDITS = 20
+LOOKUPS = 2_000
+
+
+def _network(i: int) -> _p.Network:
+    mac = ":".join(f"{(i >> s) & 255:02x}" for s in (40, 32, 24, 16, 8, 0))
+    return _p.Network(ssid=f"site-{i // 4}" if i % 5 else None, mac=mac)
+
+
+def _dataset(rows: int) -> tuple[dict[str, _p.ProxyConfig], list[_p.Network]]:
+    configs = {
+        f"cfg{i}": _p.ProxyConfig(
+            proxy=_p.SpecificProxy(host=f"10.0.{i >> 8 & 255}.{i & 255}", port=8080)
+        )
+        for i in range(max(rows // 10, 10))
+    }
+    return configs, [_network(i) for i in range(rows)]
+
+
+def _reset() -> None:
+    _store.close()
+    _state.update(configs={}, active=None, mappings={}, references={})
+    _c.generalConfig = {}
+
+
+def _write(backend: str, configs: dict, networks: list[_p.Network]) -> None:
+    names = list(configs)
+    mapping = {nw: names[i % len(names)] for i, nw in enumerate(networks)}
+    if backend == "sqlite":
+        _store.migrate(
+            {k: v.model_dump() for k, v in configs.items()},
+            {},
+            [(nw.ssid, nw.mac, conf) for nw, conf in mapping.items()],
+        )
+        return
+    _state.update(configs=configs)
+    _c.generalConfig = {
+        _m.AUTO_MAP_CONFIG_ENTRY: {_c.nwInfoToText(k): v for k, v in mapping.items()}
+    }
+    _c.save()
+
+
+def _measure(backend: str, rows: int, directory: Path) -> dict[str, float]:
+    _c.SAVE_FILE = directory / f"{backend}-{rows}.json"
+    _store.STORE_FILE = directory / f"{backend}-{rows}.db"
+    configs, networks = _dataset(rows)
+    _reset()
+    _write(backend, configs, networks)
+    _reset()
+
+    start = time.perf_counter()
+    _c.load()
+    _m.load()
+    cold = time.perf_counter() - start
+
+    rng = random.Random(rows)
+    start = time.perf_counter()
+    for i in range(EDITS):
+        _m.addMapping(_network(rows + i), "cfg0")
+    mappingEdit = (time.perf_counter() - start) / EDITS
+
+    start = time.perf_counter()
+    for i in range(EDITS):
+        _c.setGeneral("bench", i)
+    settingEdit = (time.perf_counter() - start) / EDITS
+
+    sample = [networks[rng.randrange(rows)] for _ in range(LOOKUPS)]
+    start = time.perf_counter()
+    for nw in sample:
+        assert _m._lookup(nw) is not None
+    lookup = (time.perf_counter() - start) / LOOKUPS
+
+    _reset()
+    return {
+        "cold": cold * 1000,
+        "mappingEdit": mappingEdit * 1000,
+        "settingEdit": settingEdit * 1000,
+        "lookup": lookup * 1e6,
+    }
+
+
+def main() -> None:
+    # no network probing during load
+    _m._getNetworkInfo = lambda: None  # type: ignore
+    directory = Path(tempfile.mkdtemp())
+    print(
+        f"{'rows':>7} {'backend':<7} {'cold start':>11} {'add mapping':>12}"
+        f" {'set option':>11} {'lookup':>9}"
+    )
+    for rows in SIZES:
+        for backend in ("json", "sqlite"):
+            r = _measure(backend, rows, directory)
+            print(
+                f"{rows:>7} {backend:<7} {r['cold']:>8.1f} ms {r['mappingEdit']:>9.2f} ms"
+                f" {r['settingEdit']:>8.2f} ms {r['lookup']:>6.1f} µs"
+            )
+
+
+if __name__ == "__main__":
+    main()
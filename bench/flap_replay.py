@@ -0,0 +1,89 @@
+import random
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from mapping_sim import Event, Simulator, Trace, quiet
+
+from App import __flap as _flap
+from App import __mapping as _m
+from App import __proxy as _p
+
+NETWORKS = {
+    "home": ("home", "192.168.1.1", "aa:aa:aa:aa:aa:aa"),
+    "office": ("office", "10.0.0.1", "bb:bb:bb:bb:bb:bb"),
+    "cafe": ("cafe", "172.16.0.1", "cc:cc:cc:cc:cc:cc"),
+    "lab": ("lab", "10.1.0.1", "dd:dd:dd:dd:dd:dd"),
+}
+MAPPINGS = {
+    _p.Network(ssid="home", mac="aa:aa:aa:aa:aa:aa"): "home",
+    _p.Network(ssid="office", mac="bb:bb:bb:bb:bb:bb"): "office",
+    _p.Network(ssid="lab", mac="dd:dd:dd:dd:dd:dd"): "lab",
+}
+# where the machine really is, from hour to hour
+DAY = [(8, "home"), (9, "office"), (12, "cafe"), (13, "office"), (18, "home")]
+
+
+def _trace(rng: random.Random) -> Trace:
+    """The moves of the day, plus bursts of bounces on weak signal at the
+    office and the cafe, half of the time without an SSID or gateway yet"""
+    trace = Trace(MAPPINGS, [])
+    for (hour, place), (end, _) in zip(DAY, DAY[1:] + [(20, "")]):
+        t = hour * 3600.0
+        trace.events.append(Event(t, 2, *NETWORKS[place]))
+        stable = trace.expected(trace.events[-1])
+        while place in ("office", "cafe") and t < end * 3600 - 600:
+            t += rng.uniform(300, 1500)
+            for _ in range(rng.randint(4, 15)):
+                if rng.random() < 0.4:
+                    event = Event(t, 2, None, None, None, expect=stable)
+                else:
+                    event = Event(t, 2, *NETWORKS[place])
+                trace.events.append(event)
+                t = event.up + rng.uniform(3, 25)
+            trace.events.append(Event(t, 2, *NETWORKS[place]))
+    return trace
+
+
+def _twoNetworks(rng: random.Random) -> Trace:
+    """A desk between the office and the lab access points: both are known
+    and cached after the first hour, then the machine roams between them"""
+    trace = Trace(MAPPINGS, [])
+    trace.events.append(Event(9 * 3600.0, 2, *NETWORKS["office"]))
+    trace.events.append(Event(9.5 * 3600.0, 2, *NETWORKS["lab"]))
+    t = 10 * 3600.0
+    place = "office"
+    while t < 17 * 3600:
+        for _ in range(rng.randint(6, 20)):
+            place = "lab" if place == "office" else "office"
+            trace.events.append(Event(t, 2, *NETWORKS[place]))
+            t = trace.events[-1].up + rng.uniform(3, 25)
+        trace.events.append(Event(t, 2, *NETWORKS[place]))
+        t += rng.uniform(900, 3600)
+    return trace
+
+
+def main() -> None:
+    quiet()
+    for title, trace in (
+        ("one day", _trace(random.Random(42))),
+        ("two known networks", _twoNetworks(random.Random(42))),
+    ):
+        results = {
+            "undamped": Simulator(trace, _flap.FlapSettings(suppress=1e12, reuse=1e11)),
+            "damped": Simulator(trace, _flap.FlapSettings()),
+        }
+        print(f"{title}: {len(trace.events)} reconnects")
+        print(f"{'':<10} {'writes':>7} {'toasts':>7} {'wrong proxy':>12}  held back")
+        for name, sim in results.items():
+            r = sim.run()
+            d = _m.flaps()
+            print(
+                f"{name:<10} {r.writes:>7} {r.toasts:>7} {r.wrongTime:>10.0f} s"
+                f"  {d['suppressed']} in {d['suppressions']} suppressions"
+            )
+
+
+if __name__ == "__main__":
+    main()
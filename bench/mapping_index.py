@@ -0,0 +1,86 @@
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __config as _c
+from App import __mapping as _m
+from App import __proxy as _p
+from App import __state as _state
+
+MAPPINGS = 100_000
+CONFIGS = 1_000
+READS = 1_000
+
+
+def _config(i: int) -> _p.ProxyConfig:
+    return _p.ProxyConfig(
+        proxy=_p.SpecificProxy(host=f"10.0.{i >> 8}.{i & 255}", port=i)
+    )
+
+
+def _fullCheck(snap: _state.Snapshot) -> int:
+    """What every config() call used to do"""
+    return sum(
+        1
+        for confName in snap.mappings.values()
+        if confName is not None and confName not in snap.configs
+    )
+
+
+def main() -> None:
+    persists = [0]
+
+    def countingPersist(*_: object) -> None:
+        persists[0] += 1
+
+    # keep the numbers about the index, not the disk
+    _c._persist = countingPersist  # type: ignore
+    mappings = {
+        _p.Network(ssid=f"site{i}", mac=f"mac{i}"): f"cfg{i % CONFIGS}"
+        for i in range(MAPPINGS)
+    }
+    _state.update(
+        configs={f"cfg{i}": _config(i) for i in range(CONFIGS)},
+        active="cfg0",
+        mappings=mappings,
+        references=_m._index(mappings),
+    )
+    k = MAPPINGS // CONFIGS
+
+    start = time.perf_counter()
+    for _ in range(READS):
+        _m.config()
+    read = (time.perf_counter() - start) / READS
+    start = time.perf_counter()
+    _fullCheck(_state.current())
+    scan = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _c.updateProxy("cfg1", "renamed", _config(1))
+    rename = time.perf_counter() - start
+    renamePersists = persists[0]
+    snap = _state.current()
+    assert len(_m.references("renamed")) == k and not _m.references("cfg1")
+    assert sum(1 for v in snap.mappings.values() if v == "renamed") == k
+
+    start = time.perf_counter()
+    _c.removeProxy("cfg2")
+    remove = time.perf_counter() - start
+    snap = _state.current()
+    assert len(_m.references(_m.DEPRECATED_STR)) == k and not _m.references("cfg2")
+    assert _fullCheck(snap) == k  # the deprecated ones, nothing else stale
+    assert _m._index(snap.mappings) == dict(snap.references)
+
+    print(f"mappings     {MAPPINGS} to {CONFIGS} configs, {k} each")
+    print(f"config()     {read * 1e6:.1f} µs (full check was {scan * 1000:.1f} ms)")
+    print(
+        f"rename       {rename * 1000:.1f} ms, {k} mappings moved, {renamePersists} save"
+    )
+    print(f"remove       {remove * 1000:.1f} ms, {k} mappings marked, 1 save")
+    print(f"saves        {persists[0]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,397 @@
+"""Replay network-change traces through the mapping engine.
+
+The real detection loop, applyMapping, the network cache and the flap
+damper run against fake probes and a fake proxy backend on a virtual
+clock. A trace is JSON lines, a header and then one reconnect per line:
+
+    {"mappings": {"office | bb:bb:bb:bb:bb:bb": "office", "cafe | ": null}}
+    {"t": 0, "down": 2.5, "ssid": "office", "gateway": "10.0.0.1",
+     "mac": "bb:bb:bb:bb:bb:bb", "delays": [0.08, 0.05, 0.35]}
+
+`t` is when the link drops and `down` how long it stays down; `delays` are
+how long the SSID, gateway and ARP probes take. An event may name the
+config it should end up with in "expect", otherwise it is derived from
+the mappings. Run it with a trace file, or without one to replay a
+synthetic trace.
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Iterable, NamedTuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __config as _c
+from App import __debounce as _d
+from App import __flap as _flap
+from App import __log as _l
+from App import __mapping as _m
+from App import __netcache as _nc
+from App import __proxy as _p
+from App import __state as _state
+from App import __toast as _t
+from App import __utils as _u
+
+DEFAULT_DELAYS = (0.08, 0.05, 0.35)  # SSID, gateway, ARP on a typical laptop
+UNSET = object()
+
+
+class Event(NamedTuple):
+    t: float
+    down: float
+    ssid: str | None
+    gateway: str | None
+    mac: str | None
+    delays: tuple[float, float, float] = DEFAULT_DELAYS
+    expect: Any = UNSET  # config name, None for no proxy, UNSET to derive
+
+    @property
+    def up(self: "Event") -> float:
+        return self.t + self.down
+
+    def toDict(self: "Event") -> dict[str, Any]:
+        d = self._asdict()
+        if d["expect"] is UNSET:
+            del d["expect"]
+        d["delays"] = list(self.delays)
+        return d
+
+
+class Trace(NamedTuple):
+    mappings: dict[_p.Network, str | None]
+    events: list[Event]
+
+    @staticmethod
+    def load(path: Path) -> "Trace":
+        with path.open("r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            events = []
+            for line in f:
+                if line.strip():
+                    d = json.loads(line)
+                    d["delays"] = tuple(d.get("delays", DEFAULT_DELAYS))
+                    events.append(Event(**d))
+        mappings = {_c.textToNwInfo(k): v for k, v in header["mappings"].items()}
+        return Trace(mappings, sorted(events, key=lambda e: e.t))
+
+    def save(self: "Trace", path: Path) -> None:
+        with path.open("w", encoding="utf-8") as f:
+            header = {_c.nwInfoToText(k): v for k, v in self.mappings.items()}
+            f.write(json.dumps({"mappings": header}, ensure_ascii=False) + "\n")
+            for event in self.events:
+                f.write(json.dumps(event.toDict(), ensure_ascii=False) + "\n")
+
+    def expected(self: "Trace", event: Event) -> str | None:
+        """What applyMapping should end up with, looked up independently"""
+        if event.expect is not UNSET:
+            return event.expect
+        if event.gateway is None:
+            nwInfo = _p.Network(ssid=event.ssid, mac="")
+        else:
+            nwInfo = _p.Network(ssid=event.ssid, mac=event.mac or "")
+        if nwInfo in self.mappings:
+            return self.mappings[nwInfo]
+        return self.mappings.get(_p.Network(ssid=event.ssid, mac=None))
+
+
+def synthetic(count: int, seed: int = 0, flappy: float = 0.1) -> Trace:
+    """`count` reconnects among office, home and public networks, with a
+    `flappy` share of them in bursts of bounces on weak signal"""
+    rng = random.Random(seed)
+    networks = []
+    mappings: dict[_p.Network, str | None] = {}
+    for i in range(40):
+        ssid = f"wifi-{i}" if i < 36 else None  # a few wired networks
+        macs = [
+            ":".join(f"{rng.randrange(256):02x}" for _ in range(6))
+            for _ in range(rng.choice((1, 1, 2, 3)))
+        ]
+        for j, mac in enumerate(macs):
+            networks.append((ssid, f"10.{i}.{j}.1", mac))
+        kind = rng.random()
+        if kind < 0.5:  # mapped per access point
+            for mac in macs:
+                mappings[_p.Network(ssid=ssid, mac=mac)] = f"conf-{i % 12}"
+        elif kind < 0.7 and ssid is not None:  # mapped for the whole SSID
+            mappings[_p.Network(ssid=ssid, mac=None)] = f"conf-{i % 12}"
+        elif kind < 0.8:
+            mappings[_p.Network(ssid=ssid, mac=macs[0])] = None  # no proxy
+        # the rest is unmapped
+    trace = Trace(mappings, [])
+    events = trace.events
+    t = 0.0
+    while len(events) < count:
+        ssid, gateway, mac = rng.choice(networks)
+        bounces = rng.randint(3, 12) if rng.random() < flappy else 1
+        stable = trace.expected(Event(t, 0, ssid, gateway, mac))
+        for _ in range(min(bounces, count - len(events))):
+            jitter = rng.uniform(0.5, 2)
+            delays = tuple(round(d * jitter, 3) for d in DEFAULT_DELAYS)
+            if bounces > 1 and rng.random() < 0.3:
+                # half-connected, still the network it bounces on
+                events.append(
+                    Event(t, rng.uniform(1, 4), None, None, None, delays, stable)
+                )
+            else:
+                events.append(Event(t, rng.uniform(1, 8), ssid, gateway, mac, delays))
+            t = events[-1].up + (rng.uniform(3, 25) if bounces > 1 else 0)
+        t += rng.expovariate(1 / 900)
+    return trace
+
+
+class SimResult(NamedTuple):
+    events: int
+    correct: int  # right proxy in place before the network changed again
+    timeToApply: dict[str, float]  # percentiles of link up to right proxy
+    wrongTime: float  # seconds connected with the wrong proxy
+    writes: int
+    toasts: int
+    simulated: float  # virtual seconds
+    elapsed: float  # wall seconds
+
+    def toDict(self: "SimResult") -> dict[str, Any]:
+        return self._asdict()
+
+    def describe(self: "SimResult") -> str:
+        tta = "  ".join(f"{k} {v * 1000:.0f} ms" for k, v in self.timeToApply.items())
+        return (
+            f"{self.events} events ({self.simulated / 86400:.1f} simulated days)"
+            f" in {self.elapsed:.1f} s\n"
+            f"correct   {self.correct} ({self.correct / self.events:.2%}),"
+            f" {self.wrongTime:.0f} s on a wrong proxy\n"
+            f"apply     {tta}\n"
+            f"writes    {self.writes}, toasts {self.toasts}"
+        )
+
+
+class Simulator:
+    """One replay of a trace; the engine modules are patched while it runs"""
+
+    def __init__(
+        self: "Simulator", trace: Trace, damping: _flap.FlapSettings | None = None
+    ) -> None:
+        self.trace = trace
+        self.damping = damping
+        self.configs = {
+            name: _p.ProxyConfig(
+                proxy=_p.SpecificProxy(host=f"{name}.proxy", port=8080)
+            )
+            for name in set(trace.mappings.values()) - {None}
+        }
+        self.now = 0.0
+        self.enabled = False
+        self.proxy: _p.Proxy | None = None
+        self.writes = 0
+        self.toasts = 0
+        self._index = 0
+        self._expected: str | None = None
+        self._correctAt: float | None = None
+        self._wrongFrom: float | None = None
+        self._wrongTime = 0.0
+        self._correct = 0
+        self._samples: list[float] = []
+
+    # the clock
+
+    def monotonic(self: "Simulator") -> float:
+        return self.now
+
+    def sleep(self: "Simulator", seconds: float) -> None:
+        self._advance(self.now + seconds)
+
+    def tick(self: "Simulator", seconds: float) -> None:
+        """The detection loop's poll; skips ahead while nothing can happen"""
+        target = self.now + seconds
+        event = self._event
+        events = self.trace.events
+        following = events[self._index + 1].t if self._index + 1 < len(events) else None
+        if self.now < event.up:
+            wake = event.up
+        elif _m._held is not None:
+            wake = self.now + max(_m._damper.releaseIn(key) for key in _m._held)
+            wake = wake if following is None else min(wake, following)
+        elif following is not None:
+            wake = following
+        else:
+            _m._active = False  # trace done and the engine is idle
+            return
+        if wake > target:
+            target = self.now + math.ceil(wake - self.now)
+        self._advance(target)
+
+    @property
+    def _event(self: "Simulator") -> Event:
+        return self.trace.events[self._index]
+
+    def _advance(self: "Simulator", to: float) -> None:
+        events = self.trace.events
+        while self._index + 1 < len(events) and events[self._index + 1].t <= to:
+            self._finish(events[self._index + 1].t)
+            self._index += 1
+            self._begin()
+        self.now = to
+
+    # accounting
+
+    def _isCorrect(self: "Simulator") -> bool:
+        if self._expected is None or self._expected not in self.configs:
+            return not self.enabled
+        return self.enabled and self.proxy == self.configs[self._expected].proxy
+
+    def _begin(self: "Simulator") -> None:
+        event = self._event
+        self._expected = self.trace.expected(event)
+        correct = self._isCorrect()
+        self._correctAt = event.up if correct else None
+        self._wrongFrom = None if correct else event.up
+
+    def _finish(self: "Simulator", end: float) -> None:
+        if self._wrongFrom is not None:
+            self._wrongTime += max(end - self._wrongFrom, 0)
+        if self._correctAt is not None:
+            self._correct += 1
+            self._samples.append(self._correctAt - self._event.up)
+
+    def _written(self: "Simulator") -> None:
+        self.writes += 1
+        up = self._event.up
+        if self._isCorrect():
+            if self._correctAt is None:
+                self._correctAt = max(self.now, up)
+            if self._wrongFrom is not None:
+                self._wrongTime += max(self.now - self._wrongFrom, 0)
+                self._wrongFrom = None
+        else:
+            self._correctAt = None
+            if self._wrongFrom is None:
+                self._wrongFrom = max(self.now, up)
+
+    # the machine
+
+    def isConnected(self: "Simulator") -> bool:
+        return self.now >= self._event.up
+
+    def getSSID(self: "Simulator") -> str | None:
+        self.sleep(self._event.delays[0])
+        return self._event.ssid if self.isConnected() else None
+
+    def getGateway(self: "Simulator") -> str | None:
+        self.sleep(self._event.delays[1])
+        return self._event.gateway if self.isConnected() else None
+
+    def getMacAddr(self: "Simulator", _: str) -> str | None:
+        self.sleep(self._event.delays[2])
+        return self._event.mac if self.isConnected() else None
+
+    def apply(self: "Simulator", proxy: _p.Proxy) -> bool:
+        self.proxy = proxy
+        self._written()
+        return True
+
+    def setEnabled(self: "Simulator", enabled: bool) -> None:
+        self.enabled = enabled
+        self._written()
+
+    def getCurrentProxy(self: "Simulator") -> _p.ProxyConfig:
+        if self.proxy is None:
+            raise ValueError("no proxy server set")
+        return _p.ProxyConfig(proxy=self.proxy)
+
+    def toast(self: "Simulator", *_: object) -> None:
+        self.toasts += 1
+
+    def _patch(self: "Simulator") -> None:
+        _m.time = SimpleNamespace(monotonic=self.monotonic, sleep=self.tick)
+        _d.time = _nc.time = SimpleNamespace(monotonic=self.monotonic, sleep=self.sleep)
+        _u.isConnected = self.isConnected
+        _u.getSSID = self.getSSID
+        _u.getGateway = self.getGateway
+        _u.getMacAddr = self.getMacAddr
+        _p.applyInterceptor = self.apply
+        _p.setEnabled = self.setEnabled
+        _p.getEnabled = lambda: self.enabled
+        _p.getCurrentProxy = self.getCurrentProxy
+        _t.toast = self.toast
+        _m._damper = _flap.FlapDamper(self.damping, self.monotonic)
+        _m._held = _m._joined = None
+        _m._active = True
+        _nc.CACHE_FILE = Path(tempfile.mkdtemp(), "network-cache.json")
+        _nc._loaded = True
+        _nc._entries.clear()
+        _nc._pending = None
+        _state.update(
+            configs=self.configs,
+            mappings=dict(self.trace.mappings),
+            references=_m._index(self.trace.mappings),
+            network=None,
+        )
+
+    def run(self: "Simulator") -> SimResult:
+        self._patch()
+        started = time.perf_counter()
+        self.now = self.trace.events[0].t
+        self._begin()
+        _m._networkChangeDetection()
+        self._finish(self.now)
+        elapsed = time.perf_counter() - started
+        samples = sorted(self._samples) or [math.nan]
+        quantiles = statistics.quantiles(samples, n=100) if len(samples) > 1 else []
+        return SimResult(
+            events=len(self.trace.events),
+            correct=self._correct,
+            timeToApply={
+                "p50": statistics.median(samples),
+                "p90": quantiles[89] if quantiles else samples[0],
+                "p99": quantiles[98] if quantiles else samples[0],
+                "max": samples[-1],
+            },
+            wrongTime=self._wrongTime,
+            writes=self.writes,
+            toasts=self.toasts,
+            simulated=self.now - self.trace.events[0].t,
+            elapsed=elapsed,
+        )
+
+
+def quiet(loggers: Iterable[logging.Logger] = (_l._logger,)) -> None:
+    """The engine logs every decision; far too much for a replay"""
+    for logger in loggers:
+        logger.setLevel(logging.ERROR)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("trace", nargs="?", type=Path, help="JSON lines trace")
+    parser.add_argument("--events", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--flappy", type=float, default=0.1, help="share of bouncing reconnects"
+    )
+    parser.add_argument("--save", type=Path, help="write the synthetic trace")
+    parser.add_argument("--no-damping", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    quiet()
+    trace = (
+        Trace.load(args.trace)
+        if args.trace
+        else synthetic(args.events, args.seed, args.flappy)
+    )
+    if args.save:
+        trace.save(args.save)
+    damping = _flap.FlapSettings(suppress=1e12, reuse=1e11) if args.no_damping else None
+    result = Simulator(trace, damping).run()
+    print(json.dumps(result.toDict()) if args.json else result.describe())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,235 @@
+"""Mapping page populate time and memory, two QListWidgets filled item by
+item as the page used to do versus the table model of __models.
+
+Each variant runs in a process of its own on Qt's offscreen platform, fills
+its views with --mappings mappings and shows them. Memory is what the process
+grew by (RSS, Qt's allocations included) and the Python heap tracemalloc saw
+grow. Then it times what the page does afterwards: the list widgets refill
+after every change, the model inserts, removes or changes single rows, diffs
+a reloaded table, and sorts and filters it.
+"""
+
+import argparse
+import ctypes
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+VARIANTS = ("list widgets", "model")
+
+
+def _rss() -> int | None:
+    """Resident memory of this process in bytes, None where unknown"""
+    if os.path.exists("/proc/self/statm"):
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    if sys.platform == "win32":
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", ctypes.c_ulong), ("PageFaultCount", ctypes.c_ulong)] + [
+                (name, ctypes.c_size_t)
+                for name in (
+                    "PeakWorkingSetSize",
+                    "WorkingSetSize",
+                    "QuotaPeakPagedPoolUsage",
+                    "QuotaPagedPoolUsage",
+                    "QuotaPeakNonPagedPoolUsage",
+                    "QuotaNonPagedPoolUsage",
+                    "PagefileUsage",
+                    "PeakPagefileUsage",
+                )
+            ]
+
+        counters = Counters(cb=ctypes.sizeof(Counters))
+        process = ctypes.windll.kernel32.GetCurrentProcess()  # type: ignore
+        if ctypes.windll.psapi.GetProcessMemoryInfo(  # type: ignore
+            process, ctypes.byref(counters), counters.cb
+        ):
+            return counters.WorkingSetSize
+    return None
+
+
+def _mappings(count: int, seed: int) -> dict:
+    from App import __proxy as _p
+
+    rng = random.Random(seed)
+    ret: dict[_p.Network, str | None] = {}
+    for i in range(count):
+        mac = (
+            None
+            if i % 4 == 0
+            else f"02:00:{i >> 16:02x}:{i >> 8 & 255:02x}:{i & 255:02x}:01"
+        )
+        ret[_p.Network(ssid=None if i % 50 == 0 else f"wifi-{i}", mac=mac)] = (
+            None if i % 20 == 0 else f"conf{rng.randrange(200)}"
+        )
+    return ret
+
+
+def _timed(fn: Callable[[], Any], app: Any, rounds: int) -> float:
+    """Median ms of `fn` with the events it posts handled"""
+    times = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        app.processEvents()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times) * 1000
+
+
+def _listWidgets(page: Any, mappings: dict) -> Callable[[], None]:
+    """MappingPage.updateTable before the table model"""
+    from PyQt5.QtWidgets import QListWidget
+
+    from App import __config as _c
+    from App import __models as _mdl
+
+    nwInfoList, configList = QListWidget(page), QListWidget(page)
+    page.layout().addWidget(nwInfoList)
+    page.layout().addWidget(configList)
+
+    def fill() -> None:
+        nwInfoList.clear()
+        configList.clear()
+        for nwInfo, config in mappings.items():
+            nwInfoList.addItem(_c.nwInfoToText(nwInfo))
+            configList.addItem(config or _mdl.MAPPING_UNSET_KW)
+
+    return fill
+
+
+def _table(page: Any) -> tuple[Any, Any, Any]:
+    """The model, filter and view of MappingPage"""
+    from PyQt5.QtCore import Qt
+    from PyQt5.QtWidgets import QAbstractItemView, QHeaderView, QTableView
+
+    from App import __models as _mdl
+
+    model = _mdl.MappingTableModel(page)
+    table = _mdl.TableFilter(model, page)
+    view = QTableView(page)
+    view.setModel(table)
+    view.setSortingEnabled(True)
+    view.sortByColumn(-1, Qt.SortOrder.AscendingOrder)
+    view.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+    view.verticalHeader().hide()
+    view.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+    page.layout().addWidget(view)
+    return model, table, view
+
+
+def _run(variant: str, count: int, seed: int, rounds: int) -> dict[str, Any]:
+    from PyQt5.QtCore import Qt, qInstallMessageHandler
+    from PyQt5.QtWidgets import QApplication, QHBoxLayout, QWidget
+
+    from App import __proxy as _p
+
+    qInstallMessageHandler(lambda *_: None)  # the offscreen platform complains
+    app = QApplication([])
+    mappings = _mappings(count, seed)
+    rng = random.Random(seed)
+    pages = [QWidget(), QWidget()]
+    for page in pages:
+        page.resize(480, 320)
+        QHBoxLayout(page)
+    results: dict[str, Any] = {}
+
+    def populate(page: QWidget) -> Any:
+        if variant == "list widgets":
+            built = _listWidgets(page, mappings)
+            built()
+        else:
+            built = _table(page)
+            built[0].reset(mappings)
+        page.show()
+        app.processEvents()
+        return built
+
+    app.processEvents()
+    rss = _rss()
+    started = time.perf_counter()
+    built = populate(pages[0])
+    results["populate ms"] = (time.perf_counter() - started) * 1000
+    if rss is not None and (now := _rss()) is not None:
+        results["rss MB"] = (now - rss) / 2**20
+    # tracing slows Python down, so it watches a second page being filled
+    tracemalloc.start()
+    populate(pages[1])
+    results["python MB"] = tracemalloc.get_traced_memory()[0] / 2**20
+    tracemalloc.stop()
+    pages[1].hide()
+
+    if variant == "list widgets":
+        results["refill ms"] = _timed(built, app, rounds)
+        return results
+    model, table, view = built
+    column = iter(range(rounds))
+    results["sort ms"] = _timed(
+        lambda: view.sortByColumn(next(column) % 4, Qt.SortOrder.AscendingOrder),
+        app,
+        rounds,
+    )
+    # the changes land in sorted rows
+    view.sortByColumn(2, Qt.SortOrder.AscendingOrder)
+    keys = list(mappings)
+    added = [_p.Network(ssid=f"new-{i}", mac=None) for i in range(rounds)]
+    results["insert ms"] = _timed(lambda: model.put(added.pop(), "conf0"), app, rounds)
+    results["remove ms"] = _timed(
+        lambda: model.discard(keys.pop(rng.randrange(len(keys)))), app, rounds
+    )
+    results["change ms"] = _timed(
+        lambda: model.put(rng.choice(keys), f"conf{rng.randrange(200)}"), app, rounds
+    )
+
+    def reload() -> None:
+        current = {key: model.value(key) for key in model.keys()}
+        for key in rng.sample(keys, len(keys) // 100):
+            current[key] = f"conf{rng.randrange(200)}"
+        model.reset(current)
+
+    results["reset 1% ms"] = _timed(reload, app, rounds)
+    queries = iter(["wifi-1", "wifi-12 conf1", "02:00", "有线", ""] * rounds)
+    results["filter ms"] = _timed(lambda: table.setQuery(next(queries)), app, rounds)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mappings", type=int, default=10_000)
+    parser.add_argument("--rounds", type=int, default=10, help="per timed change")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--run", choices=VARIANTS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        print(json.dumps(_run(args.run, args.mappings, args.seed, args.rounds)))
+        return
+
+    print(f"{args.mappings} mappings")
+    for variant in VARIANTS:
+        out = subprocess.run(
+            [sys.executable, __file__, "--run", variant]
+            + ["--mappings", str(args.mappings), "--rounds", str(args.rounds)]
+            + ["--seed", str(args.seed)],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        results = json.loads(out.splitlines()[-1])
+        print(
+            f"{variant:<13} "
+            + ", ".join(f"{name} {value:.2f}" for name, value in results.items())
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+"""Microbenchmarks of the hot helpers, with JSON results to compare commits.
+
+    python bench/micro.py                       # writes micro-<revision>.json
+    python bench/micro.py --compare micro-abc1234.json
+
+Runs headless on any platform; the probe parsers run on the outputs in
+bench/fixtures.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+from pathlib import Path
+from typing import Any, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __config as _c
+from App import __log as _l
+from App import __proxy as _p
+from App import __store as _store
+from App import __utils as _u
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures"
+REPEAT = 5
+CONFIG_SIZES = (10, 100, 1000)
+
+
+def _configs(count: int) -> dict[str, _p.ProxyConfig]:
+    return {
+        f"conf_{i}": _p.ProxyConfig(
+            proxy=_p.SpecificProxy(
+                proto="socks5" if i % 3 == 0 else "http",
+                host=f"proxy-{i}.example.com",
+                port=1080 + i,
+                noProxyies=["localhost", "<local>", f"*.corp-{i}.example.com"],
+            )
+        )
+        for i in range(count)
+    }
+
+
+def _cases() -> dict[str, Callable[[], Any]]:
+    cases: dict[str, Callable[[], Any]] = {}
+
+    cases["splitURL full"] = lambda: _p.splitURL("socks5://10.20.30.40:1080")
+    cases["splitURL host only"] = lambda: _p.splitURL("proxy.example.com")
+    perScheme = "http=127.0.0.1:7890;https=127.0.0.1:7890;socks=127.0.0.1:7891"
+    cases["parseServer per scheme"] = lambda: _p.parseServer.__wrapped__(perScheme)
+    cases["parseServer cached"] = lambda: _p.parseServer(perScheme)
+
+    nwInfo = _p.Network(ssid="office-5G", mac="74:da:88:4e:02:1f")
+    text = _c.nwInfoToText(nwInfo)
+    cases["nwInfoToText"] = lambda: _c.nwInfoToText(nwInfo)
+    cases["textToNwInfo"] = lambda: _c.textToNwInfo(text)
+    cases["Network.__hash__"] = lambda: hash(nwInfo)
+    mappings = {
+        _p.Network(ssid=f"wifi-{i}", mac=f"02:00:00:00:{i // 256:02x}:{i % 256:02x}"): (
+            f"conf_{i}"
+        )
+        for i in range(1000)
+    }
+    probe = _p.Network(ssid="wifi-500", mac="02:00:00:00:01:f4")
+    assert probe in mappings
+    cases["Network dict lookup (1000)"] = lambda: mappings[probe]
+
+    config = _configs(1)["conf_0"]
+    dumped = config.model_dump()
+    cases["ProxyConfig.model_validate"] = lambda: _p.ProxyConfig.model_validate(dumped)
+    cases["ProxyConfig.model_dump"] = config.model_dump
+
+    cases["macAddrValidate valid"] = lambda: _u.macAddrValidate("74-DA-88-4E-02-1F")
+    cases["macAddrValidate invalid"] = lambda: _u.macAddrValidate("incomplete")
+
+    netshEn = (FIXTURES / "netsh_wlan_en.txt").read_bytes()
+    netshZh = (FIXTURES / "netsh_wlan_zh.txt").read_bytes()
+    route = (FIXTURES / "route_print.txt").read_text("cp437")
+    arp = (FIXTURES / "arp.txt").read_text("cp437")
+    ipRoute = (FIXTURES / "ip_route.txt").read_text("utf-8")
+    textEn, textZh = _u.decodeNetsh(netshEn), _u.decodeNetsh(netshZh)
+    assert _u.parseSSID(textEn) == "office-5G"
+    assert _u.parseSSID(textZh) == "公司网络"
+    assert _u.parseRoute(route) == "192.168.1.1"
+    assert _u.parseArp(arp) == "74:da:88:4e:02:1f"
+    assert _u.parseIpRoute(ipRoute) == "192.168.1.1"
+    cases["decodeNetsh en"] = lambda: _u.decodeNetsh(netshEn)
+    cases["decodeNetsh zh"] = lambda: _u.decodeNetsh(netshZh)
+    cases["parseSSID en"] = lambda: _u.parseSSID(textEn)
+    cases["parseSSID zh"] = lambda: _u.parseSSID(textZh)
+    cases["parseRoute"] = lambda: _u.parseRoute(route)
+    cases["parseArp"] = lambda: _u.parseArp(arp)
+    cases["parseIpRoute"] = lambda: _u.parseIpRoute(ipRoute)
+
+    for size in CONFIG_SIZES:
+        cases[f"save {size} configs"] = lambda size=size: _saveLoad(size, load=False)
+        cases[f"load {size} configs"] = lambda size=size: _saveLoad(size, load=True)
+    return cases
+
+
+def _saveLoad(size: int, load: bool) -> None:
+    """Point the config at a file holding `size` configs, then save or load"""
+    if _c.SAVE_FILE != (path := _tmp / f"config-{size}.json"):
+        _c.SAVE_FILE = path
+        _c._state.update(configs=_configs(size))
+        _c.save()
+    if load:
+        _c.load()
+    else:
+        _c.save()
+
+
+def _measure(fn: Callable[[], Any]) -> dict[str, Any]:
+    timer = timeit.Timer(fn)
+    loops, _ = timer.autorange()
+    times = [t / loops * 1e9 for t in timer.repeat(REPEAT, loops)]
+    return {
+        "nsPerOp": round(min(times), 1),
+        "median": round(statistics.median(times), 1),
+        "loops": loops,
+        "repeat": REPEAT,
+    }
+
+
+def _revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _format(ns: float) -> str:
+    for unit, scale in (("s", 1e9), ("ms", 1e6), ("µs", 1e3)):
+        if ns >= scale:
+            return f"{ns / scale:.2f} {unit}"
+    return f"{ns:.0f} ns"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--filter", help="only cases containing this text")
+    parser.add_argument("--out", type=Path, help="default micro-<revision>.json")
+    parser.add_argument("--compare", type=Path, help="earlier results to compare")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.2,
+        help="slowdown that counts as a regression, 0.2 = 20%%",
+    )
+    args = parser.parse_args()
+    _l._logger.setLevel(logging.WARNING)
+    _store.STORE_FILE = _tmp / "config.db"
+    baseline = (
+        json.loads(args.compare.read_text("utf-8"))["results"] if args.compare else {}
+    )
+
+    results = {}
+    regressions = []
+    for name, fn in _cases().items():
+        if args.filter and args.filter not in name:
+            continue
+        r = results[name] = _measure(fn)
+        line = f"{name:<30} {_format(r['nsPerOp']):>10}"
+        if (before := baseline.get(name)) is not None:
+            ratio = r["nsPerOp"] / before["nsPerOp"]
+            line += f" {_format(before['nsPerOp']):>10} {ratio:>6.2f}x"
+            if ratio > 1 + args.threshold:
+                regressions.append(name)
+                line += "  slower"
+        print(line, flush=True)
+
+    revision = _revision()
+    out = args.out or Path(f"micro-{revision or 'local'}.json")
+    out.write_text(
+        json.dumps(
+            {
+                "revision": revision,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            },
+            indent=4,
+            ensure_ascii=False,
+        ),
+        encoding="utf-8",
+    )
+    print(f"results written to {out}")
+    if regressions:
+        print(f"{len(regressions)} regressions: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+_tmp = Path(tempfile.mkdtemp())
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __flap as _flap
+from App import __mapping as _m
+from App import __netcache as _nc
+from App import __proxy as _p
+from App import __state as _state
+from App import __toast as _t
+from App import __utils as _u
+
+# seconds the probes take on a typical laptop
+SSID_DELAY = 0.08
+GATEWAY_DELAY = 0.05
+ARP_DELAY = 0.35
+
+NETWORKS = {
+    "home": _p.Network(ssid="home", mac="aa:aa:aa:aa:aa:aa"),
+    "office": _p.Network(ssid="office", mac="bb:bb:bb:bb:bb:bb"),
+    "guest": _p.Network(ssid="office", mac="dd:dd:dd:dd:dd:dd"),
+    "cafe": _p.Network(ssid="cafe", mac="cc:cc:cc:cc:cc:cc"),
+}
+MAPPINGS = {
+    NETWORKS["home"]: "home",
+    NETWORKS["office"]: "office",
+    NETWORKS["guest"]: "guest",
+}
+TRACE = ["home", "office", "home", "cafe", "office", "home", "guest", "office", "cafe"]
+
+
+class _Machine:
+    """The system proxy settings and the network the probes see"""
+
+    def __init__(self: "_Machine") -> None:
+        self.network = NETWORKS["home"]
+        self.enabled = False
+        self.proxy: _p.Proxy | None = None
+        self.writes = 0
+
+    def ssid(self: "_Machine") -> str | None:
+        time.sleep(SSID_DELAY)
+        return self.network.ssid
+
+    def gateway(self: "_Machine") -> str | None:
+        time.sleep(GATEWAY_DELAY)
+        return "192.168.1.1"
+
+    def mac(self: "_Machine", _: str) -> str | None:
+        time.sleep(ARP_DELAY)
+        return self.network.mac
+
+    def apply(self: "_Machine", proxy: _p.Proxy) -> bool:
+        self.proxy = proxy
+        self.writes += 1
+        return True
+
+    def setEnabled(self: "_Machine", enabled: bool) -> None:
+        self.enabled = enabled
+        self.writes += 1
+
+    def current(self: "_Machine") -> _p.ProxyConfig:
+        if self.proxy is None:
+            raise ValueError("no proxy server set")
+        return _p.ProxyConfig(proxy=self.proxy)
+
+
+def main() -> None:
+    machine = _Machine()
+    _nc.CACHE_FILE = Path(tempfile.mkdtemp(), "network-cache.json")
+    _u.getSSID = machine.ssid
+    _u.getGateway = machine.gateway
+    _u.getMacAddr = machine.mac
+    _p.applyInterceptor = machine.apply
+    _p.setEnabled = machine.setEnabled
+    _p.getEnabled = lambda: machine.enabled
+    _p.getCurrentProxy = machine.current
+    _t.toast = lambda *_: None
+    # the trace visits networks seconds apart, which damping would hold back
+    _m._damper = _flap.FlapDamper(_flap.FlapSettings(suppress=1e12, reuse=1e11))
+    configs = {
+        name: _p.ProxyConfig(proxy=_p.SpecificProxy(host=f"{name}.proxy", port=8080))
+        for name in ("home", "office", "guest")
+    }
+    _state.update(
+        configs=configs,
+        mappings=dict(MAPPINGS),
+        references=_m._index(MAPPINGS),
+        network=None,
+    )
+
+    print(f"{'network':<8} {'decision':<9} {'cache':<6} {'correct':>9} {'lookup':>9}")
+    for name in TRACE:
+        machine.network = NETWORKS[name]
+        before = _nc.stats()
+        _m._reconnected()
+        after = _nc.stats()
+        outcome = (
+            "hit"
+            if after.hits > before.hits
+            else "wrong" if after.wrong > before.wrong else "miss"
+        )
+        expected = MAPPINGS.get(machine.network)
+        proxy = configs[expected].proxy if expected else None
+        assert machine.enabled == (proxy is not None)
+        assert proxy is None or machine.proxy == proxy
+        print(
+            f"{name:<8} {expected or 'direct':<9} {outcome:<6}"
+            f" {_nc._correctSamples[-1] * 1000:>6.0f} ms"
+            f" {_nc._confirmSamples[-1] * 1000:>6.0f} ms"
+        )
+    print(_nc.stats().describe())
+    print(f"registry writes {machine.writes}")
+
+
+if __name__ == "__main__":
+    main()
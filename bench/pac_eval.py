@@ -0,0 +1,101 @@
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __pacjs as _js
+
+DOMAINS = 300
+LOOKUPS = 50_000
+COLD = 1_000
+
+
+class _FixedResolver(_js.Resolver):
+    """Keeps the numbers about the evaluator, not the local DNS"""
+
+    def lookup(self: "_FixedResolver", host: str) -> str | None:
+        return "10.1.2.3" if host.endswith(".corp.example") else "93.184.216.34"
+
+
+def _source(rng: random.Random, n: int) -> str:
+    """A corporate style PAC file: domain list, networks, a few globs"""
+    domains = ",\n".join(f'  "d{i}.example"' for i in rng.sample(range(n * 10), n))
+    return f"""
+var DIRECT_DOMAINS = [
+{domains}
+];
+
+function FindProxyForURL(url, host) {{
+  host = host.toLowerCase();
+  if (isPlainHostName(host) || dnsDomainIs(host, ".corp.example"))
+    return "DIRECT";
+  if (shExpMatch(host, "*.cdn*.example.net") || shExpMatch(url, "ftp:*"))
+    return "PROXY cdn-proxy:3128; DIRECT";
+  for (var i = 0; i < DIRECT_DOMAINS.length; i++) {{
+    if (dnsDomainIs(host, DIRECT_DOMAINS[i])) return "DIRECT";
+  }}
+  var ip = dnsResolve(host);
+  if (ip && (isInNet(ip, "10.0.0.0", "255.0.0.0") ||
+             isInNet(ip, "192.168.0.0", "255.255.0.0")))
+    return "DIRECT";
+  return "PROXY proxy1:8080; PROXY proxy2:8080; SOCKS5 proxy3:1080";
+}}
+"""
+
+
+def _urls(rng: random.Random, n: int) -> list[str]:
+    urls = []
+    for _ in range(n):
+        kind = rng.random()
+        if kind < 0.3:
+            host = f"www.d{rng.randrange(DOMAINS * 2)}.example"
+        elif kind < 0.5:
+            host = f"app{rng.randrange(50)}.corp.example"
+        elif kind < 0.6:
+            host = f"intranet{rng.randrange(10)}"
+        elif kind < 0.7:
+            host = f"a.cdn{rng.randrange(9)}.example.net"
+        else:
+            host = f"site{rng.randrange(2000)}.example.com"
+        urls.append(f"https://{host}/path?q={rng.randrange(1000)}")
+    return urls
+
+
+def main() -> None:
+    rng = random.Random(36)
+    source = _source(rng, DOMAINS)
+    urls = _urls(rng, LOOKUPS)
+
+    start = time.perf_counter()
+    script = _js.PacScript(source, _FixedResolver())
+    compiled = time.perf_counter() - start
+
+    # clearing the memo before each call keeps it out of the cold numbers
+    cold = _js.PacScript(source, _FixedResolver())
+    sample = urls[:COLD]
+    start = time.perf_counter()
+    for url in sample:
+        cold._memo.clear()
+        cold.findProxy(url)
+    coldTime = time.perf_counter() - start
+
+    # a browser asks about the same few thousand hosts over and over
+    for url in urls:
+        script.findProxy(url)
+    start = time.perf_counter()
+    results = [script.findProxy(url) for url in urls]
+    memoTime = time.perf_counter() - start
+
+    direct = sum(_js.parseResult(r) == ["DIRECT"] for r in results)
+    print(f"source         {len(source):,} chars, {DOMAINS} domains")
+    print(f"compile        {compiled * 1000:.1f} ms")
+    print(f"cold eval      {len(sample) / coldTime:,.0f} /s")
+    print(f"memoized eval  {len(urls) / memoTime:,.0f} /s")
+    print(f"memo           {script.hits} hits, {script.misses} misses")
+    print(f"direct         {direct} of {len(urls)}")
+
+
+if __name__ == "__main__":
+    main()
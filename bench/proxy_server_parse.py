@@ -0,0 +1,29 @@
+"""Time parseServer on a per-scheme ProxyServer value, with and without its cache."""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __proxy as _p
+
+VALUE = "http=127.0.0.1:7890;https=127.0.0.1:7890;socks=127.0.0.1:7891"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=10_000, help="calls to time")
+    number = parser.parse_args().number
+    _p.parseServer.cache_clear()
+    uncached = timeit.timeit(lambda: _p.parseServer.__wrapped__(VALUE), number=number)
+    cached = timeit.timeit(lambda: _p.parseServer(VALUE), number=number)
+    print(
+        f"parseServer: {uncached / number * 1e6:.2f} µs, cached"
+        f" {cached / number * 1e6:.2f} µs; {_p.parseServer.cache_info()}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Apply path and proxy watcher against the in-memory registry (__memreg)"""
+
+import logging
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __log as _l
+from App import __memreg as _mr
+from App import __proxy as _p
+
+APPLIES = 20_000
+TOGGLES = 500
+
+
+def _applies(proxies: list[_p.SpecificProxy], count: int) -> float:
+    started = time.perf_counter()
+    for i in range(count):
+        proxies[i % len(proxies)].apply()
+    return time.perf_counter() - started
+
+
+def main() -> None:
+    if _p.reg.RegKey is not _mr.RegKey:
+        sys.exit("needs the in-memory registry, i.e. not Windows")
+    _l._logger.setLevel(logging.WARNING)
+    _mr.seed(
+        _p.PROXY_ENTRY,
+        {
+            _p.PROXY_ENABLED_ENTRY: 0,
+            _p.PROXY_SERVER_ENTRY: "http://127.0.0.1:8080",
+            _p.PROXY_OVERRIDE_ENTRY: "<local>",
+        },
+    )
+    hosts: list[str] = []
+    toggles = threading.Semaphore(0)
+    _p.hostCallback = hosts.append
+    _p.enabledCallback = lambda _: toggles.release()
+    proxies = [
+        _p.SpecificProxy(host=f"proxy-{i}.example", port=8080, noProxyies=["<local>"])
+        for i in range(4)
+    ]
+    _p.start()
+
+    print(f"{'':<24} {'applies/s':>10} {'writes':>8} {'wakes':>8} {'callbacks':>10}")
+    for name, latency in (("in memory", None), ("1 ms per write", 0.001)):
+        _mr.setLatency("set", latency)
+        before = _mr.stats()
+        count = APPLIES if latency is None else APPLIES // 50
+        hosts.clear()
+        elapsed = _applies(proxies, count)
+        time.sleep(0.2)  # let the watcher catch up
+        after = _mr.stats()
+        print(
+            f"{name:<24} {count / elapsed:>10.0f}"
+            f" {after.calls['set'] - before.calls['set']:>8}"
+            f" {after.notifications - before.notifications:>8}"
+            f" {len(hosts):>10}"
+        )
+    _mr.setLatency("set", None)
+
+    _mr.resetStats()  # only the wake latency of single changes from here on
+    for i in range(TOGGLES):
+        while not _mr.waiters(_p.PROXY_ENTRY):  # or the change goes unnoticed
+            time.sleep(0.0001)
+        _p.setEnabled(i % 2 == 0)
+        toggles.acquire(timeout=1)
+    stats = _mr.stats()
+    print(
+        f"{TOGGLES} toggles, {stats.notifications} wakes,"
+        f" median wake latency {stats.wakeLatency * 1e6:.0f} µs"  # type: ignore
+    )
+    _p.stop()
+
+
+if __name__ == "__main__":
+    main()
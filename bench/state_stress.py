@@ -0,0 +1,162 @@
+import argparse
+import random
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __config as _c
+from App import __mapping as _m
+from App import __proxy as _p
+from App import __state as _state
+
+DURATION = 3.0
+READERS = 6
+STABLE = 50  # configs the writers never touch, one of them is active
+PAIRS = 200  # pair_a_i and pair_b_i are always published together
+
+
+def _config(i: int) -> _p.ProxyConfig:
+    return _p.ProxyConfig(proxy=_p.SpecificProxy(host=f"10.0.0.{i % 250}", port=i))
+
+
+def _network(i: int) -> _p.Network:
+    return _p.Network(ssid=f"ssid{i % 40}", mac=None if i % 3 else f"mac{i}")
+
+
+class _Counters:
+    def __init__(self: "_Counters") -> None:
+        self.reads = 0
+        self.writes = 0
+        self.notified = 0
+        self.skipped = 0
+
+
+def _reader(stop: threading.Event, n: _Counters, seed: int) -> None:
+    rng = random.Random(seed)
+    while not stop.is_set():
+        snap = _state.current()
+        snap.configs.get(snap.active or "")
+        sum(1 for k in snap.configs if k.startswith("pair_"))
+        for nwInfo, confName in snap.mappings.items():
+            if confName is None:
+                break
+        _m._lookup(_network(rng.randrange(1000)), snap)
+        n.reads += 1
+
+
+def _configWriter(stop: threading.Event, n: _Counters) -> None:
+    rng = random.Random(1)
+    while not stop.is_set():
+        i = rng.randrange(PAIRS)
+        present = f"pair_a_{i}" in _c.configs()
+        proxy = None if present else _config(i)
+        _c.updateProxies({f"pair_a_{i}": proxy, f"pair_b_{i}": proxy})
+        n.writes += 1
+
+
+def _otherWriter(stop: threading.Event, n: _Counters) -> None:
+    rng = random.Random(2)
+    while not stop.is_set():
+        kind = rng.randrange(3)
+        if kind == 0:
+            # switching without the registry write of setCurrentProxy
+            key = f"stable_{rng.randrange(STABLE)}"
+            _state.modify(lambda s: {"active": key})
+        elif kind == 1:
+            nwInfo = _network(rng.randrange(1000))
+            if rng.random() < 0.5:
+                _m.addMapping(nwInfo, f"stable_{rng.randrange(STABLE)}")
+            else:
+                _m.removeMapping(nwInfo)
+        else:
+            _state.update(network=_network(rng.randrange(1000)))
+        n.writes += 1
+
+
+def _watcher(stop: threading.Event, n: _Counters) -> None:
+    seen = _state.version()
+    while not stop.is_set():
+        snap = _state.wait(seen, 0.1)
+        if snap.version > seen:
+            n.notified += 1
+            n.skipped += snap.version - seen - 1
+            seen = snap.version
+
+
+def _inPlace(duration: float) -> int:
+    """The same iterate-while-mutating pattern on a shared plain dict"""
+    shared = {_network(i): "x" for i in range(500)}
+    stop = threading.Event()
+    errors = 0
+
+    def mutate() -> None:
+        rng = random.Random(3)
+        while not stop.is_set():
+            nwInfo = _network(rng.randrange(1000))
+            if nwInfo in shared:
+                del shared[nwInfo]
+            else:
+                shared[nwInfo] = "x"
+
+    writer = threading.Thread(target=mutate)
+    writer.start()
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        try:
+            for _ in shared.items():
+                pass
+        except RuntimeError:
+            errors += 1
+    stop.set()
+    writer.join()
+    return errors
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Readers of the state snapshot against concurrent writers"
+    )
+    parser.add_argument(
+        "duration", type=float, nargs="?", default=DURATION, help="seconds"
+    )
+    duration = parser.parse_args().duration
+    # keep the numbers about the state, not the disk or the registry
+    _c._persist = lambda *_: None  # type: ignore
+    _m._saveConfig = lambda *_: None  # type: ignore
+    _state.update(
+        configs={f"stable_{i}": _config(i) for i in range(STABLE)},
+        active="stable_0",
+        mappings={},
+        network=None,
+    )
+    n = _Counters()
+    stop = threading.Event()
+    threads = [
+        threading.Thread(target=_reader, args=(stop, n, i)) for i in range(READERS)
+    ]
+    threads += [
+        threading.Thread(target=_configWriter, args=(stop, n)),
+        threading.Thread(target=_otherWriter, args=(stop, n)),
+        threading.Thread(target=_watcher, args=(stop, n)),
+    ]
+    start = _state.version()
+    for t in threads:
+        t.start()
+    time.sleep(duration)
+    stop.set()
+    for t in threads:
+        t.join()
+    versions = _state.version() - start
+
+    print(f"threads      {READERS} readers, 2 writers, 1 watcher, {duration:.0f} s")
+    print(f"reads        {n.reads / duration:,.0f} /s")
+    print(f"writes       {n.writes / duration:,.0f} /s, {versions} versions")
+    print(f"watcher      {n.notified} wakeups, {n.skipped} versions coalesced")
+    print(f"in-place     {_inPlace(1.0)} iteration errors in 1 s on a shared dict")
+
+
+if __name__ == "__main__":
+    main()
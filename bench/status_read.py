@@ -0,0 +1,69 @@
+"""Status page read throughput while another process keeps writing it.
+
+Every read is checked for a torn record, one whose key and port were written
+by different updates.
+"""
+
+import argparse
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __status as _st
+
+PAGE_FILE = Path(tempfile.gettempdir(), "proxy-control-bench.status")
+
+
+def _writer(stop, writes) -> None:
+    page = _st.StatusPage(PAGE_FILE)
+    n = 0
+    while not stop.is_set():
+        n += 1
+        # key and port always carry the same counter, so a torn read shows up
+        page.update(enabled=n & 1 == 1, key=f"cfg{n & 0xFFFF}", port=n & 0xFFFF)
+        # far above any real switch rate, still leaves readers room to finish
+        time.sleep(0.0005)
+    writes.value = n
+    page.close()
+
+
+def main(seconds: float = 2.0) -> None:
+    _st.StatusPage(PAGE_FILE).close()
+    stop = multiprocessing.Event()
+    writes = multiprocessing.Value("Q", 0)
+    proc = multiprocessing.Process(target=_writer, args=(stop, writes))
+    proc.start()
+    time.sleep(0.5)
+    with _st.StatusReader(PAGE_FILE) as reader:
+        reads = torn = failed = 0
+        start = time.perf_counter()
+        end = start + seconds
+        while time.perf_counter() < end:
+            for _ in range(1000):
+                status = reader.read()
+                if status is None:
+                    failed += 1
+                elif status.port and status.key != f"cfg{status.port}":
+                    torn += 1
+            reads += 1000
+        elapsed = time.perf_counter() - start
+    stop.set()
+    proc.join()
+    PAGE_FILE.unlink(missing_ok=True)
+    print(
+        f"{reads / elapsed:,.0f} reads/s while another process wrote"
+        f" {writes.value / (elapsed + 0.5):,.0f} updates/s,"
+        f" {torn} torn, {failed} gave up retrying"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "seconds", type=float, nargs="?", default=2.0, help="how long to read"
+    )
+    main(parser.parse_args().seconds)
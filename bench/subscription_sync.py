@@ -0,0 +1,136 @@
+import hashlib
+import http.server
+import json
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __config as _c
+from App import __state as _state
+from App import __subscription as _sub
+
+ENTRIES = 5_000
+CHANGES = 50
+
+
+def _entries(rng: random.Random, n: int) -> list[dict]:
+    return [
+        {
+            "name": f"node-{i:05d}",
+            "type": rng.choice(["http", "socks5", "http"]),
+            "server": f"10.{i >> 8 & 255}.{i & 255}.{rng.randrange(1, 255)}",
+            "port": rng.choice([1080, 3128, 8080]),
+        }
+        for i in range(n)
+    ]
+
+
+def _yaml(entries: list[dict]) -> str:
+    lines = ["mixed-port: 7890", "proxies:"]
+    for i, e in enumerate(entries):
+        if i % 2:
+            lines.append(
+                f"  - {{name: \"{e['name']}\", type: {e['type']},"
+                f" server: {e['server']}, port: {e['port']}}}"
+            )
+        else:
+            lines += [
+                f"  - name: \"{e['name']}\"  # comment",
+                f"    type: {e['type']}",
+                f"    server: {e['server']}",
+                f"    port: {e['port']}",
+                "    skip-cert-verify: true",
+                "    ws-opts:",
+                "      path: /",
+            ]
+    lines += ["proxy-groups:", "  - name: auto", "    type: url-test"]
+    return "\n".join(lines) + "\n"
+
+
+class _Server(http.server.BaseHTTPRequestHandler):
+    bodies: dict[str, bytes] = {}
+    hits = {"200": 0, "304": 0}
+
+    def do_GET(self) -> None:
+        body = self.bodies[self.path]
+        etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.hits["304"] += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.hits["200"] += 1
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+def _step(label: str, saves: list[int]) -> None:
+    before = saves[0]
+    start = time.perf_counter()
+    results = _sub.refresh()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<10} {elapsed * 1000:.0f} ms, {saves[0] - before} save(s)")
+    for name, r in results.items():
+        print(f"  {name:<8} {r.describe()}")
+
+
+def main() -> None:
+    rng = random.Random(37)
+    entries = _entries(rng, ENTRIES)
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _Server)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+
+    def publish(entries: list[dict]) -> None:
+        _Server.bodies["/list.json"] = json.dumps(entries).encode("utf-8")
+        _Server.bodies["/clash.yaml"] = _yaml(entries).encode("utf-8")
+
+    _c.SAVE_FILE = Path(tempfile.mkdtemp(), "config.json")
+    _state.update(configs={})
+    _c.generalConfig = {
+        _sub.SUBSCRIPTIONS_ENTRY: [
+            {"name": "json", "url": f"{base}/list.json"},
+            {"name": "yaml", "url": f"{base}/clash.yaml"},
+        ]
+    }
+    saves = [0]
+    save = _c.save
+
+    def countingSave() -> None:
+        saves[0] += 1
+        save()
+
+    _c.save = countingSave
+
+    publish(entries)
+    size = len(_Server.bodies["/list.json"])
+    print(f"entries    {ENTRIES} per list, {size:,} bytes of json")
+    _step("initial", saves)
+    _step("unchanged", saves)
+    changed = entries[CHANGES:]
+    for e in rng.sample(changed, CHANGES):
+        e["port"] += 1
+    changed += _entries(random.Random(1), CHANGES * 2)[-CHANGES:]
+    for e in changed[-CHANGES:]:
+        e["name"] = f"new-{e['name']}"
+    publish(changed)
+    _step("changed", saves)
+    _step("unchanged", saves)
+    print(f"configs    {len(_c.configs())}")
+    print(f"server     {_Server.hits['200']} full, {_Server.hits['304']} not modified")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""Rapid switching through setCurrentProxy and setEnabled against the
+in-memory registry, with the proxy watcher running and its callbacks wired
+the way the tray wires them: a thread per callback, each updating the
+UiStore that a GUI thread flushes (--tray store). --tray debounce is the
+tray before the store, with a sleeping 200 ms debounce on the tooltip, and
+--tray direct renders from every callback.
+
+For each rate it reports updates the callbacks never saw, updates they saw
+out of order, the state they settled on, callback latency, tooltip and icon
+renders, the peak thread count and memory growth. The switch schedule comes
+from --seed, and the report is written as JSON with everything needed to
+rerun it.
+"""
+
+import argparse
+import gc
+import json
+import logging
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Literal
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from App import __config as _c
+from App import __debounce as _deb
+from App import __log as _l
+from App import __memreg as _mr
+from App import __proxy as _p
+from App import __state as _state
+from App import __uistate as _ui
+
+SETTLE = 1.0  # seconds to wait for callbacks after the last switch
+
+
+TrayMode = Literal["store", "debounce", "direct"]
+TRAY_MODES: list[TrayMode] = ["store", "debounce", "direct"]
+INITIAL = _ui.UiState(
+    enabled=True,
+    configKey=None,
+    proto="http",
+    followGateway=False,
+    host="",
+    port=0,
+    noProxy=(),
+    windowLight=True,
+    tbLight=True,
+)
+
+
+class _Tray:
+    """The tray's callbacks and views from __gui, without Qt"""
+
+    def __init__(self: "_Tray", mode: TrayMode) -> None:
+        self.mode = mode
+        self.lock = threading.Lock()
+        self.state = INITIAL  # unless mode is store, set from every thread
+        self._wake = threading.Event()
+        self.store = _ui.UiStore(INITIAL, self._wake.set)
+        self.tooltip: str | None = None
+        self.tooltips = 0
+        self.icons = 0
+        self.hosts: list[tuple[float, str]] = []  # when each host arrived
+        self._running = True
+        self._gui = threading.Thread(target=self._loop, daemon=True)
+        if mode == "store":
+            self.store.watch("tooltip", lambda ui: ui.tooltip, self.setToolTip)
+            self.store.watch("icon", lambda ui: (ui.enabled, ui.tbLight), self.setIcon)
+            self._gui.start()
+
+    def _loop(self: "_Tray") -> None:
+        """The GUI thread: one flush per pass of the event loop"""
+        while self._running:
+            if self._wake.wait(0.1):
+                self._wake.clear()
+                self.store.flush()
+
+    def close(self: "_Tray") -> None:
+        self._running = False
+        if self._gui.is_alive():
+            self._gui.join()
+
+    def current(self: "_Tray") -> _ui.UiState:
+        return self.store.current() if self.mode == "store" else self.state
+
+    @_deb.debounce(200)
+    def _debouncedTooltip(self: "_Tray") -> str:
+        return self.state.tooltip
+
+    def setToolTip(self: "_Tray", text: str | None) -> None:
+        self.tooltips += 1
+        self.tooltip = text
+
+    def setIcon(self: "_Tray", icon: tuple[bool, bool]) -> None:
+        self.icons += 1
+
+    def report(self: "_Tray", **fields: Any) -> None:
+        if self.mode == "store":
+            self.store.update(**fields)
+            return
+        self.state = self.state._replace(**fields)
+        if "enabled" in fields:
+            self.setIcon((self.state.enabled, self.state.tbLight))
+        if self.mode == "debounce":
+            self.setToolTip(self._debouncedTooltip())
+        else:
+            self.setToolTip(self.state.tooltip)
+
+    def enabledCallback(self: "_Tray", enabled: bool) -> None:
+        self.report(enabled=enabled)
+
+    def protoCallback(self: "_Tray", proto: str) -> None:
+        self.report(proto=proto)
+
+    def hostCallback(self: "_Tray", host: str) -> None:
+        with self.lock:
+            self.hosts.append((time.perf_counter(), host))
+        self.report(host=host)
+
+    def portCallback(self: "_Tray", port: int) -> None:
+        self.report(port=port)
+
+    def noProxyCallback(self: "_Tray", noProxy: list[str]) -> None:
+        self.report(noProxy=tuple(noProxy))
+
+    def configSetCallback(self: "_Tray", key: str) -> None:
+        self.report(configKey=key)
+
+
+def _schedule(rng: random.Random, count: int, configs: int) -> list[Any]:
+    """Config indices to switch to, with a True/False toggle every so often"""
+    steps: list[Any] = []
+    enabled = True
+    for i in range(count):
+        if rng.random() < 0.2:
+            enabled = not enabled
+            steps.append(enabled)
+        else:
+            steps.append(i % configs)
+    return steps
+
+
+def _run(rate: int, duration: float, seed: int, mode: TrayMode) -> dict[str, Any]:
+    count = int(rate * duration)
+    configs = {
+        f"c{i}": _p.ProxyConfig(
+            proxy=_p.SpecificProxy(host=f"h{i}.example", port=1000 + i % 5000)
+        )
+        for i in range(count)
+    }
+    _state.update(configs=configs, active=None)
+    tray = _Tray(mode)
+    _p.enabledCallback = tray.enabledCallback
+    _p.protoCallback = tray.protoCallback
+    _p.hostCallback = tray.hostCallback
+    _p.portCallback = tray.portCallback
+    _p.noProxyiesCallback = tray.noProxyCallback
+    _c.configSetCallback = tray.configSetCallback
+    steps = _schedule(random.Random(seed), count, len(configs))
+
+    peak = threading.active_count()
+    sampling = True
+
+    def sample() -> None:
+        nonlocal peak
+        while sampling:
+            peak = max(peak, threading.active_count())
+            time.sleep(0.001)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    gc.collect()
+    memBefore = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    statsBefore = _mr.stats()
+    sampler.start()
+
+    written: dict[str, float] = {}  # host -> when it was written
+    order: list[str] = []
+    started = time.perf_counter()
+    for i, step in enumerate(steps):
+        if (delay := started + i / rate - time.perf_counter()) > 0:
+            time.sleep(delay)
+        if isinstance(step, bool):
+            _p.setEnabled(step)
+        else:
+            host = f"h{step}.example"
+            written[host] = time.perf_counter()
+            order.append(host)
+            _c.setCurrentProxy(f"c{step}")
+    elapsed = time.perf_counter() - started
+    time.sleep(SETTLE)
+    sampling = False
+    sampler.join()
+    tray.close()
+    gc.collect()
+    memAfter, memPeak = tracemalloc.get_traced_memory()
+    statsAfter = _mr.stats()
+
+    truth = _p.getCurrentProxy().proxy
+    index = {host: i for i, host in enumerate(order)}
+    latencies = [t - written[h] for t, h in tray.hosts if h in written]
+    reordered = 0
+    newest = -1
+    for _, host in tray.hosts:
+        if index.get(host, -1) < newest:
+            reordered += 1
+        newest = max(newest, index.get(host, -1))
+    shown = tray.current()
+    expected = shown._replace(
+        enabled=_p.getEnabled(),
+        configKey=_state.current().active,
+        proto=truth.proto,
+        host=truth.host,  # type: ignore
+        port=truth.port,
+    )
+    final = {
+        "enabled": shown.enabled == expected.enabled,
+        "host": shown.host == expected.host,
+        "port": shown.port == expected.port,
+        "config": shown.configKey == expected.configKey,
+        "tooltip": tray.tooltip == expected.tooltip,
+    }
+    return {
+        "rate": rate,
+        "achieved": round(len(steps) / elapsed, 1),
+        "switches": len(order),
+        "toggles": len(steps) - len(order),
+        "registryWrites": statsAfter.calls["set"] - statsBefore.calls["set"],
+        "watcherWakes": statsAfter.notifications - statsBefore.notifications,
+        "hostsSeen": len({h for _, h in tray.hosts}),
+        "hostsLost": len(order) - len({h for _, h in tray.hosts}),
+        "reordered": reordered,
+        "finalState": final,
+        "stale": [k for k, ok in final.items() if not ok],
+        "tooltips": tray.tooltips,
+        "icons": tray.icons,
+        "ui": tray.store.stats().toDict() if mode == "store" else None,
+        "latencyMs": {
+            "p50": round(statistics.median(latencies) * 1000, 2) if latencies else None,
+            "p99": (
+                round(statistics.quantiles(latencies, n=100)[98] * 1000, 2)
+                if len(latencies) > 1
+                else None
+            ),
+            "max": round(max(latencies) * 1000, 2) if latencies else None,
+        },
+        "threadPeak": peak,
+        "memoryGrowthKiB": round((memAfter - memBefore) / 1024, 1),
+        "memoryPeakKiB": round(memPeak / 1024, 1),
+    }
+
+
+def _revision() -> str | None:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            stderr=subprocess.DEVNULL,
+            text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--rates", type=int, nargs="+", default=[10, 50, 200], help="switches/s"
+    )
+    parser.add_argument("--duration", type=float, default=3, help="seconds per rate")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--tray",
+        choices=TRAY_MODES,
+        default=TRAY_MODES[0],
+        help="how the callbacks reach the tooltip, see above",
+    )
+    parser.add_argument(
+        "--report", type=Path, default=Path("switch-stress.json"), help="JSON report"
+    )
+    args = parser.parse_args()
+    if _p.reg.RegKey is not _mr.RegKey:
+        sys.exit("needs the in-memory registry, i.e. not Windows")
+    _l._logger.setLevel(logging.WARNING)
+    _mr.seed(
+        _p.PROXY_ENTRY,
+        {
+            _p.PROXY_ENABLED_ENTRY: 1,
+            _p.PROXY_SERVER_ENTRY: "http://127.0.0.1:8080",
+            _p.PROXY_OVERRIDE_ENTRY: "<local>",
+        },
+    )
+    tracemalloc.start()
+    _p.start()
+    results = [_run(rate, args.duration, args.seed, args.tray) for rate in args.rates]
+    _p.stop()
+    report = {
+        "command": ["python", "bench/switch_stress.py"] + sys.argv[1:],
+        "revision": _revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "parameters": vars(args) | {"report": str(args.report), "settle": SETTLE},
+        "results": results,
+    }
+    args.report.write_text(json.dumps(report, indent=4), encoding="utf-8")
+
+    print(
+        f"{'rate':>5} {'got':>5} {'writes':>7} {'wakes':>6} {'lost':>6} {'reorder':>8}"
+        f" {'p50 ms':>7} {'p99 ms':>7} {'tooltips':>9} {'icons':>6} {'threads':>8}"
+        f" {'mem KiB':>8}  stale"
+    )
+    for r in results:
+        ms = r["latencyMs"]
+        print(
+            f"{r['rate']:>5} {r['achieved']:>5.0f} {r['registryWrites']:>7} {r['watcherWakes']:>6}"
+            f" {r['hostsLost']:>6} {r['reordered']:>8} {ms['p50'] or '-':>7}"
+            f" {ms['p99'] or '-':>7} {r['tooltips']:>9} {r['icons']:>6} {r['threadPeak']:>8}"
+            f" {r['memoryGrowthKiB']:>8}  {', '.join(r['stale']) or '-'}"
+        )
+        if r["ui"] is not None:
+            print(f"      {_ui.UiStats(**r['ui']).describe()}")
+    print(f"report written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
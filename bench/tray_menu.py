@@ -0,0 +1,172 @@
+"""Config menu open latency, rebuilt on every open as the tray used to do
+versus kept up to date by __traymenu's MenuModel.
+
+Both run on a real QMenu on Qt's offscreen platform, with --configs
+configs of which two thirds come from two subscriptions, which get
+submenus; "incremental flat" leaves them in the menu like the rebuilt one. Each round
+changes what the tray would see between two opens: nothing, the health of
+some configs, the active config, or one config replaced by another. The
+time is from popup() until the menu has been laid out and shown.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from PyQt5.QtCore import QPoint, qInstallMessageHandler
+from PyQt5.QtWidgets import QAction, QApplication, QMenu
+
+from App import __traymenu as _tm
+
+PREFIXES = ["team", "clash"]
+
+
+class _Tray:
+    """What the tray menu shows: configs, the active one and their health"""
+
+    def __init__(self: "_Tray", count: int, seed: int, grouped: bool) -> None:
+        self.rng = random.Random(seed)
+        self.prefixes = PREFIXES if grouped else []
+        self.keys = [
+            f"{(PREFIXES + [''])[i % 3]}{'_' if i % 3 < 2 else ''}conf{i}"
+            for i in range(count)
+        ]
+        self.active = self.keys[0]
+        self.health: dict[str, str] = {k: "120 ms" for k in self.keys}
+        self.added = count
+
+    def change(self: "_Tray", kind: str) -> None:
+        if kind == "health":
+            for key in self.rng.sample(self.keys, max(1, len(self.keys) // 10)):
+                self.health[key] = f"{self.rng.randrange(20, 400)} ms"
+        elif kind == "switch":
+            self.active = self.rng.choice(self.keys)
+        elif kind == "replace":
+            removed = self.keys.pop(self.rng.randrange(len(self.keys)))
+            self.health.pop(removed)
+            self.keys.append(f"team_conf{self.added}")
+            self.health[self.keys[-1]] = "80 ms"
+            self.added += 1
+
+    def entries(self: "_Tray") -> list[_tm.MenuEntry]:
+        return _tm.entries(self.keys, self.active, self.health.get, self.prefixes)
+
+
+def _rebuilding(menu: QMenu, tray: _Tray) -> Callable[[], None]:
+    """updateConfigActions before MenuModel"""
+
+    def update() -> None:
+        menu.clear()
+        for key in tray.keys:
+            action = QAction(f"{key}\t{tray.health[key]}", menu)
+            action.triggered.connect(lambda: None)
+            if key == tray.active:
+                action.setCheckable(True)
+                action.setChecked(True)
+            menu.addAction(action)
+
+    return update
+
+
+def _incremental(menu: QMenu, tray: _Tray) -> Callable[[], None]:
+    """ConfigMenu of __gui, without the filter"""
+    groups: dict[str, QMenu] = {}
+    separator = menu.addSeparator()
+
+    def create(entry: _tm.MenuEntry) -> QAction:
+        action = QAction(entry.text, menu)
+        action.setData(entry.key)
+        action.setCheckable(entry.checked)
+        action.setChecked(entry.checked)
+        return action
+
+    def update(action: QAction, entry: _tm.MenuEntry) -> None:
+        action.setText(entry.text)
+        action.setCheckable(entry.checked)
+        action.setChecked(entry.checked)
+
+    def drop(action: QAction, entry: _tm.MenuEntry) -> None:
+        (menu if entry.group is None else groups[entry.group]).removeAction(action)
+        action.deleteLater()
+
+    def arrange(group: str | None, actions: list[QAction]) -> None:
+        if group is None:
+            menu.insertActions(separator, actions)
+        elif actions:
+            if group not in groups:
+                groups[group] = QMenu(group, menu)
+                menu.addMenu(groups[group])
+            groups[group].addActions(actions)
+
+    model: _tm.MenuModel[QAction] = _tm.MenuModel(
+        create, update, drop, arrange, lambda a, v: a.setVisible(v)
+    )
+    return lambda: model.sync(tray.entries()) and None
+
+
+def _opens(
+    app: QApplication,
+    build: Callable[[QMenu, _Tray], Callable[[], None]],
+    count: int,
+    rounds: int,
+    seed: int,
+    grouped: bool,
+) -> dict[str, list[float]]:
+    menu = QMenu()
+    tray = _Tray(count, seed, grouped)
+    menu.aboutToShow.connect(build(menu, tray))
+    times: dict[str, list[float]] = {"first": []}
+    for kind in ["first"] + ["same", "health", "switch", "replace"] * rounds:
+        if kind != "first":
+            tray.change(kind)
+        started = time.perf_counter()
+        menu.popup(QPoint(0, 0))
+        app.processEvents()
+        times.setdefault(kind, []).append(time.perf_counter() - started)
+        menu.hide()
+        app.processEvents()
+    menu.deleteLater()
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--configs", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=20, help="opens per change")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    qInstallMessageHandler(lambda *_: None)  # the offscreen platform complains
+    app = QApplication([])
+
+    results = {
+        name: _opens(app, build, args.configs, args.rounds, args.seed, grouped)
+        for name, build, grouped in (
+            ("rebuilt", _rebuilding, False),
+            ("incremental flat", _incremental, False),
+            ("incremental", _incremental, True),
+        )
+    }
+    print(f"{args.configs} configs, median open latency in ms")
+    print(
+        f"{'':<16} {'first':>8} {'same':>8} {'health':>8} {'switch':>8} {'replace':>8}"
+    )
+    for name, times in results.items():
+        print(
+            f"{name:<16}"
+            + "".join(
+                f" {statistics.median(times[k]) * 1000:>8.2f}"
+                for k in ("first", "same", "health", "switch", "replace")
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -4,10 +4,21 @@ import traceback
 import __main__
 
 try:
-    import App
+    if "--headless" in sys.argv[1:]:
+        from App import __engine as _e
 
-    if __name__ == "__main__":
-        sys.exit(App.APP.exec_())
+        if __name__ == "__main__":
+            sys.exit(_e.runHeadless())
+    else:
+        from App import __ipc as _i
+
+        if _i.forward("show"):
+            # already running, the existing instance shows its settings instead
+            sys.exit(0)
+        from App import __gui as _g
+
+        if __name__ == "__main__":
+            sys.exit(_g.APP.exec_())
 except Exception as e:
     from pathlib import Path
 
@@ -0,0 +1,132 @@
+import argparse
+import json
+import sys
+
+from App import __ipc as _i
+
+
+def watch(since: int | None) -> int:
+    try:
+        for event in _i.stream("subscribe", {"since": since}):
+            if event["kind"] == "error":
+                print(f"proxyctl: {event['value']}", file=sys.stderr)
+                return 1
+            if event["kind"] != "ping":
+                print(json.dumps(event, ensure_ascii=False), flush=True)
+    except _i.IpcError as e:
+        print(f"proxyctl: {e}", file=sys.stderr)
+        return 1
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(
+        prog="proxyctl", description="Control the running Proxy Control instance"
+    )
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("list", help="list proxy configs")
+    sub.add_parser("status", help="show proxy status")
+    switch = sub.add_parser("switch", help="switch to a proxy config")
+    switch.add_argument("key")
+    sub.add_parser("toggle", help="toggle the system proxy")
+    sub.add_parser("on", help="enable the system proxy")
+    sub.add_parser("off", help="disable the system proxy")
+    sub.add_parser("reapply", help="reapply the network mapping")
+    sub.add_parser("forward", help="show local forwarder counters")
+    sub.add_parser("pac", help="show the served PAC file")
+    bypassCmd = sub.add_parser("bypass", help="check whether a host goes direct")
+    bypassCmd.add_argument("host")
+    resolveCmd = sub.add_parser("resolve", help="show the proxies used for a url")
+    resolveCmd.add_argument("url")
+    sub.add_parser("migrate", help="move config.json into a SQLite database")
+    sub.add_parser("netcache", help="show how often cached network decisions hit")
+    sub.add_parser("flaps", help="show flapping networks")
+    subCmd = sub.add_parser("subscriptions", help="fetch the subscriptions now")
+    subCmd.add_argument(
+        "--force", action="store_true", help="download even if not modified"
+    )
+    healthCmd = sub.add_parser("health", help="probe the configured proxies")
+    healthCmd.add_argument(
+        "--refresh", action="store_true", help="ignore cached results"
+    )
+    watchCmd = sub.add_parser("watch", help="print state changes as they happen")
+    watchCmd.add_argument("--since", type=int, help="resume after this sequence number")
+    parser.add_argument("--json", action="store_true", help="print raw JSON")
+    args = parser.parse_args()
+
+    cmd, arg = {
+        "switch": ("switch", getattr(args, "key", None)),
+        "bypass": ("bypass", getattr(args, "host", None)),
+        "resolve": ("resolve", getattr(args, "url", None)),
+        "subscriptions": ("subscriptions", getattr(args, "force", False)),
+        "on": ("toggle", True),
+        "off": ("toggle", False),
+        "health": ("health", getattr(args, "refresh", False)),
+    }.get(args.cmd, (args.cmd, None))
+    if cmd == "watch":
+        return watch(args.since)
+    try:
+        data = _i.request(cmd, arg)
+    except _i.IpcError as e:
+        print(f"proxyctl: {e}", file=sys.stderr)
+        return 1
+    if args.json:
+        print(json.dumps(data, ensure_ascii=False))
+    elif args.cmd == "list":
+        for key in data["configs"]:
+            print(f"{'*' if key == data['active'] else ' '} {key}")
+    elif args.cmd == "bypass":
+        print(f"{args.host}: {'direct' if data else 'proxy'}")
+    elif args.cmd == "resolve":
+        print("; ".join(data))
+    elif args.cmd == "subscriptions":
+        for name, r in data.items():
+            if r["error"] is not None:
+                state = f"FAIL {r['error']}"
+            elif r["notModified"]:
+                state = "not modified"
+            else:
+                state = f"+{r['added']} ~{r['updated']} -{r['removed']}"
+            print(
+                f"{name:<20} {state}"
+                + (f", {r['skipped']} skipped" if r["skipped"] else "")
+            )
+    elif args.cmd == "netcache":
+        ms = {
+            k: "-" if data[k] is None else f"{data[k] * 1000:.0f} ms"
+            for k in ("timeToCorrect", "timeToConfirm")
+        }
+        print(
+            f"{data['hits']} hits, {data['wrong']} wrong, {data['misses']} misses,"
+            f" right proxy after {ms['timeToCorrect']}"
+            f" (lookup after {ms['timeToConfirm']})"
+        )
+    elif args.cmd == "flaps":
+        print(
+            f"{data['acted']} reconnects acted on, {data['suppressed']} held back,"
+            f" {data['suppressions']} suppressions"
+        )
+        for key, n in data["networks"].items():
+            held = "  held" if n["suppressed"] else ""
+            print(f"{key or 'unknown':<30} {n['score']:>6}{held}")
+    elif args.cmd == "health":
+        for key, r in data.items():
+            state = f"{r['latency']:.0f} ms" if r["ok"] else f"FAIL {r['reason']}"
+            p50 = "-" if r["p50"] is None else f"{r['p50']:.0f}"
+            p90 = "-" if r["p90"] is None else f"{r['p90']:.0f}"
+            print(
+                f"{key:<20} {state:<20} p50 {p50} p90 {p90}"
+                f" ({r['failures']}/{r['samples']} failed)"
+            )
+    elif isinstance(data, dict):
+        for k, v in data.items():
+            print(f"{k}: {v}")
+    elif data is not None:
+        print(data)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
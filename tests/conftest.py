@@ -0,0 +1,44 @@
+import logging
+import sys
+from collections.abc import Iterator
+from pathlib import Path
+
+import __main__
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))  # the replay simulator lives there
+
+# the app keeps app.log and its data next to the main script, here that is
+# pytest's; keep them in tests/ the way the benches keep theirs in bench/
+__main__.__file__ = __file__
+
+from App import __config as _c
+from App import __log as _l
+from App import __netcache as _nc
+from App import __state as _state
+from App import __store as _store
+from App import __wpad as _wpad
+
+_l._logger.setLevel(logging.WARNING)
+
+
+@pytest.fixture
+def isolated(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    """Data files in `tmp_path` and an empty state, restored afterwards"""
+    monkeypatch.setattr(_c, "SAVE_FILE", tmp_path / "config.json")
+    monkeypatch.setattr(_store, "STORE_FILE", tmp_path / "config.db")
+    monkeypatch.setattr(_nc, "CACHE_FILE", tmp_path / "network-cache.json")
+    monkeypatch.setattr(_wpad, "PAC_CACHE_DIR", tmp_path / "pac-cache")
+    monkeypatch.setattr(_c, "generalConfig", {})
+    saved = _state.current()
+    _state.update(configs={}, active=None, mappings={}, references={}, network=None)
+    yield tmp_path
+    _state.update(
+        configs=saved.configs,
+        active=saved.active,
+        mappings=saved.mappings,
+        references=saved.references,
+        network=saved.network,
+    )
@@ -0,0 +1,105 @@
+"""Flap damping: the damper itself and replays of bouncing networks."""
+
+import random
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable
+
+import pytest
+from flap_replay import _trace, _twoNetworks
+from mapping_sim import SimResult, Simulator, Trace, quiet
+
+from App import __debounce as _d
+from App import __flap as _flap
+from App import __mapping as _m
+from App import __netcache as _nc
+from App import __proxy as _p
+from App import __toast as _t
+from App import __utils as _u
+
+UNDAMPED = _flap.FlapSettings(suppress=1e12, reuse=1e11)
+
+
+class _Clock:
+    def __init__(self: "_Clock") -> None:
+        self.now = 0.0
+
+    def __call__(self: "_Clock") -> float:
+        return self.now
+
+
+@pytest.fixture
+def replay(isolated: Path, monkeypatch: pytest.MonkeyPatch) -> Callable:
+    """Runs a trace through `Simulator`, undoing what it patches afterwards"""
+    for module, names in (
+        (_m, ("time", "_damper", "_held", "_joined", "_active")),
+        (_d, ("time",)),
+        (_nc, ("time", "_loaded", "_pending")),
+        (_u, ("isConnected", "getSSID", "getGateway", "getMacAddr")),
+        (_p, ("applyInterceptor", "setEnabled", "getEnabled", "getCurrentProxy")),
+        (_t, ("toast",)),
+    ):
+        for name in names:
+            monkeypatch.setattr(module, name, getattr(module, name))
+    monkeypatch.setattr(_nc, "_entries", OrderedDict())
+    quiet()
+
+    def run(trace: Trace, damping: _flap.FlapSettings) -> SimResult:
+        return Simulator(trace, damping).run()
+
+    return run
+
+
+def test_damper() -> None:
+    clock = _Clock()
+    damper = _flap.FlapDamper(_flap.FlapSettings(), clock)
+    assert [damper.transition("a") for _ in range(4)] == [
+        "act",
+        "act",
+        "suppress",
+        "held",
+    ]
+    assert damper.transition("b") == "act"
+    assert damper.isSuppressed("a") and not damper.isSuppressed("b")
+    # 4000 decays to the reuse score of 750 in log2(4000 / 750) half-lives
+    assert damper.releaseIn("a") == pytest.approx(60 * 2.415, abs=0.01)
+    clock.now += 60 * 2.42
+    assert not damper.isSuppressed("a")
+    assert damper.transition("a") == "act"
+    assert (damper.acted, damper.suppressed, damper.suppressions) == (4, 2, 1)
+
+
+def test_max_suppress() -> None:
+    """A network that keeps bouncing is released after maxSuppress anyway"""
+    clock = _Clock()
+    damper = _flap.FlapDamper(_flap.FlapSettings(maxSuppress=300), clock)
+    verdicts = []
+    for _ in range(60):
+        verdicts.append(damper.transition("a"))
+        clock.now += 1
+    assert verdicts[:3] == ["act", "act", "suppress"] and verdicts[-1] == "held"
+    # still far above the reuse score
+    assert damper.isSuppressed("a")
+    clock.now += 235
+    assert damper.isSuppressed("a")
+    clock.now += 10
+    assert not damper.isSuppressed("a")
+
+
+def test_settings() -> None:
+    with pytest.raises(ValueError):
+        _flap.FlapDamper(_flap.FlapSettings(suppress=500, reuse=750))
+
+
+@pytest.mark.parametrize(
+    "trace", [_trace, _twoNetworks], ids=["one day", "two known networks"]
+)
+def test_replay(replay: Callable, trace: Callable) -> None:
+    """Damping cuts registry writes and toasts on a bouncing network"""
+    events = trace(random.Random(42))
+    undamped = replay(events, UNDAMPED)
+    damped = replay(events, _flap.FlapSettings())
+    assert undamped.events == damped.events == len(events.events)
+    assert damped.writes < undamped.writes
+    assert damped.toasts < undamped.toasts
+    assert damped.correct > 0
@@ -0,0 +1,186 @@
+"""Health probes against stand-in proxies on localhost.
+
+Each stand-in answers the probe's greeting the way a kind of proxy, or
+something that is not one, would.
+"""
+
+import asyncio
+import socket
+import struct
+import time
+from typing import Awaitable, Callable
+
+import pytest
+
+from App import __health as _h
+
+TIMEOUT = 0.3
+
+Answer = Callable[[asyncio.StreamReader], Awaitable[bytes | None]]
+
+
+def _httpAnswer(status: bytes) -> Answer:
+    async def answer(reader: asyncio.StreamReader) -> bytes:
+        request = await reader.readuntil(b"\r\n\r\n")
+        target = f"{_h.HEALTH_TARGET_HOST}:{_h.HEALTH_TARGET_PORT}".encode()
+        if not request.startswith(b"CONNECT " + target + b" HTTP/1.1\r\n"):
+            return b"HTTP/1.1 400 Bad Request\r\n\r\n"
+        return b"HTTP/1.1 " + status + b"\r\n\r\n"
+
+    return answer
+
+
+def _socks4Answer(code: int) -> Answer:
+    async def answer(reader: asyncio.StreamReader) -> bytes:
+        head = await reader.readexactly(8)
+        userAndHost = await reader.readuntil(b"\0") + await reader.readuntil(b"\0")
+        # SOCKS4a: connect, IP 0.0.0.1 and the host name after the empty user id
+        expected = struct.pack(">BBH4s", 4, 1, _h.HEALTH_TARGET_PORT, b"\0\0\0\1")
+        host = b"\0" + _h.HEALTH_TARGET_HOST.encode() + b"\0"
+        granted = head == expected and userAndHost == host
+        return bytes([0, code if granted else 0x5B]) + b"\0" * 6
+
+    return answer
+
+
+def _socks5Answer(method: int) -> Answer:
+    async def answer(reader: asyncio.StreamReader) -> bytes:
+        if await reader.readexactly(3) != b"\x05\x01\x00":
+            return b"\x05\xff"
+        return bytes([5, method])
+
+    return answer
+
+
+async def _silent(reader: asyncio.StreamReader) -> None:
+    await asyncio.sleep(3600)
+    return None
+
+
+async def _hangUp(reader: asyncio.StreamReader) -> None:
+    await reader.read(1024)
+    return None
+
+
+async def _ssh(reader: asyncio.StreamReader) -> bytes:
+    return b"SSH-2.0-OpenSSH_9.6\r\n"
+
+
+async def _serve(answer: Answer) -> tuple[asyncio.Server, int]:
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            if (reply := await answer(reader)) is not None:
+                writer.write(reply)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, "127.0.0.1", 0)
+    return server, server.sockets[0].getsockname()[1]
+
+
+def _closedPort() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def _probe(proto: str, answer: Answer | None) -> str | None:
+    """The failure reason, None if the probe succeeded"""
+    if answer is None:
+        server, port = None, _closedPort()
+    else:
+        server, port = await _serve(answer)
+    try:
+        latency = await _h.probe(proto, "127.0.0.1", port, TIMEOUT)
+        assert latency >= 0
+        return None
+    except _h.ProbeError as e:
+        return str(e)
+    finally:
+        if server is not None:
+            server.close()
+
+
+@pytest.mark.parametrize(
+    "proto, answer, expected",
+    [
+        ("http", _httpAnswer(b"200 Connection established"), None),
+        ("https", _httpAnswer(b"200 OK"), None),
+        ("http", _httpAnswer(b"407 Proxy Auth Required"), "http 407"),
+        ("socks4", _socks4Answer(0x5A), None),
+        ("socks4", _socks4Answer(0x5B), "socks4 rejected 0x5b"),
+        ("socks5", _socks5Answer(0), None),
+        ("socks5h", _socks5Answer(0), None),
+        ("socks5", _socks5Answer(2), "socks5 requires authentication"),
+        ("http", _ssh, "not an http proxy"),
+        ("socks5", _ssh, "not a socks5 proxy"),
+        ("socks4", _hangUp, "connection closed"),
+        ("http", _silent, "timeout"),
+        ("http", None, "refused"),
+    ],
+    ids=[
+        "http accepted",
+        "https accepted",
+        "http auth",
+        "socks4 granted",
+        "socks4 rejected",
+        "socks5 no auth",
+        "socks5h no auth",
+        "socks5 auth",
+        "ssh as http",
+        "ssh as socks5",
+        "hang up",
+        "silent",
+        "closed port",
+    ],
+)
+def test_probe(proto: str, answer: Answer | None, expected: str | None) -> None:
+    assert asyncio.run(_probe(proto, answer)) == expected
+
+
+def test_unresolvable_host() -> None:
+    with pytest.raises(_h.ProbeError) as e:
+        asyncio.run(_h.probe("http", "proxy.invalid", 8080, TIMEOUT))
+    assert str(e.value) in ("dns", "timeout")
+
+
+def test_concurrency(monkeypatch: pytest.MonkeyPatch) -> None:
+    """Silent proxies take one timeout per batch of HEALTH_CONCURRENCY"""
+    monkeypatch.setattr(_h, "HEALTH_TIMEOUT", TIMEOUT)
+    count = _h.HEALTH_CONCURRENCY * 2 + 1
+
+    async def run() -> tuple[dict[str, _h.HealthResult], float]:
+        server, port = await _serve(_silent)
+        targets = {f"silent{i}": ("http", "127.0.0.1", port) for i in range(count)}
+        started = time.perf_counter()
+        try:
+            return await _h._probeAll(targets), time.perf_counter() - started
+        finally:
+            server.close()
+
+    results, elapsed = asyncio.run(run())
+    assert len(results) == count
+    assert all(r.reason == "timeout" for r in results.values())
+    assert 3 * TIMEOUT <= elapsed < 4 * TIMEOUT
+
+
+def test_history(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(_h, "_history", {})
+    for latency in (10.0, 30.0, None, 20.0, 40.0):
+        result = _h._record("kept", latency, None if latency else "timeout")
+    assert (result.samples, result.failures, result.p50, result.p90) == (
+        5,
+        1,
+        30.0,
+        40.0,
+    )
+    for _ in range(_h.HEALTH_HISTORY):
+        result = _h._record("kept", None, "refused")
+    assert (result.samples, result.failures, result.p50) == (
+        _h.HEALTH_HISTORY,
+        _h.HEALTH_HISTORY,
+        None,
+    )
@@ -0,0 +1,118 @@
+"""The PAC evaluator: helpers, results and the limits on runaway scripts."""
+
+import time
+
+import pytest
+
+from App import __pacjs as _js
+
+# scripts that must fail cleanly, and quickly
+RUNAWAY = {
+    "doubling string": 'var a = "a"; while (true) a = a + a;',
+    "growing array": "var a = [1]; while (true) a[a.length * 2] = 1;",
+    "sparse array": "var a = []; a[4000000000] = 1;",
+    "doubling concat": 'var a = ["aaaaaaaa"]; while (true) a = a.concat(a);',
+    "global replace": 'var a = "aaaaaaaaaa"; while (true) a = a.replace(/a/g, a);',
+    "joined array": 'var a = ["a", "a"]; while (true) a = [a.join(a.join("")), "a"];',
+    "nested repeats": 'var a = /^(a+)+$/.test("aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa!");',
+    "repeat and space": 'var a = /^(\\w+\\s?)+$/.test("aaaaaaaaaaaaaaaaaaaaaaaaaaaaaa!");',
+    "three wildcards": 'var s = "a"; while (s.length < 3000) s = s + s;'
+    + " var a = /.*a.*a.*b/.test(s);",
+    "endless loop": "while (true) {}",
+    "recursion": "function f() { return f(); } f();",
+}
+# regexes PAC files use, which must keep working on long input, and whether
+# they match it
+SAFE = {
+    r"^([a-z0-9-]+\.)+example\.com$": ("a" * 200 + ".example.com", True),
+    r"^https?://[^/]*\.example\.com/": ("https://x.example.com/" + "p/" * 2000, True),
+    r".*\.example\.com": ("www.example.com" * 100, True),
+    r"^\d+\.\d+\.\d+\.\d+$": ("10." * 500 + "1", False),
+}
+TIME_LIMIT = 5.0  # a million loop steps take a second or two
+
+PAC = """
+function FindProxyForURL(url, host) {
+  if (isPlainHostName(host) || dnsDomainIs(host, ".corp.example")) return "DIRECT";
+  if (shExpMatch(host, "*.cdn?.example.net")) return "PROXY cdn:3128; DIRECT";
+  var ip = dnsResolve(host);
+  if (ip && isInNet(ip, "10.0.0.0", "255.0.0.0")) return "DIRECT";
+  if (url.substring(0, 6) == "https:") return "HTTPS secure:443";
+  return "PROXY proxy1:8080;  SOCKS5 proxy2:1080";
+}
+"""
+
+
+class _FixedResolver(_js.Resolver):
+    def lookup(self: "_FixedResolver", host: str) -> str | None:
+        return "10.1.2.3" if host.startswith("inside.") else "93.184.216.34"
+
+
+@pytest.mark.parametrize("body", RUNAWAY.values(), ids=RUNAWAY.keys())
+def test_runaway(body: str) -> None:
+    source = body + "\nfunction FindProxyForURL(url, host) { return 'DIRECT'; }"
+    started = time.perf_counter()
+    with pytest.raises(_js.PacError):
+        _js.PacScript(source)
+    assert time.perf_counter() - started < TIME_LIMIT
+
+
+@pytest.mark.parametrize(
+    "pattern, subject, matches",
+    [(pattern, *case) for pattern, case in SAFE.items()],
+    ids=SAFE.keys(),
+)
+def test_safe_regex(pattern: str, subject: str, matches: bool) -> None:
+    literal = pattern.replace("/", "\\/")
+    source = f"""
+function FindProxyForURL(url, host) {{
+  return /{literal}/.test(host) ? "PROXY p:1" : "DIRECT";
+}}"""
+    started = time.perf_counter()
+    result = _js.PacScript(source).findProxy("http://h/", subject)
+    assert result == ("PROXY p:1" if matches else "DIRECT")
+    assert time.perf_counter() - started < TIME_LIMIT
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("http://intranet/", ["DIRECT"]),
+        ("http://wiki.corp.example:8080/", ["DIRECT"]),
+        ("http://a.cdn1.example.net/x", ["PROXY cdn:3128", "DIRECT"]),
+        ("http://a.cdn12.example.net/x", ["PROXY proxy1:8080", "SOCKS5 proxy2:1080"]),
+        ("http://inside.example.com/", ["DIRECT"]),
+        ("https://example.com/", ["HTTPS secure:443"]),
+        ("http://user@example.com/", ["PROXY proxy1:8080", "SOCKS5 proxy2:1080"]),
+    ],
+)
+def test_find_proxy(url: str, expected: list[str]) -> None:
+    script = _js.PacScript(PAC, _FixedResolver())
+    assert _js.parseResult(script.findProxy(url)) == expected
+
+
+def test_memo() -> None:
+    script = _js.PacScript(PAC, _FixedResolver())
+    for path in ("a", "b", "c"):
+        script.findProxy(f"http://example.com/{path}")
+    script.findProxy("https://example.com/")
+    assert (script.hits, script.misses) == (2, 2)
+
+
+@pytest.mark.parametrize(
+    "entry, expected",
+    [
+        ("PROXY a:8080", ("http", "a", 8080)),
+        ("HTTPS a:443", ("https", "a", 443)),
+        ("SOCKS a:1080", ("socks4", "a", 1080)),
+        ("SOCKS5 a:1080", ("socks5", "a", 1080)),
+        ("DIRECT", None),
+    ],
+)
+def test_split_entry(entry: str, expected: tuple[str, str, int] | None) -> None:
+    assert _js.splitEntry(entry) == expected
+
+
+def test_missing_function() -> None:
+    with pytest.raises(_js.PacError):
+        _js.PacScript("var a = 1;")
@@ -0,0 +1,181 @@
+"""The ProxyServer and ProxyOverride parsers and serializers."""
+
+import random
+import string
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+import pytest
+
+from App import __config as _c
+from App import __memreg as _mr
+from App import __proxy as _p
+from App import __state as _state
+
+E = _p.ProxyEndpoint
+# values as other tools write them, and what WinINet makes of them
+KNOWN: dict[str, _p.ProxyServer] = {
+    "": _p.ProxyServer(None),
+    "127.0.0.1:8080": _p.ProxyServer(E("http", "127.0.0.1", 8080)),
+    "proxy.corp": _p.ProxyServer(E("http", "proxy.corp", 80)),
+    "socks5://10.0.0.1": _p.ProxyServer(E("socks5", "10.0.0.1", 1080)),
+    "HTTPS://Proxy.Corp:8443/": _p.ProxyServer(E("https", "Proxy.Corp", 8443)),
+    "[::1]:3128": _p.ProxyServer(E("http", "::1", 3128)),
+    "http=127.0.0.1:7890;https=127.0.0.1:7890;socks=127.0.0.1:7891": _p.ProxyServer(
+        None,
+        (
+            ("http", E("http", "127.0.0.1", 7890)),
+            ("https", E("http", "127.0.0.1", 7890)),
+            ("socks", E("socks4", "127.0.0.1", 7891)),
+        ),
+    ),
+    " https=h:1  ftp=h:2; ;": _p.ProxyServer(
+        None, (("https", E("http", "h", 1)), ("ftp", E("http", "h", 2)))
+    ),
+    "http=http://h:1;socks=socks5://s": _p.ProxyServer(
+        None, (("http", E("http", "h", 1)), ("socks", E("socks5", "s", 1080)))
+    ),
+    "a:1;https=b:2": _p.ProxyServer(E("http", "a", 1), (("https", E("http", "b", 2)),)),
+}
+INVALID = ["a:1;b:2", "ftp://h:21", "h:0", "h:65536", "http=", "h:port", "[::1"]
+OVERRIDES: dict[str, tuple[str, ...]] = {
+    "": (),
+    "<local>": ("<local>",),
+    " localhost ; 192.168.*;;<local>;": ("localhost", "192.168.*", "<local>"),
+}
+ROUND_TRIPS = 2000
+
+
+def _host(rng: random.Random) -> str:
+    kind = rng.randrange(3)
+    if kind == 0:
+        return ".".join(str(rng.randrange(256)) for _ in range(4))
+    if kind == 1:
+        return ":".join(f"{rng.randrange(65536):x}" for _ in range(rng.randint(2, 8)))
+    labels = rng.randint(1, 4)
+    return ".".join(
+        "".join(
+            rng.choices(
+                string.ascii_letters + string.digits + "-", k=rng.randint(1, 10)
+            )
+        )
+        for _ in range(labels)
+    )
+
+
+def _endpoint(rng: random.Random) -> _p.ProxyEndpoint:
+    proto = rng.choice(_p.PROXY_ALLOWED_PROTOS)
+    return _p.ProxyEndpoint(proto, _host(rng), rng.randint(1, 65535))
+
+
+def _server(rng: random.Random) -> _p.ProxyServer:
+    default = _endpoint(rng) if rng.random() < 0.5 else None
+    schemes = tuple(
+        (rng.choice(["http", "https", "ftp", "socks", "gopher"]), _endpoint(rng))
+        for _ in range(rng.randrange(0 if default else 1, 5))
+    )
+    return _p.ProxyServer(default, schemes)
+
+
+def _override(rng: random.Random) -> tuple[str, ...]:
+    chars = string.ascii_lowercase + string.digits + ".*-<>"
+    return tuple(
+        "".join(rng.choices(chars, k=rng.randint(1, 16)))
+        for _ in range(rng.randrange(8))
+    )
+
+
+@pytest.mark.parametrize("text, expected", KNOWN.items(), ids=repr)
+def test_known(text: str, expected: _p.ProxyServer) -> None:
+    read = _p.parseServer(text)
+    assert read == expected
+    assert _p.parseServer(_p.serializeServer(read)) == read
+
+
+@pytest.mark.parametrize("text", INVALID)
+def test_invalid(text: str) -> None:
+    with pytest.raises(ValueError):
+        _p.parseServer(text)
+
+
+@pytest.mark.parametrize("text, expected", OVERRIDES.items(), ids=repr)
+def test_override(text: str, expected: tuple[str, ...]) -> None:
+    assert _p.parseOverride(text) == expected
+
+
+@pytest.mark.parametrize("seed", range(4))
+def test_round_trip(seed: int) -> None:
+    """Random values read back as themselves, and serialize the same once read"""
+    rng = random.Random(seed)
+    for _ in range(ROUND_TRIPS):
+        server = _server(rng)
+        text = _p.serializeServer(server)
+        assert _p.parseServer(text) == server, text
+        assert _p.serializeServer(_p.parseServer(text)) == text
+        entries = _override(rng)
+        assert _p.parseOverride(_p.serializeOverride(entries)) == entries
+
+
+@pytest.fixture
+def registry(isolated: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[None]:
+    """An empty in-memory registry, emptied again afterwards"""
+    if _p.reg.RegKey is not _mr.RegKey:
+        pytest.skip("needs the in-memory registry")
+    _mr.reset()
+    yield
+    _p.stop()
+    _mr.reset()
+
+
+def test_registry(registry: None, monkeypatch: pytest.MonkeyPatch) -> None:
+    """A per-scheme value read by the watcher, getCurrentProxy and identifyActive"""
+    _mr.seed(
+        _p.PROXY_ENTRY,
+        {
+            _p.PROXY_ENABLED_ENTRY: 1,
+            _p.PROXY_SERVER_ENTRY: "http://127.0.0.1:8080",
+            _p.PROXY_OVERRIDE_ENTRY: "<local>",
+        },
+    )
+    _state.update(
+        configs={
+            "other": _p.ProxyConfig(
+                proxy=_p.SpecificProxy(
+                    host="127.0.0.1", port=8080, noProxyies=["<local>"]
+                )
+            ),
+            "clash": _p.ProxyConfig(
+                proxy=_p.SpecificProxy(
+                    host="127.0.0.1", port=7890, noProxyies=["localhost", "<local>"]
+                )
+            ),
+        },
+        active=None,
+    )
+    seen = {"host": threading.Event(), "port": threading.Event()}
+    monkeypatch.setattr(
+        _p, "hostCallback", lambda h: h == "127.0.0.1" and seen["host"].set()
+    )
+    monkeypatch.setattr(_p, "portCallback", lambda p: p == 7890 and seen["port"].set())
+    _p.start()
+    while not _mr.waiters(_p.PROXY_ENTRY):
+        pass
+    with _mr.RegKey(
+        _mr.getHKey(_mr.RegKeyRoot.HKEY_CURRENT_USER),
+        _p.PROXY_ENTRY,
+        _mr.RegKeyAccess.KEY_WRITE,
+    ) as key:
+        key.setValue(
+            _p.PROXY_SERVER_ENTRY,
+            "http=127.0.0.1:7890;https=127.0.0.1:7890;socks=127.0.0.1:7891",
+            _mr.RegValueType.REG_SZ,
+        )
+        key.setValue(
+            _p.PROXY_OVERRIDE_ENTRY, "localhost;<local>", _mr.RegValueType.REG_SZ
+        )
+    assert seen["host"].wait(1) and seen["port"].wait(1)
+    _p.stop()
+    assert _p.getCurrentProxy().proxy.url == "http://127.0.0.1:7890"  # type: ignore
+    _c.identifyActive()
+    assert _state.current().active == "clash"
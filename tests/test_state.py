@@ -0,0 +1,131 @@
+"""The state snapshot: publication, waiting and readers against writers."""
+
+import random
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from App import __config as _c
+from App import __mapping as _m
+from App import __proxy as _p
+from App import __state as _state
+
+DURATION = 1.0
+READERS = 4
+STABLE = 50  # configs the writers never touch, one of them is active
+PAIRS = 200  # pair_a_i and pair_b_i are always published together
+
+
+def _config(i: int) -> _p.ProxyConfig:
+    return _p.ProxyConfig(proxy=_p.SpecificProxy(host=f"10.0.0.{i % 250}", port=i))
+
+
+def _network(i: int) -> _p.Network:
+    return _p.Network(ssid=f"ssid{i % 40}", mac=None if i % 3 else f"mac{i}")
+
+
+def test_modify(isolated: Path) -> None:
+    before = _state.current()
+    snap = _state.update(active="a", configs={"a": _config(1)})
+    assert snap.version == before.version + 1
+    assert _state.current() is snap and _state.version() == snap.version
+    assert before.active is None and not before.configs
+    assert _state.modify(lambda s: None) is snap
+    with pytest.raises(TypeError):
+        snap.configs["b"] = _config(2)  # type: ignore[index]
+    with pytest.raises(ValueError):
+        _state.update(unknown=1)
+    assert _state.version() == snap.version
+
+
+def test_wait(isolated: Path) -> None:
+    since = _state.version()
+    assert _state.wait(since, 0.05).version == since
+    timer = threading.Timer(0.05, lambda: _state.update(active="later"))
+    timer.start()
+    snap = _state.wait(since, 5.0)
+    timer.join()
+    assert (snap.version, snap.active) == (since + 1, "later")
+
+
+def test_readers_and_writers(isolated: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    """Readers never see a version go back, the active config missing, half
+    of a pair published together, or a mapping without its reference"""
+    # the state, not the disk
+    monkeypatch.setattr(_c, "_persist", lambda *_: None)
+    monkeypatch.setattr(_m, "_saveConfig", lambda *_: None)
+    _state.update(
+        configs={f"stable_{i}": _config(i) for i in range(STABLE)},
+        active="stable_0",
+    )
+    errors: list[str] = []
+    reads = [0] * READERS
+    notified = [0]
+    stop = threading.Event()
+
+    def reader(index: int) -> None:
+        rng = random.Random(index)
+        last = 0
+        while not stop.is_set():
+            snap = _state.current()
+            if snap.version < last:
+                errors.append(f"version went back {last} -> {snap.version}")
+            last = snap.version
+            if snap.active is not None and snap.active not in snap.configs:
+                errors.append(f"active {snap.active} missing at {snap.version}")
+            if sum(1 for k in snap.configs if k.startswith("pair_")) % 2:
+                errors.append(f"half a pair visible at {snap.version}")
+            for nwInfo, confName in snap.mappings.items():
+                if confName is not None and nwInfo not in snap.references.get(
+                    confName, ()
+                ):
+                    errors.append(f"{nwInfo} unreferenced at {snap.version}")
+            _m._lookup(_network(rng.randrange(1000)), snap)
+            reads[index] += 1
+
+    def configWriter() -> None:
+        rng = random.Random(1)
+        while not stop.is_set():
+            i = rng.randrange(PAIRS)
+            proxy = None if f"pair_a_{i}" in _c.configs() else _config(i)
+            _c.updateProxies({f"pair_a_{i}": proxy, f"pair_b_{i}": proxy})
+
+    def otherWriter() -> None:
+        rng = random.Random(2)
+        while not stop.is_set():
+            kind = rng.randrange(3)
+            if kind == 0:
+                key = f"stable_{rng.randrange(STABLE)}"
+                _state.modify(lambda s: {"active": key})
+            elif kind == 1:
+                nwInfo = _network(rng.randrange(1000))
+                if rng.random() < 0.5:
+                    _m.addMapping(nwInfo, f"stable_{rng.randrange(STABLE)}")
+                else:
+                    _m.removeMapping(nwInfo)
+            else:
+                _state.update(network=_network(rng.randrange(1000)))
+
+    def watcher() -> None:
+        seen = _state.version()
+        while not stop.is_set():
+            if (snap := _state.wait(seen, 0.1)).version > seen:
+                notified[0] += 1
+                seen = snap.version
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(READERS)]
+    threads += [threading.Thread(target=t) for t in (configWriter, otherWriter)]
+    threads.append(threading.Thread(target=watcher))
+    start = _state.version()
+    for t in threads:
+        t.start()
+    time.sleep(DURATION)
+    stop.set()
+    for t in threads:
+        t.join()
+    assert errors[:10] == []
+    assert all(reads)
+    assert _state.version() > start
+    assert 0 < notified[0] <= _state.version() - start
@@ -0,0 +1,190 @@
+"""Subscription sync against a local server: the diff and what gets saved."""
+
+import hashlib
+import http.server
+import json
+import random
+import threading
+from collections.abc import Callable, Iterator
+from pathlib import Path
+
+import pytest
+
+from App import __config as _c
+from App import __proxy as _p
+from App import __subscription as _sub
+
+ENTRIES = 200
+CHANGES = 5
+
+
+def _entries(rng: random.Random, n: int) -> list[dict]:
+    return [
+        {
+            "name": f"node-{i:05d}",
+            "type": rng.choice(["http", "socks5", "http"]),
+            "server": f"10.{i >> 8 & 255}.{i & 255}.{rng.randrange(1, 255)}",
+            "port": rng.choice([1080, 3128, 8080]),
+        }
+        for i in range(n)
+    ]
+
+
+def _yaml(entries: list[dict]) -> str:
+    lines = ["mixed-port: 7890", "proxies:"]
+    for i, e in enumerate(entries):
+        if i % 2:
+            lines.append(
+                f"  - {{name: \"{e['name']}\", type: {e['type']},"
+                f" server: {e['server']}, port: {e['port']}}}"
+            )
+        else:
+            lines += [
+                f"  - name: \"{e['name']}\"  # comment",
+                f"    type: {e['type']}",
+                f"    server: {e['server']}",
+                f"    port: {e['port']}",
+                "    skip-cert-verify: true",
+                "    ws-opts:",
+                "      path: /",
+            ]
+    lines += ["proxy-groups:", "  - name: auto", "    type: url-test"]
+    return "\n".join(lines) + "\n"
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    bodies: dict[str, bytes]
+    hits: dict[str, int]
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    server: _Server
+
+    def do_GET(self) -> None:
+        body = self.server.bodies[self.path]
+        etag = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.server.hits["304"] += 1
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.server.hits["200"] += 1
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: object) -> None:
+        pass
+
+
+class _Lists:
+    """The served lists and how often configs were saved"""
+
+    def __init__(self: "_Lists", server: _Server):
+        self.server = server
+        self.saves = 0
+
+    def publish(self: "_Lists", entries: list[dict]) -> None:
+        self.server.bodies["/list.json"] = json.dumps(entries).encode("utf-8")
+        self.server.bodies["/clash.yaml"] = _yaml(entries).encode("utf-8")
+
+    def refresh(self: "_Lists") -> dict[str, str]:
+        return {name: r.describe() for name, r in _sub.refresh().items()}
+
+
+@pytest.fixture
+def lists(isolated: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[_Lists]:
+    """A JSON and a YAML subscription of the same entries"""
+    server = _Server(("127.0.0.1", 0), _Handler)
+    server.bodies = {}
+    server.hits = {"200": 0, "304": 0}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    _c.generalConfig[_sub.SUBSCRIPTIONS_ENTRY] = [
+        {"name": "json", "url": f"{base}/list.json"},
+        {"name": "yaml", "url": f"{base}/clash.yaml"},
+    ]
+    monkeypatch.setattr(_sub, "_results", {})
+    monkeypatch.setattr(_sub, "_lastCheck", {})
+    ret = _Lists(server)
+    save: Callable[[], None] = _c.save
+
+    def countingSave() -> None:
+        ret.saves += 1
+        save()
+
+    monkeypatch.setattr(_c, "save", countingSave)
+    ret.publish(_entries(random.Random(37), ENTRIES))
+    yield ret
+    server.shutdown()
+    server.server_close()
+
+
+def test_initial(lists: _Lists) -> None:
+    assert lists.refresh() == {"json": f"+{ENTRIES} ~0 -0", "yaml": f"+{ENTRIES} ~0 -0"}
+    assert lists.saves == 2
+    configs = _c.configs()
+    assert len(configs) == 2 * ENTRIES
+    entry = json.loads(lists.server.bodies["/list.json"])[0]
+    for name in ("json", "yaml"):
+        proxy = configs[_sub.key(_sub.Subscription(name=name, url=""), entry["name"])]
+        assert isinstance(proxy.proxy, _p.SpecificProxy)
+        assert (proxy.proxy.proto, proxy.proxy.host, proxy.proxy.port) == (
+            entry["type"],
+            entry["server"],
+            entry["port"],
+        )
+    assert _c.SAVE_FILE.exists()
+
+
+def test_unchanged(lists: _Lists) -> None:
+    lists.refresh()
+    saves = lists.saves
+    assert lists.refresh() == {"json": "not modified", "yaml": "not modified"}
+    assert lists.saves == saves
+    assert lists.server.hits == {"200": 2, "304": 2}
+
+
+def test_changed(lists: _Lists) -> None:
+    rng = random.Random(1)
+    entries = _entries(random.Random(37), ENTRIES)
+    lists.refresh()
+    saves = lists.saves
+    changed = entries[CHANGES:]
+    for e in rng.sample(changed, CHANGES):
+        e["port"] += 1
+    for e in _entries(rng, CHANGES):
+        changed.append(dict(e, name=f"new-{e['name']}"))
+    lists.publish(changed)
+    expected = f"+{CHANGES} ~{CHANGES} -{CHANGES}"
+    assert lists.refresh() == {"json": expected, "yaml": expected}
+    assert lists.saves == saves + 2
+    assert len(_c.configs()) == 2 * ENTRIES
+    assert lists.refresh() == {"json": "not modified", "yaml": "not modified"}
+
+
+def test_foreign_config(lists: _Lists) -> None:
+    """A config the subscription did not create keeps its name"""
+    foreign = _p.ProxyConfig(
+        proxy=_p.SpecificProxy(proto="http", host="mine", port=1)  # type: ignore
+    )
+    _c.updateProxies({"json_node_00000": foreign})
+    assert lists.refresh()["json"] == f"+{ENTRIES - 1} ~0 -0, 1 skipped"
+    assert _c.configs()["json_node_00000"] == foreign
+
+
+def test_unparsable(lists: _Lists) -> None:
+    lists.refresh()
+    before = _c.configs()
+    lists.server.bodies["/clash.yaml"] = b"<html>502 Bad Gateway</html>\n"
+    assert lists.refresh()["yaml"].startswith("✗")
+    assert _c.configs() == before
+
+
+def test_removed(lists: _Lists) -> None:
+    lists.refresh()
+    _c.generalConfig[_sub.SUBSCRIPTIONS_ENTRY].pop()
+    lists.refresh()
+    assert {k.split("_", 1)[0] for k in _c.configs()} == {"json"}
@@ -0,0 +1,132 @@
+"""WPAD discovery and PAC fetching against a stand-in server."""
+
+import hashlib
+import http.server
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from App import __proxy as _p
+from App import __wpad as _wpad
+
+PAC = """
+function FindProxyForURL(url, host) {
+  if (dnsDomainIs(host, ".corp.example") || isPlainHostName(host)) return "DIRECT";
+  if (shExpMatch(url, "https://*")) return "PROXY %s:8443; DIRECT";
+  return "PROXY %s:8080";
+}
+"""
+
+
+class _Server(http.server.ThreadingHTTPServer):
+    body = b""
+    requests = 0
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    server: _Server
+
+    def do_GET(self) -> None:
+        self.server.requests += 1
+        if self.path != f"/{_wpad.WPAD_FILE}":
+            self.send_error(404)
+            return
+        body = self.server.body
+        etag = f'"{hashlib.sha1(body).hexdigest()[:8]}"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ns-proxy-autoconfig")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def server(isolated: Path, monkeypatch: pytest.MonkeyPatch) -> Iterator[_Server]:
+    """A WPAD host whose first candidate answers 404, with empty caches"""
+    monkeypatch.setattr(_wpad, "_entries", {})
+    monkeypatch.setattr(_wpad, "_scripts", {})
+    monkeypatch.setattr(_wpad, "_stats", dict.fromkeys(_wpad._stats, 0))
+    monkeypatch.setattr(_wpad, "_discovered", None)
+    server = _Server(("127.0.0.1", 0), _Handler)
+    server.body = (PAC % ("a", "a")).encode()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    # the names WPAD would try, most specific first
+    monkeypatch.setattr(
+        _wpad,
+        "candidates",
+        lambda fqdn=None: [
+            f"{base}/missing/{_wpad.WPAD_FILE}",
+            f"{base}/{_wpad.WPAD_FILE}",
+        ],
+    )
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def test_candidates() -> None:
+    assert _wpad.candidates("pc.dept.corp.example") == [
+        "http://wpad.dept.corp.example/wpad.dat",
+        "http://wpad.corp.example/wpad.dat",
+    ]
+    assert _wpad.candidates("pc") == []
+
+
+@pytest.mark.parametrize(
+    "url, expected",
+    [
+        ("http://intranet/", ["DIRECT"]),
+        ("http://wiki.corp.example/", ["DIRECT"]),
+        ("https://example.com/", ["PROXY a:8443", "DIRECT"]),
+        ("http://example.com/", ["PROXY a:8080"]),
+    ],
+)
+def test_discovery(server: _Server, url: str, expected: list[str]) -> None:
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    assert _wpad.discover() == f"{base}/{_wpad.WPAD_FILE}"
+    assert server.requests == 2
+    assert _wpad.resolve(url, _p.PacProxy()) == expected
+
+
+def test_revalidation(server: _Server) -> None:
+    pac = _p.PacProxy()
+    url = _wpad.discover()
+    assert _wpad.resolve("http://x.y/", pac) == ["PROXY a:8080"]
+    _wpad.fetch(url, force=True)
+    assert _wpad.stats()["notModified"] == 1
+    server.body = (PAC % ("b", "b")).encode()
+    _wpad.fetch(url, force=True)
+    assert _wpad.stats()["downloads"] == 2
+    assert _wpad.resolve("http://x/", pac) == ["DIRECT"]
+    assert _wpad.resolve("http://x.y/", pac) == ["PROXY b:8080"]
+
+
+def test_fallback(server: _Server) -> None:
+    url = _wpad.discover()
+    body = server.body.decode()
+    server.shutdown()
+    server.server_close()
+    assert _wpad.fetch(url, force=True) == body
+    assert _wpad.stats()["fallbacks"] == 1
+    _wpad._entries.clear()
+    assert _wpad.fetch(url, force=True) == body
+    assert _wpad.stats()["fallbacks"] == 2
+
+
+def test_nothing_found(server: _Server, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(_wpad, "candidates", lambda fqdn=None: [])
+    with pytest.raises(_wpad.PacFetchError):
+        _wpad.discover()